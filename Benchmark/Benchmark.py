@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark reprodutível das versões Não Paralela (NP) e Paralela (P).
+
+Gera CSVs sintéticos com os esquemas reais (comum/sinteticos.py) em várias escalas,
+executa cada modo de execução com aquecimento e repetições, cada execução em um
+processo novo, e mede tempo de parede, vazão (linhas/s e MB/s) e pico de memória (RSS).
+No fim gera o relatório de speedup/eficiência em PDF e em JSON.
+
+Todos os modos gravam as mesmas saídas, o ResumoMetas.csv e o gráfico da Meta 1, para
+que o speedup compare o mesmo trabalho: o Consolidado.csv, o consolidado colunar, o
+cubo, os gráficos por meta e por ramo, a série mensal, o resumo parcial e a
+instrumentação ficam desligados nas versões NP e P (o ponto de entrada único não os gera).
+
+Os dados sintéticos são gerados em um processo à parte: no Linux, um processo filho
+começa com o pico de RSS (ru_maxrss) do pai, mesmo depois do exec, e a geração levaria o
+pico do benchmark para todas as medições.
+
+O speedup de cada modo é calculado em relação à NP original (leitura completa e
+concatenação, sem cache), na mesma escala. A eficiência divide o speedup pelo número
+de processos usados pelo modo.
+
+Exemplos:
+    python Benchmark/Benchmark.py --linhas 1e3 1e4 1e5 --tribunais 5 50
+    python Benchmark/Benchmark.py --linhas 1e6 --tribunais 300 --modos np_streaming p
+    python Benchmark/Benchmark.py --comparar resultados_benchmark/anterior.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+# Permite importar o pacote `comum` (na raiz do projeto) ao executar o script diretamente
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ_PROJETO)
+from comum.instrumentacao import pico_rss_mb
+
+# Saídas de todos os modos: só o ResumoMetas.csv e o gráfico da Meta 1
+SAIDAS = {
+    "NP": {"GERAR_CONSOLIDADO_CSV": False, "GERAR_CONSOLIDADO_COLUNAR": False, "GERAR_CUBO": False,
+           "GERAR_GRAFICOS_METAS": False, "GERAR_SERIE_MENSAL": False, "GERAR_RESUMO_PARCIAL": False,
+           "INSTRUMENTAR": False},
+    "P": {"WRITE_CSV": False, "COLUMNAR_OUTPUT": False, "BUILD_CUBE": False, "ALL_CHARTS": False,
+          "MONTHLY_SERIES": False, "PROGRESSIVE_SUMMARY": False, "INSTRUMENT": False},
+    "EXEC": {"graficos": False, "grafico_meta1": True, "instrumentar": False},
+}
+
+# Modos de execução: script, configurações sobrescritas e número de processos usados
+MODOS = {
+    "np_completo": {"versao": "NP", "config": {"MODO_STREAMING": False, "MODO_INCREMENTAL": False, "USAR_CACHE": False,
+                                               "INGESTAO_TIPADA": False}},
+    "np_tipado": {"versao": "NP", "config": {"MODO_STREAMING": False, "MODO_INCREMENTAL": False, "USAR_CACHE": False,
+                                             "INGESTAO_TIPADA": True, "MODO_PIPELINE": False}},
+    "np_pipeline": {"versao": "NP", "config": {"MODO_STREAMING": False, "MODO_INCREMENTAL": False, "USAR_CACHE": False,
+                                               "INGESTAO_TIPADA": True, "MODO_PIPELINE": True}},
+    "np_streaming": {"versao": "NP", "config": {"MODO_STREAMING": True, "MODO_INCREMENTAL": False, "USAR_CACHE": False}},
+    "np_cache": {"versao": "NP", "config": {"MODO_STREAMING": True, "MODO_INCREMENTAL": False, "USAR_CACHE": True}},
+    "np_incremental": {"versao": "NP", "config": {"MODO_INCREMENTAL": True, "USAR_CACHE": True}},
+    "p": {"versao": "P", "config": {"USE_CACHE": False, "USE_INCREMENTAL": False}},
+    "p_cache": {"versao": "P", "config": {"USE_CACHE": True, "USE_INCREMENTAL": False}},
+    "p_incremental": {"versao": "P", "config": {"USE_CACHE": True, "USE_INCREMENTAL": True}},
+    # Ponto de entrada único (comum/execucao.py), um modo por backend
+    **{f"exec_{backend}": {"versao": "EXEC", "config": {"backend": backend}}
+       for backend in ("auto", "serial", "threads", "processos", "blocos", "pipeline")},
+}
+MODO_REFERENCIA = "np_completo"
+
+DIRETORIO_DADOS_SINTETICOS = "./benchmark_dados"
+DIRETORIO_RESULTADOS = "./resultados_benchmark"
+TOLERANCIA_REGRESSAO = 0.10 # 10% mais lento que a execução anterior conta como regressão
+
+
+def gerar_dados(destino, linhas, tribunais, semente):
+    """
+    Gera os CSVs sintéticos de uma escala em um processo Python novo e retorna o manifesto
+    (este processo não importa o pandas, para que o pico dele continue pequeno).
+    """
+    os.makedirs(destino, exist_ok=True)
+    arquivo_manifesto = os.path.abspath(os.path.join(destino, "manifesto_benchmark.json"))
+    subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--gerar", os.path.abspath(destino), str(linhas), str(tribunais),
+         str(semente), arquivo_manifesto],
+        check=True,
+    )
+    with open(arquivo_manifesto, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def executar_modo(modo, diretorio_dados, diretorio_trabalho):
+    """
+    Executa um modo neste processo (chamado pelo subprocesso de cada medição) e retorna
+    tempo de parede e pico de RSS do processo principal e dos processos filhos (Pool).
+    """
+    os.makedirs(diretorio_trabalho, exist_ok=True)
+    os.chdir(diretorio_trabalho)
+    definicao = MODOS[modo]
+    if definicao["versao"] == "NP":
+        sys.path.insert(0, os.path.join(RAIZ_PROJETO, "Versao_NP"))
+        import Versao_NP as modulo
+        modulo.DIRETORIO_ENTRADA = diretorio_dados
+        modulo.ARQUIVO_CONSOLIDADO = os.path.join(diretorio_trabalho, "Consolidado.csv")
+        modulo.ARQUIVO_RESUMO_METAS = os.path.join(diretorio_trabalho, "ResumoMetas.csv")
+        modulo.ARQUIVO_GRAFICO = os.path.join(diretorio_trabalho, "grafico_meta1.png")
+        modulo.ARQUIVO_TEMPO_NP = os.path.join(diretorio_trabalho, "tempo_np.txt")
+        modulo.ARQUIVO_INSTRUMENTACAO = os.path.join(diretorio_trabalho, "instrumentacao_np.jsonl")
+        modulo.ARQUIVO_TRACE = os.path.join(diretorio_trabalho, "trace_np.json")
+        modulo.DIRETORIO_CUBO = os.path.join(diretorio_trabalho, "cubo")
+        modulo.DIRETORIO_CONSOLIDADO_COLUNAR = os.path.join(diretorio_trabalho, "Consolidado_colunar")
+        modulo.DIRETORIO_CACHE = os.path.join(diretorio_trabalho, ".cache_tribunais")
+        modulo.DIRETORIO_ESTADO = os.path.join(diretorio_trabalho, ".cache_tribunais", "estado_np")
+        modulo.DIRETORIO_GRAFICOS = os.path.join(diretorio_trabalho, "graficos")
+        modulo.ARQUIVO_SERIE_MENSAL = os.path.join(diretorio_trabalho, "SerieMensalMetas.csv")
+        modulo.DIRETORIO_ESTADO_SERIE = os.path.join(diretorio_trabalho, ".cache_tribunais", "estado_serie_np")
+        principal = modulo.main_np
+    elif definicao["versao"] == "EXEC":
+        from comum import execucao
+        plano = {}
+
+        def principal():
+            plano["usado"], _ = execucao.executar(diretorio_dados, diretorio_trabalho,
+                                                  **{**SAIDAS["EXEC"], **definicao["config"]})
+    else:
+        # A versão P usa caminhos relativos (./Dados, ./results, ./.cache)
+        if not os.path.lexists("Dados"):
+            os.symlink(diretorio_dados, "Dados")
+        sys.path.insert(0, os.path.join(RAIZ_PROJETO, "Versao_P"))
+        import Versao_P as modulo
+        principal = modulo.main
+    if definicao["versao"] != "EXEC":
+        for nome, valor in {**SAIDAS[definicao["versao"]], **definicao["config"]}.items():
+            setattr(modulo, nome, valor)
+
+    inicio = time.perf_counter()
+    processos = principal()
+    tempo = time.perf_counter() - inicio
+    medicao = {
+        "tempo": tempo,
+        "rss_principal_mb": pico_rss_mb(resource.RUSAGE_SELF),
+        "rss_filhos_mb": pico_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+    if definicao["versao"] == "EXEC":
+        # Backend e trabalhadores efetivamente usados (no modo auto, os escolhidos)
+        medicao["backend"] = plano["usado"].backend
+        medicao["processos"] = plano["usado"].trabalhadores
+    elif definicao["versao"] == "P":
+        # A P escolhe os processos pelo volume dos arquivos (e pelo orçamento de memória)
+        medicao["processos"] = processos
+    return medicao
+
+
+def medir(modo, diretorio_dados, diretorio_trabalho):
+    """Executa um modo em um processo Python novo e retorna a medição."""
+    arquivo_medicao = os.path.abspath(os.path.join(diretorio_trabalho, "medicao.json"))
+    os.makedirs(diretorio_trabalho, exist_ok=True)
+    if os.path.exists(arquivo_medicao):
+        os.remove(arquivo_medicao)
+    with open(os.path.join(diretorio_trabalho, "execucao.log"), "a") as log:
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--executar", modo,
+             os.path.abspath(diretorio_dados), os.path.abspath(diretorio_trabalho), arquivo_medicao],
+            stdout=log, stderr=subprocess.STDOUT, check=True,
+            env={**os.environ, "MPLBACKEND": "Agg"},
+        )
+    with open(arquivo_medicao, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def rodar_benchmark(escalas, modos, repeticoes, aquecimento, diretorio_dados, diretorio_resultados, semente):
+    """Gera os dados de cada escala e mede todos os modos. Retorna a lista de resultados."""
+    resultados = []
+    for linhas, tribunais in escalas:
+        destino = os.path.join(diretorio_dados, f"{linhas}_linhas_{tribunais}_tribunais")
+        print(f"Gerando dados sintéticos: {linhas} linhas, {tribunais} tribunais em {destino}")
+        manifesto = gerar_dados(destino, linhas, tribunais, semente)
+        megabytes = manifesto["bytes"] / 1e6
+
+        for modo in modos:
+            # Cada modo tem o seu diretório de trabalho (saídas, cache e estado incremental)
+            trabalho = os.path.join(diretorio_resultados, "execucoes", f"{linhas}_{tribunais}", modo)
+            for _ in range(aquecimento):
+                medir(modo, destino, trabalho)
+            medicoes = [medir(modo, destino, trabalho) for _ in range(repeticoes)]
+            tempos = [m["tempo"] for m in medicoes]
+            mediana = statistics.median(tempos)
+            resultado = {
+                "modo": modo,
+                "versao": MODOS[modo]["versao"],
+                "processos": medicoes[0].get("processos", 1),
+                "linhas": manifesto["linhas"],
+                "tribunais": tribunais,
+                "bytes": manifesto["bytes"],
+                "tempos": tempos,
+                "tempo_mediano": mediana,
+                "tempo_minimo": min(tempos),
+                "desvio_padrao": statistics.stdev(tempos) if len(tempos) > 1 else 0.0,
+                "linhas_por_segundo": manifesto["linhas"] / mediana,
+                "mb_por_segundo": megabytes / mediana,
+                "pico_rss_mb": max(max(m["rss_principal_mb"], m["rss_filhos_mb"]) for m in medicoes),
+            }
+            resultados.append(resultado)
+            print(f" -> {modo}: {mediana:.3f}s (mediana de {repeticoes}), "
+                  f"{resultado['linhas_por_segundo']:.0f} linhas/s, {resultado['pico_rss_mb']:.0f} MB")
+
+    calcular_speedups(resultados)
+    return resultados
+
+
+def calcular_speedups(resultados):
+    """Acrescenta speedup e eficiência em relação ao modo de referência da mesma escala."""
+    referencias = {
+        (r["linhas"], r["tribunais"]): r["tempo_mediano"] for r in resultados if r["modo"] == MODO_REFERENCIA
+    }
+    for r in resultados:
+        referencia = referencias.get((r["linhas"], r["tribunais"]))
+        r["speedup"] = referencia / r["tempo_mediano"] if referencia else None
+        r["eficiencia"] = r["speedup"] / r["processos"] if r["speedup"] is not None else None
+
+
+def comparar_com_anterior(resultados, arquivo_anterior, tolerancia=TOLERANCIA_REGRESSAO):
+    """Lista os (modo, escala) que ficaram mais lentos que na execução registrada em `arquivo_anterior`."""
+    with open(arquivo_anterior, encoding="utf-8") as f:
+        anteriores = {
+            (r["modo"], r["linhas"], r["tribunais"]): r["tempo_mediano"] for r in json.load(f)["resultados"]
+        }
+    regressoes = []
+    for r in resultados:
+        anterior = anteriores.get((r["modo"], r["linhas"], r["tribunais"]))
+        if anterior and r["tempo_mediano"] > anterior * (1 + tolerancia):
+            regressoes.append({
+                "modo": r["modo"],
+                "linhas": r["linhas"],
+                "tribunais": r["tribunais"],
+                "tempo_anterior": anterior,
+                "tempo_atual": r["tempo_mediano"],
+                "variacao": r["tempo_mediano"] / anterior - 1,
+            })
+    return regressoes
+
+
+def gerar_relatorio_pdf(resultados, caminho):
+    """Gráficos de tempo, speedup e eficiência por escala, mais a tabela completa."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    modos = list(dict.fromkeys(r["modo"] for r in resultados))
+    escalas = sorted({(r["linhas"], r["tribunais"]) for r in resultados})
+    rotulos = [f"{linhas:,} linhas\n{tribunais} trib.".replace(",", ".") for linhas, tribunais in escalas]
+
+    with PdfPages(caminho) as pdf:
+        for chave, titulo, rotulo_y in (
+            ("tempo_mediano", "Tempo de parede (mediana)", "Segundos"),
+            ("speedup", f"Speedup em relação a {MODO_REFERENCIA}", "Speedup"),
+            ("eficiencia", "Eficiência (speedup / processos)", "Eficiência"),
+            ("linhas_por_segundo", "Vazão", "Linhas por segundo"),
+            ("pico_rss_mb", "Pico de memória (RSS)", "MB"),
+        ):
+            plt.figure(figsize=(11, 6))
+            for modo in modos:
+                valores = {(r["linhas"], r["tribunais"]): r[chave] for r in resultados if r["modo"] == modo}
+                plt.plot(range(len(escalas)), [valores.get(e) or float("nan") for e in escalas], marker="o", label=modo)
+            if chave in ("tempo_mediano", "linhas_por_segundo"):
+                plt.yscale("log")
+            plt.xticks(range(len(escalas)), rotulos, fontsize=8)
+            plt.title(titulo)
+            plt.ylabel(rotulo_y)
+            plt.grid(linestyle="--", alpha=0.7)
+            plt.legend()
+            plt.tight_layout()
+            pdf.savefig()
+            plt.close()
+
+        colunas = ["modo", "linhas", "tribunais", "tempo_mediano", "speedup", "eficiencia", "mb_por_segundo", "pico_rss_mb"]
+        linhas_tabela = [
+            [f"{r[c]:.3f}" if isinstance(r[c], float) else ("-" if r[c] is None else str(r[c])) for c in colunas]
+            for r in resultados
+        ]
+        plt.figure(figsize=(11, max(3, 0.3 * len(linhas_tabela) + 1)))
+        plt.axis("off")
+        tabela = plt.table(cellText=linhas_tabela, colLabels=colunas, loc="center")
+        tabela.auto_set_font_size(False)
+        tabela.set_fontsize(7)
+        plt.title("Resultados")
+        pdf.savefig()
+        plt.close()
+
+
+def parse_argumentos():
+    parser = argparse.ArgumentParser(description="Benchmark das versões NP e P com dados sintéticos.")
+    parser.add_argument("--linhas", nargs="+", type=float, default=[1e3, 1e4, 1e5],
+                        help="Total de linhas de cada escala (ex.: 1e3 1e6 1e8)")
+    parser.add_argument("--tribunais", nargs="+", type=int, default=[5, 50],
+                        help="Quantidade de tribunais (arquivos) de cada escala")
+    parser.add_argument("--modos", nargs="+", choices=list(MODOS), default=list(MODOS))
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--aquecimento", type=int, default=1, help="Execuções descartadas antes das medições")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--dados", default=DIRETORIO_DADOS_SINTETICOS, help="Onde os CSVs sintéticos são gerados")
+    parser.add_argument("--saida", default=DIRETORIO_RESULTADOS, help="Diretório do relatório e das execuções")
+    parser.add_argument("--comparar", help="JSON de um benchmark anterior para detectar regressões")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_REGRESSAO)
+    parser.add_argument("--executar", nargs=4, metavar=("MODO", "DADOS", "TRABALHO", "MEDICAO"),
+                        help=argparse.SUPPRESS) # Uso interno: uma medição em processo isolado
+    parser.add_argument("--gerar", nargs=5, metavar=("DESTINO", "LINHAS", "TRIBUNAIS", "SEMENTE", "MANIFESTO"),
+                        help=argparse.SUPPRESS) # Uso interno: geração dos dados em processo isolado
+    return parser.parse_args()
+
+
+def main():
+    args = parse_argumentos()
+    if args.executar:
+        modo, dados, trabalho, arquivo_medicao = args.executar
+        medicao = executar_modo(modo, dados, trabalho)
+        with open(arquivo_medicao, "w", encoding="utf-8") as f:
+            json.dump(medicao, f)
+        return
+    if args.gerar:
+        from comum.sinteticos import gerar_dados_sinteticos
+        destino, linhas, tribunais, semente, arquivo_manifesto = args.gerar
+        manifesto = gerar_dados_sinteticos(destino, int(linhas), int(tribunais), os.path.join(RAIZ_PROJETO, "Dados"),
+                                           semente=int(semente))
+        with open(arquivo_manifesto, "w", encoding="utf-8") as f:
+            json.dump(manifesto, f)
+        return
+
+    modos = list(args.modos)
+    if MODO_REFERENCIA not in modos:
+        modos.insert(0, MODO_REFERENCIA) # Necessário para o speedup
+    escalas = [(int(linhas), tribunais) for linhas in args.linhas for tribunais in args.tribunais]
+    os.makedirs(args.saida, exist_ok=True)
+
+    resultados = rodar_benchmark(escalas, modos, args.repeticoes, args.aquecimento, args.dados, args.saida, args.semente)
+
+    relatorio = {
+        "data": datetime.datetime.now().isoformat(timespec="seconds"),
+        "ambiente": {
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "processador": platform.processor(),
+            "cpus": os.cpu_count(),
+        },
+        "parametros": {
+            "repeticoes": args.repeticoes,
+            "aquecimento": args.aquecimento,
+            "semente": args.semente,
+            "referencia": MODO_REFERENCIA,
+        },
+        "resultados": resultados,
+    }
+    regressoes = []
+    if args.comparar:
+        regressoes = comparar_com_anterior(resultados, args.comparar, args.tolerancia)
+        relatorio["regressoes"] = regressoes
+
+    arquivo_json = os.path.join(args.saida, "speedup_report.json")
+    with open(arquivo_json, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    print(f"Relatório JSON salvo em {arquivo_json}")
+    arquivo_pdf = os.path.join(args.saida, "speedup_report.pdf")
+    gerar_relatorio_pdf(resultados, arquivo_pdf)
+    print(f"Relatório PDF salvo em {arquivo_pdf}")
+
+    for r in regressoes:
+        print(f"Regressão: {r['modo']} ({r['linhas']} linhas, {r['tribunais']} tribunais) "
+              f"{r['tempo_anterior']:.3f}s -> {r['tempo_atual']:.3f}s ({r['variacao']:+.0%})")
+    if regressoes:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,110 +7,619 @@ disponibilizados, calcula as metas de desempenho dos tribunais conforme
 especificado no documento TP06 e gera arquivos consolidados e de resumo.
 """
 
+import argparse
 import pandas as pd
 import os
-import glob
 import time
 import numpy as np
 import warnings
-import matplotlib.pyplot as plt
+import sys
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+# Raiz do projeto: os caminhos padrão de entrada e saída abaixo são relativos a ela
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Permite importar o pacote `comum` (na raiz do projeto) ao executar o script diretamente
+sys.path.insert(0, RAIZ_PROJETO)
+from comum.cache import CacheColunar
+from comum.colunar import gravar_colunar
+from comum.compactados import abrir, listar_entradas, tamanho_descompactado
+from comum.consolidado import consolidar_csv
+from comum.cubo import DIMENSOES_CUBO, CuboMetas, agregar_cubo, juntar_parciais, memoria_para_montar
+from comum.deduplicacao import POLITICAS, IndiceLinhas, descartar_posicoes, descrever_duplicadas, somas_a_descontar
+from comum.esquemas import REGISTRO, ler_cabecalho
+from comum.graficos import grafico_media_por_ramo, graficos_por_meta, graficos_por_ramo
+from comum.incremental import EstadoIncremental
+from comum.instrumentacao import Instrumentacao, Progresso
+from comum.memoria import FATOR_TEXTO, FATOR_TIPADO, OrcamentoMemoria, ParciaisEmDisco, interpretar_tamanho
+from comum.ingestao import (COLUNAS_CATEGORICAS, COLUNAS_CHAVE, concatenar_tipados, converter_colunas_numericas,
+                            ler_csv_numerico, ler_csv_tipado)
+from comum.metas import COLUNAS_METAS, calcular_metas, somar_por_tribunal
+from comum.progressivo import ResumoProgressivo
+from comum.pipeline import LIMITE_ARQUIVOS_PADRAO, LeitorAntecipado
+from comum.saidas import EstagioSaidas
+from comum.series import EstadoSerieMensal, curvas_acumuladas, somar_arquivo_por_mes
 
 # Ignorar warnings específicos do Pandas que podem ocorrer durante conversões ou divisões por zero
 warnings.filterwarnings("ignore", category=RuntimeWarning)
 warnings.filterwarnings("ignore", category=pd.errors.DtypeWarning)
 
 # --- Configurações Iniciais ---
-DIRETORIO_ENTRADA = "/Users/rodrigo/Documents/Projetos VS Code/Projeto-Tribunais/Dados" # Diretório onde os CSVs de entrada estão
-ARQUIVO_CONSOLIDADO = "/Users/rodrigo/Documents/Projetos VS Code/Projeto-Tribunais/Versao_NP/Consolidado.csv"
-ARQUIVO_RESUMO_METAS = "/Users/rodrigo/Documents/Projetos VS Code/Projeto-Tribunais/Versao_NP/ResumoMetas.csv"
-ARQUIVO_GRAFICO = "/Users/rodrigo/Documents/Projetos VS Code/Projeto-Tribunais/Versao_NP/grafico_meta1.png"
-ARQUIVO_RELATORIO_SPEEDUP = "/Users/rodrigo/Documents/Projetos VS Code/Projeto-Tribunais/Versao_NP/speedup_report.pdf"
-ARQUIVO_TEMPO_NP = "/Users/rodrigo/Documents/Projetos VS Code/Projeto-Tribunais/Versao_NP/tempo_np.txt" # Para guardar tempo para speedup
-
-# Colunas que precisam ser numéricas para os cálculos das metas
-# Baseado nas fórmulas do TP06 e na análise do CSV de exemplo
-# Adicionando colunas que podem existir em outros arquivos/ramos
-COLUNAS_NUMERICAS = [
-    'casos_novos_2025', 'julgados_2025', 'suspensos_2025', 'dessobrestados_2025',
-    # Meta 1 (já inclusas acima)
-    # Meta 2
-    'distm2_a', 'julgm2_a', 'suspm2_a',
-    'distm2_b', 'julgm2_b', 'suspm2_b',
-    'distm2_c', 'julgm2_c', 'suspm2_c',
-    'distm2_ant', 'julgm2_ant', 'suspm2_ant',
-    # Meta 4
-    'distm4_a', 'julgm4_a', 'suspm4_a',
-    'distm4_b', 'julgm4_b', 'suspm4_b',
-    # Meta 6
-    'distm6', 'julgm6', 'suspm6',
-    'distm6_a', 'julgm6_a', 'suspm6_a', # STJ usa _a no exemplo
-    # Meta 7
-    'distm7_a', 'julgm7_a', 'suspm7_a',
-    'distm7_b', 'julgm7_b', 'suspm7_b',
-    # Meta 8
-    'distm8', 'julgm8', 'suspm8', # STJ
-    'distm8_a', 'julgm8_a', 'suspm8_a',
-    'distm8_b', 'julgm8_b', 'suspm8_b',
-    # Meta 10
-    'distm10', 'julgm10', 'suspm10', # STJ
-    'distm10_a', 'julgm10_a', 'suspm10_a',
-    'distm10_b', 'julgm10_b', 'suspm10_b'
-]
-
-# --- Funções Auxiliares ---
-def safe_division(numerador, denominador, fator=100):
-    """Realiza divisão segura, retornando 0 se o denominador for 0 ou NaN."""
-    if pd.isna(denominador) or denominador == 0:
-        return 0
-    if pd.isna(numerador):
-        return 0 # Ou talvez np.nan dependendo da regra de negócio para NA
-    return (numerador / denominador) * fator
-
-def get_sum(df, coluna):
-    """Retorna a soma de uma coluna, tratando caso a coluna não exista."""
-    return df[coluna].sum() if coluna in df.columns else 0
+DIRETORIO_ENTRADA = os.path.join(RAIZ_PROJETO, "Dados") # Diretório onde os CSVs de entrada estão (.csv, .csv.gz, .csv.zst ou .zip)
+ARQUIVO_CONSOLIDADO = os.path.join(RAIZ_PROJETO, "Versao_NP", "Consolidado.csv")
+ARQUIVO_RESUMO_METAS = os.path.join(RAIZ_PROJETO, "Versao_NP", "ResumoMetas.csv")
+ARQUIVO_GRAFICO = os.path.join(RAIZ_PROJETO, "Versao_NP", "grafico_meta1.png")
+ARQUIVO_RELATORIO_SPEEDUP = os.path.join(RAIZ_PROJETO, "Versao_NP", "speedup_report.pdf")
+ARQUIVO_TEMPO_NP = os.path.join(RAIZ_PROJETO, "Versao_NP", "tempo_np.txt") # Para guardar tempo para speedup
+
+# Consolidado colunar (comum/colunar.py), formato alternativo e desligado por padrão (o
+# Consolidado.csv continua sendo o artefato padrão): particionado por tribunal, com índice
+# de linhas, para ler só os tribunais e colunas necessários via mmap em vez do CSV inteiro.
+# Com ele ligado e GERAR_CONSOLIDADO_CSV = False o Consolidado.csv deixa de ser escrito no
+# ETL e pode ser gerado depois com ConsolidadoColunar(DIRETORIO_CONSOLIDADO_COLUNAR).exportar_csv(...)
+GERAR_CONSOLIDADO_COLUNAR = False
+DIRETORIO_CONSOLIDADO_COLUNAR = os.path.join(RAIZ_PROJETO, "Versao_NP", "Consolidado_colunar")
+GERAR_CONSOLIDADO_CSV = True
+
+# Modo streaming: lê cada CSV em blocos de tamanho limitado e mantém apenas as
+# somas parciais por tribunal, em vez de concatenar todos os arquivos em memória
+MODO_STREAMING = True
+TAMANHO_CHUNK = 100_000 # Linhas por bloco lido no modo streaming
+
+# Ingestão tipada (modo não streaming): lê só as colunas-chave e as das metas, com chaves
+# categóricas e contagens no menor tipo inteiro; o Consolidado.csv é montado direto dos
+# bytes de origem, então as colunas de texto livre nunca são carregadas em memória
+INGESTAO_TIPADA = True
+POLITICA_AUSENTES = "zero" # "zero" (ausente = 0) ou "nulo" (inteiros anuláveis, <NA>)
+
+# Modo pipeline (com a ingestão tipada): uma thread lê antecipadamente os bytes dos próximos
+# arquivos enquanto o atual é interpretado e agregado; o consolidado, o resumo e o gráfico
+# são escritos em threads de segundo plano. A fila de leitura é limitada em bytes
+MODO_PIPELINE = False
+LIMITE_MEMORIA_PIPELINE = 256 << 20 # Bytes lidos e ainda não interpretados
+
+# Cubo de metas (ingestão tipada e pipeline): somas das colunas das metas por tribunal,
+# grau, UF, município, órgão julgador e mês, gravadas para consultas de drill-down
+# (comum/cubo.py) sem rodar o ETL de novo
+GERAR_CUBO = True
+DIRETORIO_CUBO = os.path.join(RAIZ_PROJETO, "Versao_NP", "cubo")
+
+# Cache colunar em disco: evita refazer o parse de arquivos que não mudaram entre execuções
+USAR_CACHE = True
+DIRETORIO_CACHE = os.path.join(RAIZ_PROJETO, ".cache_tribunais")
+
+# Modo incremental: guarda as somas parciais de cada arquivo e, a cada execução, relê apenas
+# os arquivos novos/alterados (os removidos têm a contribuição descartada)
+MODO_INCREMENTAL = False
+DIRETORIO_ESTADO = os.path.join(RAIZ_PROJETO, ".cache_tribunais", "estado_np")
+
+# Série mensal (comum/series.py): cumprimento acumulado de cada meta por tribunal até o fim de
+# cada mês, em formato longo (tribunal, mês, meta, valor). As somas mensais de cada arquivo
+# ficam guardadas entre execuções; um arquivo que só ganhou linhas no fim tem só elas lidas
+GERAR_SERIE_MENSAL = False
+ARQUIVO_SERIE_MENSAL = os.path.join(RAIZ_PROJETO, "Versao_NP", "SerieMensalMetas.csv")
+DIRETORIO_ESTADO_SERIE = os.path.join(RAIZ_PROJETO, ".cache_tribunais", "estado_serie_np")
+
+# Resumo progressivo (comum/progressivo.py), nos modos streaming e pipeline: a cada arquivo lido
+# um ResumoMetas parcial é regravado (no máximo a cada INTERVALO_RESUMO_PARCIAL segundos) com os
+# tribunais já completos. Uma queda no meio da execução não perde o que já foi lido; o parcial
+# é removido depois que o ResumoMetas.csv final é gravado
+GERAR_RESUMO_PARCIAL = False
+ARQUIVO_RESUMO_PARCIAL = os.path.join(RAIZ_PROJETO, "Versao_NP", "ResumoMetas.parcial.csv")
+INTERVALO_RESUMO_PARCIAL = 1.0
+
+# Deduplicação (comum/deduplicacao.py): um índice com o hash de 64 bits de cada linha de cada
+# arquivo aponta as linhas repetidas entre arquivos (ex.: extratos reenviados que se sobrepõem).
+# Com "remover" elas ficam fora das somas, do cubo e do Consolidado.csv (o colunar mantém todas);
+# com "relatorio" só são informadas. O índice fica em disco e, a cada execução, só os arquivos
+# novos/alterados são lidos para ele. COLUNAS_DEDUPLICACAO None = a linha inteira; a chave
+# COLUNAS_IDENTIFICACAO de comum/deduplicacao.py não é única nos dados (só para "relatorio")
+DEDUPLICAR = False
+POLITICA_DUPLICADAS = "remover" # "remover" ou "relatorio"
+COLUNAS_DEDUPLICACAO = None
+DIRETORIO_INDICE_LINHAS = os.path.join(RAIZ_PROJETO, ".cache_tribunais", "indice_linhas_np")
+
+# Estágio de saídas (comum/saidas.py): resumo e consolidados escritos em threads e gráficos
+# desenhados em um pool de processos com o backend Agg, fora do caminho crítico do ETL.
+# GERAR_GRAFICOS_METAS acrescenta ao gráfico da Meta 1 um gráfico por meta e um mapa de calor por ramo
+# (desligado por padrão: só o gráfico da Meta 1, como antes)
+GERAR_GRAFICOS_METAS = False
+DIRETORIO_GRAFICOS = os.path.join(RAIZ_PROJETO, "Versao_NP", "graficos")
+PROCESSOS_GRAFICOS = None # None = um processo por core
+
+# Instrumentação: tempo, linhas, bytes e pico de memória de cada etapa e de cada arquivo,
+# exportados em JSON lines e no formato de trace do Chrome (None desativa a exportação)
+INSTRUMENTAR = True
+ARQUIVO_INSTRUMENTACAO = os.path.join(RAIZ_PROJETO, "Versao_NP", "instrumentacao_np.jsonl")
+ARQUIVO_TRACE = os.path.join(RAIZ_PROJETO, "Versao_NP", "trace_np.json")
+ETAPAS_PERFILADAS = () # Ex.: ("calcular_metas",) grava perfil_calcular_metas_<pid>.prof
+PERFILADOR = "cprofile" # Ou "pyinstrument", se estiver instalado
+INTERVALO_PROGRESSO = 2.0 # Segundos entre mensagens de progresso nos laços por arquivo
+
+# Orçamento de memória (comum/memoria.py), ex.: "2GB" ou `--max-memory 2GB`. Com ele, o tamanho
+# dos blocos e a leitura antecipada se ajustam ao limite, os modos que não cabem cedem a vez
+# ao streaming e as parciais do cubo são despejadas em disco. None = sem limite
+LIMITE_MEMORIA = None
+
+instrumentacao = Instrumentacao(ativa=False) # Configurada em main_np
+
+# O orçamento de memória (OrcamentoMemoria), o resumo progressivo (ResumoProgressivo) e as linhas
+# repetidas a remover ({arquivo: posições}) são criados em main_np e passados às etapas que os usam
+# (None = sem orçamento, sem resumo parcial, sem remoção), então main_np pode ser chamada várias vezes
+
+# Colunas que precisam ser numéricas para os cálculos das metas.
+# Derivadas da tabela de fórmulas do TP06 em comum/metas.py (todas as metas de todos os ramos)
+COLUNAS_NUMERICAS = COLUNAS_METAS
 
 # --- Etapa 1: Extração e Concatenação (NP) ---
-def extrair_e_concatenar_csv(diretorio):
-    """Localiza, lê e concatena todos os arquivos CSV de um diretório."""
+def extrair_e_concatenar_csv(diretorio, duplicadas=None):
+    """Localiza, lê e concatena todos os arquivos CSV de um diretório (também .csv.gz, .csv.zst e .zip)."""
     print(f"Procurando arquivos CSV em: {diretorio}")
-    arquivos_csv = glob.glob(os.path.join(diretorio, "*.csv"))
+    arquivos_csv = listar_entradas(diretorio)
     if not arquivos_csv:
         print("Nenhum arquivo CSV encontrado no diretório.")
         return pd.DataFrame()
     print(f"Arquivos encontrados: {len(arquivos_csv)}")
     lista_dfs = []
+    esquemas = [] # (arquivo, cabeçalho, linhas) na ordem da concatenação, para a limpeza
+    progresso = Progresso(len(arquivos_csv), "Lendo arquivos", INTERVALO_PROGRESSO)
     for arquivo in arquivos_csv:
-        print(f"Lendo arquivo: {arquivo}")
         try:
-            # CORREÇÃO: Usar vírgula como separador, conforme identificado no cabeçalho
-            df_temp = pd.read_csv(
-                arquivo,
-                sep=",", # Alterado de ";" para ","
-                encoding="latin1",
-                dtype=str,
-                low_memory=False
-            )
+            # Compactados são descompactados em fluxo direto para o parser, sem cópia em disco
+            with instrumentacao.etapa("ler_arquivo", arquivo=arquivo, bytes=os.path.getsize(arquivo)) as medida, \
+                    abrir(arquivo) as fluxo:
+                # CORREÇÃO: Usar vírgula como separador, conforme identificado no cabeçalho
+                df_temp = pd.read_csv(
+                    fluxo,
+                    sep=",", # Alterado de ";" para ","
+                    encoding="latin1",
+                    dtype=str,
+                    low_memory=False
+                )
+                medida["linhas"] = len(df_temp)
+            df_temp = sem_repetidas(df_temp, arquivo, duplicadas)
             lista_dfs.append(df_temp)
-            print(f" -> Lido com sucesso ({len(df_temp)} linhas).")
+            esquemas.append((arquivo, list(df_temp.columns), len(df_temp)))
+            progresso.avancar(linhas=len(df_temp), detalhe=os.path.basename(arquivo))
         except Exception as e:
+            progresso.avancar()
             print(f"Erro ao ler o arquivo {arquivo}: {e}")
     if not lista_dfs:
         print("Nenhum DataFrame foi lido com sucesso.")
         return pd.DataFrame()
     print("Concatenando DataFrames...")
     df_consolidado = pd.concat(lista_dfs, ignore_index=True)
+    # O consolidado fica com as colunas de origem; o leiaute de cada arquivo é resolvido na limpeza
+    df_consolidado.attrs["esquemas"] = esquemas
     print(f"DataFrame consolidado criado com {len(df_consolidado)} linhas.")
     # Adicionar verificação das colunas após leitura
     print(f"Colunas após concatenação: {df_consolidado.columns.tolist()}")
     return df_consolidado
 
+# --- Etapa 1 (alternativa): Extração Tipada (NP) ---
+def colunas_tipadas():
+    """Colunas categóricas da leitura tipada: as chaves e, se o cubo for gerado, as dimensões dele."""
+    return DIMENSOES_CUBO if GERAR_CUBO else COLUNAS_CATEGORICAS
+
+def salvar_cubo(parciais_cubo, orcamento=None):
+    """Monta o cubo de metas a partir das somas parciais, uma coluna por vez, direto em DIRETORIO_CUBO."""
+    if getattr(parciais_cubo, "abandonada", False) or \
+            (orcamento is not None and not orcamento.cabe(memoria_para_montar(parciais_cubo), 1)):
+        print("ALERTA: o cubo de metas não cabe no orçamento de memória; cubo não gerado.")
+        return
+    try:
+        with instrumentacao.etapa("cubo") as medida:
+            cubo = CuboMetas.montar_em_disco(parciais_cubo, DIRETORIO_CUBO, COLUNAS_NUMERICAS)
+            medida["linhas"] = len(cubo.niveis["detalhado"]["codigos"])
+        print(f"Cubo de metas salvo em {DIRETORIO_CUBO} ({medida['linhas']} células no nível detalhado)")
+    except Exception as e:
+        print(f"Erro ao gerar o cubo de metas: {e}")
+
+def extrair_tipado(arquivos_csv, duplicadas=None):
+    """Lê os CSVs com esquema conhecido (só chaves e colunas das metas) e concatena."""
+    print(f"Arquivos encontrados: {len(arquivos_csv)} (ingestão tipada, ausentes: {POLITICA_AUSENTES})")
+    lista_dfs = []
+    progresso = Progresso(len(arquivos_csv), "Lendo arquivos", INTERVALO_PROGRESSO)
+    for arquivo in arquivos_csv:
+        try:
+            with instrumentacao.etapa("ler_arquivo", arquivo=arquivo, bytes=os.path.getsize(arquivo)) as medida:
+                df_temp = ler_csv_tipado(arquivo, COLUNAS_NUMERICAS, colunas_tipadas(), ausentes=POLITICA_AUSENTES)
+                medida["linhas"] = len(df_temp)
+            lista_dfs.append(sem_repetidas(df_temp, arquivo, duplicadas))
+            progresso.avancar(linhas=len(df_temp), detalhe=os.path.basename(arquivo))
+        except Exception as e:
+            progresso.avancar()
+            print(f"Erro ao ler o arquivo {arquivo}: {e}")
+    if not lista_dfs:
+        print("Nenhum DataFrame foi lido com sucesso.")
+        return pd.DataFrame()
+    df_consolidado = concatenar_tipados(lista_dfs, POLITICA_AUSENTES)
+    memoria = df_consolidado.memory_usage(deep=True).sum()
+    print(f"DataFrame tipado criado com {len(df_consolidado)} linhas "
+          f"({memoria / 1e6:.1f} MB, {memoria / max(len(df_consolidado), 1):.0f} bytes/linha).")
+    return df_consolidado
+
+# --- Etapa 1 (alternativa): Extração em Pipeline (NP) ---
+def agregar_em_pipeline(arquivos_csv, arquivo_consolidado=None, parciais_cubo=None, orcamento=None, progressivo=None,
+                        duplicadas=None):
+    """
+    Lê os arquivos com leitura antecipada (LeitorAntecipado) e agrega as somas por
+    tribunal à medida que cada um é interpretado. O consolidado é montado a partir dos
+    bytes de origem em uma thread de segundo plano, ao mesmo tempo.
+
+    Se `parciais_cubo` for uma lista (ou ParciaisEmDisco), recebe as somas de cada arquivo
+    no nível do cubo. `progressivo` (ResumoProgressivo) recebe as somas de cada arquivo lido
+    e as linhas de `duplicadas` ficam fora das somas e do consolidado.
+    """
+    limite_bytes, limite_arquivos = LIMITE_MEMORIA_PIPELINE, LIMITE_ARQUIVOS_PADRAO
+    if orcamento is not None:
+        limite_bytes, limite_arquivos = orcamento.leitura_antecipada(limite_bytes, limite_arquivos)
+    print(f"Arquivos encontrados: {len(arquivos_csv)} (modo pipeline, até "
+          f"{limite_bytes / 1e6:.0f} MB em leitura antecipada)")
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="escritor") as escritor:
+        futuro_consolidado = None
+        if arquivo_consolidado is not None:
+            print(f"Salvando consolidado em: {arquivo_consolidado}")
+            futuro_consolidado = escritor.submit(escrever_consolidado, arquivos_csv, arquivo_consolidado, duplicadas)
+
+        parciais = []
+        progresso = Progresso(len(arquivos_csv), "Lendo arquivos", INTERVALO_PROGRESSO)
+        with LeitorAntecipado(arquivos_csv, limite_bytes, limite_arquivos) as leitor:
+            for arquivo, dados, erro in leitor:
+                try:
+                    if erro is not None:
+                        raise erro
+                    with instrumentacao.etapa("ler_arquivo", arquivo=arquivo, bytes=len(dados)) as medida:
+                        df_temp = ler_csv_tipado(io.BytesIO(dados), COLUNAS_NUMERICAS, colunas_tipadas(),
+                                                 ausentes=POLITICA_AUSENTES)
+                        medida["linhas"] = len(df_temp)
+                        df_temp = sem_repetidas(df_temp, arquivo, duplicadas)
+                        if 'sigla_tribunal' in df_temp.columns:
+                            parciais.append(somar_por_tribunal(df_temp, COLUNAS_NUMERICAS))
+                            if parciais_cubo is not None:
+                                parciais_cubo.append(agregar_cubo(df_temp, COLUNAS_NUMERICAS))
+                            if progressivo is not None:
+                                progressivo.adicionar(arquivo, parciais[-1])
+                        else:
+                            print(f"ALERTA: Coluna 'sigla_tribunal' não encontrada em {arquivo}.")
+                    progresso.avancar(linhas=len(df_temp), detalhe=os.path.basename(arquivo))
+                except Exception as e:
+                    progresso.avancar()
+                    print(f"Erro ao ler o arquivo {arquivo}: {e}")
+                if progressivo is not None:
+                    progressivo.concluir_tarefa(arquivo)
+
+        if futuro_consolidado is not None:
+            try:
+                futuro_consolidado.result()
+                print(" -> Consolidado salvo com sucesso.")
+            except Exception as e:
+                print(f"Erro ao salvar o arquivo consolidado: {e}")
+
+    if not parciais:
+        print("Nenhum dado foi agregado com sucesso.")
+        return pd.DataFrame()
+    df_somas = somar_por_tribunal(pd.concat(parciais, ignore_index=True), COLUNAS_NUMERICAS)
+    print(f"Somas parciais agregadas para {len(df_somas)} tribunais.")
+    return df_somas
+
+def escrever_consolidado(arquivos_csv, arquivo_consolidado, duplicadas=None):
+    """Monta o Consolidado.csv direto dos bytes de origem (sem as linhas de `duplicadas`)."""
+    with instrumentacao.etapa("escrever_consolidado") as medida:
+        medida["bytes"] = consolidar_csv(arquivos_csv, arquivo_consolidado, encoding_origem="latin1",
+                                         descartar=duplicadas)["bytes"]
+
+def escrever_consolidado_colunar(arquivos_csv, destino, cache=None):
+    """Grava o consolidado colunar, a menos que o cache indique que as fontes não mudaram."""
+    indice = os.path.join(destino, "indice.json")
+    if cache is not None and cache.artefato_atualizado("consolidado_colunar", arquivos_csv, indice):
+        print(f"Consolidado colunar {destino} já está atualizado, reaproveitando.")
+        return
+    print(f"Salvando consolidado colunar em: {destino}")
+    with instrumentacao.etapa("escrever_consolidado_colunar") as medida:
+        medida["linhas"] = gravar_colunar(arquivos_csv, destino, encoding="latin1")["linhas"]
+    if cache is not None:
+        cache.registrar_artefato("consolidado_colunar", arquivos_csv, indice)
+
+# --- Etapa 1 (alternativa): Extração e Agregação em Streaming (NP) ---
+def ler_colunas_consolidadas(arquivos_csv):
+    """Lê apenas os cabeçalhos e devolve a união das colunas na ordem em que aparecem."""
+    colunas = []
+    for arquivo in arquivos_csv:
+        try:
+            with abrir(arquivo) as fluxo:
+                cabecalho = pd.read_csv(fluxo, sep=",", encoding="latin1", dtype=str, nrows=0)
+        except Exception:
+            continue # Arquivos vazios/ilegíveis são reportados na leitura propriamente dita
+        for coluna in cabecalho.columns:
+            if coluna not in colunas:
+                colunas.append(coluna)
+    return colunas
+
+def acumular_somas(somas, ramos, df):
+    """Soma as colunas numéricas de `df` por tribunal e acumula em `somas`/`ramos`."""
+    colunas_presentes = [col for col in COLUNAS_NUMERICAS if col in df.columns]
+    grupos = df.groupby('sigla_tribunal', sort=False, observed=True)
+    parcial = grupos[colunas_presentes].sum() # sum() ignora NaN, equivalente a fillna(0)
+    somas = parcial if somas is None else somas.add(parcial, fill_value=0)
+    if 'ramo_justica' in df.columns:
+        ramos = ramos.combine_first(grupos['ramo_justica'].first().astype(object))
+    return somas, ramos
+
+def somas_do_bloco(df):
+    """Somas por tribunal de um bloco (para o resumo progressivo; o streaming acumula as suas à parte)."""
+    if 'ramo_justica' not in df.columns:
+        df = df.assign(ramo_justica=np.nan)
+    return somar_por_tribunal(df, COLUNAS_NUMERICAS)
+
+def agregar_csv_em_streaming(diretorio, tamanho_chunk=TAMANHO_CHUNK, arquivo_consolidado=None, cache=None,
+                             orcamento=None, progressivo=None, duplicadas=None):
+    """
+    Lê os CSVs em blocos de `tamanho_chunk` linhas e acumula, por tribunal, as somas
+    das colunas numéricas. Retorna um DataFrame com uma linha por tribunal, que pode ser
+    passado diretamente para `calcular_todas_metas`.
+
+    Se `arquivo_consolidado` for informado, cada bloco é anexado a ele à medida que é lido,
+    produzindo o mesmo Consolidado.csv da versão em memória.
+
+    Com um `cache` (CacheColunar), arquivos inalterados são carregados já tipados do disco
+    e o consolidado só é reescrito quando alguma fonte mudar.
+
+    Com `orcamento` de memória, o tamanho do bloco é calculado por arquivo e arquivos que não
+    cabem inteiros em memória (nem tipados) não passam pelo cache. `progressivo` recebe as
+    somas de cada bloco e as linhas de `duplicadas` ficam fora das somas e do consolidado.
+    """
+    print(f"Procurando arquivos CSV em: {diretorio}")
+    arquivos_csv = listar_entradas(diretorio)
+    if not arquivos_csv:
+        print("Nenhum arquivo CSV encontrado no diretório.")
+        return pd.DataFrame()
+    print(f"Arquivos encontrados: {len(arquivos_csv)} (modo streaming, blocos de {tamanho_chunk} linhas)")
+
+    if cache is not None and arquivo_consolidado is not None:
+        if cache.artefato_atualizado(artefato_consolidado(duplicadas), arquivos_csv, arquivo_consolidado):
+            print(f"Consolidado {arquivo_consolidado} já está atualizado, reaproveitando.")
+            arquivo_consolidado = None
+    consolidado_pendente = arquivo_consolidado is not None
+
+    colunas_consolidado = ler_colunas_consolidadas(arquivos_csv) if consolidado_pendente else []
+    cabecalho_escrito = False
+    somas = None # Somas acumuladas por sigla_tribunal
+    ramos = pd.Series(dtype=object) # Primeiro ramo_justica visto para cada tribunal
+
+    progresso = Progresso(len(arquivos_csv), "Lendo arquivos", INTERVALO_PROGRESSO)
+    for arquivo in arquivos_csv:
+        progresso.avancar(detalhe=os.path.basename(arquivo))
+        tamanho_bloco = tamanho_chunk
+        usar_cache = cache is not None
+        if orcamento is not None:
+            tamanho_bloco = orcamento.linhas_por_bloco(arquivo, tamanho_chunk)
+            usar_cache = usar_cache and orcamento.cabe(tamanho_descompactado(arquivo), FATOR_TIPADO)
+        if usar_cache and not consolidado_pendente:
+            try:
+                with instrumentacao.etapa("ler_arquivo", arquivo=arquivo, origem="cache") as medida:
+                    df_cache = cache.carregar(arquivo, COLUNAS_NUMERICAS)
+                    medida["linhas"] = len(df_cache)
+            except Exception as e:
+                print(f"Erro ao ler o arquivo {arquivo}: {e}")
+                df_cache = None
+            if df_cache is not None and 'sigla_tribunal' not in df_cache.columns:
+                print(f"ALERTA: Coluna 'sigla_tribunal' não encontrada em {arquivo}.")
+                df_cache = None
+            if df_cache is not None:
+                df_cache = sem_repetidas(df_cache, arquivo, duplicadas) # O cache guarda todas as linhas do arquivo
+                somas, ramos = acumular_somas(somas, ramos, df_cache)
+            if progressivo is not None:
+                progressivo.concluir_tarefa(arquivo, None if df_cache is None else somas_do_bloco(df_cache))
+            continue
+
+        linhas_arquivo = 0
+        blocos_cache = [] # Colunas tipadas do arquivo, guardadas para popular o cache
+        try:
+            with instrumentacao.etapa("ler_arquivo", arquivo=arquivo, bytes=os.path.getsize(arquivo)) as medida, \
+                    abrir(arquivo) as fluxo:
+                leitor = pd.read_csv(
+                    fluxo,
+                    sep=",",
+                    encoding="latin1",
+                    dtype=str,
+                    chunksize=tamanho_bloco
+                )
+                for chunk in leitor:
+                    inicio_bloco = linhas_arquivo # Número (no arquivo) da primeira linha do bloco
+                    linhas_arquivo += len(chunk)
+
+                    if consolidado_pendente and colunas_consolidado:
+                        bloco = sem_repetidas(chunk, arquivo, duplicadas, inicio_bloco)
+                        bloco.reindex(columns=colunas_consolidado).to_csv(
+                            arquivo_consolidado,
+                            sep=",",
+                            index=False,
+                            encoding="utf-8",
+                            mode="a" if cabecalho_escrito else "w",
+                            header=not cabecalho_escrito
+                        )
+                        cabecalho_escrito = True
+
+                    if 'sigla_tribunal' not in chunk.columns:
+                        print(f"ALERTA: Coluna 'sigla_tribunal' não encontrada em {arquivo}.")
+                        continue
+
+                    # Plano do leiaute (compilado uma vez por cabeçalho): colunas de origem e derivadas
+                    plano = REGISTRO.plano(chunk.columns, COLUNAS_NUMERICAS)
+                    converter_colunas_numericas(chunk, plano.leitura)
+                    chunk = plano.aplicar(chunk, origem=arquivo)
+                    unicas = sem_repetidas(chunk, arquivo, duplicadas, inicio_bloco)
+                    somas, ramos = acumular_somas(somas, ramos, unicas)
+                    if progressivo is not None:
+                        progressivo.adicionar(arquivo, somas_do_bloco(unicas))
+                    if usar_cache:
+                        colunas_chave = [col for col in COLUNAS_CHAVE if col in chunk.columns]
+                        blocos_cache.append(chunk[colunas_chave + plano.colunas])
+                if blocos_cache:
+                    cache.gravar(arquivo, pd.concat(blocos_cache, ignore_index=True), COLUNAS_NUMERICAS)
+                medida["linhas"] = linhas_arquivo
+        except Exception as e:
+            print(f"Erro ao ler o arquivo {arquivo}: {e}")
+        if progressivo is not None:
+            progressivo.concluir_tarefa(arquivo)
+
+    if cache is not None:
+        if consolidado_pendente and cabecalho_escrito:
+            cache.registrar_artefato(artefato_consolidado(duplicadas), arquivos_csv, arquivo_consolidado)
+        removidas = cache.evictar(arquivos_csv)
+        if removidas:
+            print(f"Cache: {removidas} entradas obsoletas removidas.")
+
+    if somas is None:
+        print("Nenhum dado foi agregado com sucesso.")
+        return pd.DataFrame()
+
+    df_somas = somas.fillna(0)
+    df_somas.insert(0, 'ramo_justica', ramos.reindex(df_somas.index))
+    df_somas = df_somas.rename_axis('sigla_tribunal').reset_index()
+    print(f"Somas parciais agregadas para {len(df_somas)} tribunais.")
+    return df_somas
+
+# --- Etapa 1 (alternativa): Agregação Incremental (NP) ---
+def somar_em_blocos(caminho, tamanho_chunk):
+    """Somas por tribunal de um arquivo lido em blocos (arquivos que não cabem inteiros no orçamento)."""
+    plano = REGISTRO.plano(ler_cabecalho(caminho), COLUNAS_NUMERICAS)
+    desejadas = set(plano.leitura) | set(COLUNAS_CHAVE)
+    parciais = []
+    with abrir(caminho) as fluxo:
+        leitor = pd.read_csv(fluxo, sep=",", encoding="latin1", dtype=str, chunksize=tamanho_chunk,
+                             usecols=lambda coluna: coluna in desejadas)
+        for chunk in leitor:
+            converter_colunas_numericas(chunk, plano.leitura)
+            chunk = plano.aplicar(chunk, origem=caminho)
+            if 'ramo_justica' not in chunk.columns:
+                chunk = chunk.assign(ramo_justica=np.nan)
+            parciais.append(somar_por_tribunal(chunk, COLUNAS_NUMERICAS))
+    if not parciais:
+        return pd.DataFrame()
+    return somar_por_tribunal(pd.concat(parciais, ignore_index=True), COLUNAS_NUMERICAS)
+
+def somar_arquivo(caminho, cache=None, orcamento=None):
+    """Somas por tribunal de um único arquivo (None se não puder ser lido); em blocos se não couber no orçamento."""
+    try:
+        with instrumentacao.etapa("ler_arquivo", arquivo=caminho, bytes=os.path.getsize(caminho)) as medida:
+            if orcamento is not None and not orcamento.cabe(tamanho_descompactado(caminho)):
+                if 'sigla_tribunal' not in ler_cabecalho(caminho):
+                    print(f"ALERTA: Coluna 'sigla_tribunal' não encontrada em {caminho}.")
+                    return pd.DataFrame()
+                return somar_em_blocos(caminho, orcamento.linhas_por_bloco(caminho, TAMANHO_CHUNK))
+            if cache is not None:
+                df = cache.carregar(caminho, COLUNAS_NUMERICAS)
+            else:
+                df = ler_csv_numerico(caminho, COLUNAS_NUMERICAS)
+            medida["linhas"] = len(df)
+    except Exception as e:
+        print(f"Erro ao ler o arquivo {caminho}: {e}")
+        return None
+    if 'sigla_tribunal' not in df.columns:
+        print(f"ALERTA: Coluna 'sigla_tribunal' não encontrada em {caminho}.")
+        return pd.DataFrame()
+    if 'ramo_justica' not in df.columns:
+        df = df.assign(ramo_justica=np.nan)
+    return somar_por_tribunal(df, COLUNAS_NUMERICAS)
+
+def agregar_incremental(diretorio, arquivo_consolidado=None, cache=None, orcamento=None, duplicadas=None):
+    """
+    Atualiza o estado incremental com os arquivos novos/alterados/removidos de `diretorio`
+    e retorna as somas por tribunal de todo o conjunto. O consolidado só é remontado
+    (a partir dos bytes de origem) quando alguma fonte mudou. As linhas de `duplicadas`
+    são descontadas das somas e ficam fora do consolidado.
+    """
+    print(f"Procurando arquivos CSV em: {diretorio}")
+    arquivos_csv = listar_entradas(diretorio)
+    estado = EstadoIncremental(DIRETORIO_ESTADO, COLUNAS_NUMERICAS)
+    resumo = estado.sincronizar(arquivos_csv, lambda caminho: somar_arquivo(caminho, cache, orcamento))
+    print(f"Modo incremental: {len(resumo['processados'])} arquivos processados, "
+          f"{len(resumo['removidos'])} removidos, {resumo['inalterados']} inalterados.")
+
+    if arquivo_consolidado is not None and arquivos_csv:
+        atualizado = cache is not None and \
+            cache.artefato_atualizado(artefato_consolidado(duplicadas), arquivos_csv, arquivo_consolidado)
+        if atualizado:
+            print(f"Consolidado {arquivo_consolidado} já está atualizado, reaproveitando.")
+        else:
+            print(f"Salvando consolidado em: {arquivo_consolidado}")
+            consolidar_csv(arquivos_csv, arquivo_consolidado, encoding_origem="latin1", descartar=duplicadas)
+            if cache is not None:
+                cache.registrar_artefato(artefato_consolidado(duplicadas), arquivos_csv, arquivo_consolidado)
+
+    df_somas = estado.somas_totais(arquivos_csv)
+    if duplicadas:
+        # As parciais guardadas são de cada arquivo inteiro: as linhas repetidas são descontadas do total
+        descontos = [somas_repetidas(caminho, posicoes, cache) for caminho, posicoes in duplicadas.items()]
+        df_somas = somar_por_tribunal(pd.concat([df_somas] + descontos, ignore_index=True), COLUNAS_NUMERICAS)
+    return df_somas
+
+def somas_repetidas(caminho, posicoes, cache=None):
+    """Somas por tribunal, com o sinal trocado, das linhas repetidas de um arquivo (modo incremental)."""
+    if cache is not None:
+        df = cache.carregar(caminho, COLUNAS_NUMERICAS)
+    else:
+        df = ler_csv_numerico(caminho, COLUNAS_NUMERICAS)
+    if 'sigla_tribunal' not in df.columns:
+        return pd.DataFrame()
+    return somas_a_descontar(df, posicoes, COLUNAS_NUMERICAS)[0]
+
+def somar_tarefa_por_mes(tarefa):
+    """Somas mensais de uma tarefa (caminho, intervalo) da série (None se não puder ser lida)."""
+    caminho, intervalo = tarefa
+    try:
+        with instrumentacao.etapa("ler_arquivo_serie", arquivo=caminho, anexado=intervalo is not None):
+            return somar_arquivo_por_mes(caminho, intervalo)
+    except Exception as e:
+        print(f"Erro ao ler o arquivo {caminho} para a série mensal: {e}")
+        return None
+
+def gerar_serie_mensal(arquivos_csv):
+    """Atualiza as somas mensais guardadas e grava a série acumulada das metas (SerieMensalMetas.csv)."""
+    estado = EstadoSerieMensal(DIRETORIO_ESTADO_SERIE)
+    resumo = estado.sincronizar(arquivos_csv, somar_tarefa_por_mes)
+    print(f"Série mensal: {len(resumo['processados'])} arquivos processados "
+          f"({len(resumo['anexados'])} só com linhas anexadas), {len(resumo['removidos'])} removidos, "
+          f"{resumo['inalterados']} inalterados.")
+    serie = curvas_acumuladas(estado.somas_totais(arquivos_csv))
+    if serie.empty:
+        print("Nenhum dado para a série mensal.")
+        return
+    print(f"Salvando série mensal das metas em: {ARQUIVO_SERIE_MENSAL}")
+    temporario = ARQUIVO_SERIE_MENSAL + ".tmp"
+    serie.round(2).to_csv(temporario, sep=";", index=False, encoding="utf-8")
+    os.replace(temporario, ARQUIVO_SERIE_MENSAL)
+    print(" -> Série mensal salva com sucesso.")
+
 # --- Etapa 2: Limpeza e Pré-processamento (NP) ---
+def resolver_esquemas(df, planos):
+    """
+    Preenche (in-place), no trecho de linhas de cada arquivo, as colunas canônicas que o
+    leiaute dele traz com outro nome ou só por subitem (ver comum/esquemas.py).
+    """
+    inicio = 0
+    for arquivo, plano, linhas in planos:
+        fim = inicio + linhas
+        trecho = df.iloc[inicio:fim]
+        plano.avisar_ausentes(trecho, arquivo)
+        for coluna, valores in plano.derivar(trecho).items():
+            if coluna not in df.columns:
+                df[coluna] = np.nan
+            df.iloc[inicio:fim, df.columns.get_loc(coluna)] = np.asarray(valores, dtype=np.float64)
+        inicio = fim
+    return df
+
 def limpar_e_preparar_dados(df):
     """Converte colunas para numérico e trata valores ausentes."""
     print("Iniciando limpeza e pré-processamento...")
     df_processado = df.copy()
+    planos = [(arquivo, REGISTRO.plano(cabecalho, COLUNAS_NUMERICAS), linhas)
+              for arquivo, cabecalho, linhas in df.attrs.get("esquemas", [])]
     colunas_presentes = [col for col in COLUNAS_NUMERICAS if col in df_processado.columns]
+    # Colunas de origem com nome fora das fórmulas (ex.: nomes do documento TP06) também são convertidas
+    fontes = [col for _, plano, _ in planos for col in plano.leitura if col not in colunas_presentes]
     print(f"Colunas a serem convertidas para numérico: {len(colunas_presentes)}")
 
     # Verificar se 'sigla_tribunal' existe ANTES da conversão
@@ -118,12 +627,9 @@ def limpar_e_preparar_dados(df):
         print("ALERTA: Coluna 'sigla_tribunal' não encontrada ANTES da conversão numérica.")
         # Poderia tentar encontrar uma coluna similar ou parar a execução
 
-    for coluna in colunas_presentes:
-        # A conversão só deve ocorrer se a coluna for do tipo 'object' (string)
-        if df_processado[coluna].dtype == 'object':
-            df_processado[coluna] = df_processado[coluna].str.strip().str.replace(',', '.', regex=False)
-        # A conversão para numérico deve ser feita de qualquer forma para garantir o tipo correto
-        df_processado[coluna] = pd.to_numeric(df_processado[coluna], errors='coerce')
+    converter_colunas_numericas(df_processado, colunas_presentes + list(dict.fromkeys(fontes)))
+    resolver_esquemas(df_processado, planos)
+    colunas_presentes = [col for col in COLUNAS_NUMERICAS if col in df_processado.columns]
 
     print("Preenchendo valores NaN nas colunas numéricas com 0 para cálculo.")
     df_processado[colunas_presentes] = df_processado[colunas_presentes].fillna(0)
@@ -139,98 +645,9 @@ def limpar_e_preparar_dados(df):
 
 # --- Etapa 3: Cálculo das Metas (NP) ---
 
-# Mapeamento de colunas (simplificado, assumindo que nomes no CSV são usados diretamente)
-# As funções usarão get_sum para buscar os valores
-
-def calcular_meta1(grupo):
-    """Calcula a Meta 1 para um grupo (tribunal)."""
-    julgados = get_sum(grupo, 'julgados_2025')
-    casos_novos = get_sum(grupo, 'casos_novos_2025')
-    dessobrestados = get_sum(grupo, 'dessobrestados_2025')
-    suspensos = get_sum(grupo, 'suspensos_2025')
-    denominador = casos_novos + dessobrestados - suspensos
-    return safe_division(julgados, denominador, fator=100)
-
-def calcular_metas_tribunal(grupo):
-    """Calcula todas as metas aplicáveis para um grupo (tribunal)."""
-    resultados = {}
-    # Garantir que o grupo não está vazio antes de acessar iloc[0]
-    if grupo.empty:
-        return {"sigla_tribunal": "VAZIO", "ramo_justica": "VAZIO"} # Retorna um dict vazio ou com NAs
-
-    # Usar .iloc[0] é seguro aqui porque estamos dentro de um grupo não vazio
-    sigla = grupo['sigla_tribunal'].iloc[0]
-    ramo = grupo['ramo_justica'].iloc[0]
-    resultados['sigla_tribunal'] = sigla
-    resultados['ramo_justica'] = ramo
-
-    # --- Meta 1 (Comum a todos) ---
-    resultados['Meta1'] = calcular_meta1(grupo)
-
-    # --- Outras Metas (Exemplo para STJ, baseado no CSV e TP06) ---
-    # É necessário implementar a lógica para CADA ramo e CADA meta
-    if ramo == 'Superior Tribunal de Justiça':
-        # Meta 2ANT (STJ)
-        julgados = get_sum(grupo, 'julgm2_ant') # Assumindo coluna do CSV
-        distribuidos = get_sum(grupo, 'distm2_ant')
-        suspensos = get_sum(grupo, 'suspm2_ant')
-        denominador = distribuidos - suspensos
-        resultados['Meta2ANT'] = safe_division(julgados, denominador, fator=100)
-
-        # Meta 4A (STJ)
-        julgados = get_sum(grupo, 'julgm4_a')
-        distribuidos = get_sum(grupo, 'distm4_a')
-        suspensos = get_sum(grupo, 'suspm4_a')
-        denominador = distribuidos - suspensos
-        resultados['Meta4A'] = safe_division(julgados, denominador, fator=(1000/9))
-
-        # Meta 4B (STJ)
-        julgados = get_sum(grupo, 'julgm4_b')
-        distribuidos = get_sum(grupo, 'distm4_b')
-        suspensos = get_sum(grupo, 'suspm4_b')
-        denominador = distribuidos - suspensos
-        resultados['Meta4B'] = safe_division(julgados, denominador, fator=100)
-
-        # Meta 6 (STJ) - Usando colunas com _a conforme exemplo CSV
-        julgados = get_sum(grupo, 'julgm6_a')
-        distribuidos = get_sum(grupo, 'distm6_a')
-        suspensos = get_sum(grupo, 'suspm6_a')
-        denominador = distribuidos - suspensos
-        resultados['Meta6'] = safe_division(julgados, denominador, fator=(1000/7.5))
-
-        # Meta 7A (STJ)
-        julgados = get_sum(grupo, 'julgm7_a')
-        distribuidos = get_sum(grupo, 'distm7_a')
-        suspensos = get_sum(grupo, 'suspm7_a')
-        denominador = distribuidos - suspensos
-        resultados['Meta7A'] = safe_division(julgados, denominador, fator=(1000/7.5))
-
-        # Meta 7B (STJ)
-        julgados = get_sum(grupo, 'julgm7_b')
-        distribuidos = get_sum(grupo, 'distm7_b')
-        suspensos = get_sum(grupo, 'suspm7_b')
-        denominador = distribuidos - suspensos
-        resultados['Meta7B'] = safe_division(julgados, denominador, fator=(1000/7.5))
-
-        # Meta 8 (STJ)
-        julgados = get_sum(grupo, 'julgm8') # Usando coluna sem letra conforme TP06
-        distribuidos = get_sum(grupo, 'distm8')
-        suspensos = get_sum(grupo, 'suspm8')
-        denominador = distribuidos - suspensos
-        resultados['Meta8'] = safe_division(julgados, denominador, fator=(1000/10))
-
-        # Meta 10 (STJ)
-        julgados = get_sum(grupo, 'julgm10') # Usando coluna sem letra conforme TP06
-        distribuidos = get_sum(grupo, 'distm10')
-        suspensos = get_sum(grupo, 'suspm10')
-        denominador = distribuidos - suspensos
-        resultados['Meta10'] = safe_division(julgados, denominador, fator=(1000/10))
-
-    # TODO: Implementar lógica para os outros ramos (Estadual, Trabalho, Federal, Militar, Eleitoral, TST)
-    #       Cada 'if ramo == ...' deve conter os cálculos específicos daquele ramo.
-    #       É crucial verificar os nomes exatos das colunas nos CSVs de cada ramo.
-
-    return resultados
+# As fórmulas de cada ramo/tribunal ficam na tabela declarativa de comum/metas.py.
+# Todas as somas saem de um único groupby por (sigla_tribunal, ramo_justica) e as metas
+# são calculadas com aritmética vetorizada sobre essas somas.
 
 def calcular_todas_metas(df):
     """Agrupa por tribunal e calcula as metas para cada um."""
@@ -240,100 +657,168 @@ def calcular_todas_metas(df):
         # Imprimir colunas disponíveis para depuração
         print(f"Colunas disponíveis: {df.columns.tolist()}")
         return pd.DataFrame()
+    if 'ramo_justica' not in df.columns:
+        df = df.assign(ramo_justica=np.nan)
 
-    grupos = df.groupby('sigla_tribunal')
-    resultados_lista = []
-    total_grupos = len(grupos)
-    count = 0
-    for nome_grupo, grupo_df in grupos:
-        count += 1
-        # Adicionar verificação se o grupo está vazio
-        if grupo_df.empty:
-            print(f"Aviso: Grupo {nome_grupo} está vazio, pulando cálculo.")
-            continue
-        print(f"Processando tribunal {count}/{total_grupos}: {nome_grupo}")
-        resultado_tribunal = calcular_metas_tribunal(grupo_df)
-        resultados_lista.append(resultado_tribunal)
-
-    if not resultados_lista:
+    somas = somar_por_tribunal(df, COLUNAS_NUMERICAS)
+    if somas.empty:
         print("Nenhum resultado de meta calculado.")
         return pd.DataFrame()
 
-    df_resultados = pd.DataFrame(resultados_lista)
-    print("Cálculo de metas concluído.")
+    df_resultados = calcular_metas(somas)
+    print(f"Cálculo de metas concluído para {len(df_resultados)} tribunais.")
     return df_resultados
 
 # --- Etapa 4: Geração de Saídas (NP) ---
-def gerar_saidas(df_resultados):
-    """Gera o arquivo ResumoMetas.csv e o gráfico comparativo."""
+def gerar_saidas(df_resultados, saidas, progressivo=None):
+    """
+    Envia ao estágio de saídas o ResumoMetas.csv (em uma thread) e os gráficos (no pool de
+    renderização) e retorna sem esperar: `saidas.aguardar()` espera tudo no fim. O resumo
+    final substitui o parcial de `progressivo`.
+    """
     print("Gerando arquivos de saída...")
 
     # 4.1: Salvar ResumoMetas.csv
-    try:
-        # Arredondar para melhor visualização e preencher NaN com 'NA'
-        # Garantir que colunas chave existem antes de preencher NA
-        if 'sigla_tribunal' in df_resultados.columns:
-             df_resumo = df_resultados.round(2).fillna('NA')
-             # Certificar que colunas chave não fiquem como NA se forem resultado de grupo vazio
-             df_resumo['sigla_tribunal'] = df_resumo['sigla_tribunal'].replace('NA', 'Desconhecido')
-             df_resumo['ramo_justica'] = df_resumo['ramo_justica'].replace('NA', 'Desconhecido')
-        else:
-             print("Erro: Coluna 'sigla_tribunal' ausente no DataFrame de resultados.")
-             df_resumo = pd.DataFrame() # Evitar erro no to_csv
+    def salvar_resumo():
+        try:
+            with instrumentacao.etapa("escrever_saidas", linhas=len(df_resultados)):
+                escrever_resumo(df_resultados)
+            if progressivo is not None:
+                progressivo.finalizar() # O resumo final substitui o parcial
+        except Exception as e:
+            print(f"Erro ao salvar o arquivo ResumoMetas.csv: {e}")
+    saidas.escrever("resumo", salvar_resumo)
 
-        if not df_resumo.empty:
-            print(f"Salvando resumo das metas em: {ARQUIVO_RESUMO_METAS}")
-            df_resumo.to_csv(ARQUIVO_RESUMO_METAS, sep=";", index=False, encoding="utf-8")
-            print(" -> Resumo salvo com sucesso.")
-        else:
-            print("Não foi possível gerar o resumo das metas.")
+    # 4.2: Gerar Gráfico Comparativo (Meta 1 por Ramo de Justiça) e, opcionalmente, um por meta e por ramo
+    graficos = [gerar_grafico(df_resultados)]
+    if GERAR_GRAFICOS_METAS and 'sigla_tribunal' in df_resultados.columns:
+        graficos += graficos_por_meta(df_resultados, DIRETORIO_GRAFICOS)
+        graficos += graficos_por_ramo(df_resultados, DIRETORIO_GRAFICOS)
+        print(f"Gráficos por meta e por ramo serão salvos em: {DIRETORIO_GRAFICOS}")
+    saidas.desenhar(graficos)
 
-    except Exception as e:
-        print(f"Erro ao salvar o arquivo ResumoMetas.csv: {e}")
+def formatar_resumo(df_resultados):
+    """Metas arredondadas e 'NA' onde não se aplicam (formato do ResumoMetas.csv)."""
+    # Arredondar para melhor visualização e preencher NaN com 'NA'
+    df_resumo = df_resultados.round(2).fillna('NA')
+    # Certificar que colunas chave não fiquem como NA se forem resultado de grupo vazio
+    df_resumo['sigla_tribunal'] = df_resumo['sigla_tribunal'].replace('NA', 'Desconhecido')
+    df_resumo['ramo_justica'] = df_resumo['ramo_justica'].replace('NA', 'Desconhecido')
+    return df_resumo
 
-    # 4.2: Gerar Gráfico Comparativo (Exemplo: Meta 1 por Ramo de Justiça)
-    try:
-        # Verificar se df_resultados não está vazio e contém as colunas necessárias
-        if not df_resultados.empty and 'Meta1' in df_resultados.columns and 'ramo_justica' in df_resultados.columns:
-            # Remover NAs antes de calcular a média
-            meta1_validos = df_resultados.dropna(subset=['Meta1'])
-            # Filtrar onde Meta1 não é 0 (assumindo que 0 significa não calculado ou divisão por zero)
-            meta1_validos = meta1_validos[meta1_validos['Meta1'] != 0]
-
-            if not meta1_validos.empty:
-                media_meta1_ramo = meta1_validos.groupby('ramo_justica')['Meta1'].mean().sort_values()
-
-                plt.figure(figsize=(12, 7))
-                bars = plt.barh(media_meta1_ramo.index, media_meta1_ramo.values, color='skyblue')
-                plt.xlabel('Cumprimento Médio da Meta 1 (%)')
-                plt.ylabel('Ramo da Justiça')
-                plt.title('Desempenho Médio da Meta 1 por Ramo da Justiça')
-                plt.grid(axis='x', linestyle='--', alpha=0.7)
-                plt.tight_layout()
-
-                # Adicionar valores nas barras
-                for bar in bars:
-                    plt.text(bar.get_width() + 1, bar.get_y() + bar.get_height()/2, f'{bar.get_width():.1f}%', 
-                             va='center', ha='left', fontsize=9)
-
-                print(f"Salvando gráfico comparativo em: {ARQUIVO_GRAFICO}")
-                plt.savefig(ARQUIVO_GRAFICO)
-                plt.close() # Fechar a figura para liberar memória
-                print(" -> Gráfico salvo com sucesso.")
-            else:
-                print("Não há dados válidos de Meta 1 para gerar o gráfico.")
-        elif df_resultados.empty:
-             print("DataFrame de resultados vazio, não é possível gerar gráfico.")
-        else:
-            print("Colunas 'Meta1' ou 'ramo_justica' não encontradas para gerar o gráfico.")
-    except Exception as e:
-        print(f"Erro ao gerar o gráfico: {e}")
+def gravar_resumo_parcial(df_resultados, caminho):
+    """Grava um snapshot do resumo progressivo no formato do ResumoMetas.csv."""
+    formatar_resumo(df_resultados).to_csv(caminho, sep=";", index=False, encoding="utf-8")
+
+def escrever_resumo(df_resultados):
+    """Grava o ResumoMetas.csv com as metas arredondadas e 'NA' onde não se aplicam."""
+    # Garantir que colunas chave existem antes de preencher NA
+    if 'sigla_tribunal' in df_resultados.columns:
+         df_resumo = formatar_resumo(df_resultados)
+    else:
+         print("Erro: Coluna 'sigla_tribunal' ausente no DataFrame de resultados.")
+         df_resumo = pd.DataFrame() # Evitar erro no to_csv
+
+    if not df_resumo.empty:
+        print(f"Salvando resumo das metas em: {ARQUIVO_RESUMO_METAS}")
+        # Grava em um temporário e substitui: quem lê o resumo (ex.: comum/consulta.py) nunca vê um arquivo pela metade
+        temporario = ARQUIVO_RESUMO_METAS + ".tmp"
+        df_resumo.to_csv(temporario, sep=";", index=False, encoding="utf-8")
+        os.replace(temporario, ARQUIVO_RESUMO_METAS)
+        print(" -> Resumo salvo com sucesso.")
+    else:
+        print("Não foi possível gerar o resumo das metas.")
+
+def gerar_grafico(df_resultados):
+    """Descrição do gráfico do cumprimento médio da Meta 1 por ramo de justiça (None sem dados)."""
+    # Verificar se df_resultados não está vazio e contém as colunas necessárias
+    if df_resultados.empty:
+        print("DataFrame de resultados vazio, não é possível gerar gráfico.")
+    elif 'Meta1' not in df_resultados.columns or 'ramo_justica' not in df_resultados.columns:
+        print("Colunas 'Meta1' ou 'ramo_justica' não encontradas para gerar o gráfico.")
+    else:
+        # Média por ramo, sem NAs e sem 0 (meta não calculada ou divisão por zero)
+        grafico = grafico_media_por_ramo(df_resultados, 'Meta1', ARQUIVO_GRAFICO)
+        if grafico is not None:
+            print(f"Salvando gráfico comparativo em: {ARQUIVO_GRAFICO}")
+            return grafico
+        print("Não há dados válidos de Meta 1 para gerar o gráfico.")
+    return None
+
+# --- Deduplicação (NP) ---
+def preparar_deduplicacao(arquivos_csv):
+    """
+    Atualiza o índice de linhas com os arquivos novos/alterados e informa as linhas repetidas.
+    Retorna {arquivo: linhas repetidas} na política "remover" e None na "relatorio".
+    """
+    if POLITICA_DUPLICADAS not in POLITICAS:
+        raise ValueError(f"Política de duplicadas desconhecida: {POLITICA_DUPLICADAS} (opções: {', '.join(POLITICAS)})")
+    indice = IndiceLinhas(DIRETORIO_INDICE_LINHAS, COLUNAS_DEDUPLICACAO)
+    with instrumentacao.etapa("indexar_linhas", arquivos=len(arquivos_csv)) as medida:
+        resumo = indice.sincronizar(arquivos_csv)
+        posicoes, origens = indice.duplicadas(arquivos_csv)
+        medida["linhas"] = sum(len(p) for p in posicoes.values())
+    print(f"Índice de linhas: {len(resumo['processados'])} arquivos indexados, "
+          f"{resumo['inalterados']} inalterados, {len(resumo['removidos'])} removidos.")
+    for linha in descrever_duplicadas(posicoes, origens):
+        print(linha)
+    if not posicoes:
+        print("Nenhuma linha repetida entre os arquivos.")
+    elif POLITICA_DUPLICADAS == "remover":
+        print("As linhas repetidas ficam fora das somas e do consolidado.")
+    return posicoes if POLITICA_DUPLICADAS == "remover" else None
+
+def sem_repetidas(df, arquivo, duplicadas, inicio=0):
+    """`df` (linhas de `arquivo` a partir da de número `inicio`) sem as linhas de `duplicadas`."""
+    if not duplicadas:
+        return df
+    return descartar_posicoes(df, duplicadas.get(arquivo), inicio)
+
+def artefato_consolidado(duplicadas):
+    """Nome do Consolidado.csv no cache de artefatos (sem as linhas repetidas é outro artefato)."""
+    return "consolidado" if duplicadas is None else "consolidado_sem_repetidas"
+
+# --- Orçamento de Memória (NP) ---
+def modo_cabe_no_orcamento(arquivos_csv, orcamento):
+    """False se o modo configurado (completo, tipado ou pipeline) precisar de mais memória que o orçamento."""
+    tamanhos = [tamanho_descompactado(arquivo) for arquivo in arquivos_csv]
+    if INGESTAO_TIPADA and MODO_PIPELINE:
+        # Um arquivo inteiro por vez (a leitura antecipada se ajusta ao orçamento)
+        return orcamento.cabe(max(tamanhos, default=0), FATOR_TIPADO)
+    if INGESTAO_TIPADA:
+        return orcamento.cabe(sum(tamanhos), FATOR_TIPADO)
+    # Concatenação como texto mais a cópia feita na limpeza
+    return orcamento.cabe(sum(tamanhos), 2 * FATOR_TEXTO)
+
+def parciais_do_cubo(orcamento=None):
+    """
+    Destino das parciais do cubo: uma lista ou, com orçamento, parciais despejadas em disco,
+    abandonadas assim que o cubo delas deixar de caber no orçamento.
+    """
+    if orcamento is None:
+        return []
+    return ParciaisEmDisco(orcamento.limite_parciais(), lambda parciais: juntar_parciais(parciais, COLUNAS_NUMERICAS),
+                           orcamento, prefixo="cubo_np_",
+                           cabe=lambda parciais: orcamento.cabe(memoria_para_montar(parciais), 1))
 
 # --- Função Principal (Versão NP) ---
 def main_np():
     """Função principal para execução da versão não paralela."""
     inicio_np = time.time()
     print("--- Iniciando Versão Não Paralela (NP) ---")
+    instrumentacao.configurar(INSTRUMENTAR, ETAPAS_PERFILADAS, PERFILADOR, os.path.dirname(ARQUIVO_RESUMO_METAS))
+
+    # Com orçamento, um modo que carrega tudo em memória e não cabe cede a vez ao streaming
+    modo_streaming = MODO_STREAMING
+    orcamento = None
+    if LIMITE_MEMORIA:
+        orcamento = OrcamentoMemoria(LIMITE_MEMORIA)
+        print(f"Orçamento de memória: {orcamento.descrever()}")
+        if not (MODO_INCREMENTAL or MODO_STREAMING) and \
+                not modo_cabe_no_orcamento(listar_entradas(DIRETORIO_ENTRADA), orcamento):
+            print("ALERTA: os dados não cabem no orçamento de memória no modo configurado; "
+                  "usando o modo streaming (sem o cubo de metas).")
+            modo_streaming = True
 
     # Mover arquivo de exemplo (se necessário)
     arquivo_exemplo_origem = "/home/ubuntu/upload/teste_STJ.csv"
@@ -348,32 +833,170 @@ def main_np():
     elif not os.path.exists(arquivo_exemplo_destino):
          print(f"Aviso: Arquivo de exemplo {arquivo_exemplo_destino} não encontrado.")
 
-    # Etapa 1: Extração e Concatenação
-    df_completo = extrair_e_concatenar_csv(DIRETORIO_ENTRADA)
-    if df_completo.empty:
-        print("Processamento interrompido: Nenhum dado para processar.")
-        return
+    # Linhas repetidas entre arquivos, apontadas pelo índice de linhas antes da leitura
+    duplicadas = None
+    if DEDUPLICAR:
+        try:
+            duplicadas = preparar_deduplicacao(listar_entradas(DIRETORIO_ENTRADA))
+        except Exception as e:
+            print(f"Erro ao verificar linhas repetidas: {e}")
 
-    # Salvar arquivo consolidado
-    try:
-        print(f"Salvando DataFrame consolidado em: {ARQUIVO_CONSOLIDADO}")
-        # Usar separador vírgula para consistência com a leitura
-        df_completo.to_csv(ARQUIVO_CONSOLIDADO, sep=",", index=False, encoding="utf-8")
-        print(" -> Salvo com sucesso.")
-    except Exception as e:
-        print(f"Erro ao salvar o arquivo consolidado: {e}")
+    # Resumo progressivo: um ResumoMetas parcial a cada arquivo lido (modos streaming e pipeline)
+    progressivo = None
+    if GERAR_RESUMO_PARCIAL and not MODO_INCREMENTAL and (modo_streaming or (INGESTAO_TIPADA and MODO_PIPELINE)):
+        arquivos_parcial = listar_entradas(DIRETORIO_ENTRADA)
+        progressivo = ResumoProgressivo(ARQUIVO_RESUMO_PARCIAL, dict.fromkeys(arquivos_parcial, 1),
+                                        gravar_resumo_parcial, COLUNAS_NUMERICAS, INTERVALO_RESUMO_PARCIAL)
+        print(f"Resumo parcial será atualizado em: {ARQUIVO_RESUMO_PARCIAL}")
+
+    # Consolidado.csv opcional (o colunar pode gerá-lo depois)
+    arquivo_consolidado = ARQUIVO_CONSOLIDADO if GERAR_CONSOLIDADO_CSV else None
+
+    # Saídas (consolidados, resumo e gráficos) seguem em threads/processos enquanto o ETL
+    # continua; com orçamento de memória, um único processo de renderização
+    saidas = EstagioSaidas(1 if orcamento is not None else PROCESSOS_GRAFICOS, instrumentacao=instrumentacao)
 
-    # Etapa 2: Limpeza e Pré-processamento
-    df_processado = limpar_e_preparar_dados(df_completo)
+    if MODO_INCREMENTAL:
+        # Etapas 1 e 2 a partir do estado incremental: só os arquivos alterados são relidos
+        cache = CacheColunar(DIRETORIO_CACHE) if USAR_CACHE else None
+        with instrumentacao.etapa("extrair", modo="incremental"):
+            df_somas = agregar_incremental(DIRETORIO_ENTRADA, arquivo_consolidado, cache, orcamento, duplicadas)
+        if df_somas.empty:
+            print("Processamento interrompido: Nenhum dado para processar.")
+            return
 
-    # Etapa 3: Cálculo das Metas
-    df_resultados_metas = calcular_todas_metas(df_processado)
+        # Etapa 3: Cálculo das Metas
+        with instrumentacao.etapa("calcular_metas"):
+            df_resultados_metas = calcular_todas_metas(df_somas)
+    elif modo_streaming:
+        # Etapas 1 e 2 em streaming: o consolidado é escrito bloco a bloco e só as
+        # somas por tribunal ficam em memória (uma linha por grupo)
+        if arquivo_consolidado is not None:
+            print(f"Salvando DataFrame consolidado em: {arquivo_consolidado}")
+        cache = CacheColunar(DIRETORIO_CACHE) if USAR_CACHE else None
+        with instrumentacao.etapa("extrair", modo="streaming"):
+            df_somas = agregar_csv_em_streaming(DIRETORIO_ENTRADA, TAMANHO_CHUNK, arquivo_consolidado, cache,
+                                                orcamento, progressivo, duplicadas)
+        if df_somas.empty:
+            print("Processamento interrompido: Nenhum dado para processar.")
+            return
 
-    # Etapa 4: Geração de Saídas
+        # Etapa 3: Cálculo das Metas (cada grupo tem uma única linha com as somas)
+        with instrumentacao.etapa("calcular_metas"):
+            df_resultados_metas = calcular_todas_metas(df_somas)
+    elif INGESTAO_TIPADA and MODO_PIPELINE:
+        # Etapas 1 e 2 em pipeline: leitura antecipada em uma thread, parse e agregação
+        # nesta, consolidado em segundo plano
+        print(f"Procurando arquivos CSV em: {DIRETORIO_ENTRADA}")
+        arquivos_csv = listar_entradas(DIRETORIO_ENTRADA)
+        parciais_cubo = parciais_do_cubo(orcamento) if GERAR_CUBO else None
+        with instrumentacao.etapa("extrair", modo="pipeline"):
+            df_somas = agregar_em_pipeline(arquivos_csv, arquivo_consolidado, parciais_cubo, orcamento, progressivo,
+                                           duplicadas)
+        if df_somas.empty:
+            print("Processamento interrompido: Nenhum dado para processar.")
+            return
+        if parciais_cubo is not None:
+            salvar_cubo(parciais_cubo, orcamento)
+        if isinstance(parciais_cubo, ParciaisEmDisco):
+            if parciais_cubo.arquivos:
+                print(f"Parciais do cubo despejadas em disco {len(parciais_cubo.arquivos)} vez(es).")
+            parciais_cubo.limpar()
+
+        # Etapa 3: Cálculo das Metas
+        with instrumentacao.etapa("calcular_metas"):
+            df_resultados_metas = calcular_todas_metas(df_somas)
+    elif INGESTAO_TIPADA:
+        # Etapas 1 e 2 com esquema conhecido: as colunas já chegam tipadas, sem limpeza
+        print(f"Procurando arquivos CSV em: {DIRETORIO_ENTRADA}")
+        arquivos_csv = listar_entradas(DIRETORIO_ENTRADA)
+        with instrumentacao.etapa("extrair", modo="tipado") as medida:
+            df_tipado = extrair_tipado(arquivos_csv, duplicadas)
+            medida["linhas"] = len(df_tipado)
+        if df_tipado.empty:
+            print("Processamento interrompido: Nenhum dado para processar.")
+            return
+        if GERAR_CUBO and 'sigla_tribunal' in df_tipado.columns:
+            salvar_cubo([agregar_cubo(df_tipado, COLUNAS_NUMERICAS)], orcamento)
+
+        # Consolidado.csv a partir dos bytes de origem (as colunas de texto não estão em
+        # memória), escrito em uma thread de saída enquanto as metas são calculadas
+        if arquivo_consolidado is not None:
+            def salvar_consolidado():
+                try:
+                    print(f"Salvando consolidado em: {arquivo_consolidado}")
+                    escrever_consolidado(arquivos_csv, arquivo_consolidado, duplicadas)
+                    print(" -> Salvo com sucesso.")
+                except Exception as e:
+                    print(f"Erro ao salvar o arquivo consolidado: {e}")
+            saidas.escrever("consolidado", salvar_consolidado)
+
+        # Etapa 3: Cálculo das Metas
+        with instrumentacao.etapa("calcular_metas"):
+            df_resultados_metas = calcular_todas_metas(df_tipado)
+    else:
+        # Etapa 1: Extração e Concatenação
+        with instrumentacao.etapa("extrair", modo="completo") as medida:
+            df_completo = extrair_e_concatenar_csv(DIRETORIO_ENTRADA, duplicadas)
+            medida["linhas"] = len(df_completo)
+        if df_completo.empty:
+            print("Processamento interrompido: Nenhum dado para processar.")
+            return
+
+        # Salvar arquivo consolidado
+        if arquivo_consolidado is not None:
+            try:
+                print(f"Salvando DataFrame consolidado em: {arquivo_consolidado}")
+                # Usar separador vírgula para consistência com a leitura
+                with instrumentacao.etapa("escrever_consolidado", linhas=len(df_completo)):
+                    df_completo.to_csv(arquivo_consolidado, sep=",", index=False, encoding="utf-8")
+                print(" -> Salvo com sucesso.")
+            except Exception as e:
+                print(f"Erro ao salvar o arquivo consolidado: {e}")
+
+        # Etapa 2: Limpeza e Pré-processamento
+        with instrumentacao.etapa("limpar", linhas=len(df_completo)):
+            df_processado = limpar_e_preparar_dados(df_completo)
+
+        # Etapa 3: Cálculo das Metas
+        with instrumentacao.etapa("calcular_metas"):
+            df_resultados_metas = calcular_todas_metas(df_processado)
+
+    # Consolidado colunar, direto dos arquivos de origem (mesmo para todos os modos). Ele lê
+    # cada arquivo inteiro como texto, então com orçamento só é gerado se o maior couber
+    arquivos_origem = listar_entradas(DIRETORIO_ENTRADA)
+    if GERAR_CONSOLIDADO_COLUNAR and orcamento is not None and \
+            not orcamento.cabe(max(map(tamanho_descompactado, arquivos_origem), default=0)):
+        print("ALERTA: o maior arquivo não cabe no orçamento de memória; consolidado colunar não gerado.")
+    elif GERAR_CONSOLIDADO_COLUNAR:
+        def salvar_colunar():
+            try:
+                escrever_consolidado_colunar(arquivos_origem, DIRETORIO_CONSOLIDADO_COLUNAR,
+                                             CacheColunar(DIRETORIO_CACHE) if USAR_CACHE else None)
+            except Exception as e:
+                print(f"Erro ao salvar o consolidado colunar: {e}")
+        saidas.escrever("consolidado_colunar", salvar_colunar)
+
+    if GERAR_SERIE_MENSAL:
+        try:
+            with instrumentacao.etapa("serie_mensal"):
+                gerar_serie_mensal(arquivos_origem)
+        except Exception as e:
+            print(f"Erro ao gerar a série mensal: {e}")
+
+    # Etapa 4: Geração de Saídas (enviadas ao estágio de saídas, sem esperar)
     if not df_resultados_metas.empty:
-        gerar_saidas(df_resultados_metas)
+        gerar_saidas(df_resultados_metas, saidas, progressivo)
     else:
         print("Nenhum resultado de meta para gerar saídas.")
+    print(f"ETL concluído em {time.time() - inicio_np:.4f} segundos (saídas ainda em andamento).")
+
+    try:
+        with instrumentacao.etapa("aguardar_saidas"):
+            tempos_saidas = saidas.aguardar()
+    finally:
+        saidas.fechar()
+    print(f"Saídas concluídas: {saidas.descrever(tempos_saidas)}.")
 
     fim_np = time.time()
     tempo_total_np = fim_np - inicio_np
@@ -387,7 +1010,24 @@ def main_np():
     except Exception as e:
         print(f"Erro ao salvar tempo de execução NP: {e}")
 
+    # Tempos por etapa/arquivo (JSON lines e trace do Chrome, aberto em chrome://tracing)
+    if INSTRUMENTAR:
+        instrumentacao.imprimir_resumo()
+        try:
+            if ARQUIVO_INSTRUMENTACAO:
+                instrumentacao.exportar_jsonl(ARQUIVO_INSTRUMENTACAO)
+                print(f"Instrumentação salva em {ARQUIVO_INSTRUMENTACAO}")
+            if ARQUIVO_TRACE:
+                instrumentacao.exportar_chrome_trace(ARQUIVO_TRACE)
+                print(f"Trace salvo em {ARQUIVO_TRACE}")
+        except Exception as e:
+            print(f"Erro ao salvar a instrumentação: {e}")
+
 # --- Execução ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Versão Não Paralela (NP) do processamento dos dados dos tribunais")
+    parser.add_argument("--max-memory", type=interpretar_tamanho, default=LIMITE_MEMORIA,
+                        help="Orçamento de memória (ex.: 2GB): blocos, leitura antecipada e despejo em disco se ajustam a ele")
+    LIMITE_MEMORIA = parser.parse_args().max_memory
     main_np()
 
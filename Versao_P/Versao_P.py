@@ -1,3 +1,4 @@
+import argparse
 import pandas as pd
 import os
 from multiprocessing import Pool
@@ -5,212 +6,603 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import time
 import logging
-import tempfile
-import shutil
+import sys
+
+# Permite importar o pacote `comum` (na raiz do projeto) ao executar o script diretamente
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from comum.cache import CacheColunar
+from comum.colunar import gravar_colunar
+from comum.compartilhado import AcumuladorTribunais, SegmentosCompartilhados, publicar_parcial
+from comum.compactados import listar_entradas, tamanho_descompactado
+from comum.consolidado import consolidar_csv
+from comum.cubo import DIMENSOES_CUBO, CuboMetas, agregar_cubo, juntar_parciais, memoria_para_montar
+from comum.deduplicacao import POLITICAS, IndiceLinhas, descrever_duplicadas, somas_a_descontar
+from comum.distribuido import Coordenador, decodificar_parcial
+from comum.esquemas import REGISTRO
+from comum.execucao import processos_para
+from comum.graficos import graficos_por_meta, graficos_por_ramo
+from comum.incremental import EstadoIncremental
+from comum.instrumentacao import Instrumentacao, Progresso
+from comum.memoria import FATOR_TEXTO, JanelaTarefas, OrcamentoMemoria, ParciaisEmDisco, interpretar_tamanho
+from comum.ingestao import COLUNAS_CATEGORICAS, COLUNAS_CHAVE, ler_csv_tipado
+from comum.metas import COLUNAS_METAS, calcular_metas, somar_por_tribunal
+from comum.progressivo import ResumoProgressivo, tarefas_por_arquivo
+from comum.particionamento import TAMANHO_INTERVALO, planejar_tarefas
+from comum.saidas import EstagioSaidas
+from comum.series import EstadoSerieMensal, curvas_acumuladas, somar_arquivo_por_mes
 
 # Configura o logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+# Leiautes sem colunas de alguma meta (comum/esquemas.py) são avisados no log, uma vez por processo
+REGISTRO.avisar = logging.warning
+
+# Cache colunar em disco: arquivos que não mudaram são lidos já convertidos, sem parse do CSV
+USE_CACHE = True
+CACHE_DIR = "./.cache"
+
+# Modo incremental: somas parciais por arquivo persistidas entre execuções; só arquivos
+# novos/alterados são reprocessados e os removidos têm a contribuição descartada
+USE_INCREMENTAL = False
+STATE_DIR = "./.cache/estado_p"
+
+# Codificação dos CSVs de origem. Em UTF-8 o Consolidado.csv é montado com cópia direta
+# entre arquivos (copy_file_range/sendfile); outras codificações são convertidas em blocos
+SOURCE_ENCODING = "utf-8"
+
+# Colunas usadas no cálculo das metas (as únicas guardadas no cache).
+# As fórmulas de cada ramo/tribunal (TP06) ficam na tabela declarativa de comum/metas.py
+META_COLUMNS = COLUNAS_METAS
+
+# Processos do pool. None = automático pelo total de bytes dos CSVs e pelos cores disponíveis
+NUM_PROCESSES = None
+
+# Arquivos maiores que isso são divididos em intervalos de bytes (alinhados em fim de
+# linha) processados em paralelo; as tarefas vão para o pool da maior para a menor
+TASK_SIZE = TAMANHO_INTERVALO
+
+# Consolidado colunar (comum/colunar.py), formato alternativo e desligado por padrão (o
+# Consolidado.csv continua sendo o artefato padrão): particionado por tribunal e com índice,
+# montado em um processo do pool junto com o resto. Com ele ligado e WRITE_CSV = False o
+# Consolidado.csv não é escrito; pode ser gerado depois com ConsolidadoColunar(COLUMNAR_DIR).exportar_csv(...)
+COLUMNAR_OUTPUT = False
+COLUMNAR_DIR = "./results/Consolidado_colunar"
+WRITE_CSV = True
+
+# Cubo de metas: somas das colunas das metas por tribunal, grau, UF, município, órgão
+# julgador e mês (comum/cubo.py), montado a partir das somas parciais de cada tarefa
+# para consultas de drill-down sem reprocessar os CSVs. Não é gerado no modo incremental
+BUILD_CUBE = True
+CUBE_DIR = "./results/cubo"
+
+# Resultados das tarefas pela memória compartilhada (comum/compartilhado.py): cada processo
+# do pool grava as somas (e as parciais do cubo) em um segmento e devolve só um descritor;
+# o processo principal soma direto dos segmentos, sem pickle de DataFrames pelo pipe
+SHARED_RESULTS = True
+
+# Execução distribuída (comum/distribuido.py): com endereços "host:porta" de trabalhadores
+# (iniciados na raiz do projeto com `python -m comum.distribuido --porta 9101`), as tarefas
+# vão para eles por TCP em vez do pool local, e uma tarefa de um trabalhador que cair é
+# reatribuída. O pool local continua montando os consolidados. Ex.: ["127.0.0.1:9101", "127.0.0.1:9102"]
+DISTRIBUTED_WORKERS = []
+DISTRIBUTED_TIMEOUT = 600.0  # Segundos esperando a resposta de uma tarefa antes de reatribuí-la
+
+# Orçamento de memória (comum/memoria.py), ex.: "2GB" ou `--max-memory 2GB`. Com ele, o número
+# de processos, o tamanho das tarefas e as tarefas em trânsito se ajustam ao limite, os
+# resultados são consumidos assim que chegam e as parciais do cubo vão para o disco quando
+# passam da fatia delas. None = sem limite
+MAX_MEMORY = None
+
+# Série mensal (comum/series.py): cumprimento acumulado de cada meta por tribunal até o fim de
+# cada mês (tribunal x mês x meta). As somas mensais de cada arquivo ficam guardadas entre
+# execuções; arquivos novos ou que só ganharam linhas no fim vão para o pool
+MONTHLY_SERIES = False
+MONTHLY_SERIES_PATH = "./results/SerieMensalMetas.csv"
+SERIES_STATE_DIR = "./.cache/estado_serie_p"
+
+# Resumo progressivo (comum/progressivo.py): as tarefas são consumidas na ordem em que terminam
+# e um ResumoMetas parcial é regravado (temporário + substituição) a cada arquivo concluído, no
+# máximo a cada PROGRESSIVE_INTERVAL segundos. Uma queda no fim da execução não perde os
+# tribunais que já terminaram; o parcial é removido depois que o resumo final é gravado.
+# Não se aplica ao modo incremental
+PROGRESSIVE_SUMMARY = False
+PROGRESSIVE_SUMMARY_PATH = "./results/ResumoMetas.parcial.CSV"
+PROGRESSIVE_INTERVAL = 1.0
+
+# Deduplicação (comum/deduplicacao.py): índice persistente com o hash de 64 bits de cada linha
+# de cada arquivo, montado no pool (só os arquivos novos/alterados são lidos a cada execução),
+# que aponta as linhas repetidas entre arquivos (ex.: extratos reenviados que se sobrepõem).
+# Com "remover", as somas dessas linhas são descontadas do total e do cubo e elas ficam fora do
+# Consolidado.csv (o colunar mantém todas); com "relatorio" só são informadas.
+# DEDUP_COLUMNS None = a linha inteira (COLUNAS_IDENTIFICACAO não é única nos dados)
+DEDUPLICATE = False
+DEDUP_POLICY = "remover"  # "remover" ou "relatorio"
+DEDUP_COLUMNS = None
+DEDUP_INDEX_DIR = "./.cache/indice_linhas_p"
+
+# Estágio de saídas (comum/saidas.py): o ResumoMetas e a série mensal são escritos em threads e
+# os gráficos desenhados em um pool de processos próprio (backend Agg) enquanto os consolidados
+# terminam. ALL_CHARTS acrescenta ao da Meta 1 um gráfico por meta e um mapa de calor por ramo
+# (desligado por padrão: só o gráfico da Meta 1, como antes)
+ALL_CHARTS = False
+CHARTS_DIR = "./results/graficos"
+CHART_PROCESSES = None  # None = um processo por core
+
+# Instrumentação: tempo, linhas, bytes e pico de memória por etapa e por tarefa (inclusive
+# nos processos do pool), exportados em JSON lines e trace do Chrome (None desativa)
+INSTRUMENT = True
+TRACE_JSONL = "./results/instrumentacao_p.jsonl"
+TRACE_CHROME = "./results/trace_p.json"
+PROFILE_STAGES = ()  # Ex.: ("calcular_metas",) grava perfil_calcular_metas_<pid>.prof em ./results
+PROFILER = "cprofile"  # Ou "pyinstrument", se estiver instalado
+PROGRESS_INTERVAL = 2.0  # Segundos entre mensagens de progresso das tarefas
+
+instrumentation = Instrumentacao(ativa=False)  # Configurada em main e em cada processo do pool
+
+
+def init_worker(config):
+    # Repassa a configuração da instrumentação aos processos do pool (necessário com spawn)
+    instrumentation.configurar(*config)
+
+
+def process_csv(file_path, byte_range=None, with_cube=False):
+    # Com with_cube, retorna também as somas no nível detalhado do cubo
+    try:
+        part = "" if byte_range is None else f" [bytes {byte_range[0]}-{byte_range[1]}]"
+        # Mensagens por arquivo só em DEBUG; o progresso é mostrado (amostrado) pelo processo principal
+        logging.debug(f"Iniciando processamento do arquivo: {file_path}{part}")
+        size = os.path.getsize(file_path) if byte_range is None else byte_range[1] - byte_range[0]
+        with instrumentation.etapa("processar_arquivo", arquivo=file_path, bytes=size) as measure:
+            # Só as colunas das metas são lidas: o Consolidado.csv é montado direto dos bytes de origem
+            if USE_CACHE:
+                df = CacheColunar(CACHE_DIR, encoding=SOURCE_ENCODING).carregar(
+                    file_path, META_COLUMNS, DIMENSOES_CUBO if with_cube else COLUNAS_CHAVE, intervalo=byte_range)
+            else:
+                # Leitura tipada: só chaves (categóricas) e contagens (menor tipo inteiro)
+                df = ler_csv_tipado(file_path, META_COLUMNS, DIMENSOES_CUBO if with_cube else COLUNAS_CATEGORICAS,
+                                    encoding=SOURCE_ENCODING, intervalo=byte_range)
+            measure["linhas"] = len(df)
+            if byte_range is not None:
+                measure["intervalo"] = list(byte_range)
+
+            # Soma as colunas das metas por tribunal; as metas são calculadas no processo
+            # principal, depois de juntar as somas de todos os arquivos
+            has_keys = "sigla_tribunal" in df.columns
+            partial_sums = somar_por_tribunal(df, META_COLUMNS) if has_keys else pd.DataFrame()
+            if with_cube:
+                cube_sums = agregar_cubo(df, META_COLUMNS) if has_keys else None
+        logging.debug(f"Somas parciais calculadas para o arquivo: {file_path}{part}")
+        return (partial_sums, cube_sums) if with_cube else partial_sums
+    except Exception as e:
+        logging.error(f"Erro ao processar o arquivo {file_path}: {e}")
+        return (None, None) if with_cube else None  # Retorna nulo em caso de erro
 
 
-# Meta 1: Julgar mais processos que os distribuídos.
-# Fórmula: (∑ julgadom1 / (∑ cnm1 + ∑ desm1 - ∑ susm1)) * 100
-
-# Meta 2A: Identificar e julgar pelo menos 95% dos processos.
-# Fórmula: (∑ julgadom2_a / (∑ distm2_a - ∑ suspm2_a)) * (1000 / 9.5)
-
-# Meta 2B: Identificar e julgar pelo menos 100% dos processos.
-# Fórmula: (∑ julgadom2_b / (∑ distm2_b - ∑ suspm2_b)) * 100
-
-# Meta 2C: Identificar e julgar pelo menos 95% dos processos.
-# Fórmula: (∑ julgadom2_c / (∑ distm2_c - ∑ suspm2_c)) * (1000 / 9.5)
+def process_task(task):
+    # Tarefa do plano de planejar_tarefas: (índice na ordem original, arquivo, intervalo), mais
+    # os nomes dos segmentos de memória compartilhada (somas, cubo) com SHARED_RESULTS
+    # Os eventos de instrumentação do processo voltam junto com o resultado
+    index, file_path, byte_range, *segments = task
+    result = process_csv(file_path, byte_range, BUILD_CUBE)
+    if segments:
+        # Pelo pipe volta só o descritor de cada segmento
+        parts = result if BUILD_CUBE else (result, None)
+        result = tuple(publicar_parcial(part, name) for part, name in zip(parts, segments[0]))
+    return index, result, instrumentation.coletar()
 
-# Meta 2ANT: Identificar e julgar pelo menos 100% dos processos.
-# Fórmula: (∑ julgadom2_ant / (∑ distm2_ant - ∑ susm2_ant)) * 100
 
-# Meta 4A: Identificar e julgar pelo menos 95% ddos processos.
-# Fórmula: (∑ julgadom4_a / (∑ distm4_a - ∑ suspm4_a)) * (1000 / 6.5)
+def process_monthly(task):
+    # Tarefa da série mensal: (arquivo, intervalo), com intervalo só nas linhas anexadas
+    file_path, byte_range = task
+    try:
+        return somar_arquivo_por_mes(file_path, byte_range, encoding=SOURCE_ENCODING)
+    except Exception as e:
+        logging.error(f"Erro ao processar o arquivo {file_path} para a série mensal: {e}")
+        return None
 
-# Meta 4B: Identificar e julgar 100% dos processos.
-# Fórmula: (∑ julgadom4_b / (∑ dism4_b - ∑ susm4_b)) * (100)
 
-# Meta 6: Julgar 75% dos processos.
-# Fórmula: (∑ julgadom6 / (∑ dism6 - ∑ susm6)) * (1000 / 5)
+def process_duplicates(file_path, positions):
+    # Somas (com o sinal trocado) das linhas repetidas de um arquivo, para descontar do total;
+    # o arquivo é relido inteiro e sem cache, já que as tarefas podem ser intervalos de bytes
+    try:
+        df = ler_csv_tipado(file_path, META_COLUMNS, DIMENSOES_CUBO if BUILD_CUBE else COLUNAS_CATEGORICAS,
+                            encoding=SOURCE_ENCODING)
+        if "sigla_tribunal" not in df.columns:
+            return None, None
+        return somas_a_descontar(df, positions, META_COLUMNS, cubo=BUILD_CUBE)
+    except Exception as e:
+        logging.error(f"Erro ao descontar as linhas repetidas de {file_path}: {e}")
+        return None, None
+
+
+def find_duplicates(csv_files, pool):
+    # Atualiza o índice de linhas no pool e informa as linhas repetidas entre arquivos.
+    # Retorna {arquivo: linhas repetidas} na política "remover" ({} na "relatorio")
+    if DEDUP_POLICY not in POLITICAS:
+        raise ValueError(f"Política de duplicadas desconhecida: {DEDUP_POLICY} (opções: {', '.join(POLITICAS)})")
+    index = IndiceLinhas(DEDUP_INDEX_DIR, DEDUP_COLUMNS, encoding=SOURCE_ENCODING)
+    with instrumentation.etapa("indexar_linhas", arquivos=len(csv_files)) as measure:
+        summary = index.sincronizar(csv_files, mapear=lambda func, files: pool.imap(func, files, chunksize=1))
+        positions, origins = index.duplicadas(csv_files)
+        measure["linhas"] = sum(len(p) for p in positions.values())
+    print(f"Índice de linhas: {len(summary['processados'])} arquivos indexados, {summary['inalterados']} inalterados.")
+    for line in descrever_duplicadas(positions, origins):
+        logging.warning(line)
+    if not positions:
+        print("Nenhuma linha repetida entre os arquivos.")
+    return positions if DEDUP_POLICY == "remover" else {}
+
+
+def build_consolidated(csv_files, output_path, duplicates=None):
+    # Monta o Consolidado.csv a partir dos bytes dos arquivos de origem (sem DataFrames),
+    # sem as linhas repetidas de `duplicates`
+    start = time.time()
+    with instrumentation.etapa("escrever_consolidado", arquivos=len(csv_files)) as measure:
+        stats = consolidar_csv(csv_files, output_path, encoding_origem=SOURCE_ENCODING, descartar=duplicates)
+        measure["bytes"] = stats["bytes"]
+    stats["eventos"] = instrumentation.coletar()  # Roda em um processo do pool
+    modes = {}
+    for mode in stats["modos"].values():
+        modes[mode] = modes.get(mode, 0) + 1
+    logging.info(f"Consolidado montado em {time.time() - start:.2f}s ({stats['bytes']} bytes, modos: {modes})")
+    return stats
+
+
+def build_columnar(csv_files, output_path):
+    # Consolidado colunar a partir dos arquivos de origem (roda em um processo do pool)
+    start = time.time()
+    with instrumentation.etapa("escrever_consolidado_colunar") as measure:
+        measure["linhas"] = gravar_colunar(csv_files, output_path, encoding=SOURCE_ENCODING)["linhas"]
+    logging.info(f"Consolidado colunar montado em {time.time() - start:.2f}s ({measure['linhas']} linhas)")
+    return instrumentation.coletar()
+
+
+def save_cube(cube_results, output_path, budget=None):
+    # Junta as somas do cubo de todas as tarefas e grava os níveis materializados
+    # (uma coluna por vez, direto no diretório do cubo)
+    if getattr(cube_results, "abandonada", False) or \
+            (budget is not None and not budget.cabe(memoria_para_montar(cube_results), 1)):
+        logging.warning("O cubo de metas não cabe no orçamento de memória; cubo não gerado.")
+        return
+    try:
+        with instrumentation.etapa("cubo") as measure:
+            cube = CuboMetas.montar_em_disco(cube_results, output_path, META_COLUMNS)
+            measure["linhas"] = len(cube.niveis["detalhado"]["codigos"])
+        print(f"Cubo de metas salvo em {output_path} ({measure['linhas']} células no nível detalhado)")
+    except Exception as e:
+        logging.error(f"Erro ao gerar o cubo de metas: {e}")
 
-# Meta 7A: Julgar 75% dos processos.
-# Fórmula: (∑ julgadom7_a / (∑ dism7_a - ∑ susm7_a)) * (1000/5)
 
-# Meta 7B: Julgar 75% dos processos.
-# Fórmula: (∑ julgadom7_b / (∑ dism7_b - ∑ susm7_b)) * (1000/5)
+def plot_meta1(concatenated_aggregated_df, output_dir):
+    # Agrega dados para melhor legibilidade
+    if "sigla_tribunal" in concatenated_aggregated_df.columns and "meta1_calculated" in concatenated_aggregated_df.columns:
+        aggregated_df_for_plot = concatenated_aggregated_df.groupby("sigla_tribunal")[
+            "meta1_calculated"].mean().reset_index()
+        aggregated_df_for_plot = aggregated_df_for_plot.sort_values(by="meta1_calculated", ascending=False)
 
-# Meta 8A: Identificar e julgar 75% dos processos.
-# Fórmula: (∑ julgadom8_a / (∑ dism8_a - ∑ susm8_a)) * (1000/7,5)
+        plt.figure(figsize=(14, 7))
+        sns.barplot(x="sigla_tribunal", y="meta1_calculated", data=aggregated_df_for_plot)
+        plt.title("Cumprimento Médio da Meta 1 por Tribunal")
+        plt.xlabel("Tribunal")
+        plt.ylabel("Cumprimento Médio da Meta 1 (%)")
+        plt.xticks(rotation=90)
+        plt.tight_layout()
+        plt.savefig(os.path.join(output_dir, 'meta1_Tribunais.png'))
+        plt.close()  # O processo de renderização desenha outros gráficos depois deste
+        print(f"Gráfico de cumprimento médio da Meta 1 salvo em {os.path.join(output_dir, 'meta1_Tribunais.png')}")
 
-# Meta 8B: Identificar e julgar 100% dos processos.
-# Fórmula: (∑ julgadom8_b / (∑ dism8_b - ∑ suspm8_b)) * (1000/9)
 
-# Meta 10A: Identificar e julgar 90% dos processos.
-# Fórmula: (∑ julgadom10_a / (∑ dism10_a - ∑ susm10_a)) * (1000/9)
+def rename_metas(metas_df):
+    # Colunas das metas no padrão do ResumoMetas.CSV desta versão (meta1_calculated, ...)
+    return metas_df.rename(columns=lambda col: f"{col.lower()}_calculated" if col.startswith("Meta") else col)
 
-# Meta 10B: Identificar e julgar 100% dos processos.
-# Fórmula: (∑ julgadom10_b / (∑ dism10_b - ∑ susm10_b)) * (1000/10)
 
-def calculate_meta1(df):
-    cnm1 = df["casos_novos_2025"].sum() if "casos_novos_2025" in df.columns else 0
-    julgadom1 = df["julgados_2025"].sum() if "julgados_2025" in df.columns else 0
-    desm1 = df["dessobrestados_2025"].sum() if "dessobrestados_2025" in df.columns else 0
-    susm1 = df["suspensos_2025"].sum() if "suspensos_2025" in df.columns else 0
-    denominator = cnm1 + desm1 - susm1
-    if denominator == 0:
-        return 0
-    return (julgadom1 / denominator) * 100
+def write_partial_summary(metas_df, path):
+    # Snapshot do resumo progressivo, no mesmo formato do ResumoMetas.CSV
+    rename_metas(metas_df).to_csv(path, index=False, na_rep="NA")
 
 
-def calculate_meta_generic(df, julgado_col, dist_col, susp_col, target_percentage):
-    julgado = df[julgado_col].sum() if julgado_col in df.columns else 0
-    dist = df[dist_col].sum() if dist_col in df.columns else 0
-    susp = df[susp_col].sum() if susp_col in df.columns else 0
-    denominator = dist - susp
-    if denominator == 0:
-        return 0
-    return (julgado / denominator) * (1000 / target_percentage)
+def write_summary(concatenated_aggregated_df, output_dir):
+    # Gera o arquivo ResumoMetas.CSV (NA nas metas que não se aplicam ao ramo)
+    with instrumentation.etapa("escrever_saidas", linhas=len(concatenated_aggregated_df)):
+        # Temporário + substituição: o serviço de consulta (comum/consulta.py) recarrega o arquivo inteiro
+        summary_path = os.path.join(output_dir, "ResumoMetas.CSV")
+        concatenated_aggregated_df.to_csv(summary_path + ".tmp", index=False, na_rep="NA")
+        os.replace(summary_path + ".tmp", summary_path)
+    print(f"Resumo das metas salvo em {summary_path}")
 
 
-def process_csv(file_path):
-    try:
-        logging.info(f"Iniciando processamento do arquivo: {file_path}")
-        print(f"Processando arquivo: {os.path.basename(file_path)}")  # Printa o arquivo que está sendo lido
-        df = pd.read_csv(file_path)
-        logging.info(f"Arquivo {file_path} lido com sucesso.")
-
-        # Obtém o nome do tribunal
-        tribunal_name = df["sigla_tribunal"].iloc[0] if "sigla_tribunal" in df.columns and not df.empty else "UNKNOWN"
-
-        # Calcula as metas
-        meta1 = calculate_meta1(df)
-        meta2a = calculate_meta_generic(df, "julgm2_a", "distm2_a", "suspm2_a", 9.5)
-        meta2b = calculate_meta_generic(df, "julgm2_b", "distm2_b", "suspm2_b", 100)
-        meta2c = calculate_meta_generic(df, "julgm2_c", "distm2_c", "suspm2_c", 9.5)
-        meta2ant = calculate_meta_generic(df, "julgm2_ant", "distm2_ant", "susm2_ant",100)
-        meta4a = calculate_meta_generic(df, "julgm4_a", "distm4_a", "suspm4_a", 9.5)
-        meta4b = calculate_meta_generic(df, "julgm4_b", "dism4_b", "susm4_b", 100)
-        meta6 = calculate_meta_generic(df, "julgadom6", "dism6", "susm6", 7.5)
-        meta7a = calculate_meta_generic(df, "julgadom7_a", "dism7_a", "susm7_a", 7.5)
-        meta7b = calculate_meta_generic(df, "julgadom7_b", "dism7_b", "susm7_b", 7.5)
-        meta8a = calculate_meta_generic(df, "julgadom8_a", "dism8_a", "susm8_a", 7.5)
-        meta8b = calculate_meta_generic(df, "julgadom8_b", "dism8_b", "suspm8_b", 100)
-        meta10a = calculate_meta_generic(df, "julgadom10_a", "dism10_a", "susm10_a", 9)
-        meta10b = calculate_meta_generic(df, "julgadom10_b", "dism10_b", "susm10_b", 100)
-
-        logging.info(f"Metas calculadas para o arquivo: {file_path}")
-
-        # Salva o DataFrame bruto em memória temporária
-        temp_raw_file = tempfile.NamedTemporaryFile(delete=False, suffix=".csv").name
-        df.to_csv(temp_raw_file, index=False)
-        logging.info(f"Dados brutos de {file_path} salvos temporariamente em {temp_raw_file}")
-
-        # Retorna DataFrame com os resultados das metas
-        return (
-            pd.DataFrame({
-                "sigla_tribunal": [tribunal_name],
-                "meta1_calculated": [meta1],
-                "meta2a_calculated": [meta2a],
-                "meta2b_calculated": [meta2b],
-                "meta2c_calculated": [meta2c],
-                "meta2ant_calculated": [meta2ant],
-                "meta4a_calculated": [meta4a],
-                "meta4b_calculated": [meta4b],
-                "meta6_calculated": [meta6],
-                "meta7a_calculated": [meta7a],
-                "meta7b_calculated": [meta7b],
-                "meta8a_calculated": [meta8a],
-                "meta8b_calculated": [meta8b],
-                "meta10a_calculated": [meta10a],
-                "meta10b_calculated": [meta10b]
-            }),
-            temp_raw_file  # Retorna o caminho do arquivo temporario
-        )
-    except Exception as e:
-        logging.error(f"Erro ao processar o arquivo {file_path}: {e}")
-        return None, None  # Retorna nulo para ambos em caso de erro
+def write_monthly_series(monthly_series):
+    monthly_series.round(2).to_csv(MONTHLY_SERIES_PATH + ".tmp", sep=";", index=False)
+    os.replace(MONTHLY_SERIES_PATH + ".tmp", MONTHLY_SERIES_PATH)
+    print(f"Série mensal das metas salva em {MONTHLY_SERIES_PATH}")
 
 
 def main():
+    """Processa ./Dados e grava ./results; retorna o número de processos do pool usados."""
     input_dir = "./Dados"  # Pasta de input dos arquivos CSVs
     output_dir = "./results" # Pasta de output dos resultados e do grafico
     os.makedirs(output_dir, exist_ok=True)
-
-    csv_files = [os.path.join(input_dir, f) for f in os.listdir(input_dir) if f.endswith(".csv")]
-
-    # Usa todos os cores do processador disponíveis para a paralelização
-    num_processes = os.cpu_count()
+    instrumentation.configurar(INSTRUMENT, PROFILE_STAGES, PROFILER, output_dir)
+
+    # CSVs e compactados (.csv.gz, .csv.zst, .zip): cada compactado é uma tarefa, descompactada
+    # em fluxo no processo do pool que a recebe (vários arquivos descompactam em paralelo)
+    csv_files = listar_entradas(input_dir)
+
+    # Processos pelo volume de dados (comum/execucao.py): um por core só quando há trabalho
+    # para todos; entradas pequenas (ou com muitos arquivos vazios) não pagam por processos ociosos
+    num_processes = NUM_PROCESSES or processos_para(csv_files)
+    task_size, in_flight, budget = TASK_SIZE, None, None
+    if MAX_MEMORY:
+        # Com orçamento: menos bytes por tarefa e, se ainda não couber, menos processos
+        budget = OrcamentoMemoria(MAX_MEMORY, emitir=logging.warning)
+        num_processes, task_size, in_flight = budget.planejar_pool(num_processes, TASK_SIZE)
+        print(f"Orçamento de memória: {budget.descrever()}; tarefas de até {task_size >> 10} KB, "
+              f"no máximo {in_flight} em trânsito.")
     print(f"Processando {len(csv_files)} arquivos CSV usando {num_processes} processos...")
 
     start_time = time.time()
 
-    with Pool(num_processes) as pool:
-        # processed_results é uma lista de tuplas: (aggregated_df, temp_raw_file_path)
-        processed_results = pool.map(process_csv, csv_files)
-
-    # Filtra valores nulos de processos falhos e separa os Dataframes e arquivos temporários
-    aggregated_dfs = []
-    temp_raw_file_paths = []
-    for agg_df, temp_path in processed_results:
-        if agg_df is not None and temp_path is not None:
-            aggregated_dfs.append(agg_df)
-            temp_raw_file_paths.append(temp_path)
-
-    if not aggregated_dfs:
-        print("Nenhum arquivo CSV foi processado com sucesso.")
-        return
-
-    # Gera o arquivo ResumoMetas.CSV
-    concatenated_aggregated_df = pd.concat(aggregated_dfs, ignore_index=True)
-    concatenated_aggregated_df.to_csv(os.path.join(output_dir, "ResumoMetas.CSV"), index=False)
-    print(f"Resumo das metas salvo em {os.path.join(output_dir, 'ResumoMetas.CSV')}")
-
-    # Gera o arquivo Consolidado.csv
+    # Se nenhuma fonte mudou desde a última execução, o Consolidado.csv é reaproveitado
     consolidated_output_path = os.path.join(output_dir, "Consolidado.csv")
-    if temp_raw_file_paths:
-        with open(consolidated_output_path, 'w') as outfile:
-            # Escreve o cabeçalho das colunas usando o primeiro arquivo como base
-            with open(temp_raw_file_paths[0], 'r') as infile:
-                outfile.write(infile.readline())
-            # Junta o conteúdo dos arquivos subsequentes (pulando o cabeçalho)
-            for i, temp_path in enumerate(temp_raw_file_paths):
-                with open(temp_path, 'r') as infile:
-                    if i == 0: # Pula a linha de cabeçalho no primeiro arquivo, já está escrita
-                        next(infile)
-                    shutil.copyfileobj(infile, outfile) # Cópia em bloco otimizada
+    cache = CacheColunar(CACHE_DIR, encoding=SOURCE_ENCODING) if USE_CACHE else None
+    # Sem as linhas repetidas, o Consolidado.csv é outro artefato no cache
+    consolidated_artifact = "consolidado_sem_repetidas" if DEDUPLICATE and DEDUP_POLICY == "remover" else "consolidado"
+    reuse_consolidated = cache is not None and \
+        cache.artefato_atualizado(consolidated_artifact, csv_files, consolidated_output_path)
+    if reuse_consolidated:
+        print(f"Consolidado {consolidated_output_path} já está atualizado, usando apenas o cache.")
+    columnar_index = os.path.join(COLUMNAR_DIR, "indice.json")
+    reuse_columnar = cache is not None and cache.artefato_atualizado("consolidado_colunar", csv_files, columnar_index)
+    if COLUMNAR_OUTPUT and reuse_columnar:
+        print(f"Consolidado colunar {COLUMNAR_DIR} já está atualizado, usando apenas o cache.")
+    # O consolidado colunar lê cada arquivo inteiro como texto: com orçamento, só se o maior couber
+    skip_columnar = budget is not None and not budget.cabe(max(map(tamanho_descompactado, csv_files), default=0), FATOR_TEXTO)
+    if COLUMNAR_OUTPUT and not reuse_columnar and skip_columnar:
+        logging.warning("O maior arquivo não cabe no orçamento de memória; consolidado colunar não gerado.")
+
+    # Com orçamento, as parciais do cubo ficam em memória só até a fatia delas; o resto vai para o disco
+    # (e nada mais é despejado se o cubo já não couber no orçamento)
+    cube_spill = None
+    if budget is not None and BUILD_CUBE and not USE_INCREMENTAL:
+        cube_spill = ParciaisEmDisco(budget.limite_parciais(), lambda parts: juntar_parciais(parts, META_COLUMNS),
+                                     budget, prefixo="cubo_p_",
+                                     cabe=lambda parts: budget.cabe(memoria_para_montar(parts), 1))
+
+    # Resumo, série mensal e gráficos saem do caminho crítico (threads e processos próprios);
+    # com orçamento de memória, um único processo de renderização
+    progressive = None
+    outputs = EstagioSaidas(1 if budget is not None else CHART_PROCESSES, instrumentacao=instrumentation,
+                            emitir=logging.error)
+
+    # Segmentos de memória compartilhada da execução: o que sobrar (tarefa interrompida) é
+    # removido na saída do with, depois que o pool já terminou
+    with SegmentosCompartilhados() as segments, \
+            Pool(num_processes, initializer=init_worker, initargs=(instrumentation.configuracao(),)) as pool:
+        # Linhas repetidas entre arquivos (índice de linhas montado no pool), antes das tarefas
+        duplicates = {}
+        if DEDUPLICATE:
+            try:
+                duplicates = find_duplicates(csv_files, pool)
+            except Exception as e:
+                logging.error(f"Erro ao verificar linhas repetidas: {e}")
+        # O Consolidado.csv é montado em um dos processos ao mesmo tempo que as metas são calculadas
+        consolidation = None
+        if WRITE_CSV and not reuse_consolidated:
+            consolidation = pool.apply_async(build_consolidated, (csv_files, consolidated_output_path, duplicates))
+        columnar = None
+        if COLUMNAR_OUTPUT and not reuse_columnar and not skip_columnar:
+            columnar = pool.apply_async(build_columnar, (csv_files, COLUMNAR_DIR))
+        if USE_INCREMENTAL:
+            # Só os arquivos novos/alterados vão para o pool; o resto vem do estado gravado
+            state = EstadoIncremental(STATE_DIR, META_COLUMNS)
+            # Arquivos pendentes vão um a um para o pool (os maiores primeiro)
+            with instrumentation.etapa("extrair", modo="incremental"):
+                summary = state.sincronizar(csv_files, process_csv,
+                                            mapear=lambda func, files: pool.imap(func, files, chunksize=1))
+            print(f"Modo incremental: {len(summary['processados'])} arquivos processados, "
+                  f"{len(summary['removidos'])} removidos, {summary['inalterados']} inalterados.")
+            processed_results = [state.somas_totais(csv_files)]
+            cube_results = []
+        else:
+            # Tarefas da maior para a menor, entregues uma a uma (chunksize=1): quem termina
+            # pega a próxima, e um arquivo grande não prende um único processo
+            tasks = planejar_tarefas(csv_files, task_size)
+            planned = {file_path for _, file_path, _ in tasks}
+            for file_path in csv_files:
+                if file_path not in planned:
+                    print(f"Arquivo sem linhas ignorado: {os.path.basename(file_path)}")
+            print(f"{len(tasks)} tarefas planejadas para {len(planned)} arquivos.")
+            # processed_results é uma lista com as somas parciais de cada tarefa, na ordem
+            # original (arquivo e offset), para que a junção não dependa da ordem de término
+            results = {}
+            progress = Progresso(len(tasks), "Tarefas concluídas", PROGRESS_INTERVAL, emitir=logging.info)
+            task_files = {index: file_path for index, file_path, _ in tasks}
+            if PROGRESSIVE_SUMMARY:
+                progressive = ResumoProgressivo(PROGRESSIVE_SUMMARY_PATH, tarefas_por_arquivo(tasks),
+                                                write_partial_summary, META_COLUMNS, PROGRESSIVE_INTERVAL,
+                                                emitir=logging.info)
+
+            def task_done(index, sums):
+                # Somas de uma tarefa concluída (None se falhou) para o resumo progressivo
+                if progressive is not None:
+                    progressive.concluir_tarefa(task_files[index], sums)
+
+            def remote_done(index, response):
+                if progressive is not None:
+                    task_done(index, decodificar_parcial(response.get("somas")))
+                progress.avancar(linhas=response.get("linhas", 0))
+
+            if DISTRIBUTED_WORKERS:
+                # Trabalhadores remotos devolvem somas parciais compactas, juntadas aqui por índice
+                print(f"Execução distribuída em {len(DISTRIBUTED_WORKERS)} trabalhadores: {', '.join(DISTRIBUTED_WORKERS)}")
+                coordinator = Coordenador(DISTRIBUTED_WORKERS, DISTRIBUTED_TIMEOUT, emitir=logging.warning)
+                with instrumentation.etapa("extrair", tarefas=len(tasks), modo="distribuido"):
+                    remote = coordinator.executar(
+                        tasks, SOURCE_ENCODING, DIMENSOES_CUBO if BUILD_CUBE else COLUNAS_CATEGORICAS, BUILD_CUBE,
+                        ao_concluir=remote_done)
+                results = {index: pair if BUILD_CUBE else pair[0] for index, pair in remote.items()}
+            else:
+                if SHARED_RESULTS:
+                    tasks = [(index, file_path, byte_range, (segments.nome(index, "s"), segments.nome(index, "c")))
+                             for index, file_path, byte_range in tasks]
+                # Com orçamento, só in_flight tarefas ficam entregues e sem resultado consumido
+                window = JanelaTarefas(tasks, in_flight) if in_flight else None
+                # Com despejo do cubo ou resumo progressivo, os segmentos são lidos na chegada
+                read_on_arrival = SHARED_RESULTS and (cube_spill is not None or progressive is not None)
+                try:
+                    with instrumentation.etapa("extrair", tarefas=len(tasks)):
+                        for index, result, events in pool.imap_unordered(process_task, window or tasks, chunksize=1):
+                            if read_on_arrival:
+                                result = tuple(segments.ler(part) for part in result)
+                                result = result if BUILD_CUBE else result[0]
+                            if cube_spill is not None:
+                                # Consumido na chegada: as somas (poucas linhas) ficam, o cubo vai para o despejo
+                                result, cube = result
+                                cube_spill.adicionar(cube)
+                            task_done(index, result[0] if isinstance(result, tuple) else result)
+                            results[index] = result
+                            instrumentation.incorporar(events)
+                            progress.avancar()
+                            if window is not None:
+                                window.concluir()
+                finally:
+                    if window is not None:
+                        window.fechar()
+            ordered = [results[index] for index in sorted(results)]
+            if cube_spill is not None and not DISTRIBUTED_WORKERS:
+                processed_results, cube_results = ordered, cube_spill
+                if cube_spill.arquivos:
+                    print(f"Parciais do cubo despejadas em disco {len(cube_spill.arquivos)} vez(es).")
+            elif SHARED_RESULTS and not DISTRIBUTED_WORKERS and progressive is None:
+                # Somas acumuladas in-place (tribunal x coluna) na ordem original das tarefas
+                accumulator = AcumuladorTribunais(META_COLUMNS)
+                cube_results = []
+                with instrumentation.etapa("juntar_resultados", tarefas=len(ordered)):
+                    for sums_segment, cube_segment in ordered:
+                        segments.somar_em(accumulator, sums_segment)
+                        if BUILD_CUBE:
+                            cube_results.append(segments.ler(cube_segment))
+                processed_results = [accumulator.resultado()]
+            elif BUILD_CUBE:
+                processed_results = [partial for partial, _ in ordered]
+                cube_results = [cube for _, cube in ordered]
+            else:
+                processed_results, cube_results = ordered, []
+        if duplicates:
+            # As tarefas somaram os arquivos inteiros: as linhas repetidas são descontadas do total
+            with instrumentation.etapa("descontar_repetidas", arquivos=len(duplicates)):
+                discounts = pool.starmap(process_duplicates, duplicates.items(), chunksize=1)
+            processed_results = processed_results + [sums for sums, _ in discounts]
+            if BUILD_CUBE and not USE_INCREMENTAL:
+                for _, cube in discounts:
+                    if cube is not None:
+                        cube_results.append(cube)
+            print(f"Linhas repetidas de {len(duplicates)} arquivo(s) descontadas das somas.")
+        monthly_series = None
+        if MONTHLY_SERIES:
+            # Somas mensais dos arquivos pendentes no pool, com o consolidado ainda em andamento
+            series_state = EstadoSerieMensal(SERIES_STATE_DIR)
+            with instrumentation.etapa("serie_mensal"):
+                series_summary = series_state.sincronizar(
+                    csv_files, process_monthly, mapear=lambda func, tasks: pool.imap(func, tasks, chunksize=1))
+                monthly_series = curvas_acumuladas(series_state.somas_totais(csv_files))
+            print(f"Série mensal: {len(series_summary['processados'])} arquivos processados "
+                  f"({len(series_summary['anexados'])} só com linhas anexadas), "
+                  f"{series_summary['inalterados']} inalterados.")
+
+        # Filtra valores nulos de processos falhos
+        aggregated_dfs = [agg_df for agg_df in processed_results if agg_df is not None and not agg_df.empty]
+
+        # As metas são calculadas antes de esperar pelos consolidados: o resumo e os gráficos
+        # vão para o estágio de saídas enquanto o pool termina de montá-los
+        concatenated_aggregated_df = None
+        if aggregated_dfs:
+            # Junta as somas de todos os arquivos e calcula todas as metas de uma vez (vetorizado)
+            with instrumentation.etapa("calcular_metas"):
+                total_sums = somar_por_tribunal(pd.concat(aggregated_dfs, ignore_index=True), META_COLUMNS)
+                metas_df = calcular_metas(total_sums)
+                concatenated_aggregated_df = rename_metas(metas_df)
+            outputs.escrever("resumo", write_summary, concatenated_aggregated_df, output_dir)
+            if monthly_series is not None and not monthly_series.empty:
+                outputs.escrever("serie_mensal", write_monthly_series, monthly_series)
+            outputs.renderizar("meta1_Tribunais.png", plot_meta1, concatenated_aggregated_df, output_dir)
+            if ALL_CHARTS:
+                outputs.desenhar(graficos_por_meta(metas_df, CHARTS_DIR) + graficos_por_ramo(metas_df, CHARTS_DIR))
+            print(f"ETL concluído em {time.time() - start_time:.2f} segundos (saídas em andamento).")
+
+        consolidation_stats = None
+        if consolidation is not None:
+            try:
+                consolidation_stats = consolidation.get()
+                instrumentation.incorporar(consolidation_stats.pop("eventos"))
+            except Exception as e:
+                logging.error(f"Erro ao montar o arquivo consolidado: {e}")
+        if columnar is not None:
+            try:
+                instrumentation.incorporar(columnar.get())
+                print(f"Consolidado colunar salvo em {COLUMNAR_DIR}")
+                if cache is not None:
+                    cache.registrar_artefato("consolidado_colunar", csv_files, columnar_index)
+            except Exception as e:
+                logging.error(f"Erro ao montar o consolidado colunar: {e}")
+
+    if concatenated_aggregated_df is None:
+        outputs.fechar()
+        print("Nenhum arquivo CSV foi processado com sucesso.")
+        return num_processes
+
+    if cube_results or getattr(cube_results, "abandonada", False):
+        save_cube(cube_results, CUBE_DIR, budget)
+    if cube_spill is not None:
+        cube_spill.limpar()
+
+    # Consolidado.csv
+    if not WRITE_CSV:
+        print("Consolidado.csv não gerado (WRITE_CSV = False).")
+    elif reuse_consolidated:
+        print(f"Arquivo consolidado mantido em {consolidated_output_path}")
+    elif consolidation_stats is not None and consolidation_stats["colunas"]:
         print(f"Arquivo consolidado salvo em {consolidated_output_path}")
+        if cache is not None:
+            cache.registrar_artefato(consolidated_artifact, csv_files, consolidated_output_path)
     else:
         print("Nenhum dado bruto foi processado para consolidação.")
 
     end_time = time.time()
     print(f"Tempo total de execução: {end_time - start_time:.2f} segundos")
 
-    # Limpa os arquivos temporários
-    for temp_path in temp_raw_file_paths:
-        os.remove(temp_path)
-
-    # Gera o gráfico
-    # Agrega dados para melhor legibilidade
-    if "sigla_tribunal" in concatenated_aggregated_df.columns and "meta1_calculated" in concatenated_aggregated_df.columns:
-        aggregated_df_for_plot = concatenated_aggregated_df.groupby("sigla_tribunal")[
-            "meta1_calculated"].mean().reset_index()
-        aggregated_df_for_plot = aggregated_df_for_plot.sort_values(by="meta1_calculated", ascending=False)
-
-        plt.figure(figsize=(14, 7))
-        sns.barplot(x="sigla_tribunal", y="meta1_calculated", data=aggregated_df_for_plot)
-        plt.title("Cumprimento Médio da Meta 1 por Tribunal")
-        plt.xlabel("Tribunal")
-        plt.ylabel("Cumprimento Médio da Meta 1 (%)")
-        plt.xticks(rotation=90)
-        plt.tight_layout()
-        plt.savefig(os.path.join(output_dir, 'meta1_Tribunais.png'))
-        print(f"Gráfico de cumprimento médio da Meta 1 salvo em {os.path.join(output_dir, 'meta1_Tribunais.png')}")
+    # Remove do cache as entradas de arquivos que mudaram ou saíram de ./Dados
+    if cache is not None:
+        evicted = cache.evictar(csv_files)
+        if evicted:
+            print(f"Cache: {evicted} entradas obsoletas removidas.")
 
+    # Espera o resumo, a série mensal e os gráficos enviados ao estágio de saídas
+    try:
+        with instrumentation.etapa("aguardar_saidas"):
+            output_times = outputs.aguardar()
+    finally:
+        outputs.fechar()
+    print(f"Saídas concluídas: {outputs.descrever(output_times)}.")
+    if progressive is not None and "resumo" not in output_times["falhas"]:
+        progressive.finalizar()  # O resumo final substitui o parcial
+
+    # Tempos por etapa e por tarefa (JSON lines e trace do Chrome, aberto em chrome://tracing)
+    if INSTRUMENT:
+        instrumentation.imprimir_resumo(emitir=logging.info)
+        if TRACE_JSONL:
+            instrumentation.exportar_jsonl(TRACE_JSONL)
+            print(f"Instrumentação salva em {TRACE_JSONL}")
+        if TRACE_CHROME:
+            instrumentation.exportar_chrome_trace(TRACE_CHROME)
+            print(f"Trace salvo em {TRACE_CHROME}")
+    return num_processes
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Versão Paralela (P) do processamento dos dados dos tribunais")
+    parser.add_argument("--max-memory", type=interpretar_tamanho, default=MAX_MEMORY,
+                        help="Orçamento de memória (ex.: 2GB): processos, tarefas e despejo em disco se ajustam a ele")
+    MAX_MEMORY = parser.parse_args().max_memory
     main()
 
 
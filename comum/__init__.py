@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+"""
+Código compartilhado pelas versões Não Paralela (Versao_NP) e Paralela (Versao_P).
+"""
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+Cache colunar em disco dos CSVs de tribunais já convertidos para numérico.
+
+Cada arquivo de origem vira uma entrada no diretório de cache, identificada pelo
+caminho absoluto e validada por tamanho, mtime e hash do conteúdo. A entrada guarda:
+
+* `numericas.npy`: matriz float64 em ordem de colunas (Fortran), lida com mmap;
+* `chave_<coluna>.npy`: códigos int32 das colunas-chave (as categorias ficam no meta);
+* `meta.json`: impressão digital da origem, a lista de colunas armazenadas e a versão
+  das regras de resolução de leiaute (comum/esquemas.py) usada no parse.
+
+O `meta.json` é gravado por último e funciona como marcador de entrada completa.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from comum.esquemas import VERSAO_ESQUEMAS
+from comum.ingestao import COLUNAS_CHAVE, converter_colunas_numericas, ler_csv_numerico
+
+ARQUIVO_META = "meta.json"
+ARQUIVO_NUMERICAS = "numericas.npy"
+DIRETORIO_ARTEFATOS = "artefatos"
+TAMANHO_BLOCO_HASH = 1 << 20
+TAMANHO_NOME_ENTRADA = 20
+
+
+def hash_conteudo(caminho, limite=None):
+    """Calcula o SHA-1 do conteúdo de um arquivo (ou dos `limite` primeiros bytes) lendo em blocos de 1 MB."""
+    h = hashlib.sha1()
+    restante = limite
+    with open(caminho, "rb") as f:
+        while restante is None or restante > 0:
+            bloco = f.read(TAMANHO_BLOCO_HASH if restante is None else min(TAMANHO_BLOCO_HASH, restante))
+            if not bloco:
+                break
+            h.update(bloco)
+            if restante is not None:
+                restante -= len(bloco)
+    return h.hexdigest()
+
+
+def impressao_digital(caminho):
+    """Retorna caminho absoluto, tamanho, mtime e hash do conteúdo do arquivo."""
+    info = os.stat(caminho)
+    return {
+        "caminho": os.path.abspath(caminho),
+        "tamanho": info.st_size,
+        "mtime_ns": info.st_mtime_ns,
+        "sha1": hash_conteudo(caminho),
+    }
+
+
+def mesma_origem(digital, caminho):
+    """
+    Verifica se o arquivo ainda corresponde à impressão digital gravada.
+
+    Tamanho e mtime iguais bastam; se só o mtime mudou (ex.: cópia ou `touch`),
+    o hash do conteúdo decide.
+    """
+    try:
+        info = os.stat(caminho)
+    except OSError:
+        return False
+    if info.st_size != digital["tamanho"]:
+        return False
+    if info.st_mtime_ns == digital["mtime_ns"]:
+        return True
+    if hash_conteudo(caminho) != digital["sha1"]:
+        return False
+    digital["mtime_ns"] = info.st_mtime_ns # Conteúdo igual: atualiza o mtime conhecido
+    return True
+
+
+def _gravar_json(caminho, dados):
+    """Grava um JSON de forma atômica (arquivo temporário + os.replace)."""
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(dados, f, ensure_ascii=False)
+    os.replace(temporario, caminho)
+
+
+def _nome_de_entrada(nome):
+    return len(nome) == TAMANHO_NOME_ENTRADA and all(c in "0123456789abcdef" for c in nome)
+
+
+def _ler_json(caminho):
+    try:
+        with open(caminho, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class CacheColunar:
+    """
+    Cache persistente das colunas numéricas e chaves de cada CSV de origem.
+
+    `encoding` é a codificação usada no parse dos CSVs; entradas gravadas com outra
+    codificação são tratadas como inválidas.
+    """
+
+    def __init__(self, diretorio, encoding="latin1"):
+        self.diretorio = diretorio
+        self.encoding = encoding
+        os.makedirs(self.diretorio, exist_ok=True)
+
+    def _diretorio_entrada(self, caminho, intervalo=None):
+        chave = os.path.abspath(caminho)
+        if intervalo is not None:
+            chave += f":{intervalo[0]}-{intervalo[1]}"
+        nome = hashlib.sha1(chave.encode("utf-8")).hexdigest()[:TAMANHO_NOME_ENTRADA]
+        return os.path.join(self.diretorio, nome)
+
+    def _meta_valido(self, caminho, intervalo=None):
+        """Retorna o meta da entrada se ela existir e a origem não tiver mudado."""
+        diretorio = self._diretorio_entrada(caminho, intervalo)
+        meta = _ler_json(os.path.join(diretorio, ARQUIVO_META))
+        if meta is None or meta.get("encoding", "latin1") != self.encoding:
+            return None
+        # Colunas canônicas resolvidas com regras antigas não valem mais
+        if meta.get("esquemas") != VERSAO_ESQUEMAS:
+            return None
+        mtime_anterior = meta["origem"]["mtime_ns"]
+        if not mesma_origem(meta["origem"], caminho):
+            return None
+        if meta["origem"]["mtime_ns"] != mtime_anterior:
+            _gravar_json(os.path.join(diretorio, ARQUIVO_META), meta)
+        return meta
+
+    def obter(self, caminho, colunas_numericas, colunas_chave=COLUNAS_CHAVE, intervalo=None):
+        """
+        Carrega a entrada do cache para `caminho` (ou para o intervalo de bytes `intervalo`
+        do arquivo), ou None se não houver entrada válida ou se ela não cobrir todas as
+        colunas pedidas.
+        """
+        meta = self._meta_valido(caminho, intervalo)
+        if meta is None:
+            return None
+        if not set(colunas_numericas) <= set(meta["colunas_solicitadas"]):
+            return None
+        if not set(colunas_chave) <= set(meta["chaves_solicitadas"]):
+            return None
+
+        diretorio = self._diretorio_entrada(caminho, intervalo)
+        dados = {}
+        for coluna, categorias in meta["chaves"].items():
+            if coluna not in colunas_chave:
+                continue
+            codigos = np.load(os.path.join(diretorio, f"chave_{coluna}.npy"), mmap_mode="r")
+            dados[coluna] = pd.Categorical.from_codes(codigos, categories=categorias)
+        matriz = np.load(os.path.join(diretorio, ARQUIVO_NUMERICAS), mmap_mode="r")
+        for i, coluna in enumerate(meta["numericas"]):
+            if coluna in colunas_numericas:
+                dados[coluna] = matriz[:, i]
+        return pd.DataFrame(dados, index=pd.RangeIndex(meta["linhas"]))
+
+    def gravar(self, caminho, df, colunas_numericas, colunas_chave=COLUNAS_CHAVE, intervalo=None):
+        """Grava (ou substitui) a entrada de `caminho` com as colunas presentes em `df`."""
+        diretorio = self._diretorio_entrada(caminho, intervalo)
+        shutil.rmtree(diretorio, ignore_errors=True)
+        os.makedirs(diretorio)
+
+        numericas = [col for col in colunas_numericas if col in df.columns]
+        convertido = converter_colunas_numericas(df[numericas].copy(), numericas)
+        matriz = np.asfortranarray(convertido.to_numpy(dtype=np.float64, na_value=np.nan))
+        np.save(os.path.join(diretorio, ARQUIVO_NUMERICAS), matriz)
+
+        chaves = {}
+        for coluna in colunas_chave:
+            if coluna not in df.columns:
+                continue
+            categorico = pd.Categorical(df[coluna])
+            np.save(os.path.join(diretorio, f"chave_{coluna}.npy"), categorico.codes.astype(np.int32))
+            chaves[coluna] = [str(c) for c in categorico.categories]
+
+        _gravar_json(os.path.join(diretorio, ARQUIVO_META), {
+            "origem": impressao_digital(caminho),
+            "encoding": self.encoding,
+            "esquemas": VERSAO_ESQUEMAS,
+            "intervalo": list(intervalo) if intervalo is not None else None,
+            "linhas": len(df),
+            "numericas": numericas,
+            "chaves": chaves,
+            "colunas_solicitadas": list(colunas_numericas),
+            "chaves_solicitadas": list(colunas_chave),
+        })
+
+    def carregar(self, caminho, colunas_numericas, colunas_chave=COLUNAS_CHAVE, intervalo=None):
+        """Retorna as colunas tipadas de `caminho`, lendo do cache ou fazendo o parse e gravando."""
+        df = self.obter(caminho, colunas_numericas, colunas_chave, intervalo)
+        if df is not None:
+            return df
+        meta = self._meta_valido(caminho, intervalo)
+        if meta is not None:
+            # Entrada válida mas incompleta: relê com a união das colunas já pedidas
+            colunas_numericas = sorted(set(colunas_numericas) | set(meta["colunas_solicitadas"]))
+            colunas_chave = sorted(set(colunas_chave) | set(meta["chaves_solicitadas"]))
+        df = ler_csv_numerico(caminho, colunas_numericas, colunas_chave, self.encoding, intervalo)
+        self.gravar(caminho, df, colunas_numericas, colunas_chave, intervalo)
+        return df
+
+    def invalidar(self, caminho):
+        """Remove as entradas de um arquivo de origem (o arquivo inteiro e seus intervalos)."""
+        absoluto = os.path.abspath(caminho)
+        for nome in os.listdir(self.diretorio):
+            diretorio = os.path.join(self.diretorio, nome)
+            if not _nome_de_entrada(nome):
+                continue
+            meta = _ler_json(os.path.join(diretorio, ARQUIVO_META))
+            if meta is None or meta["origem"]["caminho"] == absoluto:
+                shutil.rmtree(diretorio, ignore_errors=True)
+
+    def evictar(self, fontes_ativas=None):
+        """
+        Remove entradas cuja origem sumiu, mudou ou não está em `fontes_ativas`.
+        Retorna o número de entradas removidas.
+        """
+        ativas = None if fontes_ativas is None else {os.path.abspath(c) for c in fontes_ativas}
+        removidas = 0
+        for nome in os.listdir(self.diretorio):
+            diretorio = os.path.join(self.diretorio, nome)
+            # Só diretórios de entrada (nome = hash do caminho); outros conteúdos são preservados
+            if not _nome_de_entrada(nome) or not os.path.isdir(diretorio):
+                continue
+            meta = _ler_json(os.path.join(diretorio, ARQUIVO_META))
+            obsoleta = (
+                meta is None
+                or (ativas is not None and meta["origem"]["caminho"] not in ativas)
+                or not mesma_origem(meta["origem"], meta["origem"]["caminho"])
+            )
+            if obsoleta:
+                shutil.rmtree(diretorio, ignore_errors=True)
+                removidas += 1
+        return removidas
+
+    def limpar(self):
+        """Apaga todo o conteúdo do cache."""
+        shutil.rmtree(self.diretorio, ignore_errors=True)
+        os.makedirs(self.diretorio, exist_ok=True)
+
+    # --- Artefatos derivados (ex.: Consolidado.csv) ---
+
+    def _caminho_artefato(self, nome):
+        return os.path.join(self.diretorio, DIRETORIO_ARTEFATOS, f"{nome}.json")
+
+    def artefato_atualizado(self, nome, fontes, caminho_artefato):
+        """Indica se `caminho_artefato` foi gerado a partir exatamente das mesmas `fontes`."""
+        registro = _ler_json(self._caminho_artefato(nome))
+        if registro is None or not os.path.exists(caminho_artefato):
+            return False
+        if os.path.abspath(caminho_artefato) != registro["artefato"]["caminho"]:
+            return False
+        info = os.stat(caminho_artefato)
+        if (info.st_size, info.st_mtime_ns) != (registro["artefato"]["tamanho"], registro["artefato"]["mtime_ns"]):
+            return False
+        fontes_abs = [os.path.abspath(c) for c in fontes]
+        if fontes_abs != [d["caminho"] for d in registro["fontes"]]:
+            return False
+        return all(mesma_origem(d, d["caminho"]) for d in registro["fontes"])
+
+    def registrar_artefato(self, nome, fontes, caminho_artefato):
+        """Registra de quais fontes `caminho_artefato` foi gerado."""
+        os.makedirs(os.path.join(self.diretorio, DIRETORIO_ARTEFATOS), exist_ok=True)
+        info = os.stat(caminho_artefato)
+        _gravar_json(self._caminho_artefato(nome), {
+            "artefato": {
+                "caminho": os.path.abspath(caminho_artefato),
+                "tamanho": info.st_size,
+                "mtime_ns": info.st_mtime_ns,
+            },
+            "fontes": [impressao_digital(c) for c in fontes],
+        })
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+Consolidado em formato colunar binário, particionado por tribunal.
+
+Alternativa ao Consolidado.csv para quem só precisa de alguns tribunais ou colunas: em
+vez de refazer o parse do CSV inteiro, o leitor mapeia em memória (mmap) só as colunas
+pedidas e lê só as faixas de linhas dos tribunais pedidos.
+
+Layout do diretório:
+
+* `indice.json`: colunas (na ordem do cabeçalho reconciliado), tipo de cada coluna e os
+  grupos de linhas: para cada (arquivo de origem, tribunal), a linha inicial e o número
+  de linhas. É gravado por último e marca o diretório como completo;
+* `<n>.bin`: colunas das metas, já convertidas como no cache, no menor inteiro com sinal
+  que comporta os valores (o menor valor do tipo marca o vazio) ou em float64 (NaN);
+* `<n>.bin` + `<n>.dic.json`: demais colunas, códigos no menor inteiro com sinal
+  (-1 = vazio) e o dicionário de valores (código = posição).
+
+Os arquivos de coluna são binários crus, lidos com `np.memmap` no tipo registrado no
+índice; `n` é a posição da coluna no índice. As colunas são gravadas largas (float64 e
+int32) durante a leitura e reduzidas no fim, quando os limites já são conhecidos. As
+linhas de cada arquivo de origem são agrupadas por tribunal (ordenação estável), então
+cada tribunal ocupa faixas contíguas.
+
+O Consolidado.csv pode ser gerado depois, sob demanda, com `exportar_csv`.
+"""
+
+import csv
+import io
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from comum.compactados import abrir
+from comum.consolidado import ler_cabecalho, reconciliar_cabecalhos
+from comum.ingestao import converter_colunas_numericas
+from comum.metas import COLUNAS_METAS
+
+ARQUIVO_INDICE = "indice.json"
+VERSAO_COLUNAR = 1
+LINHAS_POR_BLOCO = 1 << 20 # Linhas por bloco ao reduzir colunas e exportar o CSV
+TIPOS_INTEIROS = ("<i1", "<i2", "<i4")
+
+
+def _arquivo_coluna(diretorio, posicao, sufixo="bin"):
+    return os.path.join(diretorio, f"{posicao}.{sufixo}")
+
+
+def _blocos(total):
+    for inicio in range(0, total, LINHAS_POR_BLOCO):
+        yield inicio, min(inicio + LINHAS_POR_BLOCO, total)
+
+
+def _inteiro_minimo(minimo, maximo):
+    """Menor tipo inteiro com sinal para [minimo, maximo] que ainda deixa o menor valor livre."""
+    for tipo in TIPOS_INTEIROS:
+        limites = np.iinfo(tipo)
+        if limites.min < minimo and maximo <= limites.max:
+            return tipo
+    return None
+
+
+def _reduzir_coluna(diretorio, posicao, tipo, linhas):
+    """
+    Regrava a coluna larga de `posicao` no menor tipo possível e retorna (dtype, vazio),
+    onde `vazio` é o valor que marca célula vazia (None para float64, que usa NaN).
+    """
+    largo = _arquivo_coluna(diretorio, posicao, "f8" if tipo == "numerica" else "i4")
+    final = _arquivo_coluna(diretorio, posicao)
+    origem = np.memmap(largo, mode="r", dtype="<f8" if tipo == "numerica" else "<i4", shape=(linhas,)) if linhas else None
+    if tipo == "numerica":
+        minimo, maximo, inteiros = 0.0, 0.0, True
+        for a, b in _blocos(linhas):
+            bloco = origem[a:b]
+            validos = bloco[~np.isnan(bloco)]
+            if len(validos):
+                inteiros = inteiros and bool(np.all(validos == np.round(validos)))
+                minimo, maximo = min(minimo, validos.min()), max(maximo, validos.max())
+        dtype = _inteiro_minimo(minimo, maximo) if inteiros else None
+        vazio = int(np.iinfo(dtype).min) if dtype is not None else None
+        dtype = dtype or "<f8"
+    else:
+        maximo = max((int(origem[a:b].max()) for a, b in _blocos(linhas)), default=-1)
+        dtype, vazio = _inteiro_minimo(-1, maximo), -1
+    with open(final, "wb") as f:
+        for a, b in _blocos(linhas):
+            bloco = np.asarray(origem[a:b])
+            if tipo == "numerica" and vazio is not None:
+                bloco = np.where(np.isnan(bloco), vazio, bloco)
+            f.write(bloco.astype(dtype).tobytes())
+    del origem
+    os.remove(largo)
+    return dtype, vazio
+
+
+def gravar_colunar(arquivos, destino, encoding="utf-8", colunas_numericas=COLUNAS_METAS):
+    """
+    Lê os `arquivos` um de cada vez e grava o consolidado colunar em `destino`
+    (substituído de forma atômica). Retorna o índice gravado.
+    """
+    cabecalhos = {}
+    for caminho in arquivos:
+        info = ler_cabecalho(caminho, encoding)
+        if info is not None:
+            cabecalhos[caminho] = info[0]
+    validos = list(cabecalhos)
+    colunas = reconciliar_cabecalhos([cabecalhos[c] for c in validos])
+    numericas = set(colunas_numericas)
+    tipos = ["numerica" if col in numericas else "texto" for col in colunas]
+
+    temporario = destino.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(temporario, ignore_errors=True)
+    os.makedirs(temporario)
+    saidas = [open(_arquivo_coluna(temporario, i, "f8" if tipo == "numerica" else "i4"), "wb")
+              for i, tipo in enumerate(tipos)]
+    dicionarios = [{} for _ in colunas] # valor -> código, por coluna de texto
+    grupos = []
+    total = 0
+    try:
+        for caminho in validos:
+            with abrir(caminho) as fluxo:
+                df = pd.read_csv(fluxo, sep=",", encoding=encoding, dtype=str, keep_default_na=False, na_values=[""])
+            if df.empty:
+                continue
+            if "sigla_tribunal" in df.columns:
+                ordem = np.argsort(df["sigla_tribunal"].fillna("").to_numpy(dtype=object), kind="stable")
+                df = df.iloc[ordem].reset_index(drop=True)
+                siglas = df["sigla_tribunal"].fillna("")
+            else:
+                siglas = pd.Series([""] * len(df))
+            # Um grupo por tribunal do arquivo (faixa contígua depois da ordenação)
+            inicio_grupo = 0
+            for sigla, linhas in siglas.value_counts(sort=False).sort_index().items():
+                grupos.append({"tribunal": sigla or None, "arquivo": os.path.basename(caminho),
+                               "inicio": total + inicio_grupo, "linhas": int(linhas)})
+                inicio_grupo += int(linhas)
+
+            presentes = [col for col, tipo in zip(colunas, tipos) if tipo == "numerica" and col in df.columns]
+            convertidas = converter_colunas_numericas(df[presentes].copy(), presentes) if presentes else None
+            for i, (coluna, tipo) in enumerate(zip(colunas, tipos)):
+                if tipo == "numerica":
+                    if coluna in df.columns:
+                        valores = convertidas[coluna].to_numpy(dtype=np.float64, na_value=np.nan)
+                    else:
+                        valores = np.full(len(df), np.nan)
+                    saidas[i].write(np.ascontiguousarray(valores, dtype="<f8").tobytes())
+                    continue
+                if coluna not in df.columns:
+                    saidas[i].write(np.full(len(df), -1, dtype="<i4").tobytes())
+                    continue
+                categorico = pd.Categorical(df[coluna])
+                dicionario = dicionarios[i]
+                globais = np.array([dicionario.setdefault(v, len(dicionario)) for v in categorico.categories] + [-1],
+                                   dtype="<i4")
+                saidas[i].write(globais[categorico.codes].tobytes()) # código -1 cai no último (-1)
+            total += len(df)
+    finally:
+        for saida in saidas:
+            saida.close()
+
+    descricao_colunas = []
+    for i, (coluna, tipo) in enumerate(zip(colunas, tipos)):
+        dtype, vazio = _reduzir_coluna(temporario, i, tipo, total)
+        descricao_colunas.append({"nome": coluna, "tipo": tipo, "dtype": dtype, "vazio": vazio})
+        if tipo == "texto":
+            with open(_arquivo_coluna(temporario, i, "dic.json"), "w", encoding="utf-8") as f:
+                json.dump(list(dicionarios[i]), f, ensure_ascii=False)
+    indice = {
+        "versao": VERSAO_COLUNAR,
+        "linhas": total,
+        "colunas": descricao_colunas,
+        "grupos": grupos,
+    }
+    with open(os.path.join(temporario, ARQUIVO_INDICE), "w", encoding="utf-8") as f:
+        json.dump(indice, f, ensure_ascii=False)
+
+    antigo = destino.rstrip(os.sep) + ".old"
+    shutil.rmtree(antigo, ignore_errors=True)
+    if os.path.exists(destino):
+        os.rename(destino, antigo)
+    os.rename(temporario, destino)
+    shutil.rmtree(antigo, ignore_errors=True)
+    return indice
+
+
+def _formatar_numero(valor):
+    """Valor float64 de coluna das metas como texto do CSV: vazio para NaN, sem '.0' nos inteiros."""
+    if valor != valor:
+        return ""
+    return f"{valor:.0f}" if np.isfinite(valor) and valor == int(valor) else repr(float(valor))
+
+
+class ConsolidadoColunar:
+    """Leitor do consolidado colunar: só as colunas e tribunais pedidos são lidos do disco."""
+
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        with open(os.path.join(diretorio, ARQUIVO_INDICE), encoding="utf-8") as f:
+            self.indice = json.load(f)
+        if self.indice.get("versao") != VERSAO_COLUNAR:
+            raise ValueError(f"Versão do consolidado colunar incompatível em {diretorio}")
+        self.linhas = self.indice["linhas"]
+        self.colunas = [col["nome"] for col in self.indice["colunas"]]
+        self._descricao = {col["nome"]: col for col in self.indice["colunas"]}
+        self._posicoes = {col: i for i, col in enumerate(self.colunas)}
+        self._dicionarios = {}
+
+    @property
+    def tribunais(self):
+        return sorted({grupo["tribunal"] for grupo in self.indice["grupos"] if grupo["tribunal"] is not None})
+
+    def linhas_por_tribunal(self):
+        contagem = {}
+        for grupo in self.indice["grupos"]:
+            contagem[grupo["tribunal"]] = contagem.get(grupo["tribunal"], 0) + grupo["linhas"]
+        return contagem
+
+    def _coluna(self, coluna):
+        dtype = self._descricao[coluna]["dtype"]
+        if self.linhas == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(_arquivo_coluna(self.diretorio, self._posicoes[coluna]), mode="r", dtype=dtype,
+                         shape=(self.linhas,))
+
+    def _dicionario(self, coluna):
+        if coluna not in self._dicionarios:
+            with open(_arquivo_coluna(self.diretorio, self._posicoes[coluna], "dic.json"), encoding="utf-8") as f:
+                self._dicionarios[coluna] = json.load(f)
+        return self._dicionarios[coluna]
+
+    def _faixas(self, tribunais):
+        if tribunais is None:
+            return [(0, self.linhas)]
+        pedidos = {tribunais} if isinstance(tribunais, str) else set(tribunais)
+        return [(g["inicio"], g["inicio"] + g["linhas"]) for g in self.indice["grupos"] if g["tribunal"] in pedidos]
+
+    def _numerica(self, coluna, valores):
+        """Valores de uma coluna das metas como float64, com NaN no vazio."""
+        vazio = self._descricao[coluna]["vazio"]
+        convertidos = np.asarray(valores, dtype=np.float64)
+        if vazio is not None:
+            convertidos[np.asarray(valores) == vazio] = np.nan
+        return convertidos
+
+    def ler(self, tribunais=None, colunas=None):
+        """
+        DataFrame com as `colunas` pedidas (todas, se None) das linhas dos `tribunais`
+        (todos, se None). Colunas de texto voltam como `category`; as das metas, float64.
+        """
+        colunas = self.colunas if colunas is None else list(colunas)
+        desconhecidas = [col for col in colunas if col not in self._posicoes]
+        if desconhecidas:
+            raise KeyError(f"Colunas fora do consolidado: {desconhecidas}")
+        faixas = self._faixas(tribunais)
+        dados = {}
+        for coluna in colunas:
+            mapa = self._coluna(coluna)
+            valores = np.concatenate([mapa[a:b] for a, b in faixas]) if faixas else np.asarray(mapa[:0])
+            if self._descricao[coluna]["tipo"] == "numerica":
+                dados[coluna] = self._numerica(coluna, valores)
+            else:
+                dados[coluna] = pd.Categorical.from_codes(valores, categories=self._dicionario(coluna))
+        return pd.DataFrame(dados, columns=colunas)
+
+    def _texto(self, coluna, valores):
+        """Valores de uma coluna como texto do CSV (vazio = '')."""
+        descricao = self._descricao[coluna]
+        if descricao["tipo"] == "texto":
+            return np.array(self._dicionario(coluna) + [""], dtype=object)[valores] # -1 cai no último
+        if descricao["vazio"] is None:
+            return pd.Series(valores).map(_formatar_numero).to_numpy(dtype=object)
+        texto = np.asarray(valores).astype(str).astype(object)
+        texto[np.asarray(valores) == descricao["vazio"]] = ""
+        return texto
+
+    def exportar_csv(self, destino, terminador="\r\n"):
+        """Gera o Consolidado.csv (UTF-8) a partir do formato colunar, em blocos de linhas."""
+        temporario = destino + ".tmp"
+        mapas = {coluna: self._coluna(coluna) for coluna in self.colunas}
+        with open(temporario, "w", encoding="utf-8", newline="") as f:
+            csv.writer(f, lineterminator=terminador).writerow(self.colunas)
+            for a, b in _blocos(self.linhas):
+                bloco = pd.DataFrame({coluna: self._texto(coluna, np.asarray(mapa[a:b])) for coluna, mapa in mapas.items()})
+                buffer = io.StringIO()
+                bloco.to_csv(buffer, header=False, index=False, lineterminator=terminador)
+                f.write(buffer.getvalue())
+        os.replace(temporario, destino)
+        return destino
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Entradas compactadas: `.csv.gz`, `.csv.zst` e `.zip` lidos direto, sem cópia descompactada em disco.
+
+`abrir` devolve um fluxo binário com os bytes do CSV, descompactados à medida que são
+lidos (o parser e a montagem do consolidado consomem o fluxo em blocos). Um `.zip` pode
+ter vários CSVs: os membros são lidos em sequência, como um único CSV, com o cabeçalho
+só do primeiro (os cabeçalhos precisam ser iguais).
+
+Arquivos compactados não podem ser divididos em intervalos de bytes, então cada um vira
+uma tarefa inteira (comum/particionamento.py). Com vários arquivos, a descompactação de
+cada um roda no trabalhador que o processa: em paralelo no pool da versão P e no
+executor (processos/threads), e na thread de leitura antecipada do modo pipeline.
+
+`.csv.zst` usa o módulo `compression.zstd` (Python 3.14+) ou o pacote zstandard, se
+instalado; os demais formatos só precisam da biblioteca padrão.
+"""
+
+import gzip
+import io
+import os
+import zipfile
+
+# Extensão -> formato (None = CSV sem compressão)
+EXTENSOES = {".csv": None, ".csv.gz": "gzip", ".csv.zst": "zstd", ".zip": "zip"}
+FATOR_COMPRESSAO = 8 # Estimativa de bytes descompactados por byte, quando o arquivo não informa
+
+
+def compressao(caminho):
+    """Formato de compressão de `caminho` pela extensão ("gzip", "zstd", "zip") ou None."""
+    nome = str(caminho).lower()
+    for extensao, formato in EXTENSOES.items():
+        if formato is not None and nome.endswith(extensao):
+            return formato
+    return None
+
+
+def eh_entrada(nome):
+    """True se `nome` tem uma das extensões de entrada (CSV, compactado ou não)."""
+    return str(nome).lower().endswith(tuple(EXTENSOES))
+
+
+def listar_entradas(diretorio):
+    """Entradas de `diretorio` (CSVs e compactados), na ordem do sistema de arquivos, como o glob."""
+    return [os.path.join(diretorio, nome) for nome in os.listdir(diretorio) if eh_entrada(nome)]
+
+
+def _membros_csv(arquivo_zip):
+    return [info for info in arquivo_zip.infolist() if not info.is_dir() and info.filename.lower().endswith(".csv")]
+
+
+class _MembrosZip(io.RawIOBase):
+    """Os CSVs de um `.zip`, um depois do outro, sem repetir o cabeçalho."""
+
+    def __init__(self, caminho):
+        self._zip = zipfile.ZipFile(caminho)
+        self._membros = _membros_csv(self._zip)
+        self._atual = None
+        self._cabecalho = None
+        self._pendente = b"" # Bytes já lidos do membro atual e ainda não entregues
+        self._ultimo = b"\n"
+
+    def readable(self):
+        return True
+
+    def _proximo(self):
+        """Abre o próximo membro e prepara os bytes após o cabeçalho; False se acabaram."""
+        if self._atual is not None:
+            self._atual.close()
+            self._atual = None
+        if not self._membros:
+            return False
+        info = self._membros.pop(0)
+        self._atual = self._zip.open(info)
+        cabecalho = self._atual.readline()
+        if self._cabecalho is None:
+            self._cabecalho = cabecalho
+            self._pendente = cabecalho
+        elif cabecalho.rstrip(b"\r\n") != self._cabecalho.rstrip(b"\r\n"):
+            raise ValueError(f"{info.filename}: cabeçalho diferente do primeiro CSV do arquivo zip")
+        if self._ultimo != b"\n" and cabecalho:
+            # Membro anterior sem quebra de linha no fim
+            self._pendente = b"\n" + self._pendente
+        return True
+
+    def readinto(self, destino):
+        while not self._pendente:
+            if self._atual is not None:
+                self._pendente = self._atual.read(len(destino))
+                if self._pendente:
+                    break
+            if not self._proximo():
+                return 0
+        tamanho = min(len(destino), len(self._pendente))
+        destino[:tamanho] = self._pendente[:tamanho]
+        self._pendente = self._pendente[tamanho:]
+        self._ultimo = destino[tamanho - 1:tamanho].tobytes() if isinstance(destino, memoryview) \
+            else bytes(destino[tamanho - 1:tamanho])
+        return tamanho
+
+    def close(self):
+        if self._atual is not None:
+            self._atual.close()
+        self._zip.close()
+        super().close()
+
+
+def _abrir_zstd(caminho):
+    try:
+        from compression import zstd # Python 3.14+
+        return zstd.open(caminho, "rb")
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(f"{caminho}: arquivos .csv.zst precisam do pacote zstandard (pip install zstandard)")
+    bruto = open(caminho, "rb")
+    return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(bruto, closefd=True))
+
+
+def abrir(caminho):
+    """Fluxo binário (com `readline`) dos bytes do CSV em `caminho`, descompactados sob demanda."""
+    formato = compressao(caminho)
+    if formato is None:
+        return open(caminho, "rb")
+    if formato == "gzip":
+        return gzip.open(caminho, "rb")
+    if formato == "zstd":
+        return _abrir_zstd(caminho)
+    return io.BufferedReader(_MembrosZip(caminho))
+
+
+def ler_bytes(caminho):
+    """Todos os bytes do CSV em `caminho` (descompactados)."""
+    with abrir(caminho) as f:
+        return f.read()
+
+
+def tamanho_descompactado(caminho):
+    """
+    Bytes do CSV descompactado: o tamanho do arquivo, o informado pelo formato (rodapé do
+    gzip, diretório do zip, cabeçalho do quadro zstd) ou, sem essa informação, uma estimativa.
+    """
+    tamanho = os.path.getsize(caminho)
+    formato = compressao(caminho)
+    if formato is None or tamanho == 0:
+        return tamanho
+    try:
+        if formato == "gzip":
+            # ISIZE: tamanho do último membro módulo 2^32 (menor que o arquivo se passou de 4 GB)
+            with open(caminho, "rb") as f:
+                f.seek(-4, os.SEEK_END)
+                informado = int.from_bytes(f.read(4), "little")
+            if informado >= tamanho:
+                return informado
+        elif formato == "zip":
+            with zipfile.ZipFile(caminho) as arquivo_zip:
+                return sum(info.file_size for info in _membros_csv(arquivo_zip))
+        else:
+            import zstandard
+            with open(caminho, "rb") as f:
+                informado = zstandard.frame_content_size(f.read(18))
+            if informado >= 0:
+                return informado
+    except (OSError, ValueError, ImportError, zipfile.BadZipFile):
+        pass
+    return tamanho * FATOR_COMPRESSAO
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+Transporte dos resultados numéricos dos processos do pool por memória compartilhada.
+
+Em vez de devolver DataFrames (serializados com pickle e copiados pelo pipe do pool), o
+processo que executou a tarefa grava o resultado em um segmento de
+`multiprocessing.shared_memory` e devolve só um descritor pequeno:
+
+* o segmento guarda cada coluna em um trecho contíguo, no tipo original: as numéricas
+  como estão e as de texto (chaves ou dimensões do cubo) como códigos do Categorical;
+* o descritor traz o nome do segmento, o número de linhas e, por coluna, o tipo, o
+  deslocamento no segmento e as categorias (nas de texto).
+
+O processo principal soma as somas por tribunal direto dos segmentos em uma matriz
+tribunal x coluna (`AcumuladorTribunais`), sem montar DataFrames intermediários, e
+copia o resto (as parciais do cubo) uma única vez para fora do segmento.
+
+Ciclo de vida: os nomes dos segmentos são escolhidos pelo processo principal antes de
+as tarefas irem para o pool (`SegmentosCompartilhados`, criado antes do pool). Cada
+segmento é removido assim que é lido e, ao sair do `with`, qualquer nome que ainda exista
+é removido também, então um processo do pool que morra no meio de uma tarefa (ou uma
+execução interrompida) não deixa segmentos para trás em /dev/shm.
+"""
+
+import os
+import secrets
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pandas as pd
+
+
+ALINHAMENTO = 8
+
+
+def _colunas_em_arrays(df):
+    """
+    (nome, array NumPy, categorias) de cada coluna: numéricas no próprio tipo (as anuláveis
+    do pandas viram float64 com NaN) e as de texto como códigos do Categorical.
+    """
+    colunas = []
+    for coluna, tipo in df.dtypes.items():
+        serie = df[coluna]
+        if isinstance(tipo, pd.CategoricalDtype):
+            # Colunas já categóricas (leitura tipada) aproveitam os próprios códigos
+            categorico = serie.array
+        elif pd.api.types.is_numeric_dtype(tipo):
+            valores = serie.to_numpy() if isinstance(tipo, np.dtype) else serie.to_numpy(np.float64, na_value=np.nan)
+            colunas.append((str(coluna), valores, None))
+            continue
+        else:
+            categorico = pd.Categorical(serie.astype(object))
+        colunas.append((str(coluna), categorico.codes, [str(c) for c in categorico.categories]))
+    return colunas
+
+
+def publicar_parcial(df, nome):
+    """
+    Copia `df` para o segmento `nome` (criado aqui) e retorna o descritor. O segmento é
+    fechado neste processo, mas não removido: isso fica com quem o ler. None -> None.
+
+    Cada coluna ocupa um trecho contíguo do segmento (alinhado em 8 bytes), no tipo em que
+    já está, então o segmento não é maior que os dados.
+    """
+    if df is None:
+        return None
+    colunas = []
+    tamanho = 0
+    for coluna, valores, categorias in _colunas_em_arrays(df):
+        colunas.append((coluna, valores, categorias, tamanho))
+        tamanho += -(-valores.nbytes // ALINHAMENTO) * ALINHAMENTO
+
+    segmento = shared_memory.SharedMemory(name=nome, create=True, size=max(tamanho, 1))
+    try:
+        for _, valores, _, deslocamento in colunas:
+            destino = np.ndarray(valores.shape, dtype=valores.dtype, buffer=segmento.buf, offset=deslocamento)
+            destino[:] = valores
+            del destino # As views precisam sumir antes do close
+    except BaseException:
+        segmento.close()
+        segmento.unlink()
+        raise
+    segmento.close()
+    return {
+        "nome": nome,
+        "linhas": len(df),
+        "colunas": [(coluna, valores.dtype.str, deslocamento, categorias)
+                    for coluna, valores, categorias, deslocamento in colunas],
+    }
+
+
+class AcumuladorTribunais:
+    """
+    Somas por tribunal acumuladas in-place (matriz tribunal x coluna), com o mesmo
+    resultado de `somar_por_tribunal` sobre as parciais concatenadas na mesma ordem:
+    cada sigla fica com o primeiro ramo não nulo visto.
+    """
+
+    def __init__(self, colunas):
+        self.colunas = list(colunas)
+        self._posicao = {coluna: j for j, coluna in enumerate(self.colunas)}
+        self._linhas = {} # sigla -> linha da matriz
+        self._ramos = []
+        self._matriz = np.zeros((16, len(self.colunas)))
+        self._presentes = np.zeros(len(self.colunas), dtype=bool)
+
+    def somar(self, siglas, ramos, colunas, valores):
+        """Soma as linhas de `valores` (linhas x `colunas`) nas siglas correspondentes."""
+        indices_colunas = np.array([self._posicao[coluna] for coluna in colunas], dtype=np.intp)
+        linhas = np.empty(len(siglas), dtype=np.intp)
+        for i, (sigla, ramo) in enumerate(zip(siglas, ramos)):
+            linha = self._linhas.get(sigla)
+            if linha is None:
+                linha = self._linhas[sigla] = len(self._ramos)
+                self._ramos.append(None)
+            if self._ramos[linha] is None:
+                self._ramos[linha] = ramo
+            linhas[i] = linha
+        if len(self._ramos) > len(self._matriz):
+            crescida = np.zeros((max(len(self._ramos), 2 * len(self._matriz)), len(self.colunas)))
+            crescida[:len(self._matriz)] = self._matriz
+            self._matriz = crescida
+        np.add.at(self._matriz, (linhas[:, None], indices_colunas[None, :]), np.nan_to_num(valores))
+        self._presentes[indices_colunas] = True
+
+    def resultado(self):
+        """DataFrame (sigla_tribunal, ramo_justica, colunas presentes), ordenado por sigla."""
+        presentes = [coluna for coluna, presente in zip(self.colunas, self._presentes) if presente]
+        indices = [self._posicao[coluna] for coluna in presentes]
+        siglas = list(self._linhas)
+        df = pd.DataFrame(self._matriz[:len(siglas)][:, indices], columns=presentes)
+        df.insert(0, "ramo_justica", pd.Series(self._ramos, dtype=object))
+        df.insert(0, "sigla_tribunal", pd.Series(siglas, dtype=object))
+        return df.sort_values("sigla_tribunal", ignore_index=True)
+
+
+class SegmentosCompartilhados:
+    """Nomes e ciclo de vida dos segmentos de uma execução (usar com `with`)."""
+
+    def __init__(self, prefixo=None):
+        # Nomes curtos: o macOS limita nomes de memória compartilhada a 31 caracteres
+        self.prefixo = prefixo or f"tb{os.getpid():x}{secrets.token_hex(3)}"
+        self._nomes = set()
+        # Com fork, os processos do pool só herdam o resource tracker se ele já estiver rodando;
+        # senão cada um sobe o seu e, ao sair, "limpa" segmentos que este processo já removeu.
+        # Compartilhado, ele também remove o que sobrar se este processo morrer sem o __exit__
+        resource_tracker.ensure_running()
+
+    def nome(self, *partes):
+        """Reserva o nome de um segmento (o processo do pool o cria com `publicar_parcial`)."""
+        nome = "_".join([self.prefixo, *map(str, partes)])
+        self._nomes.add(nome)
+        return nome
+
+    def _abrir(self, descritor):
+        """Segmento e {coluna: (view, categorias)}; as views precisam sumir antes de liberá-lo."""
+        segmento = shared_memory.SharedMemory(name=descritor["nome"])
+        views = {
+            coluna: (np.ndarray(descritor["linhas"], dtype=np.dtype(tipo), buffer=segmento.buf, offset=deslocamento),
+                     categorias)
+            for coluna, tipo, deslocamento, categorias in descritor["colunas"]
+        }
+        return segmento, views
+
+    def _liberar(self, segmento):
+        self._nomes.discard(segmento.name.lstrip("/"))
+        segmento.close()
+        segmento.unlink()
+
+    def somar_em(self, acumulador, descritor):
+        """Soma um segmento de somas por tribunal no `acumulador`, direto da memória compartilhada."""
+        if descritor is None:
+            return
+        segmento, views = self._abrir(descritor)
+        try:
+            if descritor["linhas"] and "sigla_tribunal" in views:
+                def valores_texto(coluna):
+                    codigos, categorias = views[coluna]
+                    return np.array(categorias + [None], dtype=object)[codigos] # Código -1 -> None
+                ramos = valores_texto("ramo_justica") if "ramo_justica" in views else [None] * descritor["linhas"]
+                numericas = [coluna for coluna, (_, categorias) in views.items() if categorias is None]
+                valores = np.column_stack([views[coluna][0] for coluna in numericas]).astype(np.float64) \
+                    if numericas else np.empty((descritor["linhas"], 0))
+                acumulador.somar(valores_texto("sigla_tribunal"), ramos, numericas, valores)
+        finally:
+            views = None
+            self._liberar(segmento)
+
+    def ler(self, descritor):
+        """Copia um segmento para um DataFrame (texto como `category`) e o remove."""
+        if descritor is None:
+            return None
+        segmento, views = self._abrir(descritor)
+        try:
+            colunas = {}
+            for coluna, (valores, categorias) in views.items():
+                if categorias is None:
+                    colunas[coluna] = valores.copy()
+                else:
+                    # Códigos gravados a partir de um Categorical válido: sem revalidar
+                    colunas[coluna] = pd.Categorical.from_codes(valores.copy(), categories=categorias, validate=False)
+            return pd.DataFrame(colunas, index=pd.RangeIndex(descritor["linhas"]))
+        finally:
+            views = None
+            self._liberar(segmento)
+
+    def limpar(self):
+        """Remove os segmentos reservados que ainda existirem (tarefas que falharam no meio)."""
+        removidos = 0
+        for nome in list(self._nomes):
+            self._nomes.discard(nome)
+            try:
+                segmento = shared_memory.SharedMemory(name=nome)
+            except FileNotFoundError:
+                continue
+            segmento.close()
+            segmento.unlink()
+            removidos += 1
+        return removidos
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        self.limpar()
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+Montagem do Consolidado.csv direto dos bytes dos CSVs de origem, sem DataFrames.
+
+Os cabeçalhos de todos os arquivos são lidos primeiro e reconciliados em um cabeçalho
+único (união das colunas na ordem em que aparecem, como no `pd.concat` da versão NP, então
+o Consolidado.csv tem o mesmo cabeçalho em todos os modos). Cada arquivo é então copiado
+pelo caminho mais barato possível:
+
+* `copia`: mesmo layout do consolidado e origem já em UTF-8 -> `os.copy_file_range`
+  (ou `os.sendfile`), sem passar os dados pelo Python;
+* `transcodificacao`: mesmo layout, outra codificação -> conversão para UTF-8 em blocos;
+* `prefixo`: o layout é um prefixo do consolidado -> as colunas faltantes são
+  acrescentadas no fim de cada linha por substituição de bytes, bloco a bloco;
+* `remapeamento`: qualquer outro layout -> as linhas passam pelo módulo `csv` para
+  reordenar as colunas.
+
+Arquivos com linhas a descartar (repetidas, ver comum/deduplicacao.py) passam pelo caminho
+`csv` no modo `deduplicacao`, que pula essas linhas; os demais seguem como acima.
+
+Origens compactadas (`.csv.gz`, `.csv.zst`, `.zip`, ver comum/compactados.py) passam
+pelos mesmos modos lendo o fluxo descompactado; no lugar da `copia` (que depende dos
+offsets do arquivo) fica a `descompactacao`, cópia dos blocos descompactados.
+"""
+
+import codecs
+import csv
+import io
+import os
+
+from comum.compactados import abrir, compressao
+
+TAMANHO_BLOCO = 8 << 20 # 8 MB por leitura/escrita
+ENCODINGS_UTF8 = {"utf-8", "utf8", "utf_8", "ascii", "us-ascii"}
+
+
+def ler_cabecalho(caminho, encoding="utf-8"):
+    """
+    Lê a primeira linha do arquivo e retorna (colunas, tamanho_em_bytes, terminador),
+    ou None se o arquivo estiver vazio.
+    """
+    with abrir(caminho) as f:
+        linha = f.readline()
+    if not linha.strip():
+        return None
+    terminador = b"\r\n" if linha.endswith(b"\r\n") else b"\n"
+    texto = linha.decode(encoding).lstrip("\ufeff").rstrip("\r\n")
+    colunas = next(csv.reader([texto]))
+    return colunas, len(linha), terminador
+
+
+def reconciliar_cabecalhos(cabecalhos):
+    """
+    Une as listas de colunas em um único cabeçalho, na ordem em que cada coluna aparece
+    pela primeira vez (a mesma do `pd.concat` dos DataFrames dos arquivos, na mesma ordem).
+    """
+    uniao = []
+    vistas = set()
+    for colunas in cabecalhos:
+        for coluna in colunas:
+            if coluna not in vistas:
+                vistas.add(coluna)
+                uniao.append(coluna)
+    return uniao
+
+
+def _escrever(saida, dados):
+    """Escreve todos os bytes em um arquivo sem buffer (write() pode ser parcial)."""
+    visao = memoryview(dados)
+    while visao:
+        visao = visao[saida.write(visao):]
+
+
+def _copiar_intervalo(entrada, saida, inicio, tamanho):
+    """Copia `tamanho` bytes de `entrada` (a partir de `inicio`) para a posição atual de `saida`."""
+    restante = tamanho
+    offset = inicio
+    for chamada in ("copy_file_range", "sendfile"):
+        if not hasattr(os, chamada):
+            continue
+        try:
+            while restante > 0:
+                if chamada == "copy_file_range":
+                    copiados = os.copy_file_range(entrada.fileno(), saida.fileno(), restante, offset)
+                else:
+                    copiados = os.sendfile(saida.fileno(), entrada.fileno(), offset, restante)
+                if copiados == 0:
+                    break
+                offset += copiados
+                restante -= copiados
+            if restante == 0:
+                return
+        except OSError:
+            continue # Sistema de arquivos sem suporte: tenta a próxima opção
+    entrada.seek(offset)
+    while restante > 0:
+        bloco = entrada.read(min(TAMANHO_BLOCO, restante))
+        if not bloco:
+            break
+        _escrever(saida, bloco)
+        restante -= len(bloco)
+
+
+def _copiar_fluxo(entrada, saida):
+    """Copia o restante de `entrada` (ex.: um fluxo descompactado) para `saida`, em blocos."""
+    while True:
+        bloco = entrada.read(TAMANHO_BLOCO)
+        if not bloco:
+            return
+        _escrever(saida, bloco)
+
+
+def _blocos_de_linhas(entrada):
+    """Lê blocos grandes sempre terminando em fim de linha (o resto vai para o próximo bloco)."""
+    pendente = b""
+    while True:
+        bloco = entrada.read(TAMANHO_BLOCO)
+        if not bloco:
+            if pendente:
+                yield pendente
+            return
+        bloco = pendente + bloco
+        corte = bloco.rfind(b"\n") + 1
+        if corte == 0:
+            pendente = bloco
+            continue
+        pendente = bloco[corte:]
+        yield bloco[:corte]
+
+
+def _transcodificar(entrada, saida, encoding):
+    decodificador = codecs.getincrementaldecoder(encoding)()
+    while True:
+        bloco = entrada.read(TAMANHO_BLOCO)
+        texto = decodificador.decode(bloco, final=not bloco)
+        if texto:
+            _escrever(saida, texto.encode("utf-8"))
+        if not bloco:
+            return
+
+
+def _completar_prefixo(entrada, saida, encoding, faltantes, terminador):
+    """Acrescenta `faltantes` campos vazios no fim de cada linha, sem separar os campos."""
+    sufixo = b"," * faltantes + terminador
+    for bloco in _blocos_de_linhas(entrada):
+        if b'"' in bloco:
+            return False # Pode haver quebra de linha dentro de aspas: usar o caminho csv
+        if encoding not in ENCODINGS_UTF8:
+            bloco = bloco.decode(encoding).encode("utf-8")
+        if not bloco.endswith(b"\n"):
+            bloco += terminador
+        _escrever(saida, bloco.replace(terminador, sufixo))
+    return True
+
+
+def _abrir_corpo(caminho):
+    """Fluxo do arquivo (descompactado, se for o caso) posicionado logo após o cabeçalho."""
+    entrada = abrir(caminho)
+    entrada.readline()
+    return entrada
+
+
+def _remapear(caminho, saida, encoding, colunas_origem, colunas_destino, terminador, descartar=None):
+    """Reescreve as linhas no layout de destino; `descartar` são números de linha (em ordem) a pular."""
+    posicoes = {coluna: i for i, coluna in enumerate(colunas_origem)}
+    indices = [posicoes.get(coluna) for coluna in colunas_destino]
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator=terminador.decode())
+    pular = iter(descartar if descartar is not None else ())
+    proxima = next(pular, None)
+    linha = -1
+    with _abrir_corpo(caminho) as bruto:
+        texto = io.TextIOWrapper(bruto, encoding=encoding, newline="")
+        for n, campos in enumerate(csv.reader(texto), start=1):
+            if descartar is not None:
+                if not campos:
+                    continue # Linhas em branco não contam (como no pandas)
+                linha += 1
+                if linha == proxima:
+                    proxima = next(pular, None)
+                    continue
+            escritor.writerow([campos[i] if i is not None and i < len(campos) else "" for i in indices])
+            if n % 50_000 == 0:
+                _escrever(saida, buffer.getvalue().encode("utf-8"))
+                buffer.seek(0)
+                buffer.truncate()
+    _escrever(saida, buffer.getvalue().encode("utf-8"))
+
+
+def consolidar_csv(arquivos, destino, encoding_origem="utf-8", descartar=None):
+    """
+    Gera `destino` (UTF-8) com o cabeçalho reconciliado e as linhas de todos os `arquivos`.
+    `descartar` ({arquivo: números de linha em ordem}) tira linhas de alguns arquivos.
+    Retorna um dicionário com o cabeçalho, o total de bytes e o modo usado em cada arquivo.
+    """
+    encoding_origem = codecs.lookup(encoding_origem).name
+    origem_utf8 = encoding_origem in ENCODINGS_UTF8
+    cabecalhos = {}
+    for caminho in arquivos:
+        info = ler_cabecalho(caminho, encoding_origem)
+        if info is not None:
+            cabecalhos[caminho] = info
+
+    modos = {caminho: "vazio" for caminho in arquivos if caminho not in cabecalhos}
+    if not cabecalhos:
+        return {"colunas": [], "bytes": 0, "modos": modos}
+
+    validos = list(cabecalhos)
+    colunas = reconciliar_cabecalhos([cabecalhos[c][0] for c in validos])
+    terminador = cabecalhos[validos[0]][2]
+
+    temporario = destino + ".tmp"
+    # Leitura e escrita: o último byte de cada arquivo copiado é conferido na própria saída
+    with open(temporario, "w+b", buffering=0) as saida:
+        linha = io.StringIO()
+        csv.writer(linha, lineterminator=terminador.decode()).writerow(colunas)
+        _escrever(saida, linha.getvalue().encode("utf-8"))
+
+        for caminho in validos:
+            colunas_origem, inicio, terminador_origem = cabecalhos[caminho]
+            compactado = compressao(caminho) is not None
+            posicao = saida.tell()
+            pular = (descartar or {}).get(caminho)
+            with _abrir_corpo(caminho) as entrada:
+                if pular is not None and len(pular):
+                    _remapear(caminho, saida, encoding_origem, colunas_origem, colunas, terminador_origem, pular)
+                    modo = "deduplicacao"
+                elif colunas_origem == colunas and origem_utf8 and not compactado:
+                    _copiar_intervalo(entrada, saida, inicio, os.path.getsize(caminho) - inicio)
+                    modo = "copia"
+                elif colunas_origem == colunas and origem_utf8:
+                    _copiar_fluxo(entrada, saida)
+                    modo = "descompactacao"
+                elif colunas_origem == colunas:
+                    _transcodificar(entrada, saida, encoding_origem)
+                    modo = "transcodificacao"
+                else:
+                    modo = None
+                    if colunas[:len(colunas_origem)] == colunas_origem:
+                        if _completar_prefixo(entrada, saida, encoding_origem,
+                                              len(colunas) - len(colunas_origem), terminador_origem):
+                            modo = "prefixo"
+                        else:
+                            saida.seek(posicao)
+                            saida.truncate()
+                    if modo is None:
+                        _remapear(caminho, saida, encoding_origem, colunas_origem, colunas, terminador_origem)
+                        modo = "remapeamento"
+            modos[caminho] = modo
+
+            # Garante quebra de linha entre arquivos, mesmo se a origem não terminar com uma
+            if saida.tell() > posicao:
+                saida.seek(-1, os.SEEK_END)
+                if saida.read(1) != b"\n":
+                    _escrever(saida, terminador_origem)
+        total = saida.tell()
+    os.replace(temporario, destino)
+    return {"colunas": colunas, "bytes": total, "modos": modos}
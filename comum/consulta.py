@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+Serviço local de consulta às metas já calculadas.
+
+`ServicoMetas` carrega uma vez o ResumoMetas (formato do NP, separado por `;`, ou do P,
+separado por `,` e com colunas `metaX_calculated`) e, opcionalmente, o cubo de metas
+(comum/cubo.py). O resumo fica indexado por tribunal, ramo e meta, e as consultas
+(filtro, ordenação e top-N) são respondidas da memória, com um cache LRU dos resultados
+recentes. A cada consulta o serviço confere (no máximo a cada `intervalo_verificacao`
+segundos) se o arquivo ou o cubo mudaram e recarrega, então uma nova execução do ETL
+é vista sem reiniciar o serviço.
+
+Também há um endpoint HTTP mínimo (só em localhost):
+
+    python -m comum.consulta --resumo Versao_NP/ResumoMetas.csv --cubo Versao_NP/cubo
+
+    GET /metas?tribunal=TRT6&tribunal=TRT9&meta=Meta1&ordenar=Meta1&limite=5
+    GET /metas?ramo=Justiça do Trabalho&ordenar=Meta2A&crescente=1
+    GET /cubo?por=sigla_grau&sigla_tribunal=TRT6&meta=Meta1
+    GET /status
+"""
+
+import argparse
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+from comum.metas import NOMES_METAS, normalizar_ramo
+
+TAMANHO_CACHE_PADRAO = 256
+INTERVALO_VERIFICACAO_PADRAO = 1.0 # Segundos entre verificações de mudança nos arquivos
+PORTA_PADRAO = 8765
+ARQUIVO_META_CUBO = "meta.json"
+
+# Nomes das colunas do resumo do P (meta1_calculated) -> nomes do NP (Meta1)
+_NOMES_P = {f"{meta.lower()}_calculated": meta for meta in NOMES_METAS}
+
+
+def ler_resumo(caminho):
+    """Lê um ResumoMetas do NP ou do P no formato comum: sigla_tribunal, ramo_justica e MetaX."""
+    with open(caminho, encoding="utf-8") as f:
+        cabecalho = f.readline()
+    separador = ";" if cabecalho.count(";") > cabecalho.count(",") else ","
+    df = pd.read_csv(caminho, sep=separador, encoding="utf-8", na_values=["NA"], keep_default_na=False)
+    df = df.rename(columns=_NOMES_P)
+    if "sigla_tribunal" not in df.columns:
+        raise ValueError(f"Arquivo sem a coluna sigla_tribunal: {caminho}")
+    if "ramo_justica" in df.columns:
+        df["ramo_justica"] = df["ramo_justica"].map(normalizar_ramo)
+    metas = [meta for meta in NOMES_METAS if meta in df.columns]
+    df[metas] = df[metas].astype("float64")
+    return df[[col for col in ("sigla_tribunal", "ramo_justica") if col in df.columns] + metas]
+
+
+def _assinatura(caminho):
+    """(mtime, tamanho) do arquivo, ou None se não existir."""
+    try:
+        estado = os.stat(caminho)
+    except OSError:
+        return None
+    return estado.st_mtime_ns, estado.st_size
+
+
+def _como_lista(valor):
+    if valor is None:
+        return None
+    if isinstance(valor, (list, tuple, set)):
+        return tuple(valor)
+    return (valor,)
+
+
+def _valor_json(valor):
+    """NaN/NA viram None; tipos do NumPy viram tipos do Python."""
+    if valor is None or valor is pd.NA:
+        return None
+    if hasattr(valor, "item"):
+        valor = valor.item()
+    if isinstance(valor, float) and math.isnan(valor):
+        return None
+    return valor
+
+
+def _registros(df):
+    return [{col: _valor_json(valor) for col, valor in zip(df.columns, linha)} for linha in df.itertuples(index=False)]
+
+
+class ServicoMetas:
+    """
+    Consultas às metas de um ResumoMetas (e, se houver, do cubo), com índice em memória,
+    cache LRU e recarga automática. Seguro para uso por várias threads.
+    """
+
+    def __init__(self, caminho_resumo, diretorio_cubo=None, tamanho_cache=TAMANHO_CACHE_PADRAO,
+                 intervalo_verificacao=INTERVALO_VERIFICACAO_PADRAO):
+        self.caminho_resumo = caminho_resumo
+        self.diretorio_cubo = diretorio_cubo
+        self.tamanho_cache = tamanho_cache
+        self.intervalo_verificacao = intervalo_verificacao
+        self._trava = threading.RLock()
+        self._cache = OrderedDict()
+        self._assinaturas = None
+        self._ultima_verificacao = 0.0
+        self.geracao = 0 # Incrementada a cada recarga
+        self.acertos = 0
+        self.faltas = 0
+        self.resumo = None
+        self.cubo = None
+        self._por_tribunal = {}
+        self._por_ramo = {}
+        self.recarregar()
+
+    def _assinaturas_atuais(self):
+        cubo = _assinatura(os.path.join(self.diretorio_cubo, ARQUIVO_META_CUBO)) if self.diretorio_cubo else None
+        return _assinatura(self.caminho_resumo), cubo
+
+    def recarregar(self):
+        """Relê o resumo (e o cubo) e limpa o cache. Em caso de erro mantém os dados anteriores."""
+        with self._trava:
+            assinaturas = self._assinaturas_atuais()
+            resumo = ler_resumo(self.caminho_resumo)
+            cubo = None
+            if assinaturas[1] is not None:
+                from comum.cubo import CuboMetas # Só quem usa o cubo depende do NumPy em mmap
+                cubo = CuboMetas.carregar(self.diretorio_cubo)
+            self.resumo = resumo
+            self.cubo = cubo
+            self.metas = [meta for meta in NOMES_METAS if meta in resumo.columns]
+            self._por_tribunal = resumo.groupby("sigla_tribunal", sort=False).indices
+            self._por_ramo = resumo.groupby("ramo_justica", sort=False).indices if "ramo_justica" in resumo else {}
+            self._cache.clear()
+            self._assinaturas = assinaturas
+            self.geracao += 1
+
+    def verificar_atualizacao(self):
+        """Recarrega se o resumo ou o cubo mudaram em disco. Retorna True se recarregou."""
+        agora = time.monotonic()
+        if agora - self._ultima_verificacao < self.intervalo_verificacao:
+            return False
+        self._ultima_verificacao = agora
+        if self._assinaturas_atuais() == self._assinaturas:
+            return False
+        try:
+            self.recarregar()
+        except (OSError, ValueError, pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+            # Arquivo sendo reescrito: tenta de novo na próxima verificação
+            print(f"Recarga adiada ({e}); mantendo a geração {self.geracao}.")
+            return False
+        return True
+
+    def _em_cache(self, chave, calcular):
+        with self._trava:
+            self.verificar_atualizacao()
+            if chave in self._cache:
+                self._cache.move_to_end(chave)
+                self.acertos += 1
+                return self._cache[chave]
+            self.faltas += 1
+            resultado = calcular()
+            self._cache[chave] = resultado
+            if len(self._cache) > self.tamanho_cache:
+                self._cache.popitem(last=False)
+            return resultado
+
+    def _linhas(self, tribunais, ramos):
+        """Posições das linhas que atendem os filtros, pelos índices (sem varrer a tabela)."""
+        selecionadas = None
+        for indice, valores in ((self._por_tribunal, tribunais), (self._por_ramo, ramos)):
+            if valores is None:
+                continue
+            posicoes = set()
+            for valor in valores:
+                posicoes.update(indice.get(valor, ()))
+            selecionadas = posicoes if selecionadas is None else selecionadas & posicoes
+        if selecionadas is None:
+            return slice(None)
+        return sorted(selecionadas)
+
+    def consultar(self, tribunais=None, ramos=None, metas=None, ordenar_por=None, crescente=False, limite=None):
+        """
+        Linhas do resumo (lista de dicionários) filtradas por tribunal/ramo, só com as
+        `metas` pedidas, ordenadas por `ordenar_por` (metas sem valor vão para o fim) e
+        limitadas às `limite` primeiras.
+        """
+        tribunais, ramos, metas = _como_lista(tribunais), _como_lista(ramos), _como_lista(metas)
+        chave = ("metas", tribunais, ramos, metas, ordenar_por, bool(crescente), limite)
+
+        def calcular():
+            colunas = list(metas) if metas is not None else self.metas
+            desconhecidas = [meta for meta in (*colunas, *([ordenar_por] if ordenar_por else ())) if meta not in self.metas]
+            if desconhecidas:
+                raise KeyError(f"Metas desconhecidas: {desconhecidas}")
+            chaves = [col for col in ("sigla_tribunal", "ramo_justica") if col in self.resumo.columns]
+            df = self.resumo.iloc[self._linhas(tribunais, ramos)]
+            if ordenar_por:
+                df = df.sort_values(ordenar_por, ascending=crescente, na_position="last", kind="stable")
+            if limite is not None:
+                df = df.head(limite)
+            return _registros(df[chaves + [col for col in colunas if col not in chaves]])
+
+        return self._em_cache(chave, calcular)
+
+    def detalhar(self, por=(), filtros=None, metas=None):
+        """Drill-down pelo cubo de metas (ver `CuboMetas.consultar`), também com cache."""
+        filtros = {dim: _como_lista(valor) for dim, valor in sorted((filtros or {}).items())}
+        chave = ("cubo", tuple(por), tuple(filtros.items()), _como_lista(metas))
+
+        def calcular():
+            if self.cubo is None:
+                raise LookupError("Cubo de metas não disponível.")
+            return _registros(self.cubo.consultar(por=por, filtros={d: list(v) for d, v in filtros.items()}, metas=metas))
+
+        return self._em_cache(chave, calcular)
+
+    def status(self):
+        with self._trava:
+            return {
+                "resumo": self.caminho_resumo,
+                "cubo": self.diretorio_cubo if self.cubo is not None else None,
+                "geracao": self.geracao,
+                "tribunais": len(self._por_tribunal),
+                "metas": self.metas,
+                "cache": {"itens": len(self._cache), "acertos": self.acertos, "faltas": self.faltas},
+            }
+
+
+def _criar_manipulador(servico):
+    class Manipulador(BaseHTTPRequestHandler):
+        def _responder(self, codigo, corpo):
+            dados = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+            self.send_response(codigo)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parametros = parse_qs(url.query)
+            unico = lambda nome: parametros.pop(nome, [None])[-1]
+            try:
+                if url.path == "/metas":
+                    limite = unico("limite")
+                    resposta = servico.consultar(
+                        tribunais=parametros.pop("tribunal", None),
+                        ramos=parametros.pop("ramo", None),
+                        metas=parametros.pop("meta", None),
+                        ordenar_por=unico("ordenar"),
+                        crescente=unico("crescente") in ("1", "true", "sim"),
+                        limite=int(limite) if limite else None,
+                    )
+                elif url.path == "/cubo":
+                    por = parametros.pop("por", ())
+                    metas = parametros.pop("meta", None)
+                    resposta = servico.detalhar(por=por, filtros=parametros, metas=metas)
+                elif url.path == "/status":
+                    resposta = servico.status()
+                else:
+                    self._responder(404, {"erro": f"Caminho desconhecido: {url.path}"})
+                    return
+            except (KeyError, ValueError) as e:
+                self._responder(400, {"erro": str(e)})
+                return
+            except LookupError as e:
+                self._responder(404, {"erro": str(e)})
+                return
+            self._responder(200, resposta)
+
+        def log_message(self, formato, *args):
+            pass # Sem log por requisição
+
+    return Manipulador
+
+
+def servir(servico, host="127.0.0.1", porta=PORTA_PADRAO):
+    """Atende requisições HTTP até Ctrl+C."""
+    servidor = ThreadingHTTPServer((host, porta), _criar_manipulador(servico))
+    print(f"Servindo metas de {servico.caminho_resumo} em http://{host}:{servidor.server_address[1]}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serviço local de consulta ao ResumoMetas e ao cubo de metas")
+    parser.add_argument("--resumo", required=True, help="ResumoMetas gerado pelo NP ou pelo P")
+    parser.add_argument("--cubo", default=None, help="Diretório do cubo de metas (opcional)")
+    parser.add_argument("--porta", type=int, default=PORTA_PADRAO)
+    parser.add_argument("--cache", type=int, default=TAMANHO_CACHE_PADRAO, help="Consultas guardadas no cache LRU")
+    args = parser.parse_args()
+    servir(ServicoMetas(args.resumo, args.cubo, tamanho_cache=args.cache), porta=args.porta)
+
+
+if __name__ == "__main__":
+    main()
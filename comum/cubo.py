@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*-
+"""
+Cubo pré-calculado das somas das colunas das metas por tribunal, grau, UF, município,
+órgão julgador e mês.
+
+O cubo guarda, para cada combinação observada das dimensões, a soma de todas as colunas
+usadas nas fórmulas (numeradores e denominadores), então qualquer meta em qualquer nível
+de agregação sai das somas sem reler os CSVs. Além do nível mais detalhado, alguns
+níveis mais agregados são materializados; cada consulta usa o menor nível que contém
+as dimensões pedidas.
+
+Como o fator e as colunas de uma meta dependem da tabela de fórmulas (ramo ou tribunal
+superior), toda consulta agrupa também pela dimensão derivada `tabela`.
+
+Layout do diretório:
+
+* `meta.json`: colunas, dimensões, dicionário de valores de cada dimensão e níveis;
+* `<nivel>/codigos.npy`: matriz int32 (linhas x dimensões do nível), -1 = ausente;
+* `<nivel>/valores.npy`: matriz float64 (linhas x colunas), em ordem Fortran.
+
+Os arrays são lidos com mmap.
+
+As versões NP e P usam `CuboMetas.montar_em_disco`, que monta o cubo direto no diretório:
+as parciais (ex.: as despejadas por `ParciaisEmDisco`) são lidas uma a uma, com os valores
+gravados por coluna em disco, e as somas de todos os níveis saem uma coluna por vez. Em
+memória ficam só os códigos das dimensões e uma coluna, o que `memoria_para_montar` estima
+para o orçamento de memória (comum/memoria.py).
+"""
+
+import json
+import math
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from comum.metas import COLUNAS_METAS, METAS_POR_RAMO, METAS_POR_TRIBUNAL, NOMES_METAS, _colunas_da_formula, \
+    avaliar_metas, chave_da_tabela, normalizar_ramo
+
+DIMENSOES_CUBO = [
+    "sigla_tribunal", "ramo_justica", "sigla_grau", "uf_oj", "municipio_oj", "id_ultimo_oj", "mes_cnm1", "mes_sent",
+]
+DIMENSAO_TABELA = "tabela"
+
+# Níveis agregados materializados além do detalhado (ramo e tabela entram em todos)
+NIVEIS_MATERIALIZADOS = {
+    "tribunal": ("sigla_tribunal",),
+    "tribunal_grau": ("sigla_tribunal", "sigla_grau"),
+    "tribunal_uf": ("sigla_tribunal", "uf_oj"),
+    "tribunal_mes": ("sigla_tribunal", "mes_cnm1"),
+    "tribunal_mes_sent": ("sigla_tribunal", "mes_sent"),
+    "tribunal_grau_mes": ("sigla_tribunal", "sigla_grau", "mes_cnm1"),
+    "tribunal_municipio": ("sigla_tribunal", "sigla_grau", "uf_oj", "municipio_oj"),
+}
+NIVEL_DETALHADO = "detalhado"
+ARQUIVO_META = "meta.json"
+VERSAO_CUBO = 1
+
+
+def agregar_cubo(df, colunas=None):
+    """Somas de `df` no nível detalhado (um grupo por combinação das dimensões presentes)."""
+    if colunas is None:
+        colunas = COLUNAS_METAS
+    dimensoes = [dim for dim in DIMENSOES_CUBO if dim in df.columns]
+    presentes = [col for col in colunas if col in df.columns]
+    return df.groupby(dimensoes, sort=False, dropna=False, observed=True)[presentes].sum().reset_index()
+
+
+def juntar_parciais(parciais, colunas=None):
+    """Junta parciais de `agregar_cubo` em uma só, no mesmo nível (ex.: antes de despejá-las em disco)."""
+    return agregar_cubo(pd.concat(parciais, ignore_index=True), colunas)
+
+
+# Bytes por linha de parcial no pico de `CuboMetas.montar_em_disco` (medidos com tracemalloc):
+# no agrupamento, por linha de todas as parciais (códigos, chave e ordenação); na leitura,
+# os códigos já guardados mais, por linha da parcial da vez, os textos das dimensões
+BYTES_POR_CODIGOS = 4 * (len(DIMENSOES_CUBO) + 1)
+BYTES_POR_LINHA_AGRUPADA = BYTES_POR_CODIGOS + 136
+BYTES_POR_LINHA_LIDA = 80
+
+
+def memoria_para_montar(parciais):
+    """
+    Estimativa (bytes) do pico de `CuboMetas.montar_em_disco` para estas parciais (uma lista
+    ou `ParciaisEmDisco`), qualquer que seja o número de colunas. As parciais em si ficam de
+    fora: o orçamento já reserva a fatia delas.
+    """
+    linhas = getattr(parciais, "linhas", None)
+    maior = getattr(parciais, "maior", None)
+    if linhas is None:
+        tamanhos = [len(p) for p in parciais if p is not None]
+        linhas, maior = sum(tamanhos), max(tamanhos, default=0)
+    return max(linhas * BYTES_POR_LINHA_AGRUPADA, linhas * BYTES_POR_CODIGOS + maior * BYTES_POR_LINHA_LIDA)
+
+
+def _agrupar(codigos, tamanhos):
+    """(códigos de cada grupo, grupo de cada linha) das linhas de `codigos` (-1 = ausente)."""
+    if math.prod(tamanho + 1 for tamanho in tamanhos) >= 1 << 63:
+        # A chave de base mista não cabe em int64 (dimensões com muitos valores, como órgão
+        # julgador e município em dados nacionais): agrupa as linhas inteiras, na mesma ordem
+        grupos, inverso = np.unique(codigos, axis=0, return_inverse=True)
+        return grupos, inverso.reshape(-1)
+    chave = np.zeros(len(codigos), dtype=np.int64)
+    for j, tamanho in enumerate(tamanhos):
+        chave = chave * (tamanho + 1) + (codigos[:, j].astype(np.int64) + 1)
+    _, primeiro, inverso = np.unique(chave, return_index=True, return_inverse=True)
+    return codigos[primeiro], inverso.reshape(-1)
+
+
+def _somar_por_codigos(codigos, valores, tamanhos):
+    """Agrupa as linhas de `codigos` (matriz de códigos, -1 = ausente) e soma `valores`."""
+    grupos, inverso = _agrupar(codigos, tamanhos)
+    somas = np.empty((len(grupos), valores.shape[1]), dtype=np.float64, order="F")
+    for c in range(valores.shape[1]):
+        somas[:, c] = np.bincount(inverso, weights=valores[:, c], minlength=len(grupos))
+    return grupos, somas
+
+
+def _textos_corrigidos(serie):
+    """(código local de cada linha, valores corrigidos de mojibake) de uma coluna de dimensão."""
+    codigos, unicos = pd.factorize(serie.astype(object), use_na_sentinel=True)
+    return codigos.astype(np.int32), [normalizar_ramo(str(valor)) for valor in unicos]
+
+
+def _codigos_locais(parcial):
+    """{dimensão: (código local de cada linha, valores corrigidos)} de uma parcial, com a `tabela`."""
+    textos = {dim: _textos_corrigidos(parcial[dim]) for dim in DIMENSOES_CUBO if dim in parcial.columns}
+    if "sigla_tribunal" in textos:
+        por_linha = {dim: np.array(textos[dim][1] + [np.nan], dtype=object)[textos[dim][0]] if dim in textos
+                     else np.full(len(parcial), np.nan, dtype=object) for dim in ("sigla_tribunal", "ramo_justica")}
+        textos[DIMENSAO_TABELA] = _textos_corrigidos(chave_da_tabela(por_linha["sigla_tribunal"],
+                                                                     por_linha["ramo_justica"]))
+    return textos
+
+
+def _gravar_colunas(parciais, colunas, pasta):
+    """
+    Lê as parciais uma vez: grava os valores de cada coluna (float64, na ordem das parciais)
+    em um arquivo de `pasta` e guarda os códigos locais das dimensões. Retorna
+    ([(primeira linha, linhas, códigos locais)], {coluna: arquivo}, total de linhas).
+    """
+    locais, arquivos, escritas, linhas = [], {}, {}, 0
+    try:
+        for parcial in parciais:
+            if parcial is None or not len(parcial):
+                continue
+            locais.append((linhas, len(parcial), _codigos_locais(parcial)))
+            for col in colunas:
+                if col not in parcial.columns:
+                    continue
+                if col not in arquivos:
+                    arquivos[col] = open(os.path.join(pasta, f"{len(arquivos)}.bin"), "wb")
+                    escritas[col] = 0
+                # Colunas ausentes nas parciais anteriores valem 0 (como o NaN do concat)
+                np.zeros(linhas - escritas[col], dtype=np.float64).tofile(arquivos[col])
+                parcial[col].to_numpy(dtype=np.float64, na_value=0.0).tofile(arquivos[col])
+                escritas[col] = linhas + len(parcial)
+            linhas += len(parcial)
+        for col, arquivo in arquivos.items():
+            np.zeros(linhas - escritas[col], dtype=np.float64).tofile(arquivo)
+    finally:
+        for arquivo in arquivos.values():
+            arquivo.close()
+    return locais, {col: arquivo.name for col, arquivo in arquivos.items()}, linhas
+
+
+def _codigos_globais(locais, linhas):
+    """(dimensões, dicionários, matriz de códigos linhas x dimensões) a partir dos códigos locais."""
+    presentes = set().union(*(textos for _, _, textos in locais))
+    dimensoes = [dim for dim in (*DIMENSOES_CUBO, DIMENSAO_TABELA) if dim in presentes]
+    dicionarios = {dim: sorted({valor for _, _, textos in locais if dim in textos for valor in textos[dim][1]})
+                   for dim in dimensoes}
+    posicoes = {dim: {valor: i for i, valor in enumerate(dicionarios[dim])} for dim in dimensoes}
+    codigos = np.full((linhas, len(dimensoes)), -1, dtype=np.int32, order="F")
+    while locais: # Os códigos locais saem da memória à medida que são convertidos
+        inicio, n, textos = locais.pop()
+        for j, dim in enumerate(dimensoes):
+            if dim in textos:
+                locais_dim, valores_dim = textos.pop(dim)
+                globais = np.array([posicoes[dim][valor] for valor in valores_dim] + [-1], dtype=np.int32)
+                codigos[inicio:inicio + n, j] = globais[locais_dim]
+    return dimensoes, dicionarios, codigos
+
+
+def _dimensoes_do_nivel(dims_nivel, dimensoes):
+    dims_nivel = [dim for dim in dims_nivel if dim in dimensoes]
+    return dims_nivel + [dim for dim in ("ramo_justica", DIMENSAO_TABELA) if dim not in dims_nivel]
+
+
+def _gravar_meta(diretorio, colunas, dicionarios, niveis):
+    """`meta.json` do cubo; `niveis` = {nome: (dimensões, linhas)}."""
+    with open(os.path.join(diretorio, ARQUIVO_META), "w", encoding="utf-8") as f:
+        json.dump({
+            "versao": VERSAO_CUBO,
+            "colunas": colunas,
+            "dicionarios": dicionarios,
+            "niveis": {nome: {"dimensoes": dims, "linhas": linhas} for nome, (dims, linhas) in niveis.items()},
+        }, f, ensure_ascii=False)
+
+
+def _publicar(temporario, diretorio):
+    """Substitui `diretorio` por `temporario` (o conteúdo antigo só sai depois da troca)."""
+    antigo = diretorio.rstrip(os.sep) + ".old"
+    shutil.rmtree(antigo, ignore_errors=True)
+    if os.path.exists(diretorio):
+        os.rename(diretorio, antigo)
+    os.rename(temporario, diretorio)
+    shutil.rmtree(antigo, ignore_errors=True)
+
+
+class CuboMetas:
+    """Cubo de somas em vários níveis de agregação, com dimensões codificadas por dicionário."""
+
+    def __init__(self, colunas, dicionarios, niveis):
+        self.colunas = list(colunas)
+        self.dicionarios = dicionarios # dimensão -> lista de valores (código = posição)
+        self.niveis = niveis # nome -> {"dimensoes": [...], "codigos": array, "valores": array}
+        self._indices = {dim: {valor: i for i, valor in enumerate(valores)} for dim, valores in dicionarios.items()}
+
+    @classmethod
+    def de_parciais(cls, parciais, colunas=None, niveis=NIVEIS_MATERIALIZADOS):
+        """Monta o cubo a partir de somas parciais no nível detalhado (saídas de `agregar_cubo`)."""
+        if colunas is None:
+            colunas = COLUNAS_METAS
+        parciais = [p for p in parciais if p is not None and len(p)]
+        if not parciais:
+            raise ValueError("Nenhuma soma parcial para montar o cubo.")
+        base = pd.concat(parciais, ignore_index=True)
+        colunas = [col for col in colunas if col in base.columns]
+        dimensoes = [dim for dim in DIMENSOES_CUBO if dim in base.columns]
+
+        # Dicionários com os valores (texto corrigido de mojibake) em ordem alfabética
+        textos = {}
+        for dim in dimensoes:
+            serie = base[dim].astype(object)
+            unicos = serie.dropna().unique()
+            corrigidos = {valor: normalizar_ramo(str(valor)) for valor in unicos}
+            textos[dim] = serie.map(corrigidos)
+        textos[DIMENSAO_TABELA] = chave_da_tabela(textos["sigla_tribunal"], textos["ramo_justica"]).astype(object)
+        dimensoes.append(DIMENSAO_TABELA)
+        dicionarios = {dim: sorted(textos[dim].dropna().unique()) for dim in dimensoes}
+
+        codigos = np.empty((len(base), len(dimensoes)), dtype=np.int32, order="F")
+        for j, dim in enumerate(dimensoes):
+            codigos[:, j] = pd.Categorical(textos[dim], categories=dicionarios[dim]).codes
+        valores = base[colunas].to_numpy(dtype=np.float64, na_value=0.0)
+        tamanhos = [len(dicionarios[dim]) for dim in dimensoes]
+
+        codigos, valores = _somar_por_codigos(codigos, valores, tamanhos)
+        montados = {NIVEL_DETALHADO: {"dimensoes": dimensoes, "codigos": codigos, "valores": valores}}
+        for nome, dims_nivel in niveis.items():
+            dims_nivel = _dimensoes_do_nivel(dims_nivel, dimensoes)
+            indices = [dimensoes.index(dim) for dim in dims_nivel]
+            cod, val = _somar_por_codigos(codigos[:, indices], valores, [tamanhos[i] for i in indices])
+            montados[nome] = {"dimensoes": dims_nivel, "codigos": np.asfortranarray(cod), "valores": val}
+        return cls(colunas, dicionarios, montados)
+
+    @classmethod
+    def montar_em_disco(cls, parciais, diretorio, colunas=None, niveis=NIVEIS_MATERIALIZADOS):
+        """
+        Monta e grava o mesmo cubo de `de_parciais` sem concatenar as parciais: cada uma é
+        lida uma vez, com os valores gravados por coluna em disco e só os códigos das
+        dimensões em memória; depois as somas de todos os níveis saem uma coluna por vez,
+        gravadas direto nos `valores.npy`. Retorna o cubo gravado (lido com mmap).
+        """
+        if colunas is None:
+            colunas = COLUNAS_METAS
+        temporario = diretorio.rstrip(os.sep) + ".tmp"
+        shutil.rmtree(temporario, ignore_errors=True)
+        pasta_colunas = os.path.join(temporario, "_colunas")
+        os.makedirs(pasta_colunas)
+        try:
+            locais, caminhos, linhas = _gravar_colunas(parciais, colunas, pasta_colunas)
+            if not locais:
+                raise ValueError("Nenhuma soma parcial para montar o cubo.")
+            colunas = [col for col in colunas if col in caminhos]
+            dimensoes, dicionarios, codigos = _codigos_globais(locais, linhas)
+            tamanhos = [len(dicionarios[dim]) for dim in dimensoes]
+
+            # Grupos do nível detalhado e de cada nível agregado (a partir do detalhado)
+            codigos, inverso = _agrupar(codigos, tamanhos)
+            montados = {NIVEL_DETALHADO: (dimensoes, codigos, inverso)}
+            for nome, dims_nivel in niveis.items():
+                dims_nivel = _dimensoes_do_nivel(dims_nivel, dimensoes)
+                indices = [dimensoes.index(dim) for dim in dims_nivel]
+                cod, inv = _agrupar(codigos[:, indices], [tamanhos[i] for i in indices])
+                montados[nome] = (dims_nivel, cod, inv)
+
+            # Somas uma coluna por vez, na ordem Fortran dos valores.npy de cada nível
+            saidas = {}
+            try:
+                for nome, (_, cod, _) in montados.items():
+                    os.makedirs(os.path.join(temporario, nome))
+                    np.save(os.path.join(temporario, nome, "codigos.npy"), np.asfortranarray(cod))
+                    saidas[nome] = open(os.path.join(temporario, nome, "valores.npy"), "wb")
+                    np.lib.format.write_array_header_1_0(saidas[nome], {
+                        "descr": np.lib.format.dtype_to_descr(np.dtype(np.float64)),
+                        "fortran_order": True, "shape": (len(cod), len(colunas))})
+                for col in colunas:
+                    detalhado = np.bincount(inverso, weights=np.fromfile(caminhos[col], dtype=np.float64),
+                                            minlength=len(codigos))
+                    for nome, (_, cod, inv) in montados.items():
+                        somas = detalhado if nome == NIVEL_DETALHADO else \
+                            np.bincount(inv, weights=detalhado, minlength=len(cod))
+                        somas.tofile(saidas[nome])
+            finally:
+                for saida in saidas.values():
+                    saida.close()
+        except BaseException:
+            shutil.rmtree(temporario, ignore_errors=True)
+            raise
+        shutil.rmtree(pasta_colunas)
+        _gravar_meta(temporario, colunas, dicionarios,
+                     {nome: (dims, len(cod)) for nome, (dims, cod, _) in montados.items()})
+        _publicar(temporario, diretorio)
+        return cls.carregar(diretorio)
+
+    def salvar(self, diretorio):
+        """Grava o cubo (substitui o conteúdo anterior de `diretorio` de forma atômica)."""
+        temporario = diretorio.rstrip(os.sep) + ".tmp"
+        shutil.rmtree(temporario, ignore_errors=True)
+        os.makedirs(temporario)
+        for nome, nivel in self.niveis.items():
+            os.makedirs(os.path.join(temporario, nome))
+            np.save(os.path.join(temporario, nome, "codigos.npy"), np.asfortranarray(nivel["codigos"]))
+            np.save(os.path.join(temporario, nome, "valores.npy"), np.asfortranarray(nivel["valores"]))
+        _gravar_meta(temporario, self.colunas, self.dicionarios,
+                     {nome: (nivel["dimensoes"], len(nivel["codigos"])) for nome, nivel in self.niveis.items()})
+        _publicar(temporario, diretorio)
+
+    @classmethod
+    def carregar(cls, diretorio):
+        with open(os.path.join(diretorio, ARQUIVO_META), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("versao") != VERSAO_CUBO:
+            raise ValueError(f"Versão do cubo incompatível em {diretorio}")
+        niveis = {}
+        for nome, info in meta["niveis"].items():
+            niveis[nome] = {
+                "dimensoes": info["dimensoes"],
+                "codigos": np.load(os.path.join(diretorio, nome, "codigos.npy"), mmap_mode="r"),
+                "valores": np.load(os.path.join(diretorio, nome, "valores.npy"), mmap_mode="r"),
+            }
+        return cls(meta["colunas"], meta["dicionarios"], niveis)
+
+    def escolher_nivel(self, dimensoes):
+        """Menor nível materializado que contém todas as `dimensoes`."""
+        candidatos = [
+            (len(nivel["codigos"]), nome) for nome, nivel in self.niveis.items()
+            if set(dimensoes) <= set(nivel["dimensoes"])
+        ]
+        if not candidatos:
+            raise KeyError(f"Dimensões fora do cubo: {sorted(set(dimensoes))}")
+        return min(candidatos)[1]
+
+    def _colunas_das_metas(self, metas):
+        necessarias = set()
+        for tabela in (*METAS_POR_RAMO.values(), *METAS_POR_TRIBUNAL.values()):
+            for meta, formula in tabela.items():
+                if meta in metas:
+                    necessarias.update(_colunas_da_formula(formula))
+        return [col for col in self.colunas if col in necessarias]
+
+    def consultar(self, por=(), filtros=None, metas=None, incluir_somas=False):
+        """
+        Agrega o cubo pelas dimensões `por` (mais `tabela`), só nas linhas que atendem
+        `filtros` ({dimensão: valor ou lista de valores}), e calcula as `metas` pedidas
+        (todas, se None). Retorna um DataFrame com as dimensões, as metas e, com
+        `incluir_somas`, as somas das colunas usadas.
+        """
+        por = [dim for dim in por if dim != DIMENSAO_TABELA]
+        filtros = filtros or {}
+        metas = list(NOMES_METAS) if metas is None else list(metas)
+        desconhecidas = [meta for meta in metas if meta not in NOMES_METAS]
+        if desconhecidas:
+            raise KeyError(f"Metas desconhecidas: {desconhecidas}")
+
+        nome = self.escolher_nivel([*por, *filtros, DIMENSAO_TABELA])
+        nivel = self.niveis[nome]
+        posicao = {dim: j for j, dim in enumerate(nivel["dimensoes"])}
+        codigos = nivel["codigos"]
+
+        selecao = np.ones(len(codigos), dtype=bool)
+        for dim, valor in filtros.items():
+            valores_filtro = valor if isinstance(valor, (list, tuple, set)) else [valor]
+            permitidos = [self._indices[dim][v] for v in valores_filtro if v in self._indices[dim]]
+            selecao &= np.isin(codigos[:, posicao[dim]], permitidos)
+
+        agrupamento = [*por, DIMENSAO_TABELA]
+        indices = [posicao[dim] for dim in agrupamento]
+        colunas = self._colunas_das_metas(metas)
+        indices_colunas = [self.colunas.index(col) for col in colunas]
+        sub_codigos = np.asarray(codigos[selecao][:, indices])
+        sub_valores = np.asarray(nivel["valores"][selecao][:, indices_colunas])
+        tamanhos = [len(self.dicionarios[dim]) for dim in agrupamento]
+        grupos, somas = _somar_por_codigos(sub_codigos, sub_valores, tamanhos)
+
+        # Código -1 (ausente) cai no último elemento, NaN
+        resultado = pd.DataFrame({
+            dim: np.array(self.dicionarios[dim] + [np.nan], dtype=object)[grupos[:, j]]
+            for j, dim in enumerate(agrupamento)
+        })
+        df_somas = pd.DataFrame(somas, columns=colunas)
+        valores = avaliar_metas(df_somas, resultado[DIMENSAO_TABELA])
+        for meta in metas:
+            if not np.isnan(valores[meta]).all():
+                resultado[meta] = valores[meta]
+        if incluir_somas:
+            resultado = pd.concat([resultado, df_somas], axis=1)
+        return resultado.sort_values(agrupamento, ignore_index=True)
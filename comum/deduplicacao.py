@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Deduplicação de linhas entre arquivos: um índice persistente com um hash de 64 bits por linha.
+
+Quando um tribunal reenvia um extrato que se sobrepõe a outro, as linhas repetidas
+entram duas vezes em todas as somas das metas. `IndiceLinhas` guarda, para cada arquivo
+de origem, o hash de cada linha (na ordem do arquivo) e aponta as que repetem uma linha
+já vista em um arquivo anterior (ou antes, no mesmo arquivo). Vale a primeira ocorrência,
+na ordem da lista de arquivos.
+
+* Os hashes vêm de `pd.util.hash_pandas_object` sobre as colunas da identidade, lidas
+  como texto em blocos (`hashes_do_arquivo`): 8 bytes por linha, sem guardar o texto.
+* As repetições saem de um `np.unique` sobre os hashes de todos os arquivos, sem o
+  `duplicated()` do DataFrame inteiro de texto.
+* O índice fica em disco (como o estado de comum/incremental.py): numa nova execução só
+  os arquivos novos ou alterados são lidos, e são conferidos contra os já indexados.
+
+Identidade da linha: por padrão, a linha inteira (todas as colunas). A chave
+COLUNAS_IDENTIFICACAO (tribunal, procedimento, grau, órgão julgador e meses) não é única
+nos dados: linhas diferentes de um mesmo órgão e mês trazem contagens diferentes, então
+descartar por ela apagaria dados. Com ela, use a política "relatorio".
+
+Políticas: "relatorio" só informa as repetições; "remover" tira as linhas repetidas
+das somas e do Consolidado.csv. Onde as linhas são lidas uma vez só (streaming, leitura
+tipada) elas são descartadas na leitura (`descartar_posicoes`); onde as somas vêm de
+tarefas ou de um estado já somado (versão P, modo incremental), as somas das repetidas
+são descontadas do total (`somas_a_descontar`).
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from comum.cache import impressao_digital, mesma_origem
+from comum.compactados import abrir
+from comum.cubo import agregar_cubo
+from comum.metas import somar_por_tribunal
+
+ARQUIVO_INDICE = "indice.json"
+DIRETORIO_HASHES = "hashes"
+VERSAO_INDICE = 1
+POLITICAS = ("relatorio", "remover")
+LINHAS_POR_BLOCO = 200_000
+# Chave pedida para identificar um registro (não é única nos dados, ver acima)
+COLUNAS_IDENTIFICACAO = ["sigla_tribunal", "procedimento", "sigla_grau", "id_ultimo_oj", "mes_cnm1", "mes_sent"]
+
+
+def hash_linhas(df, colunas=None):
+    """Hash de 64 bits (uint64) de cada linha de `df` nas `colunas` (None = todas), lidas como texto."""
+    if colunas is not None:
+        df = df[[coluna for coluna in colunas if coluna in df.columns]]
+    return pd.util.hash_pandas_object(df, index=False).to_numpy(dtype=np.uint64)
+
+
+def hashes_do_arquivo(caminho, colunas=None, encoding="latin1", linhas_por_bloco=LINHAS_POR_BLOCO):
+    """Hashes das linhas de um CSV (também compactado), lido como texto em blocos."""
+    blocos = []
+    desejadas = None if colunas is None else set(colunas)
+    with abrir(caminho) as fluxo:
+        try:
+            leitor = pd.read_csv(fluxo, sep=",", encoding=encoding, dtype=str, chunksize=linhas_por_bloco,
+                                 usecols=None if desejadas is None else (lambda coluna: coluna in desejadas))
+            for chunk in leitor:
+                blocos.append(hash_linhas(chunk, colunas))
+        except pd.errors.EmptyDataError:
+            pass
+    return np.concatenate(blocos) if blocos else np.empty(0, dtype=np.uint64)
+
+
+def descartar_posicoes(df, posicoes, inicio=0):
+    """`df` sem as linhas de `posicoes` (números de linha no arquivo; `inicio` = número da primeira linha de `df`)."""
+    if posicoes is None or not len(posicoes):
+        return df
+    fim = inicio + len(df)
+    trecho = posicoes[np.searchsorted(posicoes, inicio):np.searchsorted(posicoes, fim)]
+    if not len(trecho):
+        return df
+    manter = np.ones(len(df), dtype=bool)
+    manter[trecho - inicio] = False
+    return df[manter]
+
+
+def _com_sinal_trocado(df, colunas):
+    presentes = [coluna for coluna in colunas if coluna in df.columns]
+    return df.assign(**{coluna: -df[coluna].astype(np.float64) for coluna in presentes})
+
+
+def somas_a_descontar(df, posicoes, colunas, cubo=False):
+    """
+    Somas por tribunal, com o sinal trocado, das linhas `posicoes` de `df` (o arquivo inteiro,
+    lido tipado): somadas a um total, descontam as linhas repetidas. Com `cubo`, também as
+    parciais do cubo. Retorna (somas, parciais_do_cubo ou None).
+    """
+    repetidas = df.iloc[posicoes]
+    com_ramo = repetidas if "ramo_justica" in repetidas.columns else repetidas.assign(ramo_justica=np.nan)
+    somas = _com_sinal_trocado(somar_por_tribunal(com_ramo, colunas), colunas)
+    parciais = _com_sinal_trocado(agregar_cubo(repetidas, colunas), colunas) if cubo else None
+    return somas, parciais
+
+
+class IndiceLinhas:
+    """
+    Hashes das linhas de cada arquivo de origem, persistidos entre execuções.
+
+    `colunas` define a identidade da linha (None = linha inteira); mudar as colunas (ou a
+    codificação) invalida o índice gravado.
+    """
+
+    def __init__(self, diretorio, colunas=None, encoding="latin1"):
+        self.diretorio = diretorio
+        self.colunas = None if colunas is None else list(colunas)
+        self.encoding = encoding
+        os.makedirs(os.path.join(self.diretorio, DIRETORIO_HASHES), exist_ok=True)
+        self.arquivos = {}
+        indice = self._ler_indice()
+        if indice is not None and indice.get("versao") == VERSAO_INDICE and \
+                indice.get("colunas") == self.colunas and indice.get("encoding") == self.encoding:
+            self.arquivos = indice["arquivos"]
+
+    def _ler_indice(self):
+        try:
+            with open(os.path.join(self.diretorio, ARQUIVO_INDICE), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _caminho_hashes(self, nome):
+        return os.path.join(self.diretorio, DIRETORIO_HASHES, nome)
+
+    def calcular(self, caminho):
+        """Hashes das linhas de `caminho` com a identidade deste índice (None se não puder ser lido)."""
+        try:
+            return hashes_do_arquivo(caminho, self.colunas, self.encoding)
+        except Exception as e:
+            print(f"Erro ao indexar as linhas de {caminho}: {e}")
+            return None
+
+    def sincronizar(self, arquivos, calcular_hashes=None, mapear=map):
+        """
+        Indexa os arquivos novos/alterados de `arquivos` e esquece os que saíram. `calcular_hashes`
+        (padrão: `self.calcular`, que é picklable) pode rodar em outro processo via `mapear` (ex.:
+        `pool.imap`); um arquivo que falhar (None) fica fora do índice e é tentado de novo depois.
+        """
+        calcular_hashes = calcular_hashes or self.calcular
+        a_processar = {}
+        atuais = set()
+        for caminho in arquivos:
+            absoluto = os.path.abspath(caminho)
+            atuais.add(absoluto)
+            registro = self.arquivos.get(absoluto)
+            if registro is None or not mesma_origem(registro["origem"], caminho):
+                a_processar[caminho] = impressao_digital(caminho)
+        removidos = [caminho for caminho in self.arquivos if caminho not in atuais]
+        for caminho in removidos:
+            self._esquecer(caminho)
+
+        falhas = []
+        for caminho, hashes in zip(a_processar, mapear(calcular_hashes, list(a_processar))):
+            if hashes is None:
+                falhas.append(caminho)
+                continue
+            absoluto = os.path.abspath(caminho)
+            nome = hashlib.sha1(absoluto.encode("utf-8")).hexdigest()[:20] + ".npy"
+            temporario = self._caminho_hashes(nome + ".tmp.npy")
+            np.save(temporario, np.asarray(hashes, dtype=np.uint64))
+            os.replace(temporario, self._caminho_hashes(nome))
+            self.arquivos[absoluto] = {"origem": a_processar[caminho], "hashes": nome, "linhas": len(hashes)}
+        self.salvar()
+        return {"processados": [c for c in a_processar if c not in falhas], "falhas": falhas,
+                "removidos": removidos, "inalterados": len(arquivos) - len(a_processar)}
+
+    def _esquecer(self, caminho):
+        registro = self.arquivos.pop(caminho, None)
+        if registro is not None:
+            try:
+                os.remove(self._caminho_hashes(registro["hashes"]))
+            except OSError:
+                pass
+
+    def salvar(self):
+        """Grava o índice de forma atômica."""
+        caminho = os.path.join(self.diretorio, ARQUIVO_INDICE)
+        with open(caminho + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"versao": VERSAO_INDICE, "colunas": self.colunas, "encoding": self.encoding,
+                       "arquivos": self.arquivos}, f, ensure_ascii=False)
+        os.replace(caminho + ".tmp", caminho)
+
+    def hashes(self, caminho):
+        """Hashes gravados das linhas de `caminho` (None se o arquivo não está no índice)."""
+        registro = self.arquivos.get(os.path.abspath(caminho))
+        if registro is None:
+            return None
+        return np.load(self._caminho_hashes(registro["hashes"]))
+
+    def duplicadas(self, arquivos):
+        """
+        Linhas repetidas de `arquivos` (na ordem dada, vale a primeira ocorrência). Retorna
+        ({arquivo: posições das linhas repetidas, em ordem}, {(arquivo, arquivo da primeira
+        ocorrência): linhas}); arquivos fora do índice são ignorados.
+        """
+        indexados = [caminho for caminho in arquivos if os.path.abspath(caminho) in self.arquivos]
+        partes = [self.hashes(caminho) for caminho in indexados]
+        if not partes:
+            return {}, {}
+        todos = np.concatenate(partes)
+        inicios = np.cumsum([0] + [len(parte) for parte in partes])
+        unicos, primeiras = np.unique(todos, return_index=True)
+        repetida = np.ones(len(todos), dtype=bool)
+        repetida[primeiras] = False
+        linhas = np.flatnonzero(repetida)
+        if not len(linhas):
+            return {}, {}
+        # Arquivo de cada linha repetida e da primeira ocorrência do mesmo hash
+        arquivo_da_linha = np.searchsorted(inicios, linhas, side="right") - 1
+        primeira = primeiras[np.searchsorted(unicos, todos[linhas])]
+        arquivo_da_primeira = np.searchsorted(inicios, primeira, side="right") - 1
+
+        posicoes, origens = {}, {}
+        for i in np.unique(arquivo_da_linha):
+            deste = arquivo_da_linha == i
+            posicoes[indexados[i]] = linhas[deste] - inicios[i]
+            for j, n in zip(*np.unique(arquivo_da_primeira[deste], return_counts=True)):
+                origens[(indexados[i], indexados[j])] = int(n)
+        return posicoes, origens
+
+
+def descrever_duplicadas(posicoes, origens):
+    """Linhas de texto do relatório de `IndiceLinhas.duplicadas` (vazio sem repetições)."""
+    if not posicoes:
+        return []
+    total = sum(len(p) for p in posicoes.values())
+    linhas = [f"{total} linhas repetidas em {len(posicoes)} arquivo(s):"]
+    for (arquivo, anterior), n in sorted(origens.items(), key=lambda item: -item[1]):
+        onde = "no próprio arquivo" if arquivo == anterior else f"já vistas em {os.path.basename(anterior)}"
+        linhas.append(f"  {os.path.basename(arquivo)}: {n} {onde}")
+    return linhas
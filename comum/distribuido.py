@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+"""
+Execução distribuída: um coordenador reparte as tarefas entre trabalhadores em outras
+máquinas (ou em outras portas da mesma), via TCP.
+
+As tarefas são as mesmas do pool local (`comum.particionamento.planejar_tarefas`: um
+arquivo inteiro ou um intervalo de bytes dele). Cada trabalhador lê os arquivos do seu
+diretório `--dados` (padrão: Dados/ na raiz do projeto, que pode ser um sistema de
+arquivos compartilhado ou uma cópia), pelo nome enviado na tarefa; nomes que resolvem
+para fora desse diretório são recusados. Cada tarefa leva o tamanho do arquivo, e um
+trabalhador com uma cópia diferente recusa a tarefa em vez de somar outros dados.
+
+O protocolo não tem autenticação: o trabalhador atende só em 127.0.0.1 por padrão, e
+`--host` (ex.: 0.0.0.0) deve ser usado apenas em uma rede confiável.
+
+O trabalhador não devolve DataFrames: devolve registros compactos das somas parciais
+(`codificar_parcial`: colunas de texto e colunas numéricas como listas), que o
+coordenador decodifica e junta na ordem original das tarefas, então o resultado não
+depende de qual trabalhador fez o quê nem da ordem de término.
+
+Protocolo: mensagens JSON comprimidas com zlib, cada uma precedida do tamanho (4 bytes,
+big-endian). O coordenador mantém uma conexão por trabalhador e envia uma tarefa por
+vez; a fila é compartilhada, então quem termina pega a próxima. Se a conexão cai ou
+a resposta passa do tempo limite, a tarefa volta para a fila e vai para outro
+trabalhador; o trabalhador é reconectado algumas vezes antes de ser descartado.
+
+Para testar em uma única máquina:
+
+    python -m comum.distribuido --porta 9101 &
+    python -m comum.distribuido --porta 9102 &
+
+e configurar os endereços ("127.0.0.1:9101", "127.0.0.1:9102") no Versao_P.
+"""
+
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from comum.cache import CacheColunar
+from comum.cubo import agregar_cubo
+from comum.ingestao import COLUNAS_CATEGORICAS, ler_csv_tipado
+from comum.metas import COLUNAS_METAS, somar_por_tribunal
+
+PORTA_PADRAO = 9101
+HOST_PADRAO = "127.0.0.1"
+DIRETORIO_DADOS_PADRAO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Dados")
+TEMPO_CONEXAO = 5.0 # Segundos para conectar a um trabalhador
+TEMPO_LIMITE_TAREFA = 600.0 # Segundos esperando a resposta de uma tarefa
+TENTATIVAS_CONEXAO = 3 # Falhas seguidas antes de descartar um trabalhador
+ESPERA_RECONEXAO = 1.0
+TENTATIVAS_POR_TAREFA = 3 # Trabalhadores que uma tarefa pode derrubar antes de ser dada como falha
+TAMANHO_MAXIMO_MENSAGEM = 1 << 30
+_CABECALHO = struct.Struct(">I")
+
+
+# --- Protocolo ---
+
+def enviar_mensagem(conexao, mensagem):
+    dados = zlib.compress(json.dumps(mensagem, ensure_ascii=False).encode("utf-8"), 1)
+    conexao.sendall(_CABECALHO.pack(len(dados)) + dados)
+
+
+def _receber_exato(conexao, tamanho):
+    partes = []
+    while tamanho:
+        parte = conexao.recv(min(tamanho, 1 << 20))
+        if not parte:
+            raise ConnectionError("Conexão encerrada no meio de uma mensagem")
+        partes.append(parte)
+        tamanho -= len(parte)
+    return b"".join(partes)
+
+
+def receber_mensagem(conexao):
+    """Próxima mensagem da conexão, ou None se o outro lado fechou entre mensagens."""
+    cabecalho = conexao.recv(_CABECALHO.size, socket.MSG_WAITALL)
+    if not cabecalho:
+        return None
+    if len(cabecalho) < _CABECALHO.size:
+        cabecalho += _receber_exato(conexao, _CABECALHO.size - len(cabecalho))
+    (tamanho,) = _CABECALHO.unpack(cabecalho)
+    if tamanho > TAMANHO_MAXIMO_MENSAGEM:
+        raise ValueError(f"Mensagem de {tamanho} bytes excede o limite do protocolo")
+    return json.loads(zlib.decompress(_receber_exato(conexao, tamanho)).decode("utf-8"))
+
+
+def codificar_parcial(df):
+    """
+    Registro compacto e combinável de um DataFrame de somas: as colunas de texto (chaves
+    ou dimensões) como listas de valores, e as numéricas como listas com o tipo original.
+    """
+    if df is None:
+        return None
+    registro = {"linhas": len(df), "ordem": [str(coluna) for coluna in df.columns], "texto": {}, "numericas": {}}
+    for coluna in df.columns:
+        serie = df[coluna]
+        if pd.api.types.is_numeric_dtype(serie) and not isinstance(serie.dtype, pd.CategoricalDtype):
+            valores = serie.to_numpy()
+            registro["numericas"][coluna] = [valores.dtype.str, valores.tolist()]
+        else:
+            valores = serie.astype(object)
+            registro["texto"][coluna] = [None if pd.isna(v) else str(v) for v in valores]
+    return registro
+
+
+def decodificar_parcial(registro):
+    """Inverso de `codificar_parcial`."""
+    if registro is None:
+        return None
+    colunas = {}
+    for coluna in registro["ordem"]:
+        if coluna in registro["numericas"]:
+            tipo, valores = registro["numericas"][coluna]
+            colunas[coluna] = np.asarray(valores, dtype=np.dtype(tipo))
+        else:
+            colunas[coluna] = np.asarray(registro["texto"][coluna], dtype=object)
+    return pd.DataFrame(colunas, index=pd.RangeIndex(registro["linhas"]))
+
+
+# --- Trabalhador ---
+
+def resolver_arquivo(diretorio_dados, nome):
+    """Caminho de `nome` dentro de `diretorio_dados`; ValueError se ele resolver para fora do diretório."""
+    base = os.path.realpath(diretorio_dados)
+    caminho = os.path.realpath(os.path.join(base, nome))
+    if os.path.isabs(nome) or os.path.commonpath([base, caminho]) != base or caminho == base:
+        raise ValueError(f"Arquivo {nome!r} fora do diretório de dados do trabalhador")
+    return caminho
+
+
+def processar_tarefa(mensagem, diretorio_dados=DIRETORIO_DADOS_PADRAO, diretorio_cache=None):
+    """Somas parciais (e, se pedido, do cubo) de uma tarefa, no formato da resposta."""
+    caminho = resolver_arquivo(diretorio_dados, mensagem["nome"])
+    if os.path.getsize(caminho) != mensagem["tamanho"]:
+        raise ValueError(f"{caminho} tem tamanho diferente do visto pelo coordenador")
+    intervalo = tuple(mensagem["intervalo"]) if mensagem["intervalo"] is not None else None
+    dimensoes = mensagem["dimensoes"]
+    if diretorio_cache is not None:
+        cache = CacheColunar(diretorio_cache, encoding=mensagem["encoding"])
+        df = cache.carregar(caminho, COLUNAS_METAS, dimensoes, intervalo=intervalo)
+    else:
+        df = ler_csv_tipado(caminho, COLUNAS_METAS, dimensoes, encoding=mensagem["encoding"], intervalo=intervalo)
+    tem_chaves = "sigla_tribunal" in df.columns
+    somas = somar_por_tribunal(df, COLUNAS_METAS) if tem_chaves else pd.DataFrame()
+    cubo = agregar_cubo(df, COLUNAS_METAS) if mensagem["com_cubo"] and tem_chaves else None
+    return {"linhas": len(df), "somas": codificar_parcial(somas), "cubo": codificar_parcial(cubo)}
+
+
+def _criar_manipulador(diretorio_dados, diretorio_cache):
+    class Manipulador(socketserver.BaseRequestHandler):
+        def handle(self):
+            while True:
+                try:
+                    mensagem = receber_mensagem(self.request)
+                except (OSError, ValueError):
+                    return
+                if mensagem is None or mensagem.get("tipo") == "fim":
+                    return
+                resposta = {"tipo": "resultado", "indice": mensagem.get("indice")}
+                inicio = time.time()
+                try:
+                    resposta.update(processar_tarefa(mensagem, diretorio_dados, diretorio_cache))
+                except Exception as e:
+                    # Erro nos dados (arquivo vazio, ilegível...): a tarefa falha, o trabalhador segue
+                    resposta["erro"] = f"{type(e).__name__}: {e}"
+                resposta["segundos"] = time.time() - inicio
+                try:
+                    enviar_mensagem(self.request, resposta)
+                except OSError:
+                    return
+
+    return Manipulador
+
+
+class _Servidor(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def servir_trabalhador(host=HOST_PADRAO, porta=PORTA_PADRAO, diretorio_dados=DIRETORIO_DADOS_PADRAO,
+                       diretorio_cache=None):
+    """Atende tarefas de coordenadores até Ctrl+C, lendo só arquivos de `diretorio_dados`."""
+    servidor = _Servidor((host, porta), _criar_manipulador(diretorio_dados, diretorio_cache))
+    print(f"Trabalhador atendendo em {host}:{servidor.server_address[1]} com os dados de {diretorio_dados} "
+          f"(pid {os.getpid()})", flush=True)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+# --- Coordenador ---
+
+def _endereco(texto):
+    host, _, porta = texto.rpartition(":")
+    return host or "127.0.0.1", int(porta)
+
+
+class Coordenador:
+    """
+    Distribui tarefas (indice, arquivo, intervalo) entre trabalhadores TCP e junta os
+    resultados por índice. Uma thread por trabalhador, todas puxando da mesma fila.
+    """
+
+    def __init__(self, enderecos, tempo_limite=TEMPO_LIMITE_TAREFA, emitir=print):
+        if not enderecos:
+            raise ValueError("Nenhum trabalhador informado.")
+        self.enderecos = [_endereco(e) if isinstance(e, str) else tuple(e) for e in enderecos]
+        self.tempo_limite = tempo_limite
+        self.emitir = emitir
+
+    def executar(self, tarefas, encoding="latin1", dimensoes=COLUNAS_CATEGORICAS, com_cubo=False,
+                 ao_concluir=None):
+        """
+        Executa as `tarefas` e retorna {indice: (somas, cubo)} (DataFrames; (None, None)
+        nas tarefas com erro). `ao_concluir(indice, resposta)` é chamado a cada tarefa
+        terminada. Levanta RuntimeError se todos os trabalhadores caírem antes do fim.
+        """
+        fila = queue.Queue()
+        for tarefa in tarefas:
+            fila.put(tarefa)
+        total = len(tarefas)
+        resultados = {}
+        tentativas = {}
+        condicao = threading.Condition()
+        parametros = {"encoding": encoding, "dimensoes": list(dimensoes), "com_cubo": com_cubo}
+
+        def concluido():
+            return len(resultados) == total
+
+        def registrar(indice, resultado, resposta):
+            with condicao:
+                if indice not in resultados:
+                    resultados[indice] = resultado
+                    if ao_concluir is not None:
+                        ao_concluir(indice, resposta)
+                condicao.notify_all()
+
+        def atender(endereco):
+            conexao = None
+            falhas_seguidas = 0
+            try:
+                while not concluido():
+                    try:
+                        indice, caminho, intervalo = fila.get(timeout=0.2)
+                    except queue.Empty:
+                        continue
+                    mensagem = {
+                        "tipo": "tarefa", "indice": indice, "nome": os.path.basename(caminho), "tamanho": os.path.getsize(caminho),
+                        "intervalo": list(intervalo) if intervalo is not None else None, **parametros,
+                    }
+                    enviada = False
+                    try:
+                        if conexao is None:
+                            conexao = socket.create_connection(endereco, timeout=TEMPO_CONEXAO)
+                            conexao.settimeout(self.tempo_limite)
+                        enviar_mensagem(conexao, mensagem)
+                        enviada = True
+                        resposta = receber_mensagem(conexao)
+                        if resposta is None:
+                            raise ConnectionError("Conexão encerrada pelo trabalhador")
+                    except (OSError, ValueError) as e:
+                        if conexao is not None:
+                            conexao.close()
+                            conexao = None
+                        falhas_seguidas += 1
+                        # Só conta contra a tarefa a falha depois de ela chegar ao trabalhador
+                        with condicao:
+                            tentativas[indice] = tentativas.get(indice, 0) + enviada
+                            esgotada = tentativas[indice] >= TENTATIVAS_POR_TAREFA
+                        if esgotada:
+                            self.emitir(f"Tarefa {indice} ({os.path.basename(caminho)}) desistida após "
+                                        f"{tentativas[indice]} falhas de trabalhador.")
+                            registrar(indice, (None, None), {"erro": str(e)})
+                        else:
+                            fila.put((indice, caminho, intervalo)) # Reatribuída a outro trabalhador
+                            self.emitir(f"Trabalhador {endereco[0]}:{endereco[1]} falhou ({e}); "
+                                        f"tarefa {indice} devolvida à fila.")
+                        if falhas_seguidas >= TENTATIVAS_CONEXAO:
+                            self.emitir(f"Trabalhador {endereco[0]}:{endereco[1]} descartado.")
+                            return
+                        time.sleep(ESPERA_RECONEXAO)
+                        continue
+                    falhas_seguidas = 0
+                    if resposta.get("erro"):
+                        self.emitir(f"Erro ao processar o arquivo {caminho}: {resposta['erro']}")
+                        registrar(indice, (None, None), resposta)
+                    else:
+                        registrar(indice, (decodificar_parcial(resposta["somas"]),
+                                           decodificar_parcial(resposta["cubo"])), resposta)
+            finally:
+                if conexao is not None:
+                    try:
+                        enviar_mensagem(conexao, {"tipo": "fim"})
+                    except OSError:
+                        pass
+                    conexao.close()
+                with condicao:
+                    condicao.notify_all()
+
+        threads = [threading.Thread(target=atender, args=(endereco,), daemon=True,
+                                    name=f"coordenador-{endereco[0]}:{endereco[1]}")
+                   for endereco in self.enderecos]
+        for thread in threads:
+            thread.start()
+        with condicao:
+            while not concluido() and any(thread.is_alive() for thread in threads):
+                condicao.wait(0.5)
+        for thread in threads:
+            thread.join()
+        if not concluido():
+            faltando = total - len(resultados)
+            raise RuntimeError(f"Nenhum trabalhador disponível; {faltando} de {total} tarefas sem resultado.")
+        return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trabalhador da execução distribuída das metas")
+    parser.add_argument("--host", default=HOST_PADRAO,
+                        help="Interface atendida (sem autenticação: outras além de 127.0.0.1 só em rede confiável)")
+    parser.add_argument("--porta", type=int, default=PORTA_PADRAO)
+    parser.add_argument("--dados", default=DIRETORIO_DADOS_PADRAO,
+                        help="Diretório com os CSVs; só arquivos dentro dele são lidos (padrão: Dados/ do projeto)")
+    parser.add_argument("--cache", default=None, help="Diretório do cache colunar deste trabalhador (opcional)")
+    args = parser.parse_args()
+    servir_trabalhador(args.host, args.porta, args.dados, args.cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Resolução do esquema de cada CSV a partir do cabeçalho.
+
+Cada ramo publica um leiaute próprio: o STJ traz as metas 8 e 10 só por subitem
+(`distm8_a`, `distm8_b`, `distm10_a`), os TJs de leiaute reduzido trazem a Meta 6 como
+`distm6_a`, e o documento TP06 usa outros nomes para as mesmas colunas (`julgadom6`,
+`dism4_b`, `susm2_ant`, `cnm1`...). Sem resolução, a fórmula não encontra a coluna e a
+meta sai 0 sem aviso.
+
+O cabeçalho de cada arquivo vira uma impressão digital; para cada impressão o registro
+compila, uma única vez, um plano com as colunas de origem de cada coluna canônica das
+metas (as usadas nas fórmulas de comum/metas.py):
+
+* a própria coluna, se existir no cabeçalho (com o nome do arquivo ou o do documento);
+* senão, para uma coluna sem subitem (`distm8`), a soma dos subitens presentes
+  (`distm8_a` + `distm8_b`);
+* senão, a coluna fica ausente e o plano avisa, uma vez por leiaute, quais metas ficam
+  sem dados.
+
+Arquivos com o mesmo leiaute reaproveitam o plano: a leitura pede só as colunas de
+origem e as colunas derivadas saem de somas por posição, sem procurar nome por nome.
+"""
+
+import csv
+import hashlib
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from comum.compactados import abrir
+from comum.metas import COLUNAS_METAS, METAS_POR_TRIBUNAL, _colunas_da_formula, formulas_da_chave, normalizar_ramo
+
+# Versão das regras de resolução: entra na validação do cache e do estado incremental
+VERSAO_ESQUEMAS = 1
+
+# Nomes do documento TP06 -> nomes usados nos CSVs
+COLUNAS_DOCUMENTO = {
+    "julgadom1": "julgados_2025",
+    "cnm1": "casos_novos_2025",
+    "desm1": "dessobrestados_2025",
+    "susm1": "suspensos_2025",
+}
+PREFIXOS_DOCUMENTO = {"julgadom": "julgm", "dism": "distm", "susm": "suspm"}
+
+_PADRAO_DOCUMENTO = re.compile(r"^(julgadom|dism|susm)(\d.*)$")
+_PADRAO_SEM_SUBITEM = re.compile(r"^(julgm|distm|suspm)\d+$")
+_PADRAO_SUBITEM = re.compile(r"^_[a-z]$")
+
+
+def nome_canonico(coluna):
+    """Nome usado nos CSVs para uma coluna do cabeçalho (traduz os nomes do documento TP06)."""
+    coluna = coluna.strip()
+    if coluna in COLUNAS_DOCUMENTO:
+        return COLUNAS_DOCUMENTO[coluna]
+    encontrado = _PADRAO_DOCUMENTO.match(coluna)
+    if encontrado:
+        return PREFIXOS_DOCUMENTO[encontrado.group(1)] + encontrado.group(2)
+    return coluna
+
+
+def impressao_do_cabecalho(cabecalho):
+    """Impressão digital de um cabeçalho (nomes e ordem das colunas)."""
+    return hashlib.sha1("\x1f".join(cabecalho).encode("utf-8")).hexdigest()[:16]
+
+
+def ler_cabecalho(origem, encoding="latin1"):
+    """Colunas do cabeçalho de `origem`: bytes do arquivo, buffer binário ou caminho, compactado ou não ([] se vazio)."""
+    if isinstance(origem, (bytes, bytearray, memoryview)):
+        conteudo = bytes(origem)
+        fim = conteudo.find(b"\n")
+        linha = conteudo if fim < 0 else conteudo[:fim]
+    elif hasattr(origem, "getvalue"):
+        return ler_cabecalho(origem.getvalue(), encoding)
+    else:
+        with abrir(origem) as f:
+            linha = f.readline()
+    texto = linha.decode(encoding).rstrip("\r\n")
+    return next(csv.reader([texto]), []) if texto else []
+
+
+class PlanoEsquema:
+    """Plano compilado para um leiaute: de onde sai cada coluna canônica das metas."""
+
+    def __init__(self, registro, impressao, cabecalho, fontes, ausentes):
+        self.registro = registro
+        self.impressao = impressao
+        self.cabecalho = list(cabecalho)
+        # Coluna canônica -> posições no cabeçalho das colunas de origem (somadas)
+        self.fontes = fontes
+        self.ausentes = list(ausentes)
+        self.colunas = list(fontes) # Canônicas resolvidas, na ordem das fórmulas
+        posicoes = sorted({i for indices in fontes.values() for i in indices})
+        self.leitura = [self.cabecalho[i] for i in posicoes] # Colunas a pedir ao leitor
+        self._derivadas = [
+            (canonica, [self.cabecalho[i] for i in indices]) for canonica, indices in fontes.items()
+            if [self.cabecalho[i] for i in indices] != [canonica]
+        ]
+        canonicas = set(self.colunas)
+        self._descartadas = [coluna for coluna in self.leitura if coluna not in canonicas]
+        self._avisado = not self.ausentes
+
+    @property
+    def trivial(self):
+        """True se todas as colunas resolvidas estão no cabeçalho com o nome canônico."""
+        return not self._derivadas
+
+    def derivar(self, df):
+        """Valores das colunas canônicas que não estão no cabeçalho com o próprio nome."""
+        derivadas = {}
+        for canonica, origens in self._derivadas:
+            if len(origens) == 1:
+                derivadas[canonica] = df[origens[0]]
+                continue
+            valores = df[origens].to_numpy(dtype=np.float64, na_value=np.nan)
+            soma = np.nansum(valores, axis=1)
+            # Linha sem nenhum subitem preenchido continua ausente
+            soma[np.isnan(valores).all(axis=1)] = np.nan
+            derivadas[canonica] = pd.Series(soma, index=df.index)
+        return derivadas
+
+    def aplicar(self, df, origem=None, manter_fontes=False):
+        """
+        Acrescenta a `df` (lido com as colunas de `leitura`, já numéricas) as colunas
+        canônicas derivadas e, sem `manter_fontes`, descarta as de origem que não são
+        canônicas. Avisa das colunas ausentes na primeira vez que o leiaute é visto.
+        """
+        self.avisar_ausentes(df, origem)
+        if self.trivial:
+            return df
+        derivadas = self.derivar(df)
+        if not manter_fontes and self._descartadas:
+            df = df.drop(columns=self._descartadas)
+        return df.assign(**derivadas)
+
+    def avisar_ausentes(self, df, origem=None):
+        """
+        Avisa, por tabela de fórmulas presente em `df`, as metas sem colunas de origem.
+        Só na primeira chamada para o leiaute; as seguintes não fazem nada.
+        """
+        if self._avisado:
+            return
+        self._avisado = True
+        ausentes = set(self.ausentes)
+        for chave in _chaves_presentes(df):
+            sem_dados = {}
+            for meta, formula in formulas_da_chave(chave).items():
+                faltando = [col for col in _colunas_da_formula(formula) if col in ausentes]
+                if faltando:
+                    sem_dados[meta] = faltando
+            if sem_dados:
+                detalhes = "; ".join(f"{meta}: {', '.join(cols)}" for meta, cols in sem_dados.items())
+                local = f" ({origem})" if origem is not None else ""
+                self.registro.avisar(f"ALERTA: leiaute {self.impressao}{local} sem colunas para {chave} "
+                                     f"-> {detalhes}. Essas metas ficam sem numerador/denominador.")
+
+
+def _chaves_presentes(df):
+    """Chaves de tabela de fórmulas (sigla com tabela própria ou ramo) presentes em `df`."""
+    if "sigla_tribunal" not in df.columns:
+        return []
+    siglas = [str(s) for s in pd.unique(df["sigla_tribunal"].dropna())]
+    chaves = [sigla for sigla in siglas if sigla in METAS_POR_TRIBUNAL]
+    if len(chaves) < len(siglas) and "ramo_justica" in df.columns:
+        chaves += [normalizar_ramo(str(ramo)) for ramo in pd.unique(df["ramo_justica"].dropna())]
+    return list(dict.fromkeys(chaves))
+
+
+def compilar_plano(registro, cabecalho, colunas=None):
+    """Resolve as `colunas` canônicas (padrão: as das fórmulas) contra um cabeçalho."""
+    if colunas is None:
+        colunas = COLUNAS_METAS
+    posicoes = {}
+    for i, coluna in enumerate(cabecalho):
+        # Coluna repetida (ex.: nome do arquivo e do documento juntos): vale a primeira
+        posicoes.setdefault(nome_canonico(coluna), i)
+
+    fontes = {}
+    ausentes = []
+    for canonica in colunas:
+        if canonica in posicoes:
+            fontes[canonica] = (posicoes[canonica],)
+            continue
+        subitens = ()
+        if _PADRAO_SEM_SUBITEM.match(canonica):
+            subitens = tuple(
+                i for nome, i in sorted(posicoes.items())
+                if nome.startswith(canonica) and _PADRAO_SUBITEM.match(nome[len(canonica):])
+            )
+        if subitens:
+            fontes[canonica] = subitens
+        else:
+            ausentes.append(canonica)
+    return PlanoEsquema(registro, impressao_do_cabecalho(cabecalho), cabecalho, fontes, ausentes)
+
+
+class RegistroEsquemas:
+    """Planos compilados por impressão digital do cabeçalho (e conjunto de colunas pedido)."""
+
+    def __init__(self, avisar=print):
+        self.avisar = avisar
+        self._planos = {}
+        self._trava = threading.Lock()
+
+    def plano(self, cabecalho, colunas=None):
+        cabecalho = [str(coluna) for coluna in cabecalho]
+        colunas = tuple(COLUNAS_METAS if colunas is None else colunas)
+        chave = (impressao_do_cabecalho(cabecalho), colunas)
+        plano = self._planos.get(chave)
+        if plano is None:
+            with self._trava:
+                plano = self._planos.get(chave)
+                if plano is None:
+                    plano = self._planos[chave] = compilar_plano(self, cabecalho, colunas)
+        return plano
+
+    def __len__(self):
+        return len(self._planos)
+
+
+# Registro do processo (cada worker da versão P tem o seu)
+REGISTRO = RegistroEsquemas()
@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+"""
+Ponto de entrada único do cálculo das metas, com o backend de execução selecionável.
+
+As versões NP e P repetem o mesmo ETL com estratégias diferentes. Aqui a leitura (tipada,
+com o esquema resolvido pelo cabeçalho), as somas por tribunal e o cálculo das metas são
+os mesmos para todos os backends; muda só quem executa cada tarefa:
+
+* `serial`: um arquivo por vez, neste processo;
+* `threads`: um arquivo por thread (o parser em C do pandas libera o GIL em boa parte da leitura);
+* `processos`: um arquivo por tarefa em um Pool de processos;
+* `blocos`: arquivos grandes divididos em intervalos de bytes (comum/particionamento.py),
+  para que um arquivo muito maior que os outros não prenda um único processo;
+* `pipeline`: leitura antecipada em uma thread (comum/pipeline.py) enquanto o arquivo
+  anterior é interpretado, em um único processo;
+* `auto`: escolhe o backend e o número de trabalhadores pelo total de bytes, pela
+  assimetria dos tamanhos e pelos cores disponíveis (`escolher_backend`).
+
+Exemplos (na raiz do projeto):
+    python -m comum.execucao --backend auto
+    python -m comum.execucao --backend blocos --trabalhadores 8 --entrada Dados --saida results
+    python -m comum.execucao --backend auto --mostrar-plano
+"""
+
+import argparse
+import functools
+import io
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+
+import pandas as pd
+
+from comum.compactados import eh_entrada, tamanho_descompactado
+from comum.graficos import grafico_media_por_ramo, graficos_por_meta, graficos_por_ramo
+from comum.ingestao import COLUNAS_CATEGORICAS, ler_csv_tipado
+from comum.instrumentacao import Instrumentacao, Progresso
+from comum.memoria import OrcamentoMemoria, formatar_tamanho, interpretar_tamanho
+from comum.metas import COLUNAS_METAS, calcular_metas, somar_por_tribunal
+from comum.particionamento import TAMANHO_INTERVALO, planejar_tarefas
+from comum.pipeline import LIMITE_ARQUIVOS_PADRAO, LIMITE_BYTES_PADRAO, LeitorAntecipado
+from comum.saidas import EstagioSaidas
+
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BACKENDS = ("serial", "threads", "processos", "blocos", "pipeline")
+BACKENDS_PARALELOS = ("threads", "processos", "blocos") # Os que usam mais de um trabalhador
+
+# Limiares do modo auto. Subir um processo custa da ordem de 0,1 s (mais com spawn), então
+# entradas pequenas ficam em um processo; os valores são estimativas medidas nos CSVs do projeto
+LIMIAR_SERIAL = 32 << 20 # Abaixo disso, serial: o parse leva menos que subir o pool
+LIMIAR_THREADS = 128 << 20 # Abaixo disso, threads: paralelismo parcial sem custo de processos
+BYTES_POR_TRABALHADOR = 16 << 20 # Trabalho mínimo que justifica mais um trabalhador
+MAXIMO_THREADS = 4 # Além disso, as threads disputam o GIL fora do parser
+MINIMO_COM_DADOS = 1024 # Bytes: abaixo disso, o arquivo é tratado como vazio (no máximo o cabeçalho)
+
+PlanoExecucao = namedtuple("PlanoExecucao", ["backend", "trabalhadores", "motivo"])
+
+
+def listar_csvs(diretorio):
+    """CSVs de `diretorio` (também compactados), em ordem de nome (a junção não depende do sistema de arquivos)."""
+    return sorted(os.path.join(diretorio, nome) for nome in os.listdir(diretorio) if eh_entrada(nome))
+
+
+def _tamanhos_com_dados(arquivos):
+    # Arquivos vazios (ou só com o cabeçalho) não geram trabalho; compactados contam descompactados
+    return [tamanho for tamanho in map(tamanho_descompactado, arquivos) if tamanho > MINIMO_COM_DADOS]
+
+
+def processos_para(arquivos, nucleos=None):
+    """Processos que compensa subir em um pool sobre `arquivos`: um a cada BYTES_POR_TRABALHADOR, até um por core."""
+    nucleos = nucleos or os.cpu_count() or 1
+    total = sum(_tamanhos_com_dados(arquivos))
+    if total < LIMIAR_SERIAL:
+        return 1
+    return max(1, min(nucleos, -(-total // BYTES_POR_TRABALHADOR)))
+
+
+def escolher_backend(arquivos, nucleos=None, tamanho_tarefa=TAMANHO_INTERVALO):
+    """
+    Backend e número de trabalhadores para `arquivos`:
+
+    * sem dados ou menos de LIMIAR_SERIAL bytes: serial;
+    * um core só: pipeline (sobrepõe a leitura do disco e o parse);
+    * menos de LIMIAR_THREADS bytes: threads;
+    * senão, um processo a cada BYTES_POR_TRABALHADOR (até um por core). Se o maior
+      arquivo passa da fatia de um trabalhador (tamanhos assimétricos), blocos; senão,
+      um arquivo por tarefa (processos), sem mais processos que arquivos com dados.
+    """
+    nucleos = nucleos or os.cpu_count() or 1
+    com_dados = _tamanhos_com_dados(arquivos)
+    total = sum(com_dados)
+    if not com_dados:
+        return PlanoExecucao("serial", 1, "nenhum arquivo com dados")
+    if total < LIMIAR_SERIAL:
+        return PlanoExecucao("serial", 1, f"entrada pequena ({formatar_tamanho(total)})")
+    if nucleos == 1:
+        return PlanoExecucao("pipeline", 1, "um core: leitura antecipada sobreposta ao parse")
+
+    trabalhadores = max(2, min(nucleos, total // BYTES_POR_TRABALHADOR))
+    maior = max(com_dados)
+    if total < LIMIAR_THREADS:
+        trabalhadores = min(trabalhadores, MAXIMO_THREADS, len(com_dados))
+        return PlanoExecucao("threads", trabalhadores, f"entrada média ({formatar_tamanho(total)})")
+    if maior > total / trabalhadores and maior > tamanho_tarefa:
+        return PlanoExecucao("blocos", trabalhadores,
+                             f"tamanhos assimétricos (maior arquivo com {maior / total:.0%} dos bytes)")
+    return PlanoExecucao("processos", min(trabalhadores, len(com_dados)),
+                         f"{len(com_dados)} arquivos equilibrados ({formatar_tamanho(total)})")
+
+
+# --- Tarefas (as mesmas em todos os backends) ---
+
+def somar_tarefa(tarefa, encoding="utf-8"):
+    """
+    Somas por tribunal de uma tarefa (caminho, intervalo), intervalo None para o arquivo
+    inteiro. Retorna (tarefa, somas, linhas); somas None se a tarefa falhou ou não tem dados.
+    """
+    caminho, intervalo = tarefa
+    try:
+        df = ler_csv_tipado(caminho, COLUNAS_METAS, COLUNAS_CATEGORICAS, encoding=encoding, intervalo=intervalo)
+    except pd.errors.EmptyDataError:
+        return tarefa, None, 0
+    except Exception as e:
+        print(f"Erro ao ler o arquivo {caminho}: {e}")
+        return tarefa, None, 0
+    if "sigla_tribunal" not in df.columns:
+        print(f"ALERTA: Coluna 'sigla_tribunal' não encontrada em {caminho}.")
+        return tarefa, None, len(df)
+    return tarefa, somar_por_tribunal(df, COLUNAS_METAS), len(df)
+
+
+def _somar_bytes(caminho, dados, encoding):
+    """Como `somar_tarefa`, para os bytes de um arquivo já lidos (backend pipeline)."""
+    try:
+        df = ler_csv_tipado(io.BytesIO(dados), COLUNAS_METAS, COLUNAS_CATEGORICAS, encoding=encoding)
+    except pd.errors.EmptyDataError:
+        return None, 0
+    if "sigla_tribunal" not in df.columns:
+        print(f"ALERTA: Coluna 'sigla_tribunal' não encontrada em {caminho}.")
+        return None, len(df)
+    return somar_por_tribunal(df, COLUNAS_METAS), len(df)
+
+
+# --- Backends: cada um produz (tarefa, somas, linhas) ---
+
+def _executar_serial(tarefas, somar, trabalhadores):
+    return map(somar, tarefas)
+
+
+def _executar_threads(tarefas, somar, trabalhadores):
+    with ThreadPoolExecutor(max_workers=trabalhadores, thread_name_prefix="execucao") as executor:
+        yield from executor.map(somar, tarefas)
+
+
+def _executar_processos(tarefas, somar, trabalhadores):
+    # Da maior para a menor e uma a uma (chunksize=1): quem termina pega a próxima
+    with Pool(trabalhadores) as pool:
+        yield from pool.imap_unordered(somar, tarefas, chunksize=1)
+
+
+def _executar_pipeline(tarefas, encoding, limite_bytes):
+    with LeitorAntecipado([caminho for caminho, _ in tarefas], limite_bytes, LIMITE_ARQUIVOS_PADRAO) as leitor:
+        for caminho, dados, erro in leitor:
+            if erro is not None:
+                print(f"Erro ao ler o arquivo {caminho}: {erro}")
+                yield (caminho, None), None, 0
+                continue
+            try:
+                somas, linhas = _somar_bytes(caminho, dados, encoding)
+            except Exception as e:
+                print(f"Erro ao ler o arquivo {caminho}: {e}")
+                somas, linhas = None, 0
+            yield (caminho, None), somas, linhas
+
+
+def planejar(arquivos, backend, tamanho_tarefa=TAMANHO_INTERVALO):
+    """Tarefas (caminho, intervalo) do backend, da maior para a menor, e a ordem original de cada uma."""
+    if backend == "blocos":
+        plano = planejar_tarefas(arquivos, tamanho_tarefa)
+    else:
+        # Um arquivo por tarefa; os vazios também entram, para que os erros sejam informados
+        ordem = sorted(range(len(arquivos)), key=lambda i: tamanho_descompactado(arquivos[i]), reverse=True)
+        plano = [(i, arquivos[i], None) for i in ordem]
+    tarefas = [(caminho, intervalo) for _, caminho, intervalo in plano]
+    indices = {tarefa: indice for (indice, _, _), tarefa in zip(plano, tarefas)}
+    return tarefas, indices
+
+
+def somar_arquivos(arquivos, backend, trabalhadores=1, encoding="utf-8", tamanho_tarefa=TAMANHO_INTERVALO,
+                   limite_bytes=LIMITE_BYTES_PADRAO, intervalo_progresso=2.0, emitir=print):
+    """
+    Somas por tribunal de todos os `arquivos` com o `backend` escolhido. A junção segue a
+    ordem original das tarefas (arquivo e offset), então o resultado não depende do
+    backend nem da ordem em que as tarefas terminam. Retorna (somas, linhas lidas).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend desconhecido: {backend} (opções: {', '.join(BACKENDS)}, auto)")
+    tarefas, indices = planejar(arquivos, backend, tamanho_tarefa)
+    somar = functools.partial(somar_tarefa, encoding=encoding)
+    if backend == "pipeline":
+        resultados = _executar_pipeline(tarefas, encoding, limite_bytes)
+    else:
+        executar = {"serial": _executar_serial, "threads": _executar_threads,
+                    "processos": _executar_processos, "blocos": _executar_processos}[backend]
+        resultados = executar(tarefas, somar, trabalhadores)
+
+    parciais = {}
+    linhas = 0
+    progresso = Progresso(len(tarefas), "Tarefas concluídas", intervalo_progresso, emitir=emitir)
+    for tarefa, somas, linhas_tarefa in resultados:
+        linhas += linhas_tarefa
+        if somas is not None and len(somas):
+            parciais[indices[tarefa]] = somas
+        progresso.avancar(linhas=linhas_tarefa, detalhe=os.path.basename(tarefa[0]))
+    if not parciais:
+        return pd.DataFrame(), linhas
+    ordenadas = [parciais[indice] for indice in sorted(parciais)]
+    return somar_por_tribunal(pd.concat(ordenadas, ignore_index=True), COLUNAS_METAS), linhas
+
+
+def escrever_resumo(df_metas, caminho, separador=";"):
+    """ResumoMetas com as metas arredondadas e 'NA' onde não se aplicam (temporário + substituição)."""
+    resumo = df_metas.round(2).fillna("NA")
+    resumo.to_csv(caminho + ".tmp", sep=separador, index=False, encoding="utf-8")
+    os.replace(caminho + ".tmp", caminho)
+    print(f"Resumo das metas salvo em {caminho}")
+
+
+def executar(entrada, saida, backend="auto", trabalhadores=None, encoding="utf-8", separador=";",
+             tamanho_tarefa=TAMANHO_INTERVALO, graficos=False, limite_memoria=None, instrumentar=False,
+             grafico_meta1=False):
+    """
+    Executa o ETL completo e retorna o plano usado (PlanoExecucao) e os tempos. `graficos`
+    gera todos os gráficos; `grafico_meta1`, só o da Meta 1 (o único das versões NP e P).
+    """
+    inicio = time.perf_counter()
+    instrumentacao = Instrumentacao(ativa=instrumentar)
+    os.makedirs(saida, exist_ok=True)
+    arquivos = listar_csvs(entrada)
+    print(f"Arquivos encontrados em {entrada}: {len(arquivos)}")
+
+    plano = escolher_backend(arquivos, tamanho_tarefa=tamanho_tarefa)
+    if backend != "auto":
+        paralelo = backend in BACKENDS_PARALELOS
+        plano = PlanoExecucao(backend, (os.cpu_count() or 1) if paralelo else 1, "escolhido na linha de comando")
+    if trabalhadores and plano.backend in BACKENDS_PARALELOS:
+        plano = plano._replace(trabalhadores=trabalhadores)
+    limite_bytes = LIMITE_BYTES_PADRAO
+    if limite_memoria:
+        # Com orçamento: menos bytes por tarefa e, se ainda não couber, menos trabalhadores
+        orcamento = OrcamentoMemoria(limite_memoria)
+        processos, tamanho_tarefa, _ = orcamento.planejar_pool(plano.trabalhadores, tamanho_tarefa)
+        limite_bytes, _ = orcamento.leitura_antecipada(limite_bytes, LIMITE_ARQUIVOS_PADRAO)
+        plano = plano._replace(trabalhadores=processos)
+        print(f"Orçamento de memória: {orcamento.descrever()}")
+    print(f"Backend: {plano.backend} com {plano.trabalhadores} trabalhador(es) ({plano.motivo}).")
+
+    with instrumentacao.etapa("extrair", backend=plano.backend, trabalhadores=plano.trabalhadores) as medida:
+        somas, linhas = somar_arquivos(arquivos, plano.backend, plano.trabalhadores, encoding, tamanho_tarefa,
+                                       limite_bytes)
+        medida["linhas"] = linhas
+    if somas.empty:
+        print("Nenhum dado para processar.")
+        return plano, {"etl": time.perf_counter() - inicio}
+
+    with instrumentacao.etapa("calcular_metas"):
+        metas = calcular_metas(somas)
+    tempo_etl = time.perf_counter() - inicio
+    print(f"Metas calculadas para {len(metas)} tribunais ({linhas} linhas) em {tempo_etl:.2f} segundos.")
+
+    # Resumo e gráficos fora do caminho crítico (comum/saidas.py)
+    with EstagioSaidas(1 if limite_memoria else None, instrumentacao=instrumentacao) as saidas:
+        saidas.escrever("resumo", escrever_resumo, metas, os.path.join(saida, "ResumoMetas.csv"), separador)
+        if graficos or grafico_meta1:
+            tarefas = [grafico_media_por_ramo(metas, "Meta1", os.path.join(saida, "grafico_meta1.png"))]
+            if graficos:
+                diretorio_graficos = os.path.join(saida, "graficos")
+                tarefas += graficos_por_meta(metas, diretorio_graficos) + graficos_por_ramo(metas, diretorio_graficos)
+            saidas.desenhar(tarefas)
+        tempos_saidas = saidas.aguardar()
+        print(f"Saídas concluídas: {saidas.descrever(tempos_saidas)}.")
+    if instrumentar:
+        instrumentacao.imprimir_resumo()
+    tempo_total = time.perf_counter() - inicio
+    print(f"Tempo total: {tempo_total:.2f} segundos (ETL {tempo_etl:.2f}s).")
+    return plano, {"etl": tempo_etl, "total": tempo_total}
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Cálculo das metas dos tribunais com backend de execução selecionável")
+    parser.add_argument("--entrada", default=os.path.join(RAIZ_PROJETO, "Dados"), help="Diretório com os CSVs")
+    parser.add_argument("--saida", default=os.path.join(RAIZ_PROJETO, "results"), help="Diretório das saídas")
+    parser.add_argument("--backend", choices=("auto",) + BACKENDS, default="auto")
+    parser.add_argument("--trabalhadores", type=int, default=None,
+                        help="Threads/processos (padrão: escolhido pelo modo auto)")
+    parser.add_argument("--encoding", default="utf-8", help="Codificação dos CSVs de origem")
+    parser.add_argument("--separador", default=";", help="Separador do ResumoMetas.csv")
+    parser.add_argument("--tamanho-tarefa", type=interpretar_tamanho, default=TAMANHO_INTERVALO,
+                        help="Bytes por tarefa no backend blocos (ex.: 4MB)")
+    parser.add_argument("--graficos", action="store_true", help="Gera os gráficos (Meta 1, por meta e por ramo)")
+    parser.add_argument("--grafico-meta1", action="store_true", help="Gera só o gráfico da Meta 1")
+    parser.add_argument("--max-memory", type=interpretar_tamanho, default=None,
+                        help="Orçamento de memória (ex.: 2GB): trabalhadores e tamanho das tarefas se ajustam a ele")
+    parser.add_argument("--instrumentar", action="store_true", help="Mostra o tempo de cada etapa")
+    parser.add_argument("--mostrar-plano", action="store_true", help="Só mostra o backend que o modo auto escolheria")
+    args = parser.parse_args(argumentos)
+
+    if args.mostrar_plano:
+        plano = escolher_backend(listar_csvs(args.entrada), tamanho_tarefa=args.tamanho_tarefa)
+        print(f"{plano.backend} com {plano.trabalhadores} trabalhador(es): {plano.motivo}")
+        return
+    executar(args.entrada, args.saida, args.backend, args.trabalhadores, args.encoding, args.separador,
+             args.tamanho_tarefa, args.graficos, args.max_memory, args.instrumentar, args.grafico_meta1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Gráficos das metas, desenhados fora do processo do ETL (ver comum/saidas.py).
+
+Cada gráfico é descrito por um dicionário pequeno (tipo, título, rótulos, valores e
+caminho de destino), montado a partir do resumo das metas no processo principal. Só a
+descrição vai para o processo que desenha: ele não precisa do DataFrame nem da
+configuração do script, o que também funciona com o método spawn (macOS, Windows).
+
+* `graficos_por_meta`: uma barra por tribunal para cada meta (tribunais onde ela se aplica);
+* `graficos_por_ramo`: um mapa de calor tribunal x meta para cada ramo de justiça;
+* `grafico_media_por_ramo`: a média de uma meta por ramo (o gráfico da Meta 1 da versão NP).
+
+`desenhar` usa o backend Agg (sem interface gráfica) e grava em um temporário antes de
+substituir o arquivo, então quem abre a imagem nunca a vê pela metade.
+"""
+
+import os
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from comum.metas import NOMES_METAS
+
+BACKEND = "Agg"
+
+
+def nome_de_arquivo(texto):
+    """Trecho de nome de arquivo a partir de um rótulo (ex.: 'Justiça do Trabalho' -> 'justica_do_trabalho')."""
+    ascii_ = unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "_", ascii_.lower()).strip("_") or "sem_nome"
+
+
+def _metas_presentes(df, metas):
+    return [meta for meta in (NOMES_METAS if metas is None else metas) if meta in df.columns]
+
+
+def graficos_por_meta(df_resultados, diretorio, metas=None):
+    """Descrições dos gráficos de cada meta: cumprimento por tribunal, do maior para o menor."""
+    graficos = []
+    for meta in _metas_presentes(df_resultados, metas):
+        valores = df_resultados[["sigla_tribunal", meta]].dropna().sort_values(meta, ascending=False)
+        if valores.empty:
+            continue
+        graficos.append({
+            "tipo": "barras",
+            "titulo": f"Cumprimento da {meta} por Tribunal",
+            "rotulos": valores["sigla_tribunal"].astype(str).tolist(),
+            "valores": valores[meta].astype(float).tolist(),
+            "eixo_x": "Tribunal",
+            "eixo_y": f"Cumprimento da {meta} (%)",
+            "caminho": os.path.join(diretorio, f"meta_{nome_de_arquivo(meta)}.png"),
+        })
+    return graficos
+
+
+def graficos_por_ramo(df_resultados, diretorio, metas=None):
+    """Descrições dos mapas de calor de cada ramo: tribunais do ramo x metas que se aplicam a ele."""
+    graficos = []
+    metas = _metas_presentes(df_resultados, metas)
+    if "ramo_justica" not in df_resultados.columns or not metas:
+        return graficos
+    for ramo, grupo in df_resultados.groupby("ramo_justica", sort=True):
+        grupo = grupo.sort_values("sigla_tribunal")
+        aplicaveis = [meta for meta in metas if grupo[meta].notna().any()]
+        if not aplicaveis:
+            continue
+        graficos.append({
+            "tipo": "mapa",
+            "titulo": f"Cumprimento das Metas - {ramo}",
+            "rotulos": grupo["sigla_tribunal"].astype(str).tolist(),
+            "colunas": aplicaveis,
+            # NaN (meta sem dados no tribunal) vira None para a descrição continuar simples
+            "valores": [[None if pd.isna(v) else float(v) for v in linha]
+                        for linha in grupo[aplicaveis].to_numpy(dtype=np.float64, na_value=np.nan)],
+            "caminho": os.path.join(diretorio, f"ramo_{nome_de_arquivo(ramo)}.png"),
+        })
+    return graficos
+
+
+def grafico_media_por_ramo(df_resultados, meta, caminho):
+    """Descrição do gráfico da média de `meta` por ramo (ignorando NA e 0); None sem dados."""
+    if df_resultados.empty or meta not in df_resultados.columns or "ramo_justica" not in df_resultados.columns:
+        return None
+    validos = df_resultados.dropna(subset=[meta])
+    # 0 indica meta não calculada (divisão por zero)
+    validos = validos[validos[meta] != 0]
+    if validos.empty:
+        return None
+    medias = validos.groupby("ramo_justica")[meta].mean().sort_values()
+    return {
+        "tipo": "barras_horizontais",
+        "titulo": f"Desempenho Médio da {meta.replace('Meta', 'Meta ')} por Ramo da Justiça",
+        "rotulos": [str(ramo) for ramo in medias.index],
+        "valores": medias.astype(float).tolist(),
+        "eixo_x": f"Cumprimento Médio da {meta.replace('Meta', 'Meta ')} (%)",
+        "eixo_y": "Ramo da Justiça",
+        "caminho": caminho,
+    }
+
+
+def usar_backend_sem_tela():
+    """Seleciona o backend Agg (initializer dos processos que desenham)."""
+    import matplotlib
+    matplotlib.use(BACKEND, force=True)
+
+
+def desenhar(grafico):
+    """Desenha e grava um gráfico descrito por `graficos_por_*`; retorna o caminho gravado."""
+    usar_backend_sem_tela()
+    import matplotlib.pyplot as plt
+
+    tipo = grafico["tipo"]
+    rotulos = grafico["rotulos"]
+    if tipo == "barras":
+        figura, eixo = plt.subplots(figsize=(max(8, 0.3 * len(rotulos) + 2), 7))
+        eixo.bar(rotulos, grafico["valores"], color="steelblue")
+        eixo.set_xlabel(grafico["eixo_x"])
+        eixo.set_ylabel(grafico["eixo_y"])
+        eixo.tick_params(axis="x", labelrotation=90)
+        eixo.axhline(100, color="gray", linestyle="--", linewidth=0.8) # 100% = meta cumprida
+    elif tipo == "barras_horizontais":
+        figura, eixo = plt.subplots(figsize=(12, 7))
+        barras = eixo.barh(rotulos, grafico["valores"], color="skyblue")
+        eixo.set_xlabel(grafico["eixo_x"])
+        eixo.set_ylabel(grafico["eixo_y"])
+        eixo.grid(axis="x", linestyle="--", alpha=0.7)
+        for barra in barras:
+            eixo.text(barra.get_width() + 1, barra.get_y() + barra.get_height() / 2, f"{barra.get_width():.1f}%",
+                      va="center", ha="left", fontsize=9)
+    elif tipo == "mapa":
+        colunas = grafico["colunas"]
+        valores = np.array([[np.nan if v is None else v for v in linha] for linha in grafico["valores"]], dtype=float)
+        figura, eixo = plt.subplots(figsize=(max(6, 0.9 * len(colunas) + 3), max(3, 0.35 * len(rotulos) + 2)))
+        # Escala centrada em 100%: abaixo em vermelho, acima em verde
+        imagem = eixo.imshow(np.ma.masked_invalid(valores), cmap="RdYlGn", vmin=0, vmax=200, aspect="auto")
+        eixo.set_xticks(range(len(colunas)), colunas, rotation=45, ha="right")
+        eixo.set_yticks(range(len(rotulos)), rotulos)
+        for i, linha in enumerate(valores):
+            for j, valor in enumerate(linha):
+                if not np.isnan(valor):
+                    eixo.text(j, i, f"{valor:.0f}", ha="center", va="center", fontsize=7)
+        figura.colorbar(imagem, ax=eixo, label="Cumprimento (%)")
+    else:
+        raise ValueError(f"Tipo de gráfico desconhecido: {tipo}")
+    eixo.set_title(grafico["titulo"])
+    figura.tight_layout()
+
+    caminho = grafico["caminho"]
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    # Temporário com a mesma extensão: o formato da imagem sai do nome do arquivo
+    base, extensao = os.path.splitext(caminho)
+    temporario = f"{base}.tmp{os.getpid()}{extensao}"
+    try:
+        figura.savefig(temporario)
+        os.replace(temporario, caminho)
+    finally:
+        plt.close(figura)
+        if os.path.exists(temporario):
+            os.remove(temporario)
+    return caminho
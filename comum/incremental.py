@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Estado persistente para recomputação incremental das metas.
+
+Para cada arquivo de origem são guardadas as somas parciais por tribunal (uma linha por
+(sigla_tribunal, ramo_justica) e uma coluna por coluna numérica das metas). A cada
+execução só os arquivos novos ou alterados são relidos; os removidos têm a contribuição
+descartada. O total é refeito somando as parciais, que têm poucas linhas por arquivo,
+então o custo de uma atualização é dominado pelo tamanho dos arquivos que mudaram.
+
+Layout do diretório de estado:
+
+* `indice.json`: colunas usadas e, por arquivo, a impressão digital e o nome da parcial;
+* `parciais/<id>.npz`: siglas, ramos e a matriz de somas de cada arquivo.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from comum.cache import impressao_digital, mesma_origem
+from comum.metas import somar_por_tribunal
+
+ARQUIVO_INDICE = "indice.json"
+DIRETORIO_PARCIAIS = "parciais"
+VERSAO_ESTADO = 2 # 2: somas com as colunas canônicas resolvidas por comum/esquemas.py
+
+
+class EstadoIncremental:
+    """Somas parciais por arquivo e por tribunal, persistidas entre execuções."""
+
+    def __init__(self, diretorio, colunas):
+        self.diretorio = diretorio
+        self.colunas = list(colunas)
+        os.makedirs(os.path.join(self.diretorio, DIRETORIO_PARCIAIS), exist_ok=True)
+        self.arquivos = {}
+        indice = self._ler_indice()
+        # Mudou a versão do formato ou o conjunto de colunas: o estado antigo não serve mais
+        if indice is not None and indice.get("versao") == VERSAO_ESTADO and indice.get("colunas") == self.colunas:
+            self.arquivos = indice["arquivos"]
+
+    def _ler_indice(self):
+        try:
+            with open(os.path.join(self.diretorio, ARQUIVO_INDICE), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _caminho_parcial(self, nome):
+        return os.path.join(self.diretorio, DIRETORIO_PARCIAIS, nome)
+
+    def pendentes(self, arquivos):
+        """
+        Compara `arquivos` com o estado gravado. Retorna (a_processar, removidos), onde
+        `a_processar` mapeia cada arquivo novo/alterado para a impressão digital lida agora.
+        """
+        a_processar = {}
+        atuais = set()
+        for caminho in arquivos:
+            absoluto = os.path.abspath(caminho)
+            atuais.add(absoluto)
+            registro = self.arquivos.get(absoluto)
+            if registro is not None and mesma_origem(registro["origem"], caminho):
+                continue
+            a_processar[caminho] = impressao_digital(caminho)
+        removidos = [caminho for caminho in self.arquivos if caminho not in atuais]
+        return a_processar, removidos
+
+    def atualizar(self, caminho, somas, digital):
+        """Substitui a contribuição de `caminho` pelas `somas` (saída de somar_por_tribunal)."""
+        absoluto = os.path.abspath(caminho)
+        nome = hashlib.sha1(absoluto.encode("utf-8")).hexdigest()[:20] + ".npz"
+        if somas is None:
+            somas = pd.DataFrame(columns=["sigla_tribunal", "ramo_justica"])
+        valores = somas.reindex(columns=self.colunas).fillna(0).to_numpy(dtype=np.float64)
+        temporario = self._caminho_parcial(nome + ".tmp.npz")
+        np.savez(
+            temporario,
+            siglas=somas["sigla_tribunal"].astype(str).to_numpy(dtype=str),
+            ramos=somas["ramo_justica"].astype(object).fillna("").astype(str).to_numpy(dtype=str),
+            valores=valores,
+        )
+        os.replace(temporario, self._caminho_parcial(nome))
+        self.arquivos[absoluto] = {"origem": digital, "parcial": nome}
+
+    def remover(self, caminho):
+        """Descarta a contribuição de um arquivo que saiu do diretório de entrada."""
+        registro = self.arquivos.pop(os.path.abspath(caminho), None)
+        if registro is not None:
+            try:
+                os.remove(self._caminho_parcial(registro["parcial"]))
+            except OSError:
+                pass
+
+    def salvar(self):
+        """Grava o índice de forma atômica."""
+        caminho = os.path.join(self.diretorio, ARQUIVO_INDICE)
+        with open(caminho + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"versao": VERSAO_ESTADO, "colunas": self.colunas, "arquivos": self.arquivos}, f, ensure_ascii=False)
+        os.replace(caminho + ".tmp", caminho)
+
+    def sincronizar(self, arquivos, calcular_somas, mapear=map):
+        """
+        Atualiza o estado para o conjunto `arquivos`. `calcular_somas(caminho)` deve retornar
+        as somas por tribunal do arquivo (ou None em caso de erro, e o arquivo é tentado de
+        novo na próxima execução). `mapear` permite usar, por exemplo, `pool.map`.
+        Retorna um resumo com os arquivos processados e removidos.
+        """
+        a_processar, removidos = self.pendentes(arquivos)
+        # Maiores primeiro, para que o arquivo mais lento não fique para o fim
+        caminhos = sorted(a_processar, key=lambda c: a_processar[c]["tamanho"], reverse=True)
+        falhas = []
+        for caminho, somas in zip(caminhos, mapear(calcular_somas, caminhos)):
+            if somas is None:
+                falhas.append(caminho)
+                continue
+            self.atualizar(caminho, somas, a_processar[caminho])
+        for caminho in removidos:
+            self.remover(caminho)
+        self.salvar()
+        return {
+            "processados": [c for c in caminhos if c not in falhas],
+            "falhas": falhas,
+            "removidos": removidos,
+            "inalterados": len(arquivos) - len(caminhos),
+        }
+
+    def ler_parcial(self, caminho):
+        """Somas gravadas de `caminho` (None se o arquivo não estiver no estado)."""
+        registro = self.arquivos.get(os.path.abspath(caminho))
+        if registro is None:
+            return None
+        with np.load(self._caminho_parcial(registro["parcial"])) as dados:
+            parte = pd.DataFrame(dados["valores"], columns=self.colunas)
+            parte.insert(0, "ramo_justica", pd.Series(dados["ramos"]).replace("", np.nan))
+            parte.insert(0, "sigla_tribunal", dados["siglas"])
+        return parte
+
+    def somas_totais(self, arquivos=None):
+        """Junta as parciais (na ordem de `arquivos`, se informada) em uma linha por tribunal."""
+        ordem = arquivos if arquivos is not None else list(self.arquivos)
+        partes = [parte for parte in map(self.ler_parcial, ordem) if parte is not None and len(parte)]
+        if not partes:
+            return pd.DataFrame(columns=["sigla_tribunal", "ramo_justica", *self.colunas])
+        return somar_por_tribunal(pd.concat(partes, ignore_index=True), self.colunas)
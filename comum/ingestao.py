@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Leitura e conversão dos CSVs dos tribunais, compartilhada pelas versões NP e P.
+
+Além da leitura com as colunas numéricas em float (`ler_csv_numerico`), há uma leitura
+tipada com esquema conhecido (`ler_csv_tipado`): só as colunas-chave e as das metas,
+chaves como categóricas e contagens no menor tipo inteiro que comporta os valores.
+
+A conversão de texto para número das colunas das metas usa o tokenizador vetorizado de
+comum/tokenizador.py, sem uma string Python intermediária por célula.
+
+As duas leituras resolvem o leiaute pelo cabeçalho (comum/esquemas.py): pedem as colunas
+de origem do plano do arquivo e devolvem as colunas canônicas das metas.
+"""
+
+import io
+
+import numpy as np
+import pandas as pd
+
+from comum.compactados import abrir, compressao, ler_bytes
+from comum.esquemas import REGISTRO, ler_cabecalho
+from comum.tokenizador import converter_campos, ler_csv_bytes
+
+# Colunas de identificação mantidas junto com as colunas numéricas
+COLUNAS_CHAVE = ['sigla_tribunal', 'ramo_justica']
+
+# Colunas de baixa cardinalidade lidas como categóricas na leitura tipada
+COLUNAS_CATEGORICAS = ['sigla_tribunal', 'ramo_justica', 'sigla_grau', 'uf_oj']
+
+# Política para contagens ausentes na leitura tipada:
+# "zero" -> ausente vale 0 (como o fillna(0) da NP), tipos inteiros do NumPy;
+# "nulo" -> ausente continua <NA>, tipos inteiros anuláveis do pandas (UInt8, Int16, ...)
+POLITICAS_AUSENTES = ("zero", "nulo")
+
+
+def converter_colunas_numericas(df, colunas):
+    """Converte as colunas indicadas para numérico (in-place), trocando vírgula decimal por ponto."""
+    for coluna in colunas:
+        if pd.api.types.is_numeric_dtype(df[coluna]):
+            # Já numérica: a conversão só garante o tipo correto
+            df[coluna] = pd.to_numeric(df[coluna], errors='coerce')
+        else:
+            # Texto: strip + vírgula decimal + to_numeric em uma passada sobre os bytes
+            df[coluna] = pd.Series(converter_campos(df[coluna].to_numpy(dtype=object)), index=df.index)
+    return df
+
+
+def ler_intervalo(caminho, intervalo):
+    """Retorna o cabeçalho do arquivo seguido dos bytes [inicio, fim), como um buffer para read_csv."""
+    inicio, fim = intervalo
+    with open(caminho, "rb") as f:
+        cabecalho = f.readline()
+        f.seek(inicio)
+        corpo = f.read(fim - inicio)
+    return io.BytesIO(cabecalho + corpo)
+
+
+def ler_csv_numerico(caminho, colunas_numericas, colunas_chave=COLUNAS_CHAVE, encoding="latin1", intervalo=None):
+    """
+    Lê apenas as colunas-chave e as numéricas de um CSV, já convertidas para float.
+    Com `intervalo` = (inicio, fim), lê só essas linhas (offsets alinhados em fim de linha).
+
+    Arquivos sem aspas e com linhas regulares são lidos direto dos bytes (`ler_csv_bytes`,
+    chaves como `category`); os demais passam pelo `read_csv`.
+    """
+    if intervalo is not None:
+        conteudo = ler_intervalo(caminho, intervalo).getvalue()
+    else:
+        conteudo = ler_bytes(caminho) # Descompactado na leitura (.csv.gz, .csv.zst, .zip)
+    plano = REGISTRO.plano(ler_cabecalho(conteudo, encoding), colunas_numericas)
+    df = ler_csv_bytes(conteudo, plano.leitura, colunas_chave, encoding)
+    if df is not None:
+        return plano.aplicar(df, origem=caminho)
+
+    desejadas = set(plano.leitura) | set(colunas_chave)
+    df = pd.read_csv(
+        io.BytesIO(conteudo),
+        sep=",",
+        encoding=encoding,
+        dtype=str,
+        usecols=lambda coluna: coluna in desejadas
+    )
+    converter_colunas_numericas(df, [col for col in plano.leitura if col in df.columns])
+    return plano.aplicar(df, origem=caminho)
+
+
+def tipo_inteiro_minimo(minimo, maximo, anulavel=False):
+    """Menor tipo inteiro (sem sinal, se possível) que comporta o intervalo [minimo, maximo]."""
+    candidatos = (np.uint8, np.uint16, np.uint32, np.uint64) if minimo >= 0 else (np.int8, np.int16, np.int32, np.int64)
+    for tipo in candidatos:
+        limites = np.iinfo(tipo)
+        if limites.min <= minimo and maximo <= limites.max:
+            nome = np.dtype(tipo).name
+            if anulavel:
+                return pd.api.types.pandas_dtype(nome.replace("uint", "UInt") if nome.startswith("u") else nome.replace("int", "Int"))
+            return np.dtype(tipo)
+    return None
+
+
+def reduzir_inteiros(df, colunas, ausentes="zero"):
+    """
+    Converte (in-place) as colunas numéricas de valores inteiros para o menor tipo inteiro
+    possível, seguindo a política de `ausentes`. Colunas com valores não inteiros ficam em
+    float64 (com ausentes zerados na política "zero").
+    """
+    if ausentes not in POLITICAS_AUSENTES:
+        raise ValueError(f"Política de ausentes desconhecida: {ausentes} (opções: {', '.join(POLITICAS_AUSENTES)})")
+    for coluna in colunas:
+        valores = df[coluna].to_numpy(dtype=np.float64, na_value=np.nan)
+        ausente = np.isnan(valores)
+        presentes = valores[~ausente]
+        tipo = None
+        if np.isfinite(presentes).all() and np.array_equal(presentes, np.trunc(presentes)):
+            minimo = presentes.min() if presentes.size else 0
+            maximo = presentes.max() if presentes.size else 0
+            if ausentes == "zero" and ausente.any():
+                minimo, maximo = min(minimo, 0), max(maximo, 0)
+            tipo = tipo_inteiro_minimo(minimo, maximo, anulavel=ausentes == "nulo")
+        if ausentes == "zero":
+            valores = np.where(ausente, 0.0, valores)
+            df[coluna] = valores if tipo is None else valores.astype(tipo)
+        elif tipo is not None:
+            df[coluna] = pd.Series(valores, index=df.index).astype(tipo)
+    return df
+
+
+def ler_csv_tipado(caminho, colunas_numericas, colunas_categoricas=COLUNAS_CATEGORICAS, encoding="latin1",
+                   intervalo=None, ausentes="zero"):
+    """
+    Lê só as colunas categóricas e as numéricas de um CSV, com esquema conhecido: as
+    categóricas como `category` e as contagens no menor tipo inteiro (ver `reduzir_inteiros`).
+    Colunas de texto livre (nome, procedimento...) não são carregadas.
+    `caminho` também pode ser um buffer binário (ex.: io.BytesIO), sem `intervalo`.
+    Arquivos compactados (comum/compactados.py) são descompactados em fluxo para o parser.
+    """
+    if ausentes not in POLITICAS_AUSENTES:
+        raise ValueError(f"Política de ausentes desconhecida: {ausentes} (opções: {', '.join(POLITICAS_AUSENTES)})")
+    plano = REGISTRO.plano(ler_cabecalho(caminho, encoding), colunas_numericas)
+    desejadas = set(plano.leitura) | set(colunas_categoricas)
+    # Lidas como texto e convertidas depois: com dtype "category" o parser infere o tipo
+    # das categorias por bloco, e colunas como mes_cnm1 misturam inteiros e texto
+    categoricas = {coluna: str for coluna in colunas_categoricas}
+
+    def ler(tipos_numericos):
+        if hasattr(caminho, "seek"):
+            caminho.seek(0) # Buffer em memória (ex.: bytes lidos antecipadamente): relido no fallback
+            origem = caminho
+        elif intervalo is not None:
+            origem = ler_intervalo(caminho, intervalo)
+        elif compressao(caminho) is not None:
+            origem = abrir(caminho) # Sem cópia descompactada: o parser lê o fluxo em blocos
+        else:
+            origem = caminho
+        try:
+            return pd.read_csv(
+                origem,
+                sep=",",
+                encoding=encoding,
+                dtype={**categoricas, **{coluna: tipos_numericos for coluna in plano.leitura}},
+                usecols=lambda coluna: coluna in desejadas
+            )
+        finally:
+            if origem is not caminho:
+                origem.close()
+
+    try:
+        # Caminho rápido: o parser em C já converte as contagens
+        df = ler("float64")
+    except pd.errors.EmptyDataError:
+        raise
+    except ValueError:
+        # Algum valor fora do formato numérico (ex.: vírgula decimal): lê como texto e converte
+        df = ler(str)
+        converter_colunas_numericas(df, [col for col in plano.leitura if col in df.columns])
+    for coluna in colunas_categoricas:
+        if coluna in df.columns:
+            df[coluna] = df[coluna].astype("category")
+    df = plano.aplicar(df, origem=None if hasattr(caminho, "seek") else caminho)
+    reduzir_inteiros(df, plano.colunas, ausentes)
+    return df
+
+
+def concatenar_tipados(dfs, ausentes="zero"):
+    """
+    Concatena DataFrames da leitura tipada sem perder os tipos compactos: as categóricas
+    passam a ter a união (ordenada) das categorias e colunas numéricas ausentes em um
+    arquivo entram como 0 (ou <NA>, na política "nulo") em vez de virar float com NaN.
+    """
+    colunas = list(dict.fromkeys(coluna for df in dfs for coluna in df.columns))
+    categorias = {}
+    for df in dfs:
+        for coluna in df.columns:
+            if isinstance(df[coluna].dtype, pd.CategoricalDtype):
+                categorias.setdefault(coluna, set()).update(df[coluna].cat.categories)
+    categorias = {coluna: sorted(valores) for coluna, valores in categorias.items()}
+
+    ajustados = []
+    for df in dfs:
+        dados = {}
+        for coluna in colunas:
+            if coluna in categorias:
+                if coluna in df.columns:
+                    dados[coluna] = df[coluna].cat.set_categories(categorias[coluna])
+                else:
+                    dados[coluna] = pd.Categorical([np.nan] * len(df), categories=categorias[coluna])
+            elif coluna in df.columns:
+                dados[coluna] = df[coluna]
+            elif ausentes == "zero":
+                dados[coluna] = np.zeros(len(df), dtype=np.uint8)
+            else:
+                dados[coluna] = pd.array([pd.NA] * len(df), dtype="UInt8")
+        ajustados.append(pd.DataFrame(dados, index=df.index))
+    return pd.concat(ajustados, ignore_index=True)
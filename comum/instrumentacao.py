@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentação das etapas do ETL: tempos, volumes, memória e perfis sob demanda.
+
+Cada etapa é medida com `Instrumentacao.etapa(nome, **atributos)`, um context manager
+que registra início, duração, processo, thread, pico de RSS e os atributos informados
+(ex.: `linhas`, `bytes`, `arquivo`), que podem ser completados dentro do bloco:
+
+    with instrumentacao.etapa("ler_arquivo", arquivo=caminho) as medida:
+        df = ...
+        medida["linhas"] = len(df)
+
+Os eventos podem ser exportados em JSON lines ou no formato de trace do Chrome
+(chrome://tracing / Perfetto). Eventos de processos filhos são devolvidos ao processo
+principal com `coletar()` e juntados com `incorporar()`.
+
+Uma etapa pode ser perfilada com cProfile (padrão, arquivo .prof) ou pyinstrument
+(opcional, relatório .html). `Progresso` substitui os prints por arquivo nos laços
+internos por mensagens amostradas no tempo.
+"""
+
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+PERFILADORES = ("cprofile", "pyinstrument")
+
+
+def pico_rss_mb(quem=None):
+    """Pico de RSS (MB) do processo atual (ou dos filhos já finalizados); None sem `resource`."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF if quem is None else quem).ru_maxrss
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    return pico / (1 << 20) if sys.platform == "darwin" else pico / 1024
+
+
+class Instrumentacao:
+    """
+    Registro de eventos por etapa. Desativada, `etapa()` só repassa os atributos e não
+    mede nada.
+
+    `etapas_perfiladas` é um conjunto de nomes de etapa que rodam sob o perfilador;
+    os perfis são gravados em `diretorio_perfis`.
+    """
+
+    def __init__(self, ativa=True, etapas_perfiladas=(), perfilador="cprofile", diretorio_perfis="."):
+        self.eventos = []
+        self._trava = threading.Lock()
+        self.configurar(ativa, etapas_perfiladas, perfilador, diretorio_perfis)
+
+    def configurar(self, ativa=True, etapas_perfiladas=(), perfilador="cprofile", diretorio_perfis="."):
+        if perfilador not in PERFILADORES:
+            raise ValueError(f"Perfilador desconhecido: {perfilador} (opções: {', '.join(PERFILADORES)})")
+        self.ativa = ativa
+        self.etapas_perfiladas = set(etapas_perfiladas or ())
+        self.perfilador = perfilador
+        self.diretorio_perfis = diretorio_perfis
+
+    def configuracao(self):
+        """Argumentos de `configurar`, para repassar a processos filhos (ex.: initializer do Pool)."""
+        return self.ativa, tuple(self.etapas_perfiladas), self.perfilador, self.diretorio_perfis
+
+    def _iniciar_perfil(self, nome):
+        if nome not in self.etapas_perfiladas:
+            return None
+        if self.perfilador == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                print("pyinstrument não está instalado; usando cProfile.")
+            else:
+                perfil = Profiler()
+                perfil.start()
+                return perfil
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError:
+            return None # Outro perfilador já ativo (etapas perfiladas aninhadas)
+        return perfil
+
+    def _gravar_perfil(self, nome, perfil):
+        os.makedirs(self.diretorio_perfis, exist_ok=True)
+        base = os.path.join(self.diretorio_perfis, f"perfil_{nome}_{os.getpid()}")
+        if isinstance(perfil, cProfile.Profile):
+            perfil.disable()
+            perfil.dump_stats(base + ".prof")
+            return base + ".prof"
+        perfil.stop()
+        with open(base + ".html", "w", encoding="utf-8") as f:
+            f.write(perfil.output_html())
+        return base + ".html"
+
+    @contextmanager
+    def etapa(self, nome, **atributos):
+        """Mede o bloco como uma etapa; o dicionário retornado aceita atributos extras."""
+        if not self.ativa:
+            yield atributos
+            return
+        perfil = self._iniciar_perfil(nome)
+        inicio_us = time.time_ns() // 1000 # Relógio de parede: comparável entre processos
+        inicio = time.perf_counter()
+        try:
+            yield atributos
+        finally:
+            duracao = time.perf_counter() - inicio
+            evento = {
+                "etapa": nome,
+                "inicio_us": inicio_us,
+                "duracao_s": duracao,
+                "pid": os.getpid(),
+                "thread": threading.get_ident(),
+                "pico_rss_mb": pico_rss_mb(),
+                **atributos,
+            }
+            if perfil is not None:
+                evento["perfil"] = self._gravar_perfil(nome, perfil)
+            with self._trava:
+                self.eventos.append(evento)
+
+    def coletar(self):
+        """Retorna e esvazia os eventos registrados (usado nos processos filhos)."""
+        with self._trava:
+            eventos, self.eventos = self.eventos, []
+        return eventos
+
+    def incorporar(self, eventos):
+        """Junta eventos vindos de outros processos."""
+        with self._trava:
+            self.eventos.extend(eventos)
+
+    def resumo(self):
+        """Totais por etapa: quantidade, tempo somado, linhas e bytes (na ordem de primeira ocorrência)."""
+        totais = {}
+        for evento in self.eventos:
+            total = totais.setdefault(evento["etapa"], {"vezes": 0, "duracao_s": 0.0, "linhas": 0, "bytes": 0})
+            total["vezes"] += 1
+            total["duracao_s"] += evento["duracao_s"]
+            total["linhas"] += evento.get("linhas") or 0
+            total["bytes"] += evento.get("bytes") or 0
+        return totais
+
+    def imprimir_resumo(self, emitir=print):
+        for nome, total in self.resumo().items():
+            volume = f", {total['linhas']} linhas" if total["linhas"] else ""
+            volume += f", {total['bytes'] / 1e6:.1f} MB" if total["bytes"] else ""
+            emitir(f"Etapa {nome}: {total['duracao_s']:.3f}s em {total['vezes']} execução(ões){volume}")
+
+    def exportar_jsonl(self, caminho):
+        """Grava um evento por linha."""
+        with open(caminho, "w", encoding="utf-8") as f:
+            for evento in sorted(self.eventos, key=lambda e: e["inicio_us"]):
+                f.write(json.dumps(evento, ensure_ascii=False, default=str) + "\n")
+
+    def exportar_chrome_trace(self, caminho):
+        """Grava os eventos como eventos completos ("ph": "X") do formato de trace do Chrome."""
+        base = min((e["inicio_us"] for e in self.eventos), default=0)
+        eventos_trace = []
+        for evento in self.eventos:
+            argumentos = {
+                chave: valor for chave, valor in evento.items()
+                if chave not in ("etapa", "inicio_us", "duracao_s", "pid", "thread")
+            }
+            eventos_trace.append({
+                "name": evento["etapa"],
+                "cat": "etl",
+                "ph": "X",
+                "ts": evento["inicio_us"] - base,
+                "dur": round(evento["duracao_s"] * 1e6),
+                "pid": evento["pid"],
+                "tid": evento["thread"],
+                "args": argumentos,
+            })
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": eventos_trace, "displayTimeUnit": "ms"}, f, ensure_ascii=False, default=str)
+
+
+class Progresso:
+    """
+    Mensagens de progresso amostradas: no máximo uma a cada `intervalo` segundos
+    (e sempre a última), para que o log não custe vazão nos laços por arquivo.
+    """
+
+    def __init__(self, total, descricao, intervalo=2.0, emitir=print):
+        self.total = total
+        self.descricao = descricao
+        self.intervalo = intervalo
+        self.emitir = emitir
+        self.feitos = 0
+        self.linhas = 0
+        self.inicio = time.perf_counter()
+        self._ultima = self.inicio
+
+    def avancar(self, n=1, linhas=0, detalhe=""):
+        self.feitos += n
+        self.linhas += linhas
+        agora = time.perf_counter()
+        if agora - self._ultima < self.intervalo and self.feitos < self.total:
+            return
+        self._ultima = agora
+        decorrido = agora - self.inicio
+        taxa = f", {self.linhas / decorrido:.0f} linhas/s" if self.linhas and decorrido > 0 else ""
+        sufixo = f" - {detalhe}" if detalhe else ""
+        self.emitir(f"{self.descricao}: {self.feitos}/{self.total} ({decorrido:.1f}s{taxa}){sufixo}")
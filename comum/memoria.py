@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+Execução com orçamento de memória (ex.: `--max-memory 2GB`), para entradas maiores que a RAM.
+
+`OrcamentoMemoria` parte do limite informado, desconta o RSS do processo no início
+(interpretador, pandas, NumPy) e converte o restante nos parâmetros do pipeline:
+
+* linhas por bloco no modo streaming, a partir dos bytes por linha de cada arquivo e do
+  fator de expansão de um CSV lido como texto;
+* número de processos do pool e tamanho das tarefas (intervalos de bytes), reduzindo
+  primeiro o tamanho da tarefa e só depois os processos;
+* profundidade da fila: quantos bytes/arquivos lidos antecipadamente e quantas tarefas
+  em trânsito (entregues e com resultado ainda não consumido).
+
+Também decide quando um modo não cabe (ex.: concatenar tudo em memória) e precisa ceder
+a vez a um modo em blocos, em vez de terminar morto pelo OOM killer.
+
+`ParciaisEmDisco` guarda as somas parciais (ex.: as do cubo) em memória até uma fatia do
+orçamento (ou até o RSS do processo passar do limite) e então as junta e despeja em um
+arquivo temporário; no fim as parciais voltam uma a uma. As somas são de contagens
+inteiras, então juntar antes ou depois não muda o resultado.
+
+Os fatores de expansão são estimativas medidas nos CSVs do projeto; o RSS é conferido
+durante a execução, e passar dele dispara o despejo antes do previsto.
+"""
+
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import weakref
+
+import pandas as pd
+
+from comum.compactados import abrir
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+# Bytes em memória por byte de CSV: lido como texto (dtype=str) e lido tipado (só metas e chaves)
+FATOR_TEXTO = 18
+FATOR_TIPADO = 2
+CUSTO_PROCESSO = 96 << 20 # Memória própria de cada processo do pool (pandas importado, buffers)
+MINIMO_BLOCO = 1_000 # Linhas por bloco no streaming, mesmo com orçamento apertado
+MINIMO_TAREFA = 64 << 10 # Bytes por tarefa do pool
+FRACAO_DADOS = 0.5 # Fração do orçamento livre para os dados em processamento
+FRACAO_PARCIAIS = 0.25 # Fração para as parciais guardadas antes do despejo em disco
+AMOSTRA_LINHAS = 64 << 10 # Bytes lidos do início do arquivo para estimar os bytes por linha
+
+_UNIDADES = {"": 1, "B": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+_PADRAO_TAMANHO = re.compile(r"^\s*(\d+(?:[.,]\d+)?)\s*([KMGT]?)(I?B)?\s*$", re.IGNORECASE)
+
+
+def interpretar_tamanho(texto):
+    """Bytes de um tamanho como "2GB", "512M", "1.5 GiB" ou 1048576 (unidades binárias)."""
+    if isinstance(texto, (int, float)):
+        return int(texto)
+    encontrado = _PADRAO_TAMANHO.match(str(texto))
+    if not encontrado:
+        raise ValueError(f"Tamanho de memória inválido: {texto!r} (ex.: 2GB, 512MB)")
+    numero, unidade, _ = encontrado.groups()
+    return int(float(numero.replace(",", ".")) * _UNIDADES[unidade.upper()])
+
+
+def formatar_tamanho(bytes_):
+    for unidade in ("B", "KB", "MB", "GB"):
+        if abs(bytes_) < 1024 or unidade == "GB":
+            return f"{bytes_:.0f} {unidade}" if unidade == "B" else f"{bytes_:.1f} {unidade}"
+        bytes_ /= 1024
+
+
+def rss_atual():
+    """RSS atual do processo em bytes (/proc no Linux; pico do processo em outros sistemas)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is None:
+        return 0
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico if sys.platform == "darwin" else pico * 1024
+
+
+def bytes_por_linha(caminho):
+    """Média de bytes por linha no início de `caminho`, já descompactado (None se não houver linhas)."""
+    try:
+        with abrir(caminho) as f:
+            amostra = f.read(AMOSTRA_LINHAS)
+    except (OSError, ValueError):
+        return None
+    linhas = amostra.count(b"\n")
+    if not linhas:
+        return len(amostra) or None
+    return len(amostra) / linhas
+
+
+class OrcamentoMemoria:
+    """Limite de memória da execução e os parâmetros derivados dele."""
+
+    def __init__(self, limite, emitir=print):
+        self.limite = interpretar_tamanho(limite)
+        self.emitir = emitir
+        self.base = rss_atual()
+        if self.livre() < 4 * CUSTO_PROCESSO:
+            emitir(f"ALERTA: orçamento de {formatar_tamanho(self.limite)} deixa só "
+                   f"{formatar_tamanho(self.livre())} além do processo; usando os mínimos de cada etapa.")
+
+    def livre(self):
+        """Bytes do orçamento além do RSS do processo no início."""
+        return max(self.limite - self.base, 0)
+
+    def excedido(self):
+        """True se o RSS do processo já passou do limite."""
+        return rss_atual() > self.limite
+
+    def cabe(self, bytes_entrada, fator=FATOR_TEXTO):
+        """True se `bytes_entrada` de CSV, expandidos por `fator`, cabem na fatia dos dados."""
+        return bytes_entrada * fator <= self.livre() * FRACAO_DADOS
+
+    def linhas_por_bloco(self, caminho, maximo, fator=FATOR_TEXTO):
+        """Linhas por bloco para ler `caminho` em streaming dentro da fatia dos dados."""
+        por_linha = bytes_por_linha(caminho)
+        if por_linha is None:
+            return maximo
+        linhas = int(self.livre() * FRACAO_DADOS / (por_linha * fator))
+        return max(MINIMO_BLOCO, min(maximo, linhas))
+
+    def leitura_antecipada(self, maximo_bytes, maximo_arquivos):
+        """(bytes, arquivos) em leitura antecipada: a fila divide a fatia dos dados com o parse."""
+        limite = int(self.livre() * FRACAO_DADOS / (1 + FATOR_TIPADO))
+        return min(maximo_bytes, limite), maximo_arquivos if limite >= maximo_bytes else 1
+
+    def planejar_pool(self, maximo_processos, tamanho_tarefa, fator=FATOR_TIPADO):
+        """
+        (processos, bytes por tarefa, tarefas em trânsito) que cabem no orçamento. O tamanho
+        da tarefa é reduzido antes do número de processos; nunca menos de um processo.
+        """
+        for processos in range(max(maximo_processos, 1), 0, -1):
+            por_processo = self.livre() * FRACAO_DADOS / processos - CUSTO_PROCESSO
+            tamanho = min(tamanho_tarefa, int(por_processo / fator))
+            if tamanho >= MINIMO_TAREFA:
+                return processos, tamanho, 2 * processos
+        return 1, MINIMO_TAREFA, 1
+
+    def limite_parciais(self):
+        """Bytes de parciais guardados em memória antes do despejo em disco."""
+        return int(self.livre() * FRACAO_PARCIAIS)
+
+    def descrever(self):
+        return f"{formatar_tamanho(self.limite)} (processo já usa {formatar_tamanho(self.base)})"
+
+
+class JanelaTarefas:
+    """
+    Limita quantas tarefas de um iterável estão em trânsito: `__iter__` só entrega a
+    próxima depois de `concluir()` ser chamado para uma anterior. Serve para o iterável
+    do `Pool.imap_unordered`, consumido por uma thread do pool (que fica esperando aqui).
+    """
+
+    def __init__(self, tarefas, limite):
+        self.tarefas = tarefas
+        self._vagas = threading.Semaphore(max(limite, 1))
+        self._fechada = False
+
+    def __iter__(self):
+        for tarefa in self.tarefas:
+            while not self._vagas.acquire(timeout=0.1):
+                if self._fechada:
+                    return
+            if self._fechada:
+                return
+            yield tarefa
+
+    def concluir(self):
+        self._vagas.release()
+
+    def fechar(self):
+        """Libera a thread do pool que estiver esperando (ex.: execução interrompida)."""
+        self._fechada = True
+
+
+def _bytes_do_df(df):
+    return int(df.memory_usage(deep=False).sum()) if df is not None else 0
+
+
+class ParciaisEmDisco:
+    """
+    Coleção de somas parciais que despeja em disco quando passa de `limite_bytes` (ou
+    quando o `orcamento` informa que o RSS passou do limite). `juntar` reduz uma lista de
+    parciais a uma só (ex.: `agregar_cubo` sobre a concatenação) antes de cada despejo.
+    `cabe(self)`, se informado, é conferido depois de cada despejo: se der False (ex.: o
+    cubo destas parciais não caberia no orçamento), as parciais são descartadas, as
+    seguintes são ignoradas e `abandonada` fica True, sem despejar o resto à toa.
+    Use como context manager: os temporários são removidos na saída.
+    """
+
+    def __init__(self, limite_bytes, juntar, orcamento=None, diretorio=None, prefixo="parciais_", cabe=None):
+        self.limite_bytes = limite_bytes
+        self.juntar = juntar
+        self.orcamento = orcamento
+        self.cabe = cabe
+        self.abandonada = False
+        self._diretorio_base = diretorio
+        self._prefixo = prefixo
+        self._diretorio = None
+        self._remover = None
+        self._memoria = []
+        self._bytes = 0
+        self.arquivos = []
+        self.linhas = 0 # Linhas de todas as parciais guardadas (em disco e em memória)
+        self.maior = 0 # Linhas da maior parcial guardada
+
+    def adicionar(self, parcial):
+        if parcial is None or not len(parcial) or self.abandonada:
+            return
+        self._memoria.append(parcial)
+        self._bytes += _bytes_do_df(parcial)
+        self.linhas += len(parcial)
+        self.maior = max(self.maior, len(parcial))
+        if self._bytes > self.limite_bytes or (self.orcamento is not None and self.orcamento.excedido()):
+            self.despejar()
+
+    append = adicionar # Mesma interface de uma lista de parciais
+
+    def despejar(self):
+        """Junta as parciais em memória e grava o resultado em um arquivo temporário."""
+        if not self._memoria:
+            return
+        if self._diretorio is None:
+            self._diretorio = tempfile.mkdtemp(prefix=self._prefixo, dir=self._diretorio_base)
+            # Removido também se o objeto for descartado (ou o processo sair) sem limpar()
+            self._remover = weakref.finalize(self, shutil.rmtree, self._diretorio, ignore_errors=True)
+        juntas = self.juntar(self._memoria) if len(self._memoria) > 1 else self._memoria[0]
+        self.linhas -= sum(len(parcial) for parcial in self._memoria) - len(juntas)
+        self.maior = max(self.maior, len(juntas))
+        caminho = os.path.join(self._diretorio, f"{len(self.arquivos):05d}.pkl")
+        pd.to_pickle(juntas, caminho)
+        self.arquivos.append(caminho)
+        self._memoria, self._bytes = [], 0
+        if self.cabe is not None and not self.cabe(self):
+            self.limpar()
+            self.abandonada = True
+
+    def __len__(self):
+        return len(self.arquivos) + len(self._memoria)
+
+    def __iter__(self):
+        """As parciais despejadas (lidas uma a uma do disco) e depois as que estão em memória."""
+        for caminho in self.arquivos:
+            yield pd.read_pickle(caminho)
+        yield from self._memoria
+
+    def limpar(self):
+        if self._remover is not None:
+            self._remover()
+            self._diretorio = self._remover = None
+        self.arquivos, self._memoria, self._bytes, self.linhas, self.maior = [], [], 0, 0, 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        self.limpar()
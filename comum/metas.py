@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+Tabela declarativa das fórmulas das metas (TP06) e cálculo vetorizado.
+
+Todas as metas seguem o formato
+
+    Meta = (∑ julgados / (∑ distribuidos - ∑ suspensos)) × fator
+
+com a Meta 1 usando `casos_novos_2025 + dessobrestados_2025` como distribuídos.
+As fórmulas são indexadas pelo ramo de justiça; os tribunais superiores (STJ, TST, TSE)
+têm tabelas próprias, indexadas pela sigla.
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# `distribuidos` pode ser uma coluna ou uma tupla de colunas somadas
+Formula = namedtuple("Formula", ["julgados", "distribuidos", "suspensos", "fator"])
+
+META1 = Formula("julgados_2025", ("casos_novos_2025", "dessobrestados_2025"), "suspensos_2025", 100)
+
+
+def _formula(sufixo, fator):
+    """Fórmula padrão julgm<sufixo> / (distm<sufixo> - suspm<sufixo>) × fator."""
+    return Formula(f"julgm{sufixo}", f"distm{sufixo}", f"suspm{sufixo}", fator)
+
+
+# Eleitoral segue a tabela do TSE (os TREs trazem exatamente as colunas 2A, 2ANT, 4A e 4B)
+_METAS_ELEITORAL = {
+    "Meta1": META1,
+    "Meta2A": _formula("2_a", 1000 / 7),
+    "Meta2B": _formula("2_b", 1000 / 9.9),
+    "Meta2ANT": _formula("2_ant", 100),
+    "Meta4A": _formula("4_a", 1000 / 9),
+    "Meta4B": _formula("4_b", 1000 / 5),
+}
+
+METAS_POR_RAMO = {
+    "Justiça Estadual": {
+        "Meta1": META1,
+        "Meta2A": _formula("2_a", 1000 / 8),
+        "Meta2B": _formula("2_b", 1000 / 9),
+        "Meta2C": _formula("2_c", 1000 / 9.5),
+        "Meta2ANT": _formula("2_ant", 100),
+        "Meta4A": _formula("4_a", 1000 / 6.5),
+        "Meta4B": _formula("4_b", 100),
+        "Meta6": _formula("6", 100),
+        "Meta7A": _formula("7_a", 1000 / 5),
+        "Meta7B": _formula("7_b", 1000 / 5),
+        "Meta8A": _formula("8_a", 1000 / 7.5),
+        "Meta8B": _formula("8_b", 1000 / 9),
+        "Meta10A": _formula("10_a", 1000 / 9),
+        "Meta10B": _formula("10_b", 1000 / 10),
+    },
+    "Justiça do Trabalho": {
+        "Meta1": META1,
+        "Meta2A": _formula("2_a", 1000 / 9.4),
+        "Meta2ANT": _formula("2_ant", 100),
+    },
+    "Justiça Federal": {
+        "Meta1": META1,
+        "Meta2A": _formula("2_a", 1000 / 8.5),
+        "Meta2B": _formula("2_b", 100),
+        "Meta2ANT": _formula("2_ant", 100),
+        "Meta4A": _formula("4_a", 1000 / 7),
+        "Meta4B": _formula("4_b", 100),
+        "Meta6": _formula("6", 1000 / 3.5),
+        "Meta7A": _formula("7_a", 1000 / 3.5),
+        "Meta7B": _formula("7_b", 1000 / 3.5),
+        "Meta8A": _formula("8_a", 1000 / 7.5),
+        "Meta8B": _formula("8_b", 1000 / 9),
+        "Meta10A": _formula("10_a", 100),
+    },
+    "Justiça Militar da União": {
+        "Meta1": META1,
+        "Meta2A": _formula("2_a", 1000 / 9.5),
+        "Meta2B": _formula("2_b", 1000 / 9.9),
+        "Meta2ANT": _formula("2_ant", 100),
+        "Meta4A": _formula("4_a", 1000 / 9.5),
+        "Meta4B": _formula("4_b", 1000 / 9.9),
+    },
+    "Justiça Militar Estadual": {
+        "Meta1": META1,
+        "Meta2A": _formula("2_a", 1000 / 9),
+        "Meta2B": _formula("2_b", 1000 / 9.5),
+        "Meta2ANT": _formula("2_ant", 100),
+        "Meta4A": _formula("4_a", 1000 / 9.5),
+        "Meta4B": _formula("4_b", 1000 / 9.9),
+    },
+    "Justiça Eleitoral": _METAS_ELEITORAL,
+}
+
+METAS_POR_TRIBUNAL = {
+    "STJ": {
+        "Meta1": META1,
+        "Meta2ANT": _formula("2_ant", 100),
+        "Meta4A": _formula("4_a", 1000 / 9),
+        "Meta4B": _formula("4_b", 100),
+        "Meta6": _formula("6_a", 1000 / 7.5),
+        "Meta7A": _formula("7_a", 1000 / 7.5),
+        "Meta7B": _formula("7_b", 1000 / 7.5),
+        "Meta8": _formula("8", 1000 / 10),
+        "Meta10": _formula("10", 1000 / 10),
+    },
+    "TST": {
+        "Meta1": META1,
+        "Meta2A": _formula("2_a", 1000 / 9.5),
+        "Meta2B": _formula("2_b", 1000 / 9.9),
+        "Meta2ANT": _formula("2_ant", 100),
+    },
+    "TSE": _METAS_ELEITORAL,
+}
+
+# Ordem das colunas no ResumoMetas
+NOMES_METAS = [
+    "Meta1", "Meta2A", "Meta2B", "Meta2C", "Meta2ANT", "Meta4A", "Meta4B", "Meta6",
+    "Meta7A", "Meta7B", "Meta8", "Meta8A", "Meta8B", "Meta10", "Meta10A", "Meta10B",
+]
+
+
+def _colunas_da_formula(formula):
+    for campo in (formula.julgados, formula.distribuidos, formula.suspensos):
+        yield from (campo,) if isinstance(campo, str) else campo
+
+
+def colunas_das_metas():
+    """Lista (sem repetição, em ordem estável) de todas as colunas usadas pelas fórmulas."""
+    colunas = {}
+    for tabela in (*METAS_POR_RAMO.values(), *METAS_POR_TRIBUNAL.values()):
+        for formula in tabela.values():
+            for coluna in _colunas_da_formula(formula):
+                colunas[coluna] = None
+    return list(colunas)
+
+
+COLUNAS_METAS = colunas_das_metas()
+
+
+def normalizar_ramo(ramo):
+    """Corrige nomes de ramo lidos como latin1 a partir de bytes UTF-8 (ex.: 'JustiÃ§a')."""
+    if not isinstance(ramo, str):
+        return ramo
+    try:
+        return ramo.encode("latin1").decode("utf-8")
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return ramo
+
+
+def chave_da_tabela(siglas, ramos):
+    """Para cada linha, a chave da tabela de fórmulas: a sigla, se tiver tabela própria, ou o ramo."""
+    siglas = pd.Series(siglas, dtype=object).reset_index(drop=True)
+    ramos = pd.Series(ramos, dtype=object).reset_index(drop=True)
+    ramos_unicos = ramos.dropna().unique()
+    ramos = ramos.map({ramo: normalizar_ramo(ramo) for ramo in ramos_unicos})
+    return siglas.where(siglas.isin(list(METAS_POR_TRIBUNAL)), ramos)
+
+
+def formulas_da_chave(chave):
+    """Tabela de fórmulas (meta -> Formula) de uma sigla ou ramo; ramos desconhecidos só têm a Meta 1."""
+    return METAS_POR_TRIBUNAL.get(chave) or METAS_POR_RAMO.get(chave) or {"Meta1": META1}
+
+
+def somar_por_tribunal(df, colunas=None):
+    """
+    Soma as colunas das metas em um único groupby por (sigla_tribunal, ramo_justica).
+
+    Alguns tribunais trazem linhas com mais de um ramo (ex.: STM); como o resumo é por
+    tribunal, os grupos de uma mesma sigla são unidos sob o primeiro ramo encontrado.
+    """
+    if colunas is None:
+        colunas = COLUNAS_METAS
+    presentes = [col for col in colunas if col in df.columns]
+    somas = df.groupby(["sigla_tribunal", "ramo_justica"], sort=False, dropna=False, observed=True)[presentes].sum()
+    # Chaves e somas juntadas de uma vez: com muitas colunas (ex.: as mensais), reset_index fragmenta o frame
+    somas = pd.concat([somas.index.to_frame(index=False), somas.reset_index(drop=True)], axis=1)
+    somas = somas[somas["sigla_tribunal"].notna()]
+    # Chaves categóricas (leitura tipada ou cache) voltam a texto: o resultado tem poucas linhas
+    somas = somas.astype({"sigla_tribunal": object, "ramo_justica": object})
+    if not somas["sigla_tribunal"].duplicated().any():
+        return somas.sort_values("sigla_tribunal", ignore_index=True)
+    # Somas de todas as colunas de uma vez (um bloco só, mesmo com muitas colunas) e o primeiro ramo
+    grupos = somas.groupby("sigla_tribunal", sort=True, dropna=True)
+    unidas = grupos[presentes].sum()
+    primeiros = grupos["ramo_justica"].first()
+    return pd.concat([primeiros.index.to_frame(index=False), primeiros.reset_index(drop=True),
+                      unidas.reset_index(drop=True)], axis=1)
+
+
+def _indices(campo, posicao):
+    """Posições (na matriz de somas) das colunas de um campo da fórmula que estão presentes."""
+    return tuple(posicao[coluna] for coluna in ((campo,) if isinstance(campo, str) else campo) if coluna in posicao)
+
+
+@lru_cache(maxsize=None)
+def compilar_formulas(chave, colunas):
+    """
+    Fórmulas da tabela `chave` compiladas para uma matriz de somas cujas colunas são
+    `colunas` (tupla, na ordem da matriz): uma tupla (meta, índices dos julgados, dos
+    distribuídos e dos suspensos, fator) por meta. Colunas ausentes não entram nas somas.
+    Compilado uma vez por (tabela, leiaute das somas).
+    """
+    posicao = {coluna: i for i, coluna in enumerate(colunas)}
+    return tuple(
+        (meta, _indices(formula.julgados, posicao), _indices(formula.distribuidos, posicao),
+         _indices(formula.suspensos, posicao), formula.fator)
+        for meta, formula in formulas_da_chave(chave).items()
+    )
+
+
+def _somar_indices(matriz, indices):
+    total = np.zeros(len(matriz))
+    for indice in indices:
+        total = total + matriz[:, indice]
+    return total
+
+
+def _avaliar_compilada(matriz, julgados, distribuidos, suspensos, fator):
+    numerador = _somar_indices(matriz, julgados)
+    denominador = _somar_indices(matriz, distribuidos) - _somar_indices(matriz, suspensos)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominador != 0, (numerador / denominador) * fator, 0.0)
+
+
+def aplicar_formula(somas, formula):
+    """Avalia uma fórmula sobre todas as linhas de `somas`; denominador zero resulta em 0."""
+    colunas = [coluna for coluna in dict.fromkeys(_colunas_da_formula(formula)) if coluna in somas.columns]
+    posicao = {coluna: i for i, coluna in enumerate(colunas)}
+    matriz = somas[colunas].to_numpy(dtype=np.float64)
+    return _avaliar_compilada(matriz, _indices(formula.julgados, posicao), _indices(formula.distribuidos, posicao),
+                              _indices(formula.suspensos, posicao), formula.fator)
+
+
+def avaliar_metas(somas, chaves):
+    """
+    Avalia todas as metas para as linhas de `somas`, onde `chaves` traz a chave da tabela
+    de fórmulas de cada linha (ver `chave_da_tabela`). Retorna {meta: array}, com NaN
+    onde a meta não se aplica.
+
+    O laço é sobre as tabelas de fórmulas (poucas), não sobre as linhas: cada meta
+    é avaliada de uma vez para todas as linhas que compartilham a mesma tabela, com as
+    fórmulas compiladas para as posições das colunas na matriz de somas.
+    """
+    somas = somas.reset_index(drop=True)
+    numericas = somas.select_dtypes("number")
+    colunas = tuple(numericas.columns)
+    matriz = numericas.to_numpy(dtype=np.float64)
+    chaves = pd.Series(chaves, dtype=object).reset_index(drop=True).fillna("")
+    valores = {meta: np.full(len(somas), np.nan) for meta in NOMES_METAS}
+    for chave in chaves.unique():
+        linhas = (chaves == chave).to_numpy()
+        subconjunto = matriz[linhas]
+        for meta, julgados, distribuidos, suspensos, fator in compilar_formulas(chave, colunas):
+            valores[meta][linhas] = _avaliar_compilada(subconjunto, julgados, distribuidos, suspensos, fator)
+    return valores
+
+
+def calcular_metas(somas):
+    """
+    Calcula todas as metas a partir das somas por tribunal (colunas `sigla_tribunal`,
+    `ramo_justica` e as colunas numéricas já somadas). Metas que não se aplicam ao
+    ramo/tribunal ficam como NaN.
+    """
+    somas = somas.reset_index(drop=True)
+    resultado = somas[["sigla_tribunal", "ramo_justica"]].copy()
+    valores = avaliar_metas(somas, chave_da_tabela(somas["sigla_tribunal"], somas["ramo_justica"]))
+
+    for meta in NOMES_METAS:
+        if not np.isnan(valores[meta]).all():
+            resultado[meta] = valores[meta]
+    return resultado
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Divisão dos CSVs em intervalos de bytes alinhados em fim de linha, para que um arquivo
+grande seja processado por vários processos ao mesmo tempo.
+
+Cada intervalo (inicio, fim) começa logo depois de uma quebra de linha e termina em uma,
+sem o cabeçalho; quem lê o intervalo junta o cabeçalho do arquivo na frente (ver
+`comum.ingestao.ler_intervalo`). Quebras de linha dentro de campos entre aspas nunca
+são usadas como corte. O tamanho dos intervalos é fixo, então o plano de um arquivo só
+depende do conteúdo dele (e as entradas do cache por intervalo continuam valendo).
+
+Arquivos compactados (comum/compactados.py) não têm offsets de bytes utilizáveis e
+viram sempre uma tarefa inteira; o peso deles no plano é o tamanho descompactado.
+"""
+
+import os
+
+from comum.compactados import abrir, compressao, tamanho_descompactado
+
+TAMANHO_INTERVALO = 1 << 20 # 1 MB por tarefa
+TAMANHO_BLOCO_BUSCA = 64 << 10
+
+
+def _proximo_corte(f, posicao, aspas_impar):
+    """
+    A partir de `posicao` (com a paridade de aspas acumulada até ali), procura a primeira
+    quebra de linha fora de aspas. Retorna (offset logo após a quebra, paridade) ou
+    (None, paridade) se o arquivo terminar antes.
+    """
+    f.seek(posicao)
+    while True:
+        bloco = f.read(TAMANHO_BLOCO_BUSCA)
+        if not bloco:
+            return None, aspas_impar
+        anterior = 0
+        while True:
+            quebra = bloco.find(b"\n", anterior)
+            if quebra < 0:
+                aspas_impar ^= bloco.count(b'"', anterior) & 1
+                break
+            aspas_impar ^= bloco.count(b'"', anterior, quebra) & 1
+            if not aspas_impar:
+                return posicao + quebra + 1, aspas_impar
+            anterior = quebra + 1
+        posicao += len(bloco)
+
+
+def intervalos_do_arquivo(caminho, tamanho_intervalo=TAMANHO_INTERVALO):
+    """
+    Retorna a lista de intervalos (inicio, fim) do corpo do arquivo. Arquivos pequenos
+    viram [None] (uma tarefa com o arquivo inteiro); vazios ou só com cabeçalho, [].
+    """
+    tamanho = os.path.getsize(caminho)
+    if tamanho == 0:
+        return []
+    if compressao(caminho) is not None:
+        with abrir(caminho) as f:
+            f.readline()
+            return [None] if f.read(1) else []
+    with open(caminho, "rb") as f:
+        inicio = len(f.readline())
+        if tamanho - inicio <= 0:
+            return []
+        if tamanho - inicio <= tamanho_intervalo:
+            return [None]
+
+        intervalos = []
+        aspas_impar = 0
+        posicao = inicio
+        while True:
+            alvo = inicio + tamanho_intervalo
+            if alvo >= tamanho:
+                intervalos.append((inicio, tamanho))
+                return intervalos
+            # Paridade das aspas até o alvo: um corte só vale fora de campo entre aspas
+            f.seek(posicao)
+            restante = alvo - posicao
+            while restante > 0:
+                bloco = f.read(min(TAMANHO_BLOCO_BUSCA, restante))
+                aspas_impar ^= bloco.count(b'"') & 1
+                restante -= len(bloco)
+            corte, aspas_impar = _proximo_corte(f, alvo, aspas_impar)
+            if corte is None or corte >= tamanho:
+                intervalos.append((inicio, tamanho))
+                return intervalos
+            intervalos.append((inicio, corte))
+            inicio = posicao = corte
+
+
+def planejar_tarefas(arquivos, tamanho_intervalo=TAMANHO_INTERVALO):
+    """
+    Monta a lista de tarefas (indice, caminho, intervalo), da maior para a menor, para
+    que os arquivos grandes não fiquem para o fim enquanto os outros processos esperam.
+    `indice` é a posição da tarefa na ordem original (arquivo e offset), usada para
+    juntar os resultados de forma determinística. Arquivos sem linhas não geram tarefas.
+    """
+    tarefas = []
+    for caminho in arquivos:
+        for intervalo in intervalos_do_arquivo(caminho, tamanho_intervalo):
+            peso = tamanho_descompactado(caminho) if intervalo is None else intervalo[1] - intervalo[0]
+            tarefas.append((peso, caminho, intervalo))
+    ordem = sorted(range(len(tarefas)), key=lambda i: tarefas[i][0], reverse=True)
+    return [(i, tarefas[i][1], tarefas[i][2]) for i in ordem]
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Leitura antecipada dos CSVs em uma thread, para sobrepor I/O e parse.
+
+`LeitorAntecipado` lê os bytes dos próximos arquivos em segundo plano enquanto o
+arquivo atual é interpretado e agregado pelo consumidor. A fila é limitada em número
+de arquivos e em bytes em trânsito (lidos e ainda não consumidos), então a memória
+extra fica limitada mesmo com arquivos grandes. A leitura de disco libera o GIL,
+então o tempo total tende a max(I/O, CPU) em vez da soma, mesmo em um único processo.
+
+Arquivos compactados (comum/compactados.py) são descompactados nessa mesma thread: o
+consumidor recebe os bytes do CSV, e a descompactação (zlib/zstd também liberam o GIL)
+fica sobreposta ao parse do arquivo anterior.
+"""
+
+import queue
+import threading
+
+from comum.compactados import abrir, tamanho_descompactado
+
+LIMITE_BYTES_PADRAO = 256 << 20 # 256 MB em trânsito
+LIMITE_ARQUIVOS_PADRAO = 4
+
+
+class LeitorAntecipado:
+    """
+    Iterador de (caminho, dados, erro) na ordem de `arquivos`; `dados` são os bytes do
+    arquivo, já descompactados (None se `erro` não for None).
+
+    Um arquivo maior que `limite_bytes` ainda é lido, mas só quando nada mais estiver
+    em trânsito. Use como context manager (ou chame `fechar()`) para encerrar a thread
+    se o consumo for interrompido.
+    """
+
+    def __init__(self, arquivos, limite_bytes=LIMITE_BYTES_PADRAO, limite_arquivos=LIMITE_ARQUIVOS_PADRAO):
+        self.arquivos = list(arquivos)
+        self.limite_bytes = limite_bytes
+        self._fila = queue.Queue(maxsize=max(1, limite_arquivos))
+        self._em_transito = 0
+        self._condicao = threading.Condition()
+        self._encerrar = False
+        self._thread = threading.Thread(target=self._ler, name="leitor-antecipado", daemon=True)
+        self._thread.start()
+
+    def _reservar(self, tamanho):
+        """Espera até haver espaço para `tamanho` bytes em trânsito; False se o leitor foi fechado."""
+        with self._condicao:
+            self._condicao.wait_for(
+                lambda: self._encerrar or self._em_transito == 0 or self._em_transito + tamanho <= self.limite_bytes
+            )
+            if self._encerrar:
+                return False
+            self._em_transito += tamanho
+            return True
+
+    def _liberar(self, tamanho):
+        with self._condicao:
+            self._em_transito -= tamanho
+            self._condicao.notify_all()
+
+    def _colocar(self, item):
+        while not self._encerrar:
+            try:
+                self._fila.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _ler(self):
+        for caminho in self.arquivos:
+            try:
+                # Compactados reservam o tamanho informado pelo formato (ou estimado) e são
+                # corrigidos depois da leitura, com os bytes realmente descompactados
+                tamanho = tamanho_descompactado(caminho)
+                if not self._reservar(tamanho):
+                    return
+                try:
+                    with abrir(caminho) as f:
+                        dados = f.read()
+                finally:
+                    self._liberar(tamanho)
+                with self._condicao:
+                    self._em_transito += len(dados)
+                item = (caminho, dados, None)
+            except Exception as e: # Inclusive arquivo compactado corrompido
+                item = (caminho, None, e)
+            if not self._colocar(item):
+                return
+        self._colocar(None)
+
+    def __iter__(self):
+        while True:
+            item = self._fila.get()
+            if item is None:
+                return
+            caminho, dados, erro = item
+            try:
+                yield caminho, dados, erro
+            finally:
+                if dados is not None:
+                    self._liberar(len(dados))
+
+    def fechar(self):
+        with self._condicao:
+            self._encerrar = True
+            self._condicao.notify_all()
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        self.fechar()
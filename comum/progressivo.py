@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Resumo progressivo das metas: um ResumoMetas parcial regravado à medida que as tarefas
+terminam, em vez de só no fim da execução.
+
+As tarefas (arquivos inteiros ou intervalos de bytes) chegam fora de ordem, como no
+`imap_unordered` do pool. `ResumoProgressivo` guarda as somas de cada arquivo até a
+última tarefa dele chegar; aí as junta às somas dos arquivos concluídos e, respeitando
+um intervalo mínimo entre gravações, recalcula as metas e regrava o resumo parcial.
+
+* Um tribunal só entra no resumo parcial quando todos os arquivos em que ele já
+  apareceu estão concluídos (somas de um arquivo pela metade não viram meta).
+* Cada gravação é um temporário + substituição: quem lê o arquivo (ou o serviço de
+  consulta) sempre vê um snapshot inteiro, e uma queda no fim da execução não perde os
+  tribunais que já tinham terminado.
+* O resumo parcial tem o formato do resumo final (quem grava é a função do script) e é
+  removido por `finalizar()` depois que o resumo final foi gravado.
+
+Os números de um tribunal cujos dados estão em mais de um arquivo podem aparecer antes
+de o último desses arquivos ser lido; o resumo final é sempre o de referência.
+"""
+
+import os
+import time
+
+import numpy as np
+
+from comum.compartilhado import AcumuladorTribunais
+from comum.metas import COLUNAS_METAS, calcular_metas
+
+INTERVALO_PADRAO = 1.0 # Segundos mínimos entre duas gravações do resumo parcial
+
+
+def tarefas_por_arquivo(tarefas):
+    """{arquivo: número de tarefas} de um plano de `planejar_tarefas` ((índice, arquivo, intervalo, ...))."""
+    contagem = {}
+    for _, caminho, *_ in tarefas:
+        contagem[caminho] = contagem.get(caminho, 0) + 1
+    return contagem
+
+
+class ResumoProgressivo:
+    """
+    Somas dos arquivos concluídos e o resumo parcial gravado a partir delas.
+
+    `gravar(df_metas, caminho)` escreve as metas no formato do script (ex.: CSV com NA);
+    `tarefas` é o número de tarefas de cada arquivo ({arquivo: n}, ver `tarefas_por_arquivo`).
+    """
+
+    def __init__(self, caminho, tarefas, gravar, colunas=None, intervalo=INTERVALO_PADRAO, emitir=print):
+        self.caminho = caminho
+        self.gravar = gravar
+        self.colunas = list(COLUNAS_METAS if colunas is None else colunas)
+        self.intervalo = intervalo
+        self.emitir = emitir
+        self.arquivos = len(tarefas)
+        self.concluidos = 0
+        self.snapshots = 0
+        self._faltando = dict(tarefas) # arquivo -> tarefas ainda sem resultado
+        self._parciais = {} # arquivo -> somas das tarefas que já chegaram
+        self._abertos = {} # sigla -> arquivos não concluídos em que ela já apareceu
+        self._acumulador = AcumuladorTribunais(self.colunas)
+        self._pendente = False # Há arquivos concluídos ainda fora do resumo gravado
+        self._ultima = 0.0
+
+    def adicionar(self, arquivo, somas):
+        """Guarda somas por tribunal de uma parte de `arquivo` (ex.: um bloco lido em streaming)."""
+        if somas is None or not len(somas) or "sigla_tribunal" not in somas.columns:
+            return
+        self._parciais.setdefault(arquivo, []).append(somas)
+        for sigla in somas["sigla_tribunal"].dropna().unique():
+            self._abertos.setdefault(sigla, set()).add(arquivo)
+
+    def concluir_tarefa(self, arquivo, somas=None):
+        """Registra o resultado (somas por tribunal, ou None se falhou) de uma tarefa de `arquivo`."""
+        self.adicionar(arquivo, somas)
+        self._faltando[arquivo] -= 1
+        if self._faltando[arquivo] > 0:
+            return
+        for parcial in self._parciais.pop(arquivo, []):
+            self._somar(parcial)
+        for sigla in [s for s, abertos in self._abertos.items() if arquivo in abertos]:
+            self._abertos[sigla].discard(arquivo)
+            if not self._abertos[sigla]:
+                del self._abertos[sigla]
+        self.concluidos += 1
+        self._pendente = True
+        if time.monotonic() - self._ultima >= self.intervalo or self.concluidos == self.arquivos:
+            self.atualizar()
+
+    def _somar(self, somas):
+        presentes = [coluna for coluna in self.colunas if coluna in somas.columns]
+        ramos = somas["ramo_justica"].astype(object).where(somas["ramo_justica"].notna(), None) \
+            if "ramo_justica" in somas.columns else [None] * len(somas)
+        valores = somas[presentes].to_numpy(dtype=np.float64, na_value=0.0)
+        self._acumulador.somar(somas["sigla_tribunal"].astype(object).to_numpy(), list(ramos), presentes, valores)
+
+    def resumo(self):
+        """Metas dos tribunais completos até agora (todos os arquivos em que apareceram concluídos)."""
+        somas = self._acumulador.resultado()
+        somas = somas[~somas["sigla_tribunal"].isin(list(self._abertos))]
+        return calcular_metas(somas.reset_index(drop=True))
+
+    def atualizar(self):
+        """Regrava o resumo parcial (temporário + substituição), se algo mudou desde a última vez."""
+        if not self._pendente:
+            return
+        df_metas = self.resumo()
+        temporario = f"{self.caminho}.tmp"
+        self.gravar(df_metas, temporario)
+        os.replace(temporario, self.caminho)
+        self._pendente = False
+        self._ultima = time.monotonic()
+        self.snapshots += 1
+        self.emitir(f"Resumo parcial: {len(df_metas)} tribunais de {self.concluidos}/{self.arquivos} "
+                    f"arquivos concluídos em {self.caminho}")
+
+    def finalizar(self):
+        """Remove o resumo parcial (chamar depois de gravar o resumo final)."""
+        if os.path.exists(self.caminho):
+            os.remove(self.caminho)
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Estágio de saídas fora do caminho crítico do ETL.
+
+Depois que as metas estão calculadas, o que sobra é só escrita: o ResumoMetas, o
+Consolidado e os gráficos. `EstagioSaidas` recebe esse trabalho e devolve o controle
+ao script na hora:
+
+* escritas de arquivos (resumo, consolidado) vão para threads, já que passam a maior
+  parte do tempo em E/S;
+* gráficos vão para um pool de processos próprio com o backend Agg (matplotlib não é
+  thread-safe e desenhar é CPU), recebendo só as descrições de comum/graficos.py. Os
+  processos não são criados com fork: as threads de escrita já podem estar rodando (com
+  uma trava tomada) e um filho criado com fork nesse momento pode travar;
+* `aguardar()` espera tudo no fim e retorna os tempos de escrita e de renderização,
+  separados do tempo do ETL. Erros de uma saída são informados e não derrubam as outras.
+
+Mais gráficos aumentam o trabalho do pool de renderização, não o tempo até as metas
+ficarem prontas. Com instrumentação, cada saída vira uma etapa (também as desenhadas nos
+processos do pool, cujos eventos voltam junto com o resultado).
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from comum.graficos import desenhar, usar_backend_sem_tela
+from comum.instrumentacao import Instrumentacao
+
+# Instrumentação dos processos de renderização (configurada pelo initializer do pool)
+_instrumentacao_processo = Instrumentacao(ativa=False)
+
+
+def _contexto_renderizadores():
+    """forkserver onde existe (POSIX) e spawn nos demais sistemas: nunca fork com threads vivas."""
+    metodo = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(metodo)
+
+
+def _iniciar_renderizador(configuracao):
+    usar_backend_sem_tela()
+    _instrumentacao_processo.configurar(*configuracao)
+
+
+def _renderizar_medido(funcao, args, atributos):
+    """Executa `funcao(*args)` em um processo do pool; retorna (resultado, segundos, eventos)."""
+    inicio = time.perf_counter()
+    with _instrumentacao_processo.etapa("renderizar", **atributos):
+        resultado = funcao(*args)
+    return resultado, time.perf_counter() - inicio, _instrumentacao_processo.coletar()
+
+
+class EstagioSaidas:
+    """
+    Escritas em threads e gráficos em processos, aguardados juntos no fim (usar com `with`).
+
+    O pool de renderização só é criado no primeiro gráfico; `processos` None usa um por
+    core. `instrumentacao` (opcional) recebe as etapas de cada saída.
+    """
+
+    def __init__(self, processos=None, threads=3, instrumentacao=None, emitir=print):
+        self.processos = max(1, processos or os.cpu_count() or 1)
+        self.instrumentacao = instrumentacao or Instrumentacao(ativa=False)
+        self.emitir = emitir
+        self._escritores = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="saida")
+        self._renderizadores = None
+        self._pendentes = [] # (tipo, nome, futuro)
+        self._trava = threading.Lock()
+
+    def escrever(self, nome, funcao, *args):
+        """Executa `funcao(*args)` em uma thread de escrita (ex.: gravar o ResumoMetas)."""
+        def medida():
+            inicio = time.perf_counter()
+            with self.instrumentacao.etapa("escrever", saida=nome):
+                resultado = funcao(*args)
+            return resultado, time.perf_counter() - inicio
+        self._registrar("escrita", nome, self._escritores.submit(medida))
+
+    def renderizar(self, nome, funcao, *args):
+        """Executa `funcao(*args)` em um processo de renderização (função de módulo, picklable)."""
+        if self._renderizadores is None:
+            self._renderizadores = ProcessPoolExecutor(
+                max_workers=self.processos, mp_context=_contexto_renderizadores(),
+                initializer=_iniciar_renderizador, initargs=(self.instrumentacao.configuracao(),))
+        futuro = self._renderizadores.submit(_renderizar_medido, funcao, args, {"saida": nome})
+        self._registrar("renderizacao", nome, futuro)
+
+    def desenhar(self, graficos):
+        """Envia as descrições de gráficos (comum/graficos.py) ao pool de renderização."""
+        for grafico in graficos:
+            if grafico is not None:
+                self.renderizar(os.path.basename(grafico["caminho"]), desenhar, grafico)
+
+    def _registrar(self, tipo, nome, futuro):
+        with self._trava:
+            self._pendentes.append((tipo, nome, futuro))
+
+    def aguardar(self):
+        """
+        Espera todas as saídas enviadas até agora. Retorna {"escrita": s, "renderizacao": s,
+        "graficos": n, "falhas": [nomes], "espera": s}, com o tempo somado de cada tipo e o
+        tempo que o script ficou parado aqui esperando.
+        """
+        inicio_espera = time.perf_counter()
+        tempos = {"escrita": 0.0, "renderizacao": 0.0, "graficos": 0, "falhas": []}
+        with self._trava:
+            pendentes, self._pendentes = self._pendentes, []
+        for tipo, nome, futuro in pendentes:
+            try:
+                if tipo == "escrita":
+                    _, segundos = futuro.result()
+                else:
+                    _, segundos, eventos = futuro.result()
+                    self.instrumentacao.incorporar(eventos)
+                    tempos["graficos"] += 1
+            except Exception as e:
+                self.emitir(f"Erro ao gerar a saída {nome}: {e}")
+                tempos["falhas"].append(nome)
+                continue
+            tempos[tipo] += segundos
+        tempos["espera"] = time.perf_counter() - inicio_espera
+        return tempos
+
+    def descrever(self, tempos):
+        """Resumo dos tempos de `aguardar()` em uma linha."""
+        texto = f"escrita {tempos['escrita']:.2f}s"
+        if tempos["graficos"]:
+            texto += (f", renderização de {tempos['graficos']} gráfico(s) {tempos['renderizacao']:.2f}s "
+                      f"em até {self.processos} processo(s)")
+        return texto + f"; espera no fim {tempos['espera']:.2f}s"
+
+    def fechar(self):
+        self._escritores.shutdown(wait=True)
+        if self._renderizadores is not None:
+            self._renderizadores.shutdown(wait=True, cancel_futures=True)
+            self._renderizadores = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        self.fechar()
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Série mensal acumulada das metas: o cumprimento de cada meta, por tribunal, considerando
+só o que aconteceu até o fim de cada mês do ano.
+
+Cada linha dos CSVs traz o mês do caso novo (`mes_cnm1`) e o mês da sentença (`mes_sent`).
+Em uma única passada pelos dados, as colunas das metas são somadas por tribunal e por mês:
+
+* as colunas de julgados (numeradores) no mês da sentença;
+* as demais (distribuídos, casos novos, dessobrestados e suspensos) no mês do caso novo;
+* linhas sem mês (ou com mês inválido) entram no "mês 0", contado desde o início, para
+  que o acumulado até dezembro seja igual ao total do ano (o ResumoMetas).
+
+As somas mensais ficam em colunas largas `<coluna>@<mês>` (uma linha por tribunal), então
+se juntam como as somas do ano (`somar_por_tribunal`) e cabem no estado incremental. As
+curvas saem de um cumsum vetorizado sobre a matriz tribunal x coluna x mês, e as metas de
+todos os cortes são avaliadas de uma vez (`avaliar_metas`).
+
+`EstadoSerieMensal` guarda as somas mensais de cada arquivo entre execuções: um mês novo,
+seja em um arquivo novo ou em linhas anexadas ao fim de um arquivo já processado, é
+somado sem reler os meses anteriores.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from comum.cache import hash_conteudo
+from comum.compactados import compressao
+from comum.incremental import EstadoIncremental
+from comum.ingestao import COLUNAS_CATEGORICAS, ler_csv_tipado
+from comum.metas import (COLUNAS_METAS, METAS_POR_RAMO, METAS_POR_TRIBUNAL, NOMES_METAS, avaliar_metas,
+                         chave_da_tabela, somar_por_tribunal)
+
+MESES = 12
+COLUNA_MES_JULGADOS = "mes_sent"
+COLUNA_MES_DEMAIS = "mes_cnm1"
+COLUNAS_SERIE = ["sigla_tribunal", "ramo_justica", "mes", "meta", "valor"]
+
+
+def _colunas_de_julgados():
+    colunas = {}
+    for tabela in (*METAS_POR_RAMO.values(), *METAS_POR_TRIBUNAL.values()):
+        for formula in tabela.values():
+            for coluna in (formula.julgados,) if isinstance(formula.julgados, str) else formula.julgados:
+                colunas[coluna] = None
+    return list(colunas)
+
+
+# Numeradores das fórmulas: somados no mês da sentença
+COLUNAS_JULGADOS = _colunas_de_julgados()
+
+
+def nome_mensal(coluna, mes):
+    return f"{coluna}@{mes:02d}"
+
+
+def colunas_mensais(colunas=None):
+    """Colunas largas das somas mensais: cada coluna das metas nos meses 0 (sem mês) a 12."""
+    if colunas is None:
+        colunas = COLUNAS_METAS
+    return [nome_mensal(coluna, mes) for coluna in colunas for mes in range(MESES + 1)]
+
+
+def _meses(serie):
+    """Mês (1 a 12) de cada linha; vazio ou inválido vira 0."""
+    meses = pd.to_numeric(pd.Series(serie, dtype=object), errors="coerce").to_numpy(dtype=np.float64)
+    validos = (meses >= 1) & (meses <= MESES) & (meses == np.floor(meses))
+    return np.where(validos, meses, 0).astype(np.intp)
+
+
+def somar_por_mes(df, colunas=None):
+    """
+    Somas de `df` por tribunal e mês, em colunas largas (`colunas_mensais`): uma linha por
+    (sigla_tribunal, ramo_justica), no formato de `somar_por_tribunal`.
+    """
+    if colunas is None:
+        colunas = COLUNAS_METAS
+    presentes = [coluna for coluna in colunas if coluna in df.columns]
+    ramos = df["ramo_justica"] if "ramo_justica" in df.columns else pd.Series(np.nan, index=df.index)
+    # Ramo vazio vira "" só para o factorize (NaN não forma grupo); volta a NaN no fim
+    chaves = pd.MultiIndex.from_arrays([df["sigla_tribunal"].astype(object), ramos.astype(object).fillna("")])
+    grupos, unicos = pd.factorize(chaves)
+    validas = grupos >= 0 # Linhas sem sigla ficam de fora (como em somar_por_tribunal)
+
+    largas = np.zeros((len(unicos), len(presentes), MESES + 1))
+    for papel, coluna_mes in ((True, COLUNA_MES_JULGADOS), (False, COLUNA_MES_DEMAIS)):
+        indices = [j for j, coluna in enumerate(presentes) if (coluna in COLUNAS_JULGADOS) == papel]
+        if not indices:
+            continue
+        meses = _meses(df[coluna_mes]) if coluna_mes in df.columns else np.zeros(len(df), dtype=np.intp)
+        posicao = (grupos * (MESES + 1) + meses)[validas]
+        for j in indices:
+            valores = df[presentes[j]].to_numpy(dtype=np.float64, na_value=0.0)[validas]
+            largas[:, j, :] = np.bincount(posicao, weights=valores, minlength=len(unicos) * (MESES + 1)) \
+                .reshape(len(unicos), MESES + 1)
+
+    somas = pd.DataFrame(largas.reshape(len(unicos), -1), columns=colunas_mensais(presentes))
+    somas.insert(0, "ramo_justica", pd.Series(unicos.get_level_values(1), dtype=object).replace("", np.nan))
+    somas.insert(0, "sigla_tribunal", pd.Series(unicos.get_level_values(0), dtype=object))
+    return somar_por_tribunal(somas, colunas_mensais(presentes))
+
+
+def somar_arquivo_por_mes(caminho, intervalo=None, encoding="latin1"):
+    """Somas mensais de um CSV (ou de um intervalo de bytes dele, com o cabeçalho do arquivo)."""
+    df = ler_csv_tipado(caminho, COLUNAS_METAS, COLUNAS_CATEGORICAS + [COLUNA_MES_DEMAIS, COLUNA_MES_JULGADOS],
+                        encoding=encoding, intervalo=intervalo)
+    if "sigla_tribunal" not in df.columns:
+        return pd.DataFrame(columns=["sigla_tribunal", "ramo_justica"])
+    return somar_por_mes(df)
+
+
+def curvas_acumuladas(somas_mensais, colunas=None):
+    """
+    Metas acumuladas até o fim de cada mês, em formato longo: uma linha por
+    (sigla_tribunal, ramo_justica, mes, meta), com as metas que se aplicam ao tribunal.
+    """
+    if colunas is None:
+        colunas = COLUNAS_METAS
+    somas_mensais = somas_mensais.reset_index(drop=True)
+    presentes = [coluna for coluna in colunas if nome_mensal(coluna, 0) in somas_mensais.columns]
+    n = len(somas_mensais)
+    if n == 0 or not presentes:
+        return pd.DataFrame(columns=COLUNAS_SERIE)
+
+    # tribunal x coluna x mês -> acumulado -> (tribunal, mês) x coluna, meses 1 a 12
+    matriz = somas_mensais[colunas_mensais(presentes)].to_numpy(dtype=np.float64).reshape(n, len(presentes), MESES + 1)
+    acumulado = np.cumsum(matriz, axis=2)[:, :, 1:]
+    cortes = pd.DataFrame(acumulado.transpose(0, 2, 1).reshape(n * MESES, len(presentes)), columns=presentes)
+    chaves = np.repeat(chave_da_tabela(somas_mensais["sigla_tribunal"], somas_mensais["ramo_justica"]).to_numpy(), MESES)
+    valores = avaliar_metas(cortes, chaves)
+
+    largas = pd.DataFrame({
+        "sigla_tribunal": np.repeat(somas_mensais["sigla_tribunal"].to_numpy(dtype=object), MESES),
+        "ramo_justica": np.repeat(somas_mensais["ramo_justica"].to_numpy(dtype=object), MESES),
+        "mes": np.tile(np.arange(1, MESES + 1), n),
+        **{meta: valores[meta] for meta in NOMES_METAS},
+    })
+    longas = largas.melt(id_vars=["sigla_tribunal", "ramo_justica", "mes"], value_vars=NOMES_METAS,
+                         var_name="meta", value_name="valor").dropna(subset=["valor"])
+    # Ordem das metas como no ResumoMetas
+    longas["meta"] = pd.Categorical(longas["meta"], categories=NOMES_METAS, ordered=True)
+    longas = longas.sort_values(["sigla_tribunal", "meta", "mes"], ignore_index=True)
+    longas["meta"] = longas["meta"].astype(object)
+    return longas[COLUNAS_SERIE]
+
+
+class EstadoSerieMensal(EstadoIncremental):
+    """
+    Somas mensais por arquivo, persistidas entre execuções. Além de arquivos novos e
+    alterados, reconhece arquivos que só cresceram (linhas anexadas ao fim, ex.: o mês
+    seguinte): só os bytes novos são lidos e somados à parcial gravada.
+    """
+
+    def __init__(self, diretorio, colunas=None):
+        super().__init__(diretorio, colunas_mensais(colunas))
+
+    def inicio_anexado(self, caminho):
+        """
+        Offset até onde `caminho` já foi somado, se o arquivo só ganhou linhas no fim desde
+        a última execução (o conteúdo anterior continua igual byte a byte); senão None.
+        """
+        registro = self.arquivos.get(os.path.abspath(caminho))
+        if registro is None or compressao(caminho) is not None: # Compactado: sempre relido inteiro
+            return None
+        anterior = registro["origem"]
+        if os.path.getsize(caminho) <= anterior["tamanho"] or anterior["tamanho"] == 0:
+            return None
+        with open(caminho, "rb") as f:
+            f.seek(anterior["tamanho"] - 1)
+            if f.read(1) != b"\n":
+                return None
+        if hash_conteudo(caminho, anterior["tamanho"]) != anterior["sha1"]:
+            return None
+        return anterior["tamanho"]
+
+    def sincronizar(self, arquivos, calcular_somas, mapear=map):
+        """
+        Como `EstadoIncremental.sincronizar`, mas `calcular_somas` recebe uma tarefa
+        (caminho, intervalo): intervalo None para o arquivo inteiro ou (inicio, fim) com só
+        as linhas anexadas. Retorna também a lista de arquivos que só tiveram linhas anexadas.
+        """
+        a_processar, removidos = self.pendentes(arquivos)
+        tarefas = []
+        for caminho, digital in a_processar.items():
+            inicio = self.inicio_anexado(caminho)
+            tarefas.append((caminho, None if inicio is None else (inicio, digital["tamanho"])))
+        # Maiores primeiro (em bytes a ler), para que a tarefa mais lenta não fique para o fim
+        tarefas.sort(key=lambda t: a_processar[t[0]]["tamanho"] - (t[1][0] if t[1] else 0), reverse=True)
+        falhas, anexados = [], []
+        for (caminho, intervalo), somas in zip(tarefas, mapear(calcular_somas, tarefas)):
+            if somas is None:
+                falhas.append(caminho)
+                continue
+            if intervalo is not None:
+                somas = somar_por_tribunal(pd.concat([self.ler_parcial(caminho), somas], ignore_index=True),
+                                           self.colunas)
+                anexados.append(caminho)
+            self.atualizar(caminho, somas, a_processar[caminho])
+        for caminho in removidos:
+            self.remover(caminho)
+        self.salvar()
+        return {
+            "processados": [c for c, _ in tarefas if c not in falhas],
+            "anexados": anexados,
+            "falhas": falhas,
+            "removidos": removidos,
+            "inalterados": len(arquivos) - len(tarefas),
+        }
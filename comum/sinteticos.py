@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Gerador de CSVs sintéticos de tribunais para benchmarks.
+
+Os arquivos usam os esquemas reais: cada tribunal sintético copia o cabeçalho de um
+arquivo modelo de `Dados/` (por padrão STJ, TRE e TRT) e sorteia linhas desse modelo,
+trocando a sigla e os valores das colunas das metas por inteiros aleatórios. Células
+vazias no modelo continuam vazias, então a esparsidade de cada layout é preservada.
+A geração é feita em blocos, com semente fixa, e é reprodutível byte a byte.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from comum.metas import COLUNAS_METAS
+
+MODELOS_PADRAO = ("teste_STJ.csv", "teste_TRE-MG.csv", "teste_TRT9.csv")
+LINHAS_AMOSTRA_MODELO = 2000
+LINHAS_POR_BLOCO = 100_000
+ARQUIVO_MANIFESTO = "manifesto.json"
+
+
+def _carregar_modelo(caminho):
+    """Lê as primeiras linhas de um arquivo modelo, como texto."""
+    modelo = pd.read_csv(caminho, dtype=str, keep_default_na=False, nrows=LINHAS_AMOSTRA_MODELO, encoding="utf-8")
+    if modelo.empty:
+        raise ValueError(f"Arquivo modelo sem linhas: {caminho}")
+    return modelo
+
+
+def _distribuir_linhas(linhas, tribunais, rng):
+    """Divide `linhas` entre os tribunais com tamanhos desiguais (como nos dados reais)."""
+    pesos = rng.pareto(1.5, tribunais) + 1
+    contagens = np.floor(pesos / pesos.sum() * linhas).astype(np.int64)
+    contagens[np.argmax(pesos)] += linhas - contagens.sum()
+    return contagens
+
+
+def _siglas(modelos, tribunais):
+    """Sigla de cada tribunal sintético: a do modelo na primeira vez, depois com sufixo."""
+    siglas = []
+    for i in range(tribunais):
+        base = modelos[i % len(modelos)]["sigla_tribunal"].iloc[0]
+        rodada = i // len(modelos)
+        siglas.append(base if rodada == 0 else f"{base}-S{rodada:03d}")
+    return siglas
+
+
+def gerar_dados_sinteticos(destino, linhas, tribunais, diretorio_modelos="Dados", modelos=MODELOS_PADRAO, semente=0):
+    """
+    Gera `tribunais` arquivos em `destino` somando `linhas` linhas de dados e grava um
+    manifesto com linhas, bytes e parâmetros. Se o manifesto já existir com os mesmos
+    parâmetros, os arquivos são reaproveitados. Retorna o manifesto.
+    """
+    parametros = {
+        "linhas": int(linhas),
+        "tribunais": int(tribunais),
+        "modelos": list(modelos),
+        "semente": int(semente),
+    }
+    caminho_manifesto = os.path.join(destino, ARQUIVO_MANIFESTO)
+    if os.path.exists(caminho_manifesto):
+        with open(caminho_manifesto, encoding="utf-8") as f:
+            manifesto = json.load(f)
+        if manifesto.get("parametros") == parametros and all(
+            os.path.exists(os.path.join(destino, nome)) for nome in manifesto["arquivos"]
+        ):
+            return manifesto
+
+    os.makedirs(destino, exist_ok=True)
+    for nome in os.listdir(destino):
+        if nome.endswith(".csv"):
+            os.remove(os.path.join(destino, nome))
+
+    rng = np.random.default_rng(semente)
+    tabelas = [_carregar_modelo(os.path.join(diretorio_modelos, nome)) for nome in modelos]
+    contagens = _distribuir_linhas(int(linhas), int(tribunais), rng)
+    arquivos = {}
+    for i, (sigla, quantidade) in enumerate(zip(_siglas(tabelas, int(tribunais)), contagens)):
+        modelo = tabelas[i % len(tabelas)]
+        numericas = [col for col in COLUNAS_METAS if col in modelo.columns]
+        nome = f"sintetico_{sigla}.csv"
+        caminho = os.path.join(destino, nome)
+        with open(caminho, "w", encoding="utf-8", newline="") as f:
+            f.write(",".join(modelo.columns) + "\r\n")
+            for inicio in range(0, int(quantidade), LINHAS_POR_BLOCO):
+                n = min(LINHAS_POR_BLOCO, int(quantidade) - inicio)
+                bloco = modelo.iloc[rng.integers(0, len(modelo), n)].reset_index(drop=True)
+                bloco["sigla_tribunal"] = sigla
+                valores = rng.poisson(3, size=(n, len(numericas))).astype(str)
+                preenchidas = bloco[numericas].to_numpy() != ""
+                bloco[numericas] = np.where(preenchidas, valores, "")
+                bloco.to_csv(f, header=False, index=False, lineterminator="\r\n")
+        arquivos[nome] = {"linhas": int(quantidade), "bytes": os.path.getsize(caminho)}
+
+    manifesto = {
+        "parametros": parametros,
+        "linhas": int(contagens.sum()),
+        "bytes": sum(info["bytes"] for info in arquivos.values()),
+        "arquivos": arquivos,
+    }
+    with open(caminho_manifesto, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+    return manifesto
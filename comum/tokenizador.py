@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+Tokenizador numérico vetorizado para as colunas das metas.
+
+As colunas das metas são quase sempre inteiros pequenos não negativos ou vazios. Em vez
+de criar uma string Python por célula (strip, troca de vírgula e `pd.to_numeric`), os
+campos são tratados como uma matriz de bytes (linhas x largura do campo, completada com
+zeros) e convertidos com operações do NumPy:
+
+* dígitos acumulados por Horner, uma passada por posição de caractere (a largura dos
+  campos numéricos é pequena);
+* um separador decimal opcional (`,` ou `.`), com a divisão final por 10**casas, que dá
+  o mesmo float que o parse de texto (mantissa e potência exatas);
+* campos vazios (ou só com espaços) viram NaN.
+
+Campos fora desse formato (sinal, expoente, texto, mais de 15 dígitos) são poucos e vão
+para `pd.to_numeric`, com a mesma limpeza de `converter_colunas_numericas`, então o
+resultado é sempre igual ao do caminho por strings.
+
+`ler_csv_bytes` aplica isso direto no buffer do arquivo: as posições das vírgulas e dos
+fins de linha delimitam os campos, sem passar pelo parser do pandas. Uma soma acumulada
+de "não dígitos" sobre o buffer inteiro diz, em O(1) por campo, quais campos são só
+dígitos (o caso comum); esses são convertidos por Horner sobre os bytes do próprio
+buffer, e só os demais passam pela matriz acima. Só vale para arquivos sem aspas e com
+o mesmo número de campos em todas as linhas; nos demais retorna None e quem chamou usa
+o `read_csv`.
+"""
+
+import csv
+
+import numpy as np
+import pandas as pd
+
+VIRGULA, PONTO, ESPACO, CR, LF, ASPAS = (ord(c) for c in ",. \r\n\"")
+MAXIMO_DIGITOS = 15 # Mantissa exata em float64
+LARGURA_MAXIMA = 24 # Campos numéricos mais largos vão direto para o caminho lento
+
+
+def _converter_restantes(textos):
+    """Caminho lento (pandas) para os poucos campos fora do formato simples."""
+    serie = pd.Series(textos, dtype=object).str.strip().str.replace(",", ".", regex=False)
+    return pd.to_numeric(serie, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def converter_matriz(matriz):
+    """
+    Converte uma matriz uint8 (campos x largura, completada com zeros à direita) em
+    float64. Retorna (valores, fora_do_formato): `fora_do_formato` marca os campos que
+    não são dígitos com no máximo um separador decimal (entre espaços opcionais).
+    """
+    linhas, largura = matriz.shape
+    digito = matriz - np.uint8(ord("0"))
+    eh_digito = digito < 10
+    separador = (matriz == VIRGULA) | (matriz == PONTO)
+    vazio = (matriz == 0) | (matriz == ESPACO)
+
+    # Campo válido: [espaços] dígitos/separador [espaços], com ao menos um dígito
+    conteudo = ~vazio
+    posicoes = np.arange(largura)
+    primeiro = np.where(conteudo.any(axis=1), np.argmax(conteudo, axis=1), largura)
+    ultimo = largura - 1 - np.argmax(conteudo[:, ::-1], axis=1)
+    dentro = (posicoes >= primeiro[:, None]) & (posicoes <= ultimo[:, None])
+    validos_no_meio = np.where(dentro, eh_digito | separador, True).all(axis=1)
+    separadores = (separador & dentro).sum(axis=1)
+    digitos = (eh_digito & dentro).sum(axis=1)
+    em_branco = primeiro == largura
+    simples = validos_no_meio & (separadores <= 1) & (digitos >= 1) & (digitos <= MAXIMO_DIGITOS)
+
+    mantissa = np.zeros(linhas, dtype=np.int64)
+    casas = np.zeros(linhas, dtype=np.int64)
+    depois_do_separador = np.zeros(linhas, dtype=bool)
+    for j in range(largura):
+        usar = eh_digito[:, j] & dentro[:, j]
+        mantissa = np.where(usar, mantissa * 10 + digito[:, j], mantissa)
+        casas += usar & depois_do_separador
+        depois_do_separador |= separador[:, j]
+
+    valores = mantissa.astype(np.float64) / 10.0 ** casas
+    valores[~simples] = np.nan
+    return valores, ~simples & ~em_branco
+
+
+def _matriz_de_campos(dados, inicios, fins, largura_maxima):
+    """Copia os campos [inicio, fim) de `dados` para uma matriz completada com zeros."""
+    tamanhos = fins - inicios
+    largura = int(min(tamanhos.max(initial=0), largura_maxima))
+    if largura == 0:
+        return np.zeros((len(inicios), 0), dtype=np.uint8), tamanhos
+    posicoes = np.arange(largura)
+    indices = np.minimum(inicios[:, None] + posicoes, len(dados) - 1)
+    matriz = dados[indices]
+    matriz[posicoes >= tamanhos[:, None]] = 0
+    return matriz, tamanhos
+
+
+def _converter_intervalos(conteudo, dados, digitos, nao_digitos, inicios, fins, encoding):
+    """Converte os campos [inicio, fim) do buffer para float64 (NaN no vazio)."""
+    tamanhos = fins - inicios
+    valores = np.full(len(inicios), np.nan)
+    inteiros = (tamanhos > 0) & (tamanhos <= MAXIMO_DIGITOS) & (nao_digitos[fins] == nao_digitos[inicios])
+    indices = np.flatnonzero(inteiros)
+    if len(indices):
+        comecos, larguras = inicios[indices], tamanhos[indices]
+        mantissa = np.zeros(len(indices), dtype=np.int64)
+        for k in range(int(larguras.max())):
+            dentro = k < larguras
+            mantissa = np.where(dentro, mantissa * 10 + digitos[np.minimum(comecos + k, len(digitos) - 1)], mantissa)
+        valores[indices] = mantissa
+
+    outros = np.flatnonzero((tamanhos > 0) & ~inteiros)
+    if len(outros):
+        matriz, larguras = _matriz_de_campos(dados, inicios[outros], fins[outros], LARGURA_MAXIMA)
+        convertidos, restantes = converter_matriz(matriz)
+        restantes |= larguras > LARGURA_MAXIMA
+        if restantes.any():
+            lentos = outros[restantes]
+            convertidos[restantes] = _converter_restantes(
+                [conteudo[a:b].decode(encoding) for a, b in zip(inicios[lentos], fins[lentos])]
+            )
+        valores[outros] = convertidos
+    return valores
+
+
+def _marcadores(dados):
+    """Dígitos do buffer (byte - '0') e a contagem acumulada de bytes que não são dígitos."""
+    digitos = dados - np.uint8(ord("0"))
+    return digitos, np.concatenate(([0], np.cumsum(digitos >= 10, dtype=np.int64)))
+
+
+def converter_campos(campos):
+    """
+    Converte uma sequência de campos de texto (com NaN/None nos ausentes) para float64,
+    com o mesmo resultado de strip + troca de vírgula + `pd.to_numeric(errors="coerce")`.
+    Os campos são unidos em um único buffer (uma cópia em C) e convertidos por posição.
+    """
+    campos = np.asarray(campos, dtype=object)
+    if len(campos) == 0:
+        return np.empty(0, dtype=np.float64)
+    textos = np.where(pd.isna(campos), "", campos)
+    try:
+        conteudo = "\n".join(textos).encode("utf-8")
+    except TypeError: # Algum campo não é texto
+        return _converter_restantes(campos)
+    dados = np.frombuffer(conteudo, dtype=np.uint8)
+    separadores = np.flatnonzero(dados == LF)
+    if len(separadores) != len(campos) - 1: # Quebra de linha dentro de algum campo
+        return _converter_restantes(campos)
+    inicios = np.concatenate(([0], separadores + 1))
+    fins = np.append(separadores, len(dados))
+    return _converter_intervalos(conteudo, dados, *_marcadores(dados), inicios, fins, "utf-8")
+
+
+def ler_csv_bytes(conteudo, colunas_numericas, colunas_texto=(), encoding="latin1"):
+    """
+    Lê as colunas pedidas de um CSV (bytes: cabeçalho + linhas) sem o parser do pandas.
+    Colunas numéricas saem em float64 (NaN no vazio) e as de texto como `category`.
+    Retorna None se o arquivo tiver aspas ou linhas com número de campos diferente.
+    """
+    if ASPAS in conteudo:
+        return None
+    fim_cabecalho = conteudo.find(b"\n")
+    if fim_cabecalho < 0:
+        return None
+    cabecalho = next(csv.reader([conteudo[:fim_cabecalho].decode(encoding).rstrip("\r")]))
+    posicao = {coluna: i for i, coluna in enumerate(cabecalho)}
+    numericas = [col for col in colunas_numericas if col in posicao]
+    textos = [col for col in colunas_texto if col in posicao]
+
+    dados = np.frombuffer(conteudo, dtype=np.uint8)
+    # Fins de linha do corpo (a última linha pode não ter \n)
+    quebras = np.flatnonzero(dados == LF)
+    quebras = quebras[quebras > fim_cabecalho]
+    if len(dados) and dados[-1] != LF:
+        quebras = np.append(quebras, len(dados))
+    inicios_linha = np.concatenate(([fim_cabecalho + 1], quebras[:-1] + 1))
+    fins_linha = quebras - (dados[np.maximum(quebras - 1, 0)] == CR)
+    if len(quebras) == 0:
+        return pd.DataFrame({
+            coluna: pd.Series(dtype="float64") if coluna in numericas else pd.Categorical([])
+            for coluna in cabecalho if coluna in numericas or coluna in textos
+        })
+
+    virgulas = np.flatnonzero(dados == VIRGULA)
+    virgulas = virgulas[virgulas > fim_cabecalho]
+    campos_por_linha = len(cabecalho) - 1
+    if len(virgulas) != campos_por_linha * len(quebras):
+        return None
+    matriz_virgulas = virgulas.reshape(len(quebras), campos_por_linha) if campos_por_linha else virgulas.reshape(-1, 0)
+    # Cada linha precisa ter exatamente as suas vírgulas (nenhuma linha vazia ou irregular)
+    if campos_por_linha and not ((matriz_virgulas[:, 0] >= inicios_linha) & (matriz_virgulas[:, -1] < fins_linha)).all():
+        return None
+
+    def limites(i):
+        inicio = inicios_linha if i == 0 else matriz_virgulas[:, i - 1] + 1
+        fim = fins_linha if i == campos_por_linha else matriz_virgulas[:, i]
+        return inicio, fim
+
+    # Todas as colunas numéricas de uma vez: uma conversão sobre os campos concatenados
+    convertidas = {}
+    if numericas:
+        digitos, nao_digitos = _marcadores(dados)
+        intervalos = [limites(posicao[coluna]) for coluna in numericas]
+        valores = _converter_intervalos(conteudo, dados, digitos, nao_digitos,
+                                        np.concatenate([inicio for inicio, _ in intervalos]),
+                                        np.concatenate([fim for _, fim in intervalos]), encoding)
+        convertidas = dict(zip(numericas, np.split(valores, len(numericas))))
+
+    colunas = {}
+    for coluna in cabecalho:
+        if coluna in convertidas:
+            colunas[coluna] = convertidas[coluna]
+        elif coluna in textos:
+            inicio, fim = limites(posicao[coluna])
+            matriz, _ = _matriz_de_campos(dados, inicio, fim, np.iinfo(np.int64).max)
+            fixos = np.ascontiguousarray(matriz).view(f"S{max(matriz.shape[1], 1)}").ravel() if matriz.shape[1] \
+                else np.zeros(len(inicio), dtype="S1")
+            unicos, codigos = np.unique(fixos, return_inverse=True)
+            categorias = [valor.decode(encoding) for valor in unicos]
+            if categorias and categorias[0] == "":
+                # Campo vazio = ausente (como no read_csv)
+                categorias, codigos = categorias[1:], codigos - 1
+            colunas[coluna] = pd.Categorical.from_codes(codigos.reshape(-1), categories=categorias)
+    return pd.DataFrame(colunas)
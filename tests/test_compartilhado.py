@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""Segmentos de memória compartilhada (comum/compartilhado.py): ida e volta, e nada sobrando em /dev/shm."""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from multiprocessing import shared_memory
+
+from comum.compartilhado import AcumuladorTribunais, SegmentosCompartilhados, publicar_parcial
+from comum.metas import somar_por_tribunal
+
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DADOS = os.path.join(RAIZ_PROJETO, "Dados")
+DEV_SHM = "/dev/shm"
+
+pytestmark = pytest.mark.skipif(not os.path.isdir(DEV_SHM), reason="sem /dev/shm neste sistema")
+
+
+def segmentos_em_dev_shm():
+    return set(os.listdir(DEV_SHM))
+
+
+def existe(nome):
+    try:
+        shared_memory.SharedMemory(name=nome).close()
+        return True
+    except FileNotFoundError:
+        return False
+
+
+@pytest.fixture
+def parcial():
+    return pd.DataFrame({
+        "sigla_tribunal": ["TRT6", "TJAC", "TRT6"],
+        "ramo_justica": pd.Categorical(["Trabalho", None, "Trabalho"]),
+        "casos_novos_2025": [1.0, 2.5, np.nan],
+        "julgados_2025": np.array([3, 4, 5], dtype=np.int64),
+        "dessobrestados_2025": pd.array([1, None, 2], dtype="Int64"),
+    })
+
+
+def test_publicar_e_ler(parcial):
+    antes = segmentos_em_dev_shm()
+    with SegmentosCompartilhados() as segmentos:
+        nome = segmentos.nome(0, "s")
+        descritor = publicar_parcial(parcial, nome)
+        assert nome in segmentos_em_dev_shm()
+        lido = segmentos.ler(descritor)
+        assert not existe(nome) # Removido assim que é lido
+
+    assert list(lido.columns) == list(parcial.columns)
+    assert lido["sigla_tribunal"].astype(object).tolist() == ["TRT6", "TJAC", "TRT6"]
+    assert lido["ramo_justica"].astype(object).tolist()[::2] == ["Trabalho", "Trabalho"]
+    assert pd.isna(lido["ramo_justica"].iloc[1])
+    np.testing.assert_array_equal(lido["casos_novos_2025"], parcial["casos_novos_2025"])
+    assert lido["julgados_2025"].dtype == np.int64
+    np.testing.assert_array_equal(lido["dessobrestados_2025"], [1.0, np.nan, 2.0])
+    assert segmentos_em_dev_shm() <= antes
+
+
+def test_vazio_e_ausente():
+    with SegmentosCompartilhados() as segmentos:
+        assert publicar_parcial(None, segmentos.nome("x")) is None
+        assert segmentos.ler(None) is None
+        vazio = segmentos.ler(publicar_parcial(pd.DataFrame({"casos_novos_2025": []}), segmentos.nome("vazio")))
+        assert len(vazio) == 0 and list(vazio.columns) == ["casos_novos_2025"]
+        assert segmentos.limpar() == 0
+
+
+def test_somar_em_igual_a_somar_por_tribunal(parcial):
+    colunas = ["casos_novos_2025", "julgados_2025", "dessobrestados_2025"]
+    partes = [parcial, parcial.iloc[::-1].reset_index(drop=True).assign(ramo_justica="Estadual")]
+    acumulador = AcumuladorTribunais(colunas)
+    with SegmentosCompartilhados() as segmentos:
+        for i, parte in enumerate(partes):
+            segmentos.somar_em(acumulador, publicar_parcial(somar_por_tribunal(parte, colunas), segmentos.nome(i)))
+    esperado = somar_por_tribunal(pd.concat(partes, ignore_index=True), colunas)
+    obtido = acumulador.resultado()
+    assert obtido["sigla_tribunal"].tolist() == esperado["sigla_tribunal"].astype(object).tolist()
+    assert obtido["ramo_justica"].tolist() == esperado["ramo_justica"].astype(object).tolist()
+    np.testing.assert_allclose(obtido[colunas].to_numpy(float), esperado[colunas].to_numpy(float))
+
+
+def test_sobras_removidas_na_saida(parcial):
+    # Segmentos publicados e nunca lidos (tarefa interrompida) saem no __exit__, mesmo com exceção
+    with pytest.raises(RuntimeError):
+        with SegmentosCompartilhados() as segmentos:
+            nomes = [segmentos.nome(i, "c") for i in range(3)]
+            for nome in nomes[:2]:
+                publicar_parcial(parcial, nome)
+            assert all(existe(nome) for nome in nomes[:2])
+            raise RuntimeError("tarefa interrompida")
+    assert not any(existe(nome) for nome in nomes)
+
+
+def test_nome_repetido_falha_sem_sobras(parcial):
+    with SegmentosCompartilhados() as segmentos:
+        nome = segmentos.nome("repetido")
+        publicar_parcial(parcial, nome)
+        with pytest.raises(FileExistsError):
+            publicar_parcial(parcial, nome)
+        assert segmentos.limpar() == 1
+    assert not existe(nome)
+
+
+@pytest.fixture
+def versao_p(tmp_path, monkeypatch):
+    """Versao_P rodando em um diretório temporário com alguns arquivos de Dados/."""
+    (tmp_path / "Dados").mkdir()
+    for nome in ("teste_STM.csv", "teste_TRE-AC.csv", "teste_TRT6.csv", "teste_TJSP.csv"):
+        (tmp_path / "Dados" / nome).symlink_to(os.path.join(DADOS, nome))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(os.path.join(RAIZ_PROJETO, "Versao_P"))
+    sys.modules.pop("Versao_P", None)
+    import Versao_P
+    for nome, valor in {"NUM_PROCESSES": 2, "TASK_SIZE": 256 * 1024, "SHARED_RESULTS": True, "BUILD_CUBE": True,
+                        "ALL_CHARTS": False, "INSTRUMENT": False, "COLUMNAR_OUTPUT": False, "USE_CACHE": False,
+                        "USE_INCREMENTAL": False, "DISTRIBUTED_WORKERS": []}.items():
+        monkeypatch.setattr(Versao_P, nome, valor)
+    yield Versao_P
+    sys.modules.pop("Versao_P", None)
+
+
+@pytest.mark.parametrize("config", [{}, {"MAX_MEMORY": "600MB"}, {"BUILD_CUBE": False, "PROGRESSIVE_SUMMARY": True}],
+                         ids=["acumulador", "orcamento", "progressivo"])
+def test_main_nao_deixa_segmentos(versao_p, monkeypatch, tmp_path, config):
+    for nome, valor in config.items():
+        monkeypatch.setattr(versao_p, nome, valor)
+    antes = segmentos_em_dev_shm()
+    versao_p.main()
+    assert (tmp_path / "results" / "ResumoMetas.CSV").exists()
+    assert segmentos_em_dev_shm() - antes == set()
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""Consolidado.csv montado dos bytes de origem (comum/consolidado.py) contra o `pd.concat` da versão NP."""
+
+import pandas as pd
+
+from comum.consolidado import consolidar_csv, reconciliar_cabecalhos
+
+
+def test_uniao_na_ordem_em_que_as_colunas_aparecem():
+    assert reconciliar_cabecalhos([["a", "b"], ["c", "a", "d", "b", "e"], ["e", "f"]]) == ["a", "b", "c", "d", "e", "f"]
+    assert reconciliar_cabecalhos([]) == []
+
+
+def test_mesmo_cabecalho_e_linhas_do_pd_concat(tmp_path):
+    # O primeiro arquivo é o menor: o cabeçalho não depende do volume de cada layout
+    conteudos = {
+        "a.csv": "sigla_tribunal,casos_novos_2025\nTJAC,1\n",
+        "b.csv": "sigla_tribunal,ramo_justica,julgados_2025,casos_novos_2025\n" + "TRT6,Trabalho,2,3\n" * 50,
+        "c.csv": "",
+        "d.csv": "ramo_justica,sigla_tribunal,casos_novos_2025,julgados_2025\nEleitoral,TRE-AC,4,5\n",
+        "e.csv": "sigla_tribunal,casos_novos_2025\nTJAP,6\n",
+    }
+    arquivos = []
+    for nome, conteudo in conteudos.items():
+        (tmp_path / nome).write_text(conteudo, encoding="latin1")
+        arquivos.append(str(tmp_path / nome))
+    destino = str(tmp_path / "Consolidado.csv")
+
+    resultado = consolidar_csv(arquivos, destino, encoding_origem="latin1")
+
+    esperado = pd.concat([pd.read_csv(tmp_path / nome, dtype=str) for nome, conteudo in conteudos.items() if conteudo],
+                         ignore_index=True)
+    obtido = pd.read_csv(destino, dtype=str)
+    assert resultado["colunas"] == list(esperado.columns)
+    pd.testing.assert_frame_equal(obtido, esperado)
+    assert resultado["modos"][str(tmp_path / "a.csv")] == "prefixo"
+    assert resultado["modos"][str(tmp_path / "c.csv")] == "vazio"
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""Agrupamento das linhas do cubo de metas (comum/cubo.py) pelos códigos das dimensões."""
+
+import numpy as np
+
+from comum.cubo import _agrupar
+
+
+def test_chave_grande_demais_para_int64():
+    rng = np.random.default_rng(0)
+    codigos = rng.integers(-1, 5, size=(2000, 9)).astype(np.int32)
+    grupos, inverso = _agrupar(codigos, [5] * 9)
+
+    # Com os mesmos códigos, tamanhos cujo produto passa de 2**63 (a chave de base mista estouraria)
+    enormes = [200_000] * 9
+    assert np.prod(np.array(enormes, dtype=float) + 1) > 2.0 ** 63
+    grupos_enormes, inverso_enormes = _agrupar(codigos, enormes)
+
+    np.testing.assert_array_equal(grupos_enormes, grupos)
+    np.testing.assert_array_equal(inverso_enormes, inverso)
+    np.testing.assert_array_equal(grupos[inverso], codigos)
+    assert len(grupos) == len(np.unique(codigos, axis=0))
+
+
+def test_codigos_altos_sem_colisao():
+    # Linhas diferentes que colidiriam numa chave int64 que estourasse continuam separadas
+    codigos = np.array([[199_999] * 9, [0] * 9, [199_999] * 8 + [0], [199_999] * 9], dtype=np.int32)
+    grupos, inverso = _agrupar(codigos, [200_000] * 9)
+    assert len(grupos) == 3
+    assert inverso[0] == inverso[3] and len({inverso[0], inverso[1], inverso[2]}) == 3
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""Linhas repetidas entre arquivos (comum/deduplicacao.py) e o efeito delas no ResumoMetas da versão NP."""
+
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from comum.deduplicacao import IndiceLinhas, descartar_posicoes
+
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DADOS = os.path.join(RAIZ_PROJETO, "Dados")
+sys.path.insert(0, os.path.join(RAIZ_PROJETO, "Versao_NP"))
+import Versao_NP  # noqa: E402
+
+
+def linhas_do_arquivo(nome):
+    with open(os.path.join(DADOS, nome), "rb") as f:
+        return f.read().splitlines(keepends=True)
+
+
+def gravar(caminho, cabecalho, linhas):
+    with open(caminho, "wb") as f:
+        f.write(cabecalho)
+        f.writelines(linhas)
+
+
+@pytest.fixture(scope="module")
+def trt6():
+    linhas = linhas_do_arquivo("teste_TRT6.csv")
+    return linhas[0], linhas[1:]
+
+
+def test_posicoes_das_repetidas(tmp_path):
+    cabecalho = "sigla_tribunal,casos_novos_2025\n"
+    gravar(tmp_path / "a.csv", cabecalho.encode(), [b"TJAC,1\n", b"TJAC,2\n", b"TJAC,3\n", b"TJAC,2\n"])
+    gravar(tmp_path / "b.csv", cabecalho.encode(), [b"TJAC,9\n", b"TJAC,3\n", b"TJAC,8\n", b"TJAC,1\n", b"TJAC,8\n"])
+    arquivos = [str(tmp_path / "a.csv"), str(tmp_path / "b.csv")]
+
+    indice = IndiceLinhas(str(tmp_path / "indice"))
+    indice.sincronizar(arquivos)
+    posicoes, origens = indice.duplicadas(arquivos)
+
+    np.testing.assert_array_equal(posicoes[arquivos[0]], [3])
+    np.testing.assert_array_equal(posicoes[arquivos[1]], [1, 3, 4])
+    assert origens == {(arquivos[0], arquivos[0]): 1, (arquivos[1], arquivos[0]): 2, (arquivos[1], arquivos[1]): 1}
+
+
+def test_sobreposicao_do_trt6(tmp_path, trt6):
+    # 2000 linhas reenviadas (as 1000 a 2999 do primeiro envio) e 1000 linhas novas
+    cabecalho, linhas = trt6
+    gravar(tmp_path / "envio.csv", cabecalho, linhas[:3000])
+    gravar(tmp_path / "reenvio.csv", cabecalho, linhas[1000:4000])
+    arquivos = [str(tmp_path / "envio.csv"), str(tmp_path / "reenvio.csv")]
+
+    indice = IndiceLinhas(str(tmp_path / "indice"))
+    indice.sincronizar(arquivos)
+    posicoes, origens = indice.duplicadas(arquivos)
+
+    # Repetidas dentro do próprio envio (se houver) são as mesmas de qualquer leitura do arquivo
+    texto = pd.read_csv(arquivos[0], dtype=str, encoding="latin1")
+    np.testing.assert_array_equal(posicoes.get(arquivos[0], []), np.flatnonzero(texto.duplicated().to_numpy()))
+    repetidas = posicoes[arquivos[1]]
+    assert list(repetidas[:2000]) == list(range(2000))
+    assert origens[(arquivos[1], arquivos[0])] == 2000
+    # Sem as repetidas, o reenvio só traz as 1000 linhas novas (menos as repetidas entre elas)
+    novas = descartar_posicoes(pd.read_csv(arquivos[1], dtype=str, encoding="latin1"), repetidas)
+    assert len(novas) == 1000 - len(repetidas[2000:])
+    assert not novas.duplicated().any()
+
+
+def test_descartar_posicoes_em_blocos():
+    df = pd.DataFrame({"x": range(10)})
+    posicoes = np.array([0, 3, 4, 9])
+    blocos = [descartar_posicoes(df.iloc[inicio:inicio + 4], posicoes, inicio) for inicio in range(0, 10, 4)]
+    assert pd.concat(blocos)["x"].tolist() == [1, 2, 5, 6, 7, 8]
+    assert descartar_posicoes(df, None) is df
+
+
+def rodar_np(monkeypatch, entrada, saida, **config):
+    """Executa a versão NP sobre `entrada` com as saídas em `saida` e retorna o ResumoMetas (texto)."""
+    os.makedirs(saida, exist_ok=True)
+    caminhos = {
+        "DIRETORIO_ENTRADA": str(entrada),
+        "ARQUIVO_CONSOLIDADO": os.path.join(saida, "Consolidado.csv"),
+        "ARQUIVO_RESUMO_METAS": os.path.join(saida, "ResumoMetas.csv"),
+        "ARQUIVO_GRAFICO": os.path.join(saida, "grafico_meta1.png"),
+        "ARQUIVO_TEMPO_NP": os.path.join(saida, "tempo_np.txt"),
+        "DIRETORIO_CACHE": os.path.join(saida, "cache"),
+        "DIRETORIO_ESTADO": os.path.join(saida, "estado"),
+        "DIRETORIO_INDICE_LINHAS": os.path.join(saida, "indice"),
+    }
+    padrao = {"GERAR_CONSOLIDADO_COLUNAR": False, "GERAR_CUBO": False, "GERAR_SERIE_MENSAL": False,
+              "GERAR_RESUMO_PARCIAL": False, "GERAR_GRAFICOS_METAS": False, "INSTRUMENTAR": False,
+              "PROCESSOS_GRAFICOS": 1, "LIMITE_MEMORIA": None, "DEDUPLICAR": True, "POLITICA_DUPLICADAS": "remover"}
+    for nome, valor in {**caminhos, **padrao, **config}.items():
+        monkeypatch.setattr(Versao_NP, nome, valor)
+    Versao_NP.main_np()
+    with open(caminhos["ARQUIVO_RESUMO_METAS"], encoding="utf-8") as f:
+        return f.read()
+
+
+MODOS = {
+    "streaming": {"MODO_STREAMING": True, "MODO_INCREMENTAL": False, "USAR_CACHE": False},
+    "pipeline": {"MODO_STREAMING": False, "MODO_INCREMENTAL": False, "USAR_CACHE": False,
+                 "INGESTAO_TIPADA": True, "MODO_PIPELINE": True},
+    "incremental": {"MODO_INCREMENTAL": True, "USAR_CACHE": True},
+}
+
+
+@pytest.mark.parametrize("modo", sorted(MODOS))
+def test_reenvio_nao_muda_o_resumo(tmp_path, monkeypatch, trt6, modo):
+    cabecalho, linhas = trt6
+    original = tmp_path / "original"
+    original.mkdir()
+    gravar(original / "teste_TRT6.csv", cabecalho, linhas[:4000])
+    shutil.copy(os.path.join(DADOS, "teste_STM.csv"), original)
+    esperado = rodar_np(monkeypatch, original, str(tmp_path / "saida_original"), **MODOS[modo])
+
+    # O mesmo conteúdo, com o STM reenviado inteiro e o TRT6 em dois envios que se sobrepõem
+    reenvios = tmp_path / "reenvios"
+    reenvios.mkdir()
+    gravar(reenvios / "teste_TRT6.csv", cabecalho, linhas[:3000])
+    gravar(reenvios / "teste_TRT6_reenvio.csv", cabecalho, linhas[1000:4000])
+    shutil.copy(os.path.join(DADOS, "teste_STM.csv"), reenvios)
+    shutil.copy(os.path.join(DADOS, "teste_STM.csv"), reenvios / "teste_STM_reenvio.csv")
+    obtido = rodar_np(monkeypatch, reenvios, str(tmp_path / "saida_reenvios"), **MODOS[modo])
+    assert obtido == esperado
+
+    # Sem a deduplicação, as linhas reenviadas contam duas vezes
+    duplicado = rodar_np(monkeypatch, reenvios, str(tmp_path / "saida_sem_dedup"), DEDUPLICAR=False, **MODOS[modo])
+    assert duplicado != esperado
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""Protocolo da execução distribuída (comum/distribuido.py): mensagens, parciais e arquivos do trabalhador."""
+
+import os
+import socket
+import struct
+import threading
+import zlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from comum import distribuido
+from comum.distribuido import (Coordenador, codificar_parcial, decodificar_parcial, enviar_mensagem,
+                               receber_mensagem, resolver_arquivo)
+from comum.ingestao import ler_csv_tipado
+from comum.metas import COLUNAS_METAS, somar_por_tribunal
+from comum.particionamento import planejar_tarefas
+
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DADOS = os.path.join(RAIZ_PROJETO, "Dados")
+
+
+def textos(serie):
+    """Valores de texto com os ausentes como None (o pandas pode representá-los como None ou NaN)."""
+    return [None if pd.isna(v) else v for v in serie]
+
+
+@pytest.fixture
+def par():
+    a, b = socket.socketpair()
+    yield a, b
+    a.close()
+    b.close()
+
+
+def test_mensagem_ida_e_volta(par):
+    a, b = par
+    mensagens = [{"tipo": "tarefa", "nome": "teste_TRT6.csv", "intervalo": [0, 10]}, {"texto": "órgão ç"}, [], {}]
+    for mensagem in mensagens:
+        enviar_mensagem(a, mensagem)
+    assert [receber_mensagem(b) for _ in mensagens] == mensagens
+    a.close()
+    assert receber_mensagem(b) is None # Fechada entre mensagens
+
+
+def test_formato_da_mensagem(par):
+    # 4 bytes big-endian com o tamanho, seguidos do JSON comprimido com zlib
+    a, b = par
+    enviar_mensagem(a, {"indice": 3})
+    (tamanho,) = struct.unpack(">I", b.recv(4, socket.MSG_WAITALL))
+    assert zlib.decompress(b.recv(tamanho, socket.MSG_WAITALL)) == b'{"indice": 3}'
+
+
+def test_mensagem_em_pedacos(par):
+    a, b = par
+    mensagem = {"valores": list(range(200_000))}
+    dados = zlib.compress(str(mensagem).replace("'", '"').encode(), 1)
+    quadro = struct.pack(">I", len(dados)) + dados
+    escritor = threading.Thread(target=lambda: [a.sendall(quadro[i:i + 3]) for i in range(0, len(quadro), 3)])
+    escritor.start()
+    assert receber_mensagem(b) == mensagem
+    escritor.join()
+
+
+def test_mensagem_cortada_e_grande_demais(par, monkeypatch):
+    a, b = par
+    a.sendall(struct.pack(">I", 100) + b"abc")
+    a.shutdown(socket.SHUT_WR)
+    with pytest.raises(ConnectionError):
+        receber_mensagem(b)
+
+    c, d = socket.socketpair()
+    with c, d:
+        monkeypatch.setattr(distribuido, "TAMANHO_MAXIMO_MENSAGEM", 10)
+        enviar_mensagem(c, {"valores": list(range(100))})
+        with pytest.raises(ValueError):
+            receber_mensagem(d)
+
+
+def test_parcial_ida_e_volta(par):
+    df = pd.DataFrame({
+        "sigla_tribunal": pd.Categorical(["TJAC", "TRT6", None]),
+        "ramo_justica": ["Estadual", None, "Trabalho"],
+        "casos_novos_2025": [1.5, np.nan, -0.0],
+        "linhas": np.array([1, 2, 3], dtype=np.int64),
+        "pesos": np.array([1, 2, 3], dtype=np.float32),
+    })
+    a, b = par
+    enviar_mensagem(a, codificar_parcial(df))
+    volta = decodificar_parcial(receber_mensagem(b))
+
+    assert list(volta.columns) == list(df.columns)
+    assert textos(volta["sigla_tribunal"]) == ["TJAC", "TRT6", None]
+    assert textos(volta["ramo_justica"]) == ["Estadual", None, "Trabalho"]
+    for coluna in ("casos_novos_2025", "linhas", "pesos"):
+        assert volta[coluna].dtype == df[coluna].dtype
+        np.testing.assert_array_equal(volta[coluna].to_numpy(), df[coluna].to_numpy())
+    assert np.signbit(volta["casos_novos_2025"].iloc[2])
+
+
+def test_parcial_vazia_e_ausente():
+    assert codificar_parcial(None) is None and decodificar_parcial(None) is None
+    vazio = decodificar_parcial(codificar_parcial(pd.DataFrame({"sigla_tribunal": [], "x": np.array([], float)})))
+    assert len(vazio) == 0 and list(vazio.columns) == ["sigla_tribunal", "x"]
+
+
+def test_resolver_arquivo(tmp_path):
+    (tmp_path / "dados").mkdir()
+    (tmp_path / "dados" / "teste.csv").write_text("a\n")
+    (tmp_path / "fora.csv").write_text("a\n")
+    (tmp_path / "dados" / "atalho.csv").symlink_to(tmp_path / "fora.csv")
+    dados = str(tmp_path / "dados")
+
+    assert resolver_arquivo(dados, "teste.csv") == os.path.realpath(tmp_path / "dados" / "teste.csv")
+    for nome in ("../fora.csv", str(tmp_path / "fora.csv"), "/etc/passwd", "atalho.csv", ".", "sub/../../fora.csv"):
+        with pytest.raises(ValueError):
+            resolver_arquivo(dados, nome)
+
+
+def test_coordenador_com_trabalhador_local():
+    arquivos = [os.path.join(DADOS, nome) for nome in ("teste_STM.csv", "teste_TRE-AC.csv")]
+    servidor = distribuido._Servidor(("127.0.0.1", 0), distribuido._criar_manipulador(DADOS, None))
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+    try:
+        tarefas = planejar_tarefas(arquivos)
+        resultados = Coordenador([servidor.server_address], emitir=lambda *_: None).executar(tarefas)
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+
+    assert sorted(resultados) == sorted(indice for indice, _, _ in tarefas)
+    somas = pd.concat([resultados[indice][0] for indice in sorted(resultados)], ignore_index=True)
+    obtido = somar_por_tribunal(somas, COLUNAS_METAS)
+    esperado = somar_por_tribunal(pd.concat([ler_csv_tipado(c, COLUNAS_METAS) for c in arquivos]), COLUNAS_METAS)
+    pd.testing.assert_frame_equal(obtido, esperado, check_dtype=False, check_categorical=False)
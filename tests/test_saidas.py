@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""Estágio de saídas (comum/saidas.py): escritas em threads e gráficos em processos sem fork."""
+
+import threading
+
+import pandas as pd
+
+from comum.graficos import grafico_media_por_ramo
+from comum.saidas import EstagioSaidas, _contexto_renderizadores
+
+
+def test_renderizadores_sem_fork():
+    assert _contexto_renderizadores().get_start_method() != "fork"
+
+
+def test_grafico_com_escrita_em_andamento(tmp_path):
+    # A escrita ainda está rodando (em uma thread) quando o pool de renderização sobe
+    metas = pd.DataFrame({"sigla_tribunal": ["TJAC", "TRT6"], "ramo_justica": ["Estadual", "Trabalho"],
+                          "Meta1": [98.5, 101.2]})
+    liberar = threading.Event()
+
+    def escrever_devagar(caminho):
+        liberar.wait(10)
+        caminho.write_text("ok")
+
+    with EstagioSaidas(processos=1) as saidas:
+        saidas.escrever("resumo", escrever_devagar, tmp_path / "ResumoMetas.csv")
+        saidas.desenhar([grafico_media_por_ramo(metas, "Meta1", str(tmp_path / "grafico_meta1.png"))])
+        liberar.set()
+        tempos = saidas.aguardar()
+
+    assert tempos["falhas"] == [] and tempos["graficos"] == 1
+    assert (tmp_path / "grafico_meta1.png").stat().st_size > 0
+    assert (tmp_path / "ResumoMetas.csv").read_text() == "ok"
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""O tokenizador numérico (comum/tokenizador.py) tem que dar o mesmo float do caminho por strings."""
+
+import io
+
+import numpy as np
+import pandas as pd
+
+from comum.ingestao import converter_colunas_numericas
+from comum.tokenizador import converter_campos, ler_csv_bytes
+
+CAMPOS = [
+    "0", "7", "0007", "42", " 3 ", "  12", "5  ", # inteiros, com e sem espaços
+    "1,5", "-1,5", "0,1", "12,", ",5", " 2,50", "3.14159", "2.25", ".5", "7.", # decimais com "," e "."
+    "-3", "+7", "-0", "+0", "- 1", # sinais
+    "1e3", "1E-2", "-2.5e+1", "1,5e2", # expoentes
+    "1234567890123456", "12345678901234567890", "123456789012345,5", "0,1234567890123456", # mais de 15 dígitos
+    "", "   ", "NA", "nan", None, np.nan, # vazios e ausentes
+    "abc", "1.2.3", "1,2,3", "12a", "-", ",", # fora do formato
+]
+
+
+def pelo_texto(campos):
+    """O caminho por strings: strip, vírgula decimal trocada por ponto e `pd.to_numeric`."""
+    serie = pd.Series(campos, dtype=object)
+    return pd.to_numeric(serie.str.strip().str.replace(",", ".", regex=False), errors="coerce") \
+        .to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def assert_iguais(obtido, esperado):
+    """Mesmos valores, com NaN nas mesmas posições e o mesmo sinal (inclusive em -0.0)."""
+    obtido, esperado = np.asarray(obtido, dtype=np.float64), np.asarray(esperado, dtype=np.float64)
+    np.testing.assert_array_equal(obtido, esperado)
+    np.testing.assert_array_equal(np.signbit(obtido), np.signbit(esperado))
+
+
+def test_converter_campos_igual_ao_texto():
+    assert_iguais(converter_campos(CAMPOS), pelo_texto(CAMPOS))
+
+
+def test_converter_campos_aleatorios():
+    gerador = np.random.default_rng(14)
+    partes = ["", " ", "-", "+", ",", ".", "e", "0", "1", "5", "9", "a"]
+    campos = ["".join(gerador.choice(partes, size=gerador.integers(0, 8))) for _ in range(5_000)]
+    campos += [str(valor) for valor in gerador.integers(0, 10**18, size=1_000)]
+    assert_iguais(converter_campos(campos), pelo_texto(campos))
+
+
+def test_converter_campos_vazio():
+    assert converter_campos([]).shape == (0,)
+
+
+def test_converter_colunas_numericas_igual_ao_texto():
+    df = pd.DataFrame({"a": CAMPOS, "b": list(reversed(CAMPOS))}, dtype=object)
+    esperado = {coluna: pelo_texto(df[coluna]) for coluna in df.columns}
+    converter_colunas_numericas(df, ["a", "b"])
+    for coluna, valores in esperado.items():
+        assert_iguais(df[coluna], valores)
+
+
+def csv_de(linhas):
+    return ("\n".join(linhas) + "\n").encode("latin1")
+
+
+def test_ler_csv_bytes_igual_ao_read_csv():
+    # Sem vírgula decimal: dentro do CSV a vírgula separa os campos
+    numericos = [campo for campo in CAMPOS if isinstance(campo, str) and "," not in campo]
+    linhas = ["sigla_tribunal,casos_novos,julgados,id"]
+    for i, campo in enumerate(numericos):
+        linhas.append(f"TJ{i % 3},{campo},{numericos[-1 - i]},{i}")
+    conteudo = csv_de(linhas)
+
+    obtido = ler_csv_bytes(conteudo, ["casos_novos", "julgados", "id"], ["sigla_tribunal"])
+    texto = pd.read_csv(io.BytesIO(conteudo), dtype=str, encoding="latin1")
+    convertido = converter_colunas_numericas(texto.copy(), ["casos_novos", "julgados", "id"])
+    for coluna in ["casos_novos", "julgados", "id"]:
+        assert_iguais(obtido[coluna], pelo_texto(texto[coluna]))
+        assert_iguais(obtido[coluna], convertido[coluna])
+    assert list(obtido["sigla_tribunal"].astype(object)) == list(texto["sigla_tribunal"])
+
+
+def test_ler_csv_bytes_campos_vazios_e_crlf():
+    conteudo = b"sigla_tribunal,casos_novos,julgados\r\nTJAC,,1\r\nTJAP, 2 ,\r\n,  ,3"
+    obtido = ler_csv_bytes(conteudo, ["casos_novos", "julgados"], ["sigla_tribunal"])
+    assert_iguais(obtido["casos_novos"], [np.nan, 2.0, np.nan])
+    assert_iguais(obtido["julgados"], [1.0, np.nan, 3.0])
+    assert obtido["sigla_tribunal"].isna().tolist() == [False, False, True]
+
+
+def test_ler_csv_bytes_com_aspas_retorna_none():
+    conteudo = csv_de(["sigla_tribunal,casos_novos", '"TJAC",1', "TJAP,2"])
+    assert ler_csv_bytes(conteudo, ["casos_novos"], ["sigla_tribunal"]) is None
+
+
+def test_ler_csv_bytes_linhas_irregulares_retornam_none():
+    cabecalho = "sigla_tribunal,casos_novos,julgados"
+    for linhas in (
+        [cabecalho, "TJAC,1,2", "TJAP,3"], # campo a menos
+        [cabecalho, "TJAC,1,2,4", "TJAP,3,5"], # campo a mais
+        [cabecalho, "TJAC,1", "TJAP,3,5,6"], # mesma contagem de vírgulas, linhas diferentes
+        [cabecalho, "TJAC,1,2", "", "TJAP,3,5"], # linha vazia no meio
+    ):
+        assert ler_csv_bytes(csv_de(linhas), ["casos_novos", "julgados"], ["sigla_tribunal"]) is None